@@ -39,12 +39,20 @@ from services.api.core.shared import (
     _new_id,
     AUTH_MODE
 )
-from services.api.core.repos import PlansRepoDB, NotesRepoDB, ensure_plans_schema, ensure_runs_schema, ensure_notes_schema, ensure_projects_schema, ensure_history_schema, ensure_features_schema, ensure_priority_changes_schema
+from services.api.core.repos import PlansRepoDB, NotesRepoDB, ensure_plans_schema, ensure_runs_schema, ensure_notes_schema, ensure_projects_schema, ensure_history_schema, ensure_features_schema, ensure_priority_changes_schema, ensure_llm_calls_schema
 from services.api.ui.plans import router as ui_plans_router
 from services.api.ui.auth import router as ui_auth_router
 from services.api.auth.tokens import read_token
 from services.api.auth.routes import router as auth_router, get_current_user
-from services.api.runs.routes import router as runs_router
+from services.api.runs.routes import router as runs_router, reconcile_orphaned_runs
+from services.api.runs.manifest import manifest_writer
+from services.api.runs.lease import RunHeartbeat
+from services.api.runs.retention import RunCompactor
+from services.api.core.settings import settings_cache
+from services.api.llm_cache import LLMCacheBypassMiddleware
+from services.api.llm_http import aclose_http_clients, close_http_clients, prewarm_in_background, provider_urls_from_env
+from services.api.llm_ollama import warmer as ollama_warmer
+from services.api.llm_telemetry import telemetry
 from services.api.routes.ui_requests import router as ui_requests_router
 from services.api.routes.dashboard import router as dashboard_router
 from services.api.routes.projects import router as projects_router
@@ -268,6 +276,38 @@ def _init_schemas():
         ensure_history_schema(eng)
     except Exception:
         pass
+    try:
+        ensure_llm_calls_schema(eng)
+    except Exception:
+        pass
+
+_RUNS_RECOVERED = False
+
+# Background retention for docs/plans/*/runs (RUN_RETENTION_* env; interval 0 disables)
+_run_compactor = RunCompactor(lambda: shared._repo_root())
+# Keeps this process's run leases fresh so other workers leave its runs alone (RUN_LEASE_SECONDS)
+_run_heartbeat = RunHeartbeat(lambda: shared._repo_root())
+
+def _recover_runs():
+    """
+    Resume or fail runs orphaned by a dead process (RUN_RECOVERY=off disables).
+    Once per process; runs whose lease another live process keeps renewing are
+    left alone.
+    """
+    global _RUNS_RECOVERED
+    if _RUNS_RECOVERED or os.getenv("RUN_RECOVERY", "on").strip().lower() in {"off", "0", "false", "no"}:
+        return
+    _RUNS_RECOVERED = True
+    try:
+        from services.api.ui.plans import _RUN_QUEUE
+        report = reconcile_orphaned_runs(
+            shared._repo_root(),
+            requeue=lambda plan_id, run_id: _RUN_QUEUE.put((plan_id, run_id)),
+        )
+        if any(report.values()):
+            print(f"[runs] recovered orphaned runs: {report}")
+    except Exception as e:
+        print(f"[runs] run recovery failed: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -275,6 +315,27 @@ async def lifespan(app: FastAPI):
     print("Starting lifespan...")
     try:
         _init_schemas()  # Temporarily commented out for debugging
+        _recover_runs()
+        _run_heartbeat.start()
+        _run_compactor.start()
+        # optional settings.json watcher: reads then skip the per-call stat()
+        try:
+            settings_cache.start_watch(float(os.getenv("SETTINGS_WATCH_INTERVAL_SECONDS", "0") or 0))
+        except ValueError:
+            pass
+        # open provider connections ahead of the first generation (LLM_HTTP_PREWARM=off disables)
+        if os.getenv("LLM_HTTP_PREWARM", "on").strip().lower() not in {"off", "0", "false", "no"}:
+            prewarm_in_background(provider_urls_from_env())
+        # batch LLM call records into the llm_calls table
+        try:
+            telemetry.start(float(os.getenv("LLM_TELEMETRY_FLUSH_SECONDS", "5") or 0))
+        except ValueError:
+            pass
+        # load local Ollama models now and keep them loaded (OLLAMA_WARM_INTERVAL_SECONDS=0 disables)
+        try:
+            ollama_warmer.start(float(os.getenv("OLLAMA_WARM_INTERVAL_SECONDS", "240") or 0))
+        except ValueError:
+            pass
         print("Lifespan startup complete")
         yield
         print("Lifespan yielding back")
@@ -286,9 +347,26 @@ async def lifespan(app: FastAPI):
     finally:
         # ---- shutdown (was @app.on_event("shutdown")) ----
         print("Lifespan shutdown")
-        # nothing to do here right now
-        # e.g., close DBs/threads if you add them later
-        pass
+        # each cleanup runs on its own so one failure doesn't skip the rest:
+        # debounced run manifests are persisted first, then the background
+        # threads stop (telemetry flushes its buffer) and the HTTP pools close
+        for name, cleanup in (
+            ("run manifests", manifest_writer.flush_all),
+            ("run heartbeat", _run_heartbeat.stop),
+            ("run compactor", _run_compactor.stop),
+            ("settings watcher", settings_cache.stop_watch),
+            ("llm telemetry", telemetry.stop),
+            ("ollama warmer", ollama_warmer.stop),
+            ("http clients", close_http_clients),
+        ):
+            try:
+                cleanup()
+            except Exception as e:
+                print(f"[shutdown] {name} failed: {e}")
+        try:
+            await aclose_http_clients()
+        except Exception as e:
+            print(f"[shutdown] async http clients failed: {e}")
 
 # Create app with lifespan wired (replaces deprecated on_event usage)
 print("Creating FastAPI app...")
@@ -341,6 +419,8 @@ app.add_middleware(
     allow_headers=["*"],
     allow_credentials=allow_credentials,
 )
+# Cache-Control: no-cache / X-LLM-Cache: bypass skip cached LLM answers for that request
+app.add_middleware(LLMCacheBypassMiddleware)
 
 # Mount static files (for UI templates/assets)
 try:
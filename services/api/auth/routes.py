@@ -6,7 +6,7 @@ import secrets
 from typing import Any, Dict, Optional
 from fastapi import APIRouter, Body, Cookie, Header, HTTPException, Depends, Request
 from fastapi.responses import JSONResponse, RedirectResponse
-from services.api.auth.users import FileUserStore
+from services.api.auth.users import FileUserStore, get_user_index, write_users_file
 from services.api.core.shared import _new_id
 from services.api.core.shared import _users_file
 from services.api.auth.tokens import AUTH_SECRET, issue_bearer, read_token
@@ -19,24 +19,14 @@ def _hash_pw(pw: str) -> str:
     return hashlib.sha256((pw or "").encode("utf-8")).hexdigest()
 
 def _get_user_by_id(uid: str) -> Optional[Dict[str, Any]]:
-    """Get user by ID from users file."""
-    uf = _users_file()
+    """Get user by ID from the in-memory users index (reloaded when users.json changes)."""
+    return get_user_index(_users_file()).get_by_id(uid)
+
+def _load_users_raw(uf) -> Any:
     try:
-        users_raw = json.loads(uf.read_text(encoding="utf-8"))
+        return json.loads(uf.read_text(encoding="utf-8"))
     except Exception:
-        users_raw = {}
-
-    def _iter_user_dicts(obj):
-        if isinstance(obj, dict):
-            for v in obj.values():
-                if isinstance(v, dict):
-                    yield v
-        elif isinstance(obj, list):
-            for v in obj:
-                if isinstance(v, dict):
-                    yield v
-
-    return next((u for u in _iter_user_dicts(users_raw) if u.get("id") == uid), None)
+        return {}
 
 def get_current_user(
     authorization: str = Header(default=""),
@@ -77,28 +67,12 @@ def register(payload: Dict[str, str] = Body(...)):
     if not email or not password:
         raise HTTPException(status_code=400, detail="email and password required")
 
-    # Read users.json directly
+    # check duplicate by email via the index
     uf = _users_file()
-    try:
-        users_raw = json.loads(uf.read_text(encoding="utf-8"))
-    except Exception:
-        users_raw = {}
-
-    def _iter_user_dicts(obj):
-        if isinstance(obj, dict):
-            for v in obj.values():
-                if isinstance(v, dict):
-                    yield v
-        elif isinstance(obj, list):
-            for v in obj:
-                if isinstance(v, dict):
-                    yield v
-
-    # check duplicate by email safely
-    for u in _iter_user_dicts(users_raw):
-        if str(u.get("email", "")).strip().lower() == email:
-            # behave idempotently
-            return {"status": "ok", "user": {"id": u.get("id"), "email": email, "role": u.get("role", "user")}}
+    u = get_user_index(uf).get_by_email(email)
+    if u:
+        # behave idempotently
+        return {"status": "ok", "user": {"id": u.get("id"), "email": email, "role": u.get("role", "user")}}
 
     # persist new user with default role
     uid = _new_id("u")
@@ -109,6 +83,7 @@ def register(payload: Dict[str, str] = Body(...)):
         "role": "user"  # default role
     }
 
+    users_raw = _load_users_raw(uf)
     if isinstance(users_raw, dict):
         users_raw[uid] = record
     elif isinstance(users_raw, list):
@@ -116,8 +91,7 @@ def register(payload: Dict[str, str] = Body(...)):
     else:
         users_raw = {uid: record}
 
-    uf.parent.mkdir(parents=True, exist_ok=True)
-    uf.write_text(json.dumps(users_raw, indent=2), encoding="utf-8")
+    write_users_file(uf, users_raw)
     
     return {"status": "ok", "user": {"id": uid, "email": email, "role": "user"}}
 
@@ -128,30 +102,7 @@ def auth_login(payload: Dict[str, str] = Body(...)):
     if not email or not password:
         raise HTTPException(status_code=400, detail="email and password required")
 
-    # Read users.json directly
-    uf = _users_file()
-    try:
-        users_raw = json.loads(uf.read_text(encoding="utf-8"))
-        print(f"[DEBUG] Loaded users_raw type: {type(users_raw)}, keys: {list(users_raw.keys()) if isinstance(users_raw, dict) else 'N/A'}")
-    except Exception as e:
-        print(f"[DEBUG] Failed to load users.json: {e}")
-        users_raw = {}
-
-    def _iter_user_records(obj):
-        if isinstance(obj, dict):
-            for v in obj.values():
-                if isinstance(v, dict):
-                    yield v
-        elif isinstance(obj, list):
-            for v in obj:
-                if isinstance(v, dict):
-                    yield v
-
-    user = next(
-        (u for u in _iter_user_records(users_raw)
-         if str(u.get("email", "")).strip().lower() == email),
-        None
-    )
+    user = get_user_index(_users_file()).get_by_email(email)
     print(f"[DEBUG] Found user: {user is not None}")
     if user:
         print(f"[DEBUG] User email: {user.get('email')}, has password_hash: {bool(user.get('password_hash'))}")
@@ -211,10 +162,7 @@ def promote_to_admin(
         raise HTTPException(status_code=403, detail="Admin access required")
     
     uf = _users_file()
-    try:
-        users_raw = json.loads(uf.read_text(encoding="utf-8"))
-    except Exception:
-        users_raw = {}
+    users_raw = _load_users_raw(uf)
 
     # Find target user
     target_user = None
@@ -245,6 +193,6 @@ def promote_to_admin(
     elif isinstance(users_raw, list):
         users_raw[user_key] = target_user
     
-    uf.write_text(json.dumps(users_raw, indent=2), encoding="utf-8")
+    write_users_file(uf, users_raw)
     
     return {"status": "ok", "message": f"User {target_email} promoted to admin"}
\ No newline at end of file
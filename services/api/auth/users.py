@@ -1,7 +1,8 @@
 from __future__ import annotations
 import json, os, time, uuid, threading
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 _LOCK = threading.Lock()
 
@@ -11,10 +12,112 @@ def _now() -> int:
 def _default_db() -> Dict[str, Any]:
     return {"version": 1, "users": []}
 
+def iter_user_records(obj: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Yield user dicts from any users.json shape we have written over time:
+    {"version": 1, "users": [...]}, {uid: record, ...}, or a bare list.
+    """
+    if isinstance(obj, dict):
+        for v in obj.values():
+            if isinstance(v, dict):
+                yield v
+            elif isinstance(v, list):  # "users" envelope
+                yield from (u for u in v if isinstance(u, dict))
+    elif isinstance(obj, list):
+        for v in obj:
+            if isinstance(v, dict):
+                yield v
+
+def write_users_file(path: Path, raw: Any) -> None:
+    """
+    Atomic write (temp + rename) that keeps whatever shape `raw` has. Holds
+    _LOCK like every other users-file write, since they share the temp path.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _LOCK:
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(raw, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+    get_user_index(path).refresh()
+
+@dataclass(frozen=True)
+class _Snapshot:
+    sig: Optional[Tuple[int, int, int]]  # (inode, size, mtime_ns) of the file it was built from
+    by_id: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    by_email: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+class UserIndex:
+    """
+    In-memory users.json index (by id and lowercase email).
+
+    Reads are lock-free: they compare the file's stat signature with the
+    current snapshot and only take the lock to rebuild when the file changed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._snap = _Snapshot(sig=None)
+        self.loads = 0  # number of full parses (observability/tests)
+
+    def _sig(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _current(self) -> _Snapshot:
+        snap = self._snap
+        sig = self._sig()
+        if snap.sig == sig:
+            return snap
+        return self.refresh()
+
+    def refresh(self) -> _Snapshot:
+        with self._lock:
+            sig = self._sig()
+            try:
+                txt = self.path.read_text(encoding="utf-8") if sig is not None else ""
+                raw = json.loads(txt) if txt.strip() else {}
+            except Exception:
+                raw = {}
+            by_id: Dict[str, Dict[str, Any]] = {}
+            by_email: Dict[str, Dict[str, Any]] = {}
+            for u in iter_user_records(raw):
+                if u.get("id") is not None:
+                    by_id.setdefault(str(u["id"]), u)
+                email = str(u.get("email", "")).strip().lower()
+                if email:
+                    by_email.setdefault(email, u)
+            self._snap = _Snapshot(sig=sig, by_id=by_id, by_email=by_email)
+            self.loads += 1
+            return self._snap
+
+    def get_by_id(self, uid: str) -> Optional[Dict[str, Any]]:
+        u = self._current().by_id.get(str(uid))
+        return dict(u) if u is not None else None
+
+    def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        u = self._current().by_email.get((email or "").strip().lower())
+        return dict(u) if u is not None else None
+
+_INDEXES: Dict[str, UserIndex] = {}
+
+def get_user_index(path: Path) -> UserIndex:
+    """One shared index per users file (AUTH_USERS_FILE may differ per test/app)."""
+    key = str(Path(path))
+    idx = _INDEXES.get(key)
+    if idx is None:
+        with _LOCK:
+            idx = _INDEXES.setdefault(key, UserIndex(Path(path)))
+    return idx
+
 class FileUserStore:
     def __init__(self, path: Path):
         self.path = path
         self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._index = get_user_index(self.path)
         if not self.path.exists():
             self._save(_default_db())
 
@@ -26,24 +129,13 @@ class FileUserStore:
             return json.loads(txt) if txt.strip() else _default_db()
 
     def _save(self, db: Dict[str, Any]) -> None:
-        with _LOCK:
-            tmp = self.path.with_suffix(".tmp")
-            tmp.write_text(json.dumps(db, indent=2), encoding="utf-8")
-            os.replace(tmp, self.path)
+        write_users_file(self.path, db)
 
     def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        db = self._load()
-        for u in db["users"]:
-            if u["email"].lower() == email.lower():
-                return u
-        return None
+        return self._index.get_by_email(email)
 
     def get_by_id(self, uid: str) -> Optional[Dict[str, Any]]:
-        db = self._load()
-        for u in db["users"]:
-            if u["id"] == uid:
-                return u
-        return None
+        return self._index.get_by_id(uid)
 
     def create(self, email: str, password_hash: str) -> Dict[str, Any]:
         if self.get_by_email(email):
@@ -55,6 +147,6 @@ class FileUserStore:
             "created_at": _now(),
         }
         db = self._load()
-        db["users"].append(user)
+        db.setdefault("users", []).append(user)
         self._save(db)
         return user
@@ -1,12 +1,12 @@
 # services/api/repos.py
 from __future__ import annotations
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
 from sqlalchemy import (
-    create_engine, MetaData, Table, Column, String, JSON, DateTime, Integer,
+    create_engine, MetaData, Table, Column, String, JSON, DateTime, Integer, Float, Index,
     select, insert, update, delete as sa_delete, func, ForeignKey, 
-    text, inspect, cast, asc, desc, and_, or_, true as sql_true
+    text, inspect, cast, asc, desc, and_, or_, true as sql_true, case
     
 )
 from sqlalchemy.exc import OperationalError, ProgrammingError, SQLAlchemyError
@@ -32,6 +32,7 @@ _PROJECTS_TABLE = Table(
     Column("repository_owner", String, nullable=True),
     Column("repository_name", String, nullable=True),
     Column("active_plan_id", String, nullable=True),
+    Column("plan_generation_mode", String, nullable=True),  # single | sectioned; NULL = LLM_PLAN_MODE
 )
 
 _PLANS_METADATA = MetaData()
@@ -66,6 +67,8 @@ _RUNS_TABLE = Table(
     Column("started_at", DateTime(timezone=True), nullable=True),
     Column("completed_at", DateTime(timezone=True), nullable=True),
     Column("updated_at", DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'), onupdate=text('CURRENT_TIMESTAMP')),
+    Column("owner", String, nullable=True),                  # "host:pid" holding the run's lease
+    Column("heartbeat_at", DateTime(timezone=True), nullable=True),
 )
 
 _FEATURES_METADATA = MetaData()
@@ -141,6 +144,20 @@ _HISTORY_TABLE = Table(
     Column("metadata", JSON, nullable=True),
     Column("created_at", DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP')),
 )
+# newest-first reads per project (chat context) stay index range scans
+_HISTORY_RECENT_INDEX = Index("ix_interaction_history_project_created", _HISTORY_TABLE.c.project_id, _HISTORY_TABLE.c.created_at)
+
+# Rolling summary of the history rows that fell out of the recent window
+_HISTORY_SUMMARIES_TABLE = Table(
+    "interaction_history_summaries",
+    _HISTORY_METADATA,
+    Column("project_key", String, primary_key=True),   # project id, or '*' for all projects
+    Column("step", String, primary_key=True),          # '' when not scoped to a step
+    Column("summary", String, nullable=False),
+    Column("covered_until", DateTime(timezone=True), nullable=False),  # created_at of the newest folded row
+    Column("covered_rows", Integer, nullable=False, server_default="0"),
+    Column("updated_at", DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP')),
+)
 
 _DB: Dict[str, Any] = DBS.setdefault("notes", {})
 
@@ -152,6 +169,8 @@ def ensure_agent_types_schema(engine: Engine) -> None:
 # ---------- Interaction History DB (Postgres/SQLite via SQLAlchemy) ----------
 def ensure_history_schema(engine: Engine) -> None:
     _HISTORY_METADATA.create_all(engine)
+    # create_all skips indexes of tables that already existed
+    _HISTORY_RECENT_INDEX.create(engine, checkfirst=True)
 
 class InteractionHistoryRepoDB:
     def __init__(self, engine: Engine):
@@ -167,6 +186,8 @@ class InteractionHistoryRepoDB:
             with self.engine.begin() as conn:
                 if "id" not in entry:
                     entry["id"] = str(uuid.uuid4())
+                # sub-second timestamps keep newest-first ordering stable (CURRENT_TIMESTAMP is whole seconds on SQLite)
+                entry.setdefault("created_at", datetime.now(timezone.utc))
                 conn.execute(insert(_HISTORY_TABLE).values(**entry))
         except Exception as e:
             print(f"Database error in add: {e}")
@@ -208,6 +229,121 @@ class InteractionHistoryRepoDB:
             print(f"Database error in list_all: {e}")
             return []
 
+    def list_recent(self, project_id: Optional[str] = None, step: Optional[str] = None, limit: int = 10,
+                    after: Optional[datetime] = None, with_unscoped: bool = False) -> list[dict]:
+        """
+        Newest-first rows (all projects when project_id is None), only those
+        created after `after`. With `with_unscoped`, a `step` filter also keeps
+        rows recorded without a step (plain chat turns).
+        """
+        t = _HISTORY_TABLE
+        stmt = select(t).order_by(desc(t.c.created_at)).limit(limit)
+        if project_id is not None:
+            stmt = stmt.where(t.c.project_id == project_id)
+        if step is not None:
+            stmt = stmt.where(or_(t.c.step == step, t.c.step.is_(None)) if with_unscoped else t.c.step == step)
+        if after is not None:
+            stmt = stmt.where(t.c.created_at > after)
+        try:
+            with self.engine.begin() as conn:
+                return [dict(row) for row in conn.execute(stmt).mappings()]
+        except Exception as e:
+            print(f"Database error in list_recent: {e}")
+            return []
+
+    def get_summary(self, project_key: str, step: str = "") -> Optional[dict]:
+        t = _HISTORY_SUMMARIES_TABLE
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                select(t).where(and_(t.c.project_key == project_key, t.c.step == step))
+            ).mappings().first()
+        return dict(row) if row else None
+
+    def save_summary(self, project_key: str, step: str, summary: str, covered_until: datetime, covered_rows: int) -> None:
+        t = _HISTORY_SUMMARIES_TABLE
+        values = {"summary": summary, "covered_until": covered_until, "covered_rows": covered_rows,
+                  "updated_at": datetime.now(timezone.utc)}
+        with self.engine.begin() as conn:
+            res = conn.execute(
+                update(t).where(and_(t.c.project_key == project_key, t.c.step == step)).values(**values)
+            )
+            if res.rowcount == 0:
+                conn.execute(insert(t).values(project_key=project_key, step=step, **values))
+
+# ---------- LLM call telemetry (Postgres/SQLite via SQLAlchemy) ----------
+_LLM_CALLS_METADATA = MetaData()
+_LLM_CALLS_TABLE = Table(
+    "llm_calls",
+    _LLM_CALLS_METADATA,
+    Column("id", String, primary_key=True),
+    Column("provider", String, nullable=False),
+    Column("model", String, nullable=True),
+    Column("step", String, nullable=True),         # e.g., 'prd_generation', 'story_generation'
+    Column("project_id", String, nullable=True),
+    Column("mode", String, nullable=False),        # 'sync', 'async' or 'stream'
+    Column("status", String, nullable=False),      # 'ok', 'error' or 'throttled'
+    Column("http_status", Integer, nullable=True),
+    Column("error", String, nullable=True),
+    Column("attempt", Integer, nullable=False, server_default="1"),  # >1 after failover/hedge
+    Column("latency_ms", Float, nullable=False),
+    Column("ttft_ms", Float, nullable=True),
+    Column("input_tokens", Integer, nullable=True),
+    Column("output_tokens", Integer, nullable=True),
+    Column("tokens_estimated", Integer, nullable=False, server_default="0"),
+    Column("cost_usd", Float, nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP')),
+)
+
+_LLM_CALLS_GROUPS = ("provider", "model", "step", "project_id", "status", "mode")
+
+def ensure_llm_calls_schema(engine: Engine) -> None:
+    _LLM_CALLS_METADATA.create_all(engine)
+
+class LLMCallsRepoDB:
+    def __init__(self, engine: Engine):
+        try:
+            ensure_llm_calls_schema(engine)
+        except Exception:
+            pass
+        self.engine = engine
+
+    def add_many(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        rows = [{"id": uuid.uuid4().hex, **r} for r in rows]
+        with self.engine.begin() as conn:
+            conn.execute(insert(_LLM_CALLS_TABLE), rows)
+
+    def list_recent(self, limit: int = 100, project_id: Optional[str] = None, step: Optional[str] = None) -> List[Dict[str, Any]]:
+        t = _LLM_CALLS_TABLE
+        stmt = select(t).order_by(desc(t.c.created_at)).limit(limit)
+        if project_id:
+            stmt = stmt.where(t.c.project_id == project_id)
+        if step:
+            stmt = stmt.where(t.c.step == step)
+        with self.engine.begin() as conn:
+            return [dict(row) for row in conn.execute(stmt).mappings()]
+
+    def summary(self, group_by: List[str], since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Calls, errors, latency, tokens and cost aggregated over `group_by` columns."""
+        t = _LLM_CALLS_TABLE
+        cols = [t.c[g] for g in group_by if g in _LLM_CALLS_GROUPS] or [t.c.provider]
+        stmt = select(
+            *cols,
+            func.count().label("calls"),
+            func.sum(case((t.c.status.in_(("error", "throttled")), 1), else_=0)).label("errors"),
+            func.avg(t.c.latency_ms).label("avg_latency_ms"),
+            func.max(t.c.latency_ms).label("max_latency_ms"),
+            func.avg(t.c.ttft_ms).label("avg_ttft_ms"),
+            func.sum(t.c.input_tokens).label("input_tokens"),
+            func.sum(t.c.output_tokens).label("output_tokens"),
+            func.sum(t.c.cost_usd).label("cost_usd"),
+        ).group_by(*cols).order_by(desc("calls"))
+        if since is not None:
+            stmt = stmt.where(t.c.created_at >= since)
+        with self.engine.begin() as conn:
+            return [dict(row) for row in conn.execute(stmt).mappings()]
+
 # A single metadata object for our schema
 _NOTES_METADATA = MetaData()
 
@@ -229,6 +365,13 @@ def ensure_plans_schema(engine: Engine) -> None:
 
 def ensure_runs_schema(engine: Engine) -> None:
     _RUNS_METADATA.create_all(engine)
+    # lease columns (sql/023) on runs tables created before them
+    have = {c["name"] for c in inspect(engine).get_columns("runs")}
+    missing = [(n, t) for n, t in (("owner", "TEXT"), ("heartbeat_at", "TIMESTAMP")) if n not in have]
+    if missing:
+        with engine.begin() as conn:
+            for name, type_ in missing:
+                conn.execute(text(f"ALTER TABLE runs ADD COLUMN {name} {type_}"))
 
 def ensure_features_schema(engine: Engine) -> None:
     _FEATURES_METADATA.create_all(engine)
@@ -386,7 +529,7 @@ class ProjectsRepoDB:
                 # No valid fields to update
                 return current_project
         
-        allowed = {"title", "description", "owner", "artifacts", "status", "repository_id", "repository_url", "repository_owner", "repository_name"}
+        allowed = {"title", "description", "owner", "artifacts", "status", "repository_id", "repository_url", "repository_owner", "repository_name", "plan_generation_mode"}
         payload = {k: v for k, v in fields.items() if k in allowed}
         print(f"[ProjectsRepoDB.update] payload={payload}")
         if not payload:
@@ -400,6 +543,12 @@ class ProjectsRepoDB:
             print(f"[ProjectsRepoDB.update] Updated {res.rowcount} rows")
             # res.rowcount might be 0 if not found
         return self.get(project_id)
+
+    def get_plan_generation_mode(self, project_id: str) -> Optional[str]:
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(_PROJECTS_TABLE.c.plan_generation_mode).where(_PROJECTS_TABLE.c.id == project_id)
+            ).scalar()
     
 class PlansRepoDB:
     def __init__(self, engine: Engine):
@@ -567,14 +716,16 @@ class RunsRepoDB:
         self.engine = engine
         ensure_runs_schema(engine)
 
-    def create(self, run_id: str, plan_id: str) -> dict:
+    def create(self, run_id: str, plan_id: str, owner: Optional[str] = None) -> dict:
+        lease = {"owner": owner, "heartbeat_at": datetime.now(timezone.utc)} if owner else {}
         with self.engine.begin() as conn:
             conn.execute(
-                insert(_RUNS_TABLE).values(id=run_id, plan_id=plan_id, status="queued")
+                insert(_RUNS_TABLE).values(id=run_id, plan_id=plan_id, status="queued", **lease)
             )
         return {"id": run_id, "plan_id": plan_id, "status": "queued"}
 
-    def set_running(self, run_id: str, manifest_path: str, log_path: str):
+    def set_running(self, run_id: str, manifest_path: str, log_path: str, owner: Optional[str] = None):
+        lease = {"owner": owner, "heartbeat_at": datetime.now(timezone.utc)} if owner else {}
         with self.engine.begin() as conn:
             conn.execute(
                 update(_RUNS_TABLE)
@@ -585,9 +736,32 @@ class RunsRepoDB:
                     manifest_path=manifest_path,
                     log_path=log_path,
                     started_at=func.now(),
+                    **lease,
                 )
             )
 
+    def heartbeat(self, owner: str) -> int:
+        """Renew the lease on every queued/running row `owner` holds."""
+        with self.engine.begin() as conn:
+            res = conn.execute(
+                update(_RUNS_TABLE)
+                .where(_RUNS_TABLE.c.owner == owner)
+                .where(_RUNS_TABLE.c.status.in_(("queued", "running")))
+                .values(heartbeat_at=datetime.now(timezone.utc))
+            )
+        return res.rowcount or 0
+
+    def claim(self, run_id: str, owner: str, stale_before: datetime) -> bool:
+        """Take over a run whose lease expired (or never existed); True if this caller got it."""
+        with self.engine.begin() as conn:
+            res = conn.execute(
+                update(_RUNS_TABLE)
+                .where(_RUNS_TABLE.c.id == run_id)
+                .where(or_(_RUNS_TABLE.c.heartbeat_at.is_(None), _RUNS_TABLE.c.heartbeat_at < stale_before))
+                .values(owner=owner, heartbeat_at=datetime.now(timezone.utc))
+            )
+        return res.rowcount == 1
+
     def set_completed(self, run_id: str, status: str):
         with self.engine.begin() as conn:
             conn.execute(
@@ -649,6 +823,35 @@ class RunsRepoDB:
             })
         return out
 
+    def list_by_status(self, *statuses: str) -> list[dict]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(_RUNS_TABLE.c.id, _RUNS_TABLE.c.plan_id, _RUNS_TABLE.c.status,
+                       _RUNS_TABLE.c.owner, _RUNS_TABLE.c.heartbeat_at)
+                .where(_RUNS_TABLE.c.status.in_(statuses))
+                .order_by(_RUNS_TABLE.c.created_at.asc(), _RUNS_TABLE.c.id.asc())
+            ).all()
+        return [{"id": rid, "plan_id": pid, "status": st, "owner": own, "heartbeat_at": hb}
+                for rid, pid, st, own, hb in rows]
+
+    def list_finished(self) -> list[dict]:
+        """Rows no worker will touch again (not queued/running), newest first within each plan."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(_RUNS_TABLE.c.id, _RUNS_TABLE.c.plan_id, _RUNS_TABLE.c.created_at)
+                .where(_RUNS_TABLE.c.status.notin_(("queued", "running")))
+                .order_by(_RUNS_TABLE.c.plan_id.asc(), _RUNS_TABLE.c.created_at.desc(), _RUNS_TABLE.c.id.asc())
+            ).all()
+        return [{"id": rid, "plan_id": pid, "created_at": c} for rid, pid, c in rows]
+
+    def delete_many(self, run_ids) -> int:
+        ids = [str(rid) for rid in run_ids]  # not list(): this module shadows it
+        if not ids:
+            return 0
+        with self.engine.begin() as conn:
+            res = conn.execute(sa_delete(_RUNS_TABLE).where(_RUNS_TABLE.c.id.in_(ids)))
+        return res.rowcount or 0
+
 class NotesRepoDB:
     def __init__(self, engine: Engine):
         self.engine = engine
@@ -26,6 +26,7 @@ NotesRepoDB = repos_module.NotesRepoDB
 RunsRepoDB = repos_module.RunsRepoDB
 ProjectsRepoDB = repos_module.ProjectsRepoDB
 InteractionHistoryRepoDB = repos_module.InteractionHistoryRepoDB
+LLMCallsRepoDB = repos_module.LLMCallsRepoDB
 ensure_plans_schema = repos_module.ensure_plans_schema
 ensure_runs_schema = repos_module.ensure_runs_schema
 ensure_features_schema = repos_module.ensure_features_schema
@@ -34,6 +35,7 @@ ensure_notes_schema = repos_module.ensure_notes_schema
 ensure_projects_schema = repos_module.ensure_projects_schema
 ensure_history_schema = repos_module.ensure_history_schema
 ensure_agent_types_schema = repos_module.ensure_agent_types_schema
+ensure_llm_calls_schema = repos_module.ensure_llm_calls_schema
 
 from .agent_template import AgentTemplateRepository
 from .repository import RepositoryRepository as RepositoriesRepoDB
@@ -46,6 +48,7 @@ __all__ = [
     'RunsRepoDB',
     'ProjectsRepoDB',
     'InteractionHistoryRepoDB',
+    'LLMCallsRepoDB',
     'ensure_plans_schema',
     'ensure_runs_schema',
     'ensure_features_schema',
@@ -54,6 +57,7 @@ __all__ = [
     'ensure_projects_schema',
     'ensure_history_schema',
     'ensure_agent_types_schema',
+    'ensure_llm_calls_schema',
     'RepositoriesRepoDB',
     'AgentsRepoDB',
     'AgentRunsRepoDB'
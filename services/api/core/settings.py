@@ -1,7 +1,10 @@
 from __future__ import annotations
 import json
+import os
+import threading
 from pathlib import Path
-from typing import Any, Dict
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
 # Defaults live here. Keep keys stable; UI depends on them.
 _DEFAULTS: Dict[str, Any] = {
@@ -18,8 +21,7 @@ _DEFAULTS: Dict[str, Any] = {
 def _settings_path(state_dir: Path) -> Path:
     return state_dir / "settings.json"
 
-def load_settings(state_dir: Path) -> Dict[str, Any]:
-    p = _settings_path(state_dir)
+def _read_settings_file(p: Path) -> Dict[str, Any]:
     if not p.exists():
         return _DEFAULTS.copy()
     try:
@@ -32,6 +34,105 @@ def load_settings(state_dir: Path) -> Dict[str, Any]:
         # corrupted file → return defaults (fail-safe)
         return _DEFAULTS.copy()
 
+# ---------- cached settings service ----------
+
+_Sig = Optional[Tuple[int, int, int]]  # (inode, size, mtime_ns); None = no file
+
+def _file_sig(p: Path) -> _Sig:
+    try:
+        st = p.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+class SettingsCache:
+    """
+    Parsed settings.json per state dir, shared by every reader.
+
+    A read costs one stat() while the file is unchanged; with the optional
+    watcher running (start_watch) it costs nothing, the watcher thread does
+    the stat() instead. save/update invalidate immediately and notify
+    subscribers with the new config.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[_Sig, Mapping[str, Any]]] = {}
+        self._listeners: List[Callable[[Path, Mapping[str, Any]], None]] = []
+        self._watch_stop: Optional[threading.Event] = None
+        self.loads = 0  # number of file parses (observability/tests)
+
+    def get(self, state_dir: Path) -> Mapping[str, Any]:
+        p = _settings_path(Path(state_dir))
+        key = str(p)
+        entry = self._entries.get(key)
+        if entry is not None and (self._watch_stop is not None or entry[0] == _file_sig(p)):
+            return entry[1]
+        return self._reload(p)[1]
+
+    def _reload(self, p: Path) -> Tuple[_Sig, Mapping[str, Any]]:
+        with self._lock:
+            sig = _file_sig(p)
+            old = self._entries.get(str(p))
+            if old is not None and old[0] == sig:
+                return old
+            entry = (sig, MappingProxyType(_read_settings_file(p)))
+            self._entries[str(p)] = entry
+            self.loads += 1
+        if old is not None and dict(old[1]) != dict(entry[1]):
+            self._notify(p.parent, entry[1])
+        return entry
+
+    def invalidate(self, state_dir: Optional[Path] = None) -> None:
+        with self._lock:
+            if state_dir is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(_settings_path(Path(state_dir))), None)
+
+    def subscribe(self, fn: Callable[[Path, Mapping[str, Any]], None]) -> Callable[[], None]:
+        """Register fn(state_dir, cfg) for settings changes; returns an unsubscribe callable."""
+        self._listeners.append(fn)
+        return lambda: self._listeners.remove(fn) if fn in self._listeners else None
+
+    def _notify(self, state_dir: Path, cfg: Mapping[str, Any]) -> None:
+        for fn in list(self._listeners):
+            try:
+                fn(state_dir, cfg)
+            except Exception as e:
+                print(f"[settings] listener failed: {e}")
+
+    # -- optional file watch --
+    def start_watch(self, interval_s: float = 1.0) -> None:
+        """Poll cached files in the background so reads skip stat() entirely."""
+        if self._watch_stop is not None or interval_s <= 0:
+            return
+        stop = threading.Event()
+        self._watch_stop = stop
+
+        def _loop() -> None:
+            while not stop.wait(interval_s):
+                for key, (sig, _cfg) in list(self._entries.items()):
+                    p = Path(key)
+                    if _file_sig(p) != sig:
+                        self._reload(p)
+
+        threading.Thread(target=_loop, name="settings-watch", daemon=True).start()
+
+    def stop_watch(self) -> None:
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+
+settings_cache = SettingsCache()
+
+def get_settings(state_dir: Path) -> Mapping[str, Any]:
+    """Cached, read-only view of the settings; use load_settings() for a mutable copy."""
+    return settings_cache.get(state_dir)
+
+def load_settings(state_dir: Path) -> Dict[str, Any]:
+    return dict(settings_cache.get(state_dir))
+
 def save_settings(state_dir: Path, cfg: Dict[str, Any]) -> Dict[str, Any]:
     # write atomically
     p = _settings_path(state_dir)
@@ -39,7 +140,10 @@ def save_settings(state_dir: Path, cfg: Dict[str, Any]) -> Dict[str, Any]:
     # only persist known keys
     payload = _DEFAULTS.copy()
     payload.update({k: v for k, v in (cfg or {}).items() if k in _DEFAULTS})
-    p.write_text(json.dumps(payload, indent=2, sort_keys=True), encoding="utf-8")
+    tmp = p.with_suffix(".tmp")
+    tmp.write_text(json.dumps(payload, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, p)
+    settings_cache._reload(p)
     return payload
 
 def update_settings(state_dir: Path, partial: Dict[str, Any]) -> Dict[str, Any]:
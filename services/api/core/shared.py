@@ -1,15 +1,17 @@
 from __future__ import annotations
 
 import os, json
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterator
 from functools import lru_cache
 from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine, URL
 import markdown as _markdown
 import secrets
-from services.api.core.settings import load_settings
+from services.api.core.settings import get_settings
 
 AUTH_MODE = os.getenv("AUTH_MODE", "disabled").lower() # "disabled" | "token"
 # Module-level cache for repo root
@@ -125,6 +127,16 @@ def _sort_key(entry: Dict[str, Any], key: Any) -> Any:
     # fall back to top-level field if present
     return entry.get(k, "")
 
+def env_num(name: str, default: float) -> float:
+    """Numeric setting from the environment; unset, empty or malformed values give `default`."""
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+def env_int(name: str, default: int) -> int:
+    return int(env_num(name, default))
+
 def _new_id(prefix: str) -> str:
     """Generate IDs. Tests require user IDs to start with 'u_'."""
     if prefix == "user":
@@ -172,10 +184,22 @@ def _users_file() -> Path:
     uf.parent.mkdir(parents=True, exist_ok=True)
     return uf
 
+# Serializes index.json writers in this process (request handlers, run threads,
+# the retention compactor); reentrant so _save_index works inside _locked_index.
+_INDEX_LOCK = threading.RLock()
+
 def _save_index(repo_root: Path, idx: Dict[str, dict]) -> None:
-    path = _plans_index_path(repo_root)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(idx, indent=2, ensure_ascii=False), encoding="utf-8")
+    from services.api.runs.manifest import write_json_atomic  # runs imports this module
+    with _INDEX_LOCK:
+        write_json_atomic(_plans_index_path(repo_root), idx)
+
+@contextmanager
+def _locked_index(repo_root: Path) -> Iterator[Dict[str, dict]]:
+    """Load index.json, yield it for changes and save it, all under the index lock."""
+    with _INDEX_LOCK:
+        idx = _load_index(repo_root)
+        yield idx
+        _save_index(repo_root, idx)
 
 def _plans_index_path(repo_root: Path) -> Path:
     return repo_root / "docs" / "plans" / "index.json"
@@ -192,18 +216,19 @@ def _load_index(repo_root: Path) -> Dict[str, dict]:
         return {}
 
 def _append_run_to_index(repo_root: Path, plan_id: str, run_id: str, rel_manifest: str, rel_log: str, status: str) -> None:
-    idx = _load_index(repo_root)
-    entry = idx.get(plan_id) or {"id": plan_id, "artifacts": {}}
-    runs = entry.get("runs", [])
-    runs.append({
-        "run_id": run_id,
-        "manifest_path": rel_manifest,
-        "log_path": rel_log,
-        "status": status,
-    })
-    entry["runs"] = runs
-    idx[plan_id] = entry
-    _save_index(repo_root, idx)
+    with _locked_index(repo_root) as idx:
+        entry = idx.get(plan_id) or {"id": plan_id, "artifacts": {}}
+        runs = entry.get("runs", [])
+        # upsert by run_id: status updates and resumed runs rewrite their own row
+        row = next((r for r in runs if r.get("run_id") == run_id), None)
+        if row is None:
+            row = {"run_id": run_id, "manifest_path": None, "log_path": None}
+            runs.append(row)
+        row["manifest_path"] = rel_manifest or row.get("manifest_path")
+        row["log_path"] = rel_log or row.get("log_path")
+        row["status"] = status
+        entry["runs"] = runs
+        idx[plan_id] = entry
 
 def _auth_enabled() -> bool:
     """
@@ -221,7 +246,7 @@ def _auth_enabled() -> bool:
 
     # 2) Persisted settings
     try:
-        cfg = load_settings(_repo_root())
+        cfg = get_settings(_repo_root())
         if isinstance(cfg.get("auth_enabled"), bool):
             return cfg["auth_enabled"]
     except Exception:
@@ -232,7 +257,7 @@ def _auth_enabled() -> bool:
 
 def _planner_defaults() -> dict:
     """Expose planner mode/provider defaults to callers."""
-    cfg = load_settings(_repo_root())
+    cfg = get_settings(_repo_root())
     return {
         "planner_mode": cfg.get("planner_mode", "single"),
         "default_provider": cfg.get("default_provider", "none"),
@@ -241,7 +266,7 @@ def _planner_defaults() -> dict:
     }
     
 def _github_cfg() -> dict:
-   cfg = load_settings(_repo_root())
+   cfg = get_settings(_repo_root())
    token = os.getenv("GITHUB_TOKEN") or cfg.get("github_token", "")
    # Allow '***' from settings form to mean "keep stored value"
    if token == "***":
@@ -1,8 +1,14 @@
 # services/api/llm.py
 from __future__ import annotations
 import json, os, httpx
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Protocol
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Protocol, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from services.api.llm_http import get_async_http_client, get_http_client
+from services.api.llm_limits import estimate_tokens, limiter_for
+from services.api.llm_telemetry import aobserve_call, observe_call
 
 @dataclass
 class PlanArtifacts:
@@ -17,6 +23,15 @@ class LLMClient(Protocol):
         ...
 
 
+class AsyncLLMClient(Protocol):
+    """Non-blocking providers; use the module-level agenerate_* helpers to call any client."""
+    async def agenerate_plan(self, user_request: str) -> PlanArtifacts:
+        ...
+
+    async def agenerate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        ...
+
+
 def _prompt(user_request: str) -> str:
     return f"""You are a senior software planner. From this request:
 
@@ -131,84 +146,251 @@ class MockLLM:
             implementation_plan=implementation_plan,
         )
 
-def get_llm_from_env() -> Optional[LLMClient]:
+    async def agenerate_plan(self, request_text: str) -> PlanArtifacts:
+        return self.generate_plan(request_text)
+
+    async def astream_plan(self, request_text: str) -> AsyncIterator[str]:
+        for chunk in _chunks(json.dumps(asdict(self.generate_plan(request_text)))):
+            yield chunk
+
+    async def astream_text(self, user_prompt: str, system_prompt: str = "") -> AsyncIterator[str]:
+        for chunk in _chunks(self.generate_plan(user_prompt).prd_markdown):
+            yield chunk
+
+def _chunks(text: str, size: int = 64) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def get_llm_from_env(step: Optional[str] = None) -> Optional[LLMClient]:
     """
     Return an LLM client instance based on env vars.
     Honors LLM_PROVIDER=mock (used by the test).
+    Real providers come wrapped, outermost first, in the response cache
+    (llm_cache), the near-duplicate cache (llm_similar, opt-in),
+    singleflight (llm_singleflight) and failover (llm_router).
+    `step` tags the client's calls in telemetry.
     """
+    from services.api.llm_cache import with_response_cache
+    from services.api.llm_router import with_failover
+    from services.api.llm_similar import with_similarity_cache
+    from services.api.llm_singleflight import with_singleflight
+    from services.api.llm_telemetry import tag_llm_client
+    client = tag_llm_client(with_failover(_provider_from_env()), step=step)
+    return with_response_cache(with_similarity_cache(with_singleflight(client)))
+
+def _provider_from_env() -> Optional[LLMClient]:
     provider = os.getenv("LLM_PROVIDER", "").strip().lower()
     if not provider or provider in {"none", "off", "disabled"}:
         return None
     if provider in {"mock", "test"}:
         return MockLLM()
+    return _provider_by_name(provider)
+
+def _provider_by_name(provider: str, fallback: bool = False) -> Optional[LLMClient]:
+    """
+    Build a provider from env. LLM_MODEL belongs to the primary provider, so a
+    fallback reads LLM_MODEL_<PROVIDER> instead, and is skipped (None) when
+    its credentials are missing.
+    """
+    timeout = float(os.environ.get("LLM_TIMEOUT_SECONDS", "20"))
+    model = os.environ.get(f"LLM_MODEL_{provider.upper()}" if fallback else "LLM_MODEL")
     if provider == "supabase":
-        return SupabaseLLM(
-            supabase_url=os.environ.get("SUPABASE_URL", ""),
-            supabase_key=os.environ.get("SUPABASE_ANON_KEY", ""),
-            timeout=float(os.environ.get("LLM_TIMEOUT_SECONDS", "20")),
-        )
+        url, key = os.environ.get("SUPABASE_URL", ""), os.environ.get("SUPABASE_ANON_KEY", "")
+        if fallback and not (url and key):
+            return None
+        return SupabaseLLM(supabase_url=url, supabase_key=key, timeout=timeout)
     if provider == "openai":
-        return OpenAIChatLLM(
-            api_key=os.environ.get("OPENAI_API_KEY", ""),
-            model=os.environ.get("LLM_MODEL", "gpt-4o-mini"),
-            timeout=float(os.environ.get("LLM_TIMEOUT_SECONDS", "20")),
-        )
+        api_key = os.environ.get("OPENAI_API_KEY", "")
+        if fallback and not api_key:
+            return None
+        return OpenAIChatLLM(api_key=api_key, model=model or "gpt-4o-mini", timeout=timeout)
     if provider == "anthropic":
-        return AnthropicMessagesLLM(
-            api_key=os.environ.get("ANTHROPIC_API_KEY", ""),
-            model=os.environ.get("LLM_MODEL", "claude-3-5-sonnet-latest"),
-            timeout=float(os.environ.get("LLM_TIMEOUT_SECONDS", "20")),
-        )
+        api_key = os.environ.get("ANTHROPIC_API_KEY", "")
+        if fallback and not api_key:
+            return None
+        return AnthropicMessagesLLM(api_key=api_key, model=model or "claude-3-5-sonnet-latest", timeout=timeout)
     if provider == "ollama":
         return OllamaLLM(
             base_url=os.environ.get("LLM_ENDPOINT", "http://localhost:11434"),
-            model=os.environ.get("LLM_MODEL", "llama3.1:8b"),
-            timeout=float(os.environ.get("LLM_TIMEOUT_SECONDS", "20")),
+            model=model or "llama3.1:8b",
+            timeout=timeout,
         )
     # Unknown -> disable
     return None
 
+def _artifacts_from_json(text: str) -> PlanArtifacts:
+    """Plan from an answer with local repairs only (fences, trailing commas, truncated tail)."""
+    from services.api.llm_repair import repair_plan_output
+    return repair_plan_output(text)
+
+def _model_key(provider: Any) -> str:
+    name, model = provider._limit_key
+    return f"{name}:{model}" if model else name
+
+def _complete_text(provider: Any, user_prompt: str, system_prompt: str) -> str:
+    """One non-streamed text completion (used to re-ask broken plan fragments)."""
+    url, headers, data = provider._text_request(user_prompt, system_prompt)
+    return provider._response_text(_post(provider, url, headers, data))
+
+async def _acomplete_text(provider: Any, user_prompt: str, system_prompt: str) -> str:
+    url, headers, data = provider._text_request(user_prompt, system_prompt)
+    return provider._response_text(await _apost(provider, url, headers, data))
+
+def _plan_from_output(provider: Any, text: str, user_request: str) -> PlanArtifacts:
+    """Validate and repair a plan answer; broken fragments are re-asked from `provider` (llm_repair)."""
+    from services.api.llm_repair import repair_plan_output
+    return repair_plan_output(text, user_request, lambda u, s: _complete_text(provider, u, s), _model_key(provider))
+
+async def _aplan_from_output(provider: Any, text: str, user_request: str) -> PlanArtifacts:
+    from services.api.llm_repair import arepair_plan_output
+    return await arepair_plan_output(text, user_request, lambda u, s: _acomplete_text(provider, u, s), _model_key(provider))
+
+# -----------------------------
+# Streaming
+# -----------------------------
+def _openai_sse_delta(line: str) -> str:
+    """`data: {...}` chat-completions chunk (OpenAI and the Supabase chat function)."""
+    if not line.startswith("data: ") or line[6:] in ("", "[DONE]"):
+        return ""
+    try:
+        return json.loads(line[6:]).get("choices", [{}])[0].get("delta", {}).get("content", "") or ""
+    except (json.JSONDecodeError, IndexError, AttributeError):
+        return ""
+
+def _anthropic_sse_delta(line: str) -> str:
+    if not line.startswith("data: "):
+        return ""
+    try:
+        event = json.loads(line[6:])
+    except json.JSONDecodeError:
+        return ""
+    if event.get("type") == "content_block_delta":
+        return event.get("delta", {}).get("text", "") or ""
+    return ""
+
+def _ollama_ndjson_delta(line: str) -> str:
+    try:
+        return json.loads(line).get("response", "") or ""
+    except json.JSONDecodeError:
+        return ""
+
+def _post(provider: Any, url: str, headers: Dict[str, str], data: Dict[str, Any]) -> httpx.Response:
+    """POST through the provider's limiter (429/5xx feed its adaptive concurrency) and record telemetry."""
+    with observe_call(provider, "sync", data) as call, \
+            limiter_for(*provider._limit_key).slot(estimate_tokens(data)):
+        resp = get_http_client(url).post(url, headers=headers, json=data, timeout=provider.timeout)
+        resp.raise_for_status()
+        call.response(resp)
+    return resp
+
+async def _apost(provider: Any, url: str, headers: Dict[str, str], data: Dict[str, Any]) -> httpx.Response:
+    async with aobserve_call(provider, "async", data) as call, \
+            limiter_for(*provider._limit_key).aslot(estimate_tokens(data)):
+        resp = await get_async_http_client(url).post(url, headers=headers, json=data, timeout=provider.timeout)
+        resp.raise_for_status()
+        call.response(resp)
+    return resp
+
+async def _astream(provider: Any, url: str, headers: Dict[str, str], data: Dict[str, Any],
+                   delta: Callable[[str], str]) -> AsyncIterator[str]:
+    """POST with a streaming body and yield the text delta of each line as it arrives."""
+    client = get_async_http_client(url)
+    # the slot is held for the whole stream
+    async with aobserve_call(provider, "stream", data) as call, \
+            limiter_for(*provider._limit_key).aslot(estimate_tokens(data)):
+        async with client.stream("POST", url, headers=headers, json=data, timeout=provider.timeout) as resp:
+            resp.raise_for_status()
+            call.http_status = resp.status_code
+            async for line in resp.aiter_lines():
+                call.stream_line(line)
+                chunk = delta(line)
+                if chunk:
+                    call.chunk(chunk)
+                    yield chunk
+
 class OpenAIChatLLM:
-    def __init__(self, api_key: str, model: str, timeout: float = 20.0):
+    temperature = 0.2
+
+    def __init__(self, api_key: str, model: str, timeout: float = 20.0, base_url: Optional[str] = None):
         self.api_key = api_key
         self.model = model
         self.timeout = timeout
+        # OPENAI_BASE_URL points at a compatible server (e.g. the llm_standin load-test server)
+        self.base_url = (base_url or os.environ.get("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
 
-    def generate_plan(self, user_request: str) -> PlanArtifacts:
+    @property
+    def _limit_key(self) -> Tuple[str, str]:
+        return ("openai", self.model)
+
+    def _request(self, user_request: str, *, stream: bool = False) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        return self._chat_request(
+            _prompt(user_request), "You are a careful software planner that outputs strict JSON.", stream=stream
+        )
+
+    def _chat_request(self, user_prompt: str, system_prompt: str, *, stream: bool = False) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
         if not self.api_key:
             raise RuntimeError("OPENAI_API_KEY not set")
-        url = "https://api.openai.com/v1/chat/completions"
+        url = f"{self.base_url}/chat/completions"
         headers = {"Authorization": f"Bearer {self.api_key}"}
         data = {
             "model": self.model,
             "messages": [
-                {"role": "system", "content": "You are a careful software planner that outputs strict JSON."},
-                {"role": "user", "content": _prompt(user_request)},
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
             ],
-            "temperature": 0.2,
+            "temperature": self.temperature,
         }
-        with httpx.Client(timeout=self.timeout) as client:
-            resp = client.post(url, headers=headers, json=data)
-            resp.raise_for_status()
-            content = resp.json()["choices"][0]["message"]["content"]
-        # Expect JSON string
-        obj = json.loads(content)
-        return PlanArtifacts(
-            prd_markdown=obj["prd_markdown"],
-            openapi_yaml=obj["openapi_yaml"],
-            implementation_plan=obj.get("implementation_plan", []),
-        )
+        if stream:
+            data["stream"] = True
+            data["stream_options"] = {"include_usage": True}  # final chunk carries token usage
+        return url, headers, data
+
+    def _text_request(self, user_prompt: str, system_prompt: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        return self._chat_request(user_prompt, system_prompt)
+
+    @staticmethod
+    def _response_text(resp: httpx.Response) -> str:
+        return resp.json()["choices"][0]["message"]["content"]
+
+    def generate_plan(self, user_request: str) -> PlanArtifacts:
+        url, headers, data = self._request(user_request)
+        resp = _post(self, url, headers, data)
+        return _plan_from_output(self, self._response_text(resp), user_request)
+
+    async def agenerate_plan(self, user_request: str) -> PlanArtifacts:
+        url, headers, data = self._request(user_request)
+        resp = await _apost(self, url, headers, data)
+        return await _aplan_from_output(self, self._response_text(resp), user_request)
+
+    def astream_plan(self, user_request: str) -> AsyncIterator[str]:
+        url, headers, data = self._request(user_request, stream=True)
+        return _astream(self, url, headers, data, _openai_sse_delta)
+
+    def astream_text(self, user_prompt: str, system_prompt: str = "") -> AsyncIterator[str]:
+        url, headers, data = self._chat_request(user_prompt, system_prompt or "You are a helpful AI assistant.", stream=True)
+        return _astream(self, url, headers, data, _openai_sse_delta)
 
 class AnthropicMessagesLLM:
-    def __init__(self, api_key: str, model: str, timeout: float = 20.0):
+    temperature = 0.2
+
+    def __init__(self, api_key: str, model: str, timeout: float = 20.0, base_url: Optional[str] = None):
         self.api_key = api_key
         self.model = model
         self.timeout = timeout
+        self.base_url = (base_url or os.environ.get("ANTHROPIC_BASE_URL") or "https://api.anthropic.com").rstrip("/")
 
-    def generate_plan(self, user_request: str) -> PlanArtifacts:
+    @property
+    def _limit_key(self) -> Tuple[str, str]:
+        return ("anthropic", self.model)
+
+    def _request(self, user_request: str, *, stream: bool = False) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        return self._messages_request(
+            _prompt(user_request), "You are a careful software planner that outputs strict JSON only.", stream=stream
+        )
+
+    def _messages_request(self, user_prompt: str, system_prompt: str, *, stream: bool = False) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
         if not self.api_key:
             raise RuntimeError("ANTHROPIC_API_KEY not set")
-        url = "https://api.anthropic.com/v1/messages"
+        url = f"{self.base_url}/v1/messages"
         headers = {
             "x-api-key": self.api_key,
             "anthropic-version": "2023-06-01",
@@ -216,43 +398,125 @@ class AnthropicMessagesLLM:
         data = {
             "model": self.model,
             "max_tokens": 2000,
-            "temperature": 0.2,
-            "system": "You are a careful software planner that outputs strict JSON only.",
-            "messages": [{"role": "user", "content": _prompt(user_request)}],
+            "temperature": self.temperature,
+            "system": system_prompt,
+            "messages": [{"role": "user", "content": user_prompt}],
         }
-        with httpx.Client(timeout=self.timeout) as client:
-            resp = client.post(url, headers=headers, json=data)
-            resp.raise_for_status()
-            # Claude returns a list of content blocks
-            content_blocks = resp.json()["content"]
-            text = "".join(block.get("text", "") for block in content_blocks if block.get("type") == "text")
-        obj = json.loads(text)
-        return PlanArtifacts(
-            prd_markdown=obj["prd_markdown"],
-            openapi_yaml=obj["openapi_yaml"],
-            implementation_plan=obj.get("implementation_plan", []),
-        )
+        if stream:
+            data["stream"] = True
+        return url, headers, data
+
+    def _text_request(self, user_prompt: str, system_prompt: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        return self._messages_request(user_prompt, system_prompt)
+
+    @staticmethod
+    def _response_text(resp: httpx.Response) -> str:
+        # Claude returns a list of content blocks
+        content_blocks = resp.json()["content"]
+        return "".join(block.get("text", "") for block in content_blocks if block.get("type") == "text")
+
+    def generate_plan(self, user_request: str) -> PlanArtifacts:
+        url, headers, data = self._request(user_request)
+        resp = _post(self, url, headers, data)
+        return _plan_from_output(self, self._response_text(resp), user_request)
+
+    async def agenerate_plan(self, user_request: str) -> PlanArtifacts:
+        url, headers, data = self._request(user_request)
+        resp = await _apost(self, url, headers, data)
+        return await _aplan_from_output(self, self._response_text(resp), user_request)
+
+    def astream_plan(self, user_request: str) -> AsyncIterator[str]:
+        url, headers, data = self._request(user_request, stream=True)
+        return _astream(self, url, headers, data, _anthropic_sse_delta)
+
+    def astream_text(self, user_prompt: str, system_prompt: str = "") -> AsyncIterator[str]:
+        url, headers, data = self._messages_request(user_prompt, system_prompt or "You are a helpful AI assistant.", stream=True)
+        return _astream(self, url, headers, data, _anthropic_sse_delta)
 
 class OllamaLLM:
+    # keep_alive, num_ctx/num_predict options and small-prompt batching live in llm_ollama
     def __init__(self, base_url: str, model: str, timeout: float = 20.0):
         self.base_url = base_url.rstrip("/")
         self.model = model
         self.timeout = timeout
 
+    @property
+    def _limit_key(self) -> Tuple[str, str]:
+        return ("ollama", self.model)
+
+    def _payload(self, prompt: str, system_prompt: str = "", stream: bool = False) -> Dict[str, Any]:
+        from services.api.llm_ollama import request_fields
+        data = {"model": self.model, "prompt": prompt, "stream": stream}
+        if system_prompt:
+            data["system"] = system_prompt
+        data.update(request_fields(self.base_url, self.model))
+        return data
+
+    def _request(self, user_request: str, *, stream: bool = False) -> Tuple[str, Dict[str, Any]]:
+        return f"{self.base_url}/api/generate", self._payload(_prompt(user_request), stream=stream)
+
+    def _text_request(self, user_prompt: str, system_prompt: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        return f"{self.base_url}/api/generate", {}, self._payload(user_prompt, system_prompt)
+
+    @staticmethod
+    def _response_text(resp: httpx.Response) -> str:
+        return resp.json()["response"]
+
     def generate_plan(self, user_request: str) -> PlanArtifacts:
+        url, data = self._request(user_request)
+        resp = _post(self, url, {}, data)
+        return _plan_from_output(self, self._response_text(resp), user_request)
+
+    async def agenerate_plan(self, user_request: str) -> PlanArtifacts:
+        url, data = self._request(user_request)
+        resp = await _apost(self, url, {}, data)
+        return await _aplan_from_output(self, self._response_text(resp), user_request)
+
+    def generate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        return _complete_text(self, user_prompt, system_prompt).strip()
+
+    async def agenerate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        from services.api.llm_ollama import batcher
+        return (await batcher.submit(self, user_prompt, system_prompt)).strip()
+
+    def astream_plan(self, user_request: str) -> AsyncIterator[str]:
+        url, data = self._request(user_request, stream=True)
+        return _astream(self, url, {}, data, _ollama_ndjson_delta)
+
+    def astream_text(self, user_prompt: str, system_prompt: str = "") -> AsyncIterator[str]:
         url = f"{self.base_url}/api/generate"
-        prompt = _prompt(user_request)
-        data = {"model": self.model, "prompt": prompt, "stream": False}
-        with httpx.Client(timeout=self.timeout) as client:
-            resp = client.post(url, json=data)
-            resp.raise_for_status()
-            text = resp.json()["response"]
-        obj = json.loads(text)
-        return PlanArtifacts(
-            prd_markdown=obj["prd_markdown"],
-            openapi_yaml=obj["openapi_yaml"],
-            implementation_plan=obj.get("implementation_plan", []),
-        )
+        return _astream(self, url, {}, self._payload(user_prompt, system_prompt, stream=True), _ollama_ndjson_delta)
+
+_SUPABASE_PLAN_SYSTEM_PROMPT = """You are a senior software planner. From the user's request you MUST return a strict JSON object with keys:
+- "prd_markdown": markdown product requirements (H1 title, problem, goals, non-goals, success criteria)
+- "openapi_yaml": a minimal valid OpenAPI 3.1 YAML describing the API touched by this feature
+- "implementation_plan": an array of plans. Each plan must include: id, name, description, priority (critical/high/medium/low), size_estimate_days (integer), and a "features" array. Each feature must include: id, name, description, priority, size_estimate_hours (integer), acceptance_criteria (array of bullet strings).
+Return JSON only with this structure. Do not wrap in markdown. Do not add commentary."""
+
+def _sse_content(body: str) -> str:
+    """Concatenate the delta chunks of an OpenAI-style `data: ...` event stream."""
+    content = ""
+    for line in body.splitlines():
+        if line.startswith("data: "):
+            data_str = line[6:]
+            if data_str and data_str != "[DONE]":
+                try:
+                    parsed = json.loads(data_str)
+                    chunk = parsed.get("choices", [{}])[0].get("delta", {}).get("content", "")
+                    content += chunk
+                except json.JSONDecodeError:
+                    continue
+    return content
+
+def _strip_code_fence(content: str) -> str:
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:]  # Remove ```json
+    if content.startswith("```"):
+        content = content[3:]  # Remove ```
+    if content.endswith("```"):
+        content = content[:-3]  # Remove trailing ```
+    return content.strip()
 
 class SupabaseLLM:
     def __init__(self, supabase_url: str, supabase_key: str, timeout: float = 20.0):
@@ -260,105 +524,111 @@ class SupabaseLLM:
         self.supabase_key = supabase_key
         self.timeout = timeout
 
-    def generate_plan(self, user_request: str) -> PlanArtifacts:
+    @property
+    def _limit_key(self) -> Tuple[str, str]:
+        return ("supabase", "")
+
+    def _request(self, user_prompt: str, system_prompt: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
         if not self.supabase_url or not self.supabase_key:
             raise RuntimeError("SUPABASE_URL and SUPABASE_ANON_KEY must be set")
-
         url = f"{self.supabase_url}/functions/v1/chat"
         headers = {
             "Authorization": f"Bearer {self.supabase_key}",
             "Content-Type": "application/json",
         }
-
-        system_prompt = """You are a senior software planner. From the user's request you MUST return a strict JSON object with keys:
-- "prd_markdown": markdown product requirements (H1 title, problem, goals, non-goals, success criteria)
-- "openapi_yaml": a minimal valid OpenAPI 3.1 YAML describing the API touched by this feature
-- "implementation_plan": an array of plans. Each plan must include: id, name, description, priority (critical/high/medium/low), size_estimate_days (integer), and a "features" array. Each feature must include: id, name, description, priority, size_estimate_hours (integer), acceptance_criteria (array of bullet strings).
-Return JSON only with this structure. Do not wrap in markdown. Do not add commentary."""
-
         data = {
             "messages": [
-                {"role": "user", "content": _prompt(user_request)}
+                {"role": "user", "content": user_prompt}
             ],
             "systemPrompt": system_prompt
         }
+        return url, headers, data
 
-        with httpx.Client(timeout=self.timeout) as client:
-            resp = client.post(url, headers=headers, json=data)
-            resp.raise_for_status()
+    def _chat(self, user_prompt: str, system_prompt: str) -> str:
+        url, headers, data = self._request(user_prompt, system_prompt)
+        resp = _post(self, url, headers, data)
+        # Supabase returns streaming response, need to parse it
+        content = self._response_text(resp)
+        if not content.strip():
+            raise RuntimeError("Empty response from Supabase AI")
+        return content
 
-            # Supabase returns streaming response, need to parse it
-            content = ""
-            for line in resp.iter_lines():
-                line = line.decode('utf-8') if isinstance(line, bytes) else line
-                if line.startswith("data: "):
-                    data_str = line[6:]
-                    if data_str and data_str != "[DONE]":
-                        try:
-                            parsed = json.loads(data_str)
-                            chunk = parsed.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                            content += chunk
-                        except json.JSONDecodeError:
-                            continue
-
-        # Parse the accumulated content as JSON
+    async def _achat(self, user_prompt: str, system_prompt: str) -> str:
+        url, headers, data = self._request(user_prompt, system_prompt)
+        resp = await _apost(self, url, headers, data)
+        content = self._response_text(resp)
         if not content.strip():
             raise RuntimeError("Empty response from Supabase AI")
+        return content
 
-        # Strip markdown code blocks if present
-        content = content.strip()
-        if content.startswith("```json"):
-            content = content[7:]  # Remove ```json
-        if content.startswith("```"):
-            content = content[3:]  # Remove ```
-        if content.endswith("```"):
-            content = content[:-3]  # Remove trailing ```
-        content = content.strip()
-
-        obj = json.loads(content)
-        return PlanArtifacts(
-            prd_markdown=obj["prd_markdown"],
-            openapi_yaml=obj["openapi_yaml"],
-            implementation_plan=obj.get("implementation_plan", []),
-        )
+    def _text_request(self, user_prompt: str, system_prompt: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        return self._request(user_prompt, system_prompt)
 
-    def generate_text(self, user_prompt: str, system_prompt: str = "") -> str:
-        """Generate plain text response (not JSON) from Supabase LLM."""
-        if not self.supabase_url or not self.supabase_key:
-            raise RuntimeError("SUPABASE_URL and SUPABASE_ANON_KEY must be set")
+    @staticmethod
+    def _response_text(resp: httpx.Response) -> str:
+        return _sse_content(resp.text)
 
-        url = f"{self.supabase_url}/functions/v1/chat"
-        headers = {
-            "Authorization": f"Bearer {self.supabase_key}",
-            "Content-Type": "application/json",
-        }
+    def generate_plan(self, user_request: str) -> PlanArtifacts:
+        content = self._chat(_prompt(user_request), _SUPABASE_PLAN_SYSTEM_PROMPT)
+        return _plan_from_output(self, _strip_code_fence(content), user_request)
 
-        data = {
-            "messages": [
-                {"role": "user", "content": user_prompt}
-            ],
-            "systemPrompt": system_prompt or "You are a helpful AI assistant."
-        }
+    async def agenerate_plan(self, user_request: str) -> PlanArtifacts:
+        content = await self._achat(_prompt(user_request), _SUPABASE_PLAN_SYSTEM_PROMPT)
+        return await _aplan_from_output(self, _strip_code_fence(content), user_request)
 
-        with httpx.Client(timeout=self.timeout) as client:
-            resp = client.post(url, headers=headers, json=data)
-            resp.raise_for_status()
+    def generate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        """Generate plain text response (not JSON) from Supabase LLM."""
+        return self._chat(user_prompt, system_prompt or "You are a helpful AI assistant.").strip()
 
-            # Supabase returns streaming response
-            content = ""
-            for line in resp.iter_lines():
-                line = line.decode('utf-8') if isinstance(line, bytes) else line
-                if line.startswith("data: "):
-                    data_str = line[6:]
-                    if data_str and data_str != "[DONE]":
-                        try:
-                            parsed = json.loads(data_str)
-                            chunk = parsed.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                            content += chunk
-                        except json.JSONDecodeError:
-                            continue
+    async def agenerate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        return (await self._achat(user_prompt, system_prompt or "You are a helpful AI assistant.")).strip()
 
-        if not content.strip():
-            raise RuntimeError("Empty response from Supabase AI")
+    def astream_plan(self, user_request: str) -> AsyncIterator[str]:
+        url, headers, data = self._request(_prompt(user_request), _SUPABASE_PLAN_SYSTEM_PROMPT)
+        return _astream(self, url, headers, data, _openai_sse_delta)
 
-        return content.strip()
\ No newline at end of file
+    def astream_text(self, user_prompt: str, system_prompt: str = "") -> AsyncIterator[str]:
+        url, headers, data = self._request(user_prompt, system_prompt or "You are a helpful AI assistant.")
+        return _astream(self, url, headers, data, _openai_sse_delta)
+
+# -----------------------------
+# Async entry points
+# -----------------------------
+async def agenerate_plan(llm_client: Any, user_request: str, **kwargs: Any) -> PlanArtifacts:
+    """
+    Await a plan from any client: native `agenerate_plan` when the provider
+    has one, otherwise the blocking `generate_plan` on a worker thread.
+    """
+    native = getattr(llm_client, "agenerate_plan", None)
+    if native is not None:
+        return await native(user_request, **kwargs)
+    return await run_in_threadpool(llm_client.generate_plan, user_request, **kwargs)
+
+async def agenerate_text(llm_client: Any, user_prompt: str, system_prompt: str = "") -> str:
+    native = getattr(llm_client, "agenerate_text", None)
+    if native is not None:
+        return await native(user_prompt, system_prompt)
+    return await run_in_threadpool(llm_client.generate_text, user_prompt, system_prompt)
+
+async def astream_plan(llm_client: Any, user_request: str) -> AsyncIterator[str]:
+    """
+    Yield the raw plan JSON as the provider produces it. Clients without a
+    streaming method yield the whole (non-streamed) result as one chunk.
+    """
+    native = getattr(llm_client, "astream_plan", None)
+    if native is not None:
+        async for chunk in native(user_request):
+            yield chunk
+        return
+    yield json.dumps(asdict(await agenerate_plan(llm_client, user_request)))
+
+async def astream_text(llm_client: Any, user_prompt: str, system_prompt: str = "") -> AsyncIterator[str]:
+    native = getattr(llm_client, "astream_text", None)
+    if native is not None:
+        async for chunk in native(user_prompt, system_prompt):
+            yield chunk
+        return
+    if hasattr(llm_client, "generate_text"):
+        yield await agenerate_text(llm_client, user_prompt, system_prompt)
+    else:
+        yield (await agenerate_plan(llm_client, user_prompt)).prd_markdown
@@ -0,0 +1,350 @@
+# services/api/llm_cache.py
+"""
+Response cache for LLM calls.
+
+Key: sha256 over (provider, model, temperature, system prompt, user prompt),
+computed with llm_singleflight.request_fingerprint. Text calls hash the same
+prompts singleflight coalesces on; plan calls hash the full plan prompt
+(_prompt(user_request)), while singleflight keys plans on the raw request.
+Two tiers: an in-process LRU and a SQLite file (docs/plans/llm_cache.db by
+default, LLM_CACHE_PATH to override) so answers survive restarts. Entries
+expire after LLM_CACHE_TTL_SECONDS; both tiers evict least-recently-used
+entries beyond their size limit. The async paths run cache reads and writes
+on a worker thread so SQLite never blocks the event loop.
+
+A request can skip cached answers (the fresh one is still stored) by sending
+`Cache-Control: no-cache` or `X-LLM-Cache: bypass`, or in code with
+`with bypass_llm_cache(): ...`.
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from services.api.core.shared import env_num
+from services.api.llm import PlanArtifacts, _prompt, agenerate_plan, agenerate_text
+from services.api.llm_singleflight import request_fingerprint
+
+_BYPASS: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+def cache_enabled() -> bool:
+    return os.getenv("LLM_CACHE", "on").strip().lower() not in {"off", "0", "false", "no"}
+
+
+@contextmanager
+def bypass_llm_cache(bypass: bool = True) -> Iterator[None]:
+    token = _BYPASS.set(bypass)
+    try:
+        yield
+    finally:
+        _BYPASS.reset(token)
+
+
+class LLMResponseCache:
+    """Memory LRU in front of a SQLite table; values are JSON strings."""
+
+    def __init__(self, path: Path, ttl_s: float = 7 * 86400, max_entries: int = 5000, memory_entries: int = 256):
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache(accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_s > 0 and now - created_at > self.ttl_s
+
+    def _remember(self, key: str, created_at: float, value: str) -> None:
+        self._mem[key] = (created_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_entries:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None and not self._expired(hit[0], now):
+                self._mem.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return hit[1]
+            self._mem.pop(key, None)
+            try:
+                db = self._db()
+                row = db.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and self._expired(row[1], now):
+                    db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    db.commit()
+                    row = None
+                if row is not None:
+                    db.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    db.commit()
+                    self._remember(key, row[1], row[0])
+                    self.stats["disk_hits"] += 1
+                    return row[0]
+            except sqlite3.Error as e:
+                print(f"[llm-cache] read failed: {e}")
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            self.stats["stores"] += 1
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache(key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                if self.max_entries > 0:
+                    cur = db.execute(
+                        "DELETE FROM llm_cache WHERE key IN ("
+                        " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+                    self.stats["evictions"] += max(cur.rowcount, 0)
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"[llm-cache] write failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            try:
+                self._db().execute("DELETE FROM llm_cache")
+                self._db().commit()
+            except sqlite3.Error:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        s = dict(self.stats)
+        hits = s["memory_hits"] + s["disk_hits"]
+        lookups = hits + s["misses"]
+        s["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        s["memory_size"] = len(self._mem)
+        s["path"] = str(self.path)
+        return s
+
+
+_CACHES: Dict[str, LLMResponseCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def _default_path() -> Path:
+    override = os.getenv("LLM_CACHE_PATH", "").strip()
+    if override:
+        return Path(override)
+    from services.api.core.shared import _plans_db_path
+    return _plans_db_path().with_name("llm_cache.db")
+
+
+def get_response_cache(path: Optional[Path] = None) -> LLMResponseCache:
+    """One cache per file, so each repo root (and test tmp dir) gets its own."""
+    p = Path(path) if path is not None else _default_path()
+    key = str(p)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = LLMResponseCache(
+                p,
+                ttl_s=env_num("LLM_CACHE_TTL_SECONDS", 7 * 86400),
+                max_entries=int(env_num("LLM_CACHE_MAX_ENTRIES", 5000)),
+                memory_entries=int(env_num("LLM_CACHE_MEMORY_ENTRIES", 256)),
+            )
+            _CACHES[key] = cache
+    return cache
+
+
+def cache_stats() -> Dict[str, Any]:
+    with _CACHES_LOCK:
+        caches = list(_CACHES.values())
+    return {"caches": [c.snapshot() for c in caches]}
+
+
+# -----------------------------
+# Client wrappers
+# -----------------------------
+def cache_bypassed() -> bool:
+    """True inside `bypass_llm_cache()` or a request that asked to skip cached answers."""
+    return _BYPASS.get()
+
+
+def dump_plan(a: PlanArtifacts) -> str:
+    return json.dumps(asdict(a))
+
+
+def load_plan(s: str) -> PlanArtifacts:
+    return PlanArtifacts(**json.loads(s))
+
+
+class CachingLLM:
+    """
+    Base for provider wrappers that answer from a cache. Subclasses implement
+    `_lookup` (cached value or None, plus a token for `_store`) and `_store`;
+    the async paths go through `_alookup`/`_astore`, which default to the sync
+    ones. `generate_text`/`agenerate_text` are only exposed when the wrapped
+    client has them, so `hasattr(client, "generate_text")` checks in the
+    routes keep choosing the same code path.
+    """
+
+    def __init__(self, inner: Any):
+        self.inner = inner
+
+    def _plan_prompt(self, user_request: str) -> str:
+        return user_request
+
+    def _lookup(self, system_prompt: str, user_prompt: str, **kwargs: Any) -> Tuple[Optional[str], Any]:
+        raise NotImplementedError
+
+    def _store(self, token: Any, value: str) -> None:
+        raise NotImplementedError
+
+    async def _alookup(self, system_prompt: str, user_prompt: str, **kwargs: Any) -> Tuple[Optional[str], Any]:
+        return self._lookup(system_prompt, user_prompt, **kwargs)
+
+    async def _astore(self, token: Any, value: str) -> None:
+        self._store(token, value)
+
+    def generate_plan(self, user_request: str, **kwargs: Any) -> PlanArtifacts:
+        hit, token = self._lookup("plan", self._plan_prompt(user_request), **kwargs)
+        if hit is not None:
+            return load_plan(hit)
+        result = self.inner.generate_plan(user_request, **kwargs)
+        self._store(token, dump_plan(result))
+        return result
+
+    async def agenerate_plan(self, user_request: str, **kwargs: Any) -> PlanArtifacts:
+        hit, token = await self._alookup("plan", self._plan_prompt(user_request), **kwargs)
+        if hit is not None:
+            return load_plan(hit)
+        result = await agenerate_plan(self.inner, user_request, **kwargs)
+        await self._astore(token, dump_plan(result))
+        return result
+
+    def _generate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        hit, token = self._lookup(system_prompt, user_prompt)
+        if hit is not None:
+            return json.loads(hit)
+        result = self.inner.generate_text(user_prompt, system_prompt)
+        self._store(token, json.dumps(result))
+        return result
+
+    async def _agenerate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        hit, token = await self._alookup(system_prompt, user_prompt)
+        if hit is not None:
+            return json.loads(hit)
+        result = await agenerate_text(self.inner, user_prompt, system_prompt)
+        await self._astore(token, json.dumps(result))
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "inner":  # not set yet (e.g. during unpickling)
+            raise AttributeError(name)
+        if name in {"generate_text", "agenerate_text"}:
+            if not hasattr(self.inner, "generate_text"):
+                raise AttributeError(name)
+            return self._generate_text if name == "generate_text" else self._agenerate_text
+        return getattr(self.inner, name)
+
+
+class CachedLLM(CachingLLM):
+    """Exact-match response cache; plan keys hash the full plan prompt."""
+
+    def __init__(self, inner: Any, cache: Optional[LLMResponseCache] = None):
+        super().__init__(inner)
+        self._cache = cache
+
+    @property
+    def cache(self) -> LLMResponseCache:
+        return self._cache or get_response_cache()
+
+    def _key(self, system_prompt: str, user_prompt: str, **kwargs: Any) -> str:
+        # same fingerprint singleflight uses; looks through a CoalescedLLM inner
+        return request_fingerprint(self.inner, system_prompt, user_prompt, **kwargs)
+
+    def _plan_prompt(self, user_request: str) -> str:
+        return _prompt(user_request)
+
+    def _lookup(self, system_prompt: str, user_prompt: str, **kwargs: Any) -> Tuple[Optional[str], str]:
+        key = self._key(system_prompt, user_prompt, **kwargs)
+        if cache_bypassed():
+            self.cache.stats["bypassed"] += 1
+            return None, key
+        return self.cache.get(key), key
+
+    def _store(self, key: str, value: str) -> None:
+        self.cache.put(key, value)
+
+    async def _alookup(self, system_prompt: str, user_prompt: str, **kwargs: Any) -> Tuple[Optional[str], str]:
+        key = self._key(system_prompt, user_prompt, **kwargs)
+        if cache_bypassed():  # read here: the worker thread may not see this context
+            self.cache.stats["bypassed"] += 1
+            return None, key
+        return await run_in_threadpool(self.cache.get, key), key
+
+    async def _astore(self, key: str, value: str) -> None:
+        await run_in_threadpool(self.cache.put, key, value)
+
+
+def with_response_cache(client: Any) -> Any:
+    """Wrap a provider in the response cache (LLM_CACHE=off disables; MockLLM is never cached)."""
+    from services.api.llm import MockLLM
+    if client is None or isinstance(client, (MockLLM, CachedLLM)) or not cache_enabled():
+        return client
+    return CachedLLM(client)
+
+
+class LLMCacheBypassMiddleware:
+    """ASGI middleware: `Cache-Control: no-cache` / `X-LLM-Cache: bypass` skip cached answers."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope.get("type") != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        bypass = b"no-cache" in headers.get(b"cache-control", b"").lower() or \
+            headers.get(b"x-llm-cache", b"").lower() == b"bypass"
+        if not bypass:
+            await self.app(scope, receive, send)
+            return
+        with bypass_llm_cache():
+            await self.app(scope, receive, send)
@@ -0,0 +1,144 @@
+# services/api/llm_http.py
+"""
+Process-wide pooled HTTP clients for LLM providers.
+
+One httpx.Client per origin (scheme://host:port), so keep-alive connections
+are reused across calls and each provider host gets its own connection
+limit. HTTP/2 is used when the optional `h2` package is installed.
+Async clients are pooled the same way, per event loop (an AsyncClient's
+connections belong to the loop that opened them).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import weakref
+from typing import Dict, Iterable, List
+from urllib.parse import urlsplit
+
+import httpx
+
+from services.api.core.shared import env_int
+
+_LOCK = threading.Lock()
+_CLIENTS: Dict[str, httpx.Client] = {}
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = weakref.WeakKeyDictionary()
+
+
+def _http2_available() -> bool:
+    if os.getenv("LLM_HTTP2", "on").strip().lower() in {"off", "0", "false", "no"}:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return f"{parts.scheme}://{parts.hostname}:{port}"
+
+
+def _client_kwargs() -> Dict[str, object]:
+    limits = httpx.Limits(
+        max_connections=env_int("LLM_HTTP_MAX_CONNECTIONS", 20),       # per host
+        max_keepalive_connections=env_int("LLM_HTTP_MAX_KEEPALIVE", 10),
+        keepalive_expiry=float(env_int("LLM_HTTP_KEEPALIVE_SECONDS", 60)),
+    )
+    # Per-call timeouts are passed on each request; this is only the fallback.
+    return {
+        "limits": limits,
+        "http2": _http2_available(),
+        "timeout": float(os.getenv("LLM_TIMEOUT_SECONDS", "20") or 20),
+    }
+
+
+def _new_client() -> httpx.Client:
+    return httpx.Client(**_client_kwargs())
+
+
+def get_http_client(url: str) -> httpx.Client:
+    """Shared client for the origin of `url` (created on first use)."""
+    key = _origin(url)
+    client = _CLIENTS.get(key)
+    if client is None or client.is_closed:
+        with _LOCK:
+            client = _CLIENTS.get(key)
+            if client is None or client.is_closed:
+                client = _new_client()
+                _CLIENTS[key] = client
+    return client
+
+
+def get_async_http_client(url: str) -> httpx.AsyncClient:
+    """Shared AsyncClient for the origin of `url` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    key = _origin(url)
+    with _LOCK:
+        per_loop = _ASYNC_CLIENTS.setdefault(loop, {})
+        client = per_loop.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**_client_kwargs())
+            per_loop[key] = client
+    return client
+
+
+async def aclose_http_clients() -> None:
+    """Close the async clients owned by the running loop."""
+    with _LOCK:
+        clients = list(_ASYNC_CLIENTS.pop(asyncio.get_running_loop(), {}).values())
+    for c in clients:
+        try:
+            await c.aclose()
+        except Exception:
+            pass
+
+
+def provider_urls_from_env() -> List[str]:
+    """Base URLs of the provider selected by LLM_PROVIDER (for pre-warming)."""
+    provider = os.getenv("LLM_PROVIDER", "").strip().lower()
+    if provider == "openai":
+        return [os.getenv("OPENAI_BASE_URL") or "https://api.openai.com"]
+    if provider == "anthropic":
+        return [os.getenv("ANTHROPIC_BASE_URL") or "https://api.anthropic.com"]
+    if provider == "ollama":
+        return [os.getenv("LLM_ENDPOINT", "http://localhost:11434")]
+    # projects default to the Supabase function when it is configured
+    return [os.environ["SUPABASE_URL"]] if os.getenv("SUPABASE_URL") else []
+
+
+def prewarm(urls: Iterable[str], timeout: float = 3.0) -> List[str]:
+    """
+    Open a connection (DNS + TCP + TLS) to each origin so the first generation
+    doesn't pay for it. Any HTTP status counts as warm; network errors are ignored.
+    """
+    warmed: List[str] = []
+    for url in urls:
+        if not url:
+            continue
+        try:
+            get_http_client(url).head(_origin(url), timeout=timeout)
+            warmed.append(_origin(url))
+        except httpx.HTTPError as e:
+            print(f"[llm] pre-warm {url} skipped: {e}")
+    return warmed
+
+
+def prewarm_in_background(urls: Iterable[str]) -> None:
+    urls = [u for u in urls if u]
+    if urls:
+        threading.Thread(target=prewarm, args=(urls,), name="llm-http-prewarm", daemon=True).start()
+
+
+def close_http_clients() -> None:
+    with _LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for c in clients:
+        try:
+            c.close()
+        except Exception:
+            pass
@@ -0,0 +1,155 @@
+# services/api/llm_json.py
+"""
+Incremental parser for the plan JSON the providers stream back.
+
+    parser = PlanStreamParser()
+    for chunk in tokens:
+        for field, value in parser.feed(chunk):
+            ...   # ("prd_markdown", str), ("openapi_yaml", str),
+                  # ("implementation_plan_item", dict), other top-level keys
+    artifacts = parser.finish()
+
+Top-level values are emitted as soon as they close, and each
+implementation_plan item as soon as its object closes. Leading prose or a
+``` fence before the opening brace is skipped. A truncated or malformed
+tail only loses the part that never closed.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.api.llm import PlanArtifacts
+
+ITEM_EVENT = "implementation_plan_item"
+_ITEMS_KEY = "implementation_plan"
+
+
+class PlanStreamParser:
+    def __init__(self) -> None:
+        self._text = ""          # unconsumed tail; absolute index = _base + local index
+        self._base = 0
+        self._pos = 0            # absolute index of next char to scan
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._done = False
+        self._expect = "start"   # start | key | key_str | colon | value | in_value | after_value
+        self._key: Optional[str] = None
+        self._tok_start: Optional[int] = None    # key string / top-level value start
+        self._scalar = False
+        self._item_start: Optional[int] = None
+        self.fields: Dict[str, Any] = {}
+        self.items: List[Dict[str, Any]] = []
+        self.errors = 0
+
+    def _raw(self, start: int, end: int) -> str:
+        return self._text[start - self._base:end - self._base]
+
+    def _finish_value(self, end: int, out: List[Tuple[str, Any]]) -> None:
+        start, self._tok_start = self._tok_start, None
+        self._expect = "after_value"
+        if self._key == _ITEMS_KEY and not self._scalar:
+            self.fields[_ITEMS_KEY] = list(self.items)
+            return
+        try:
+            value = json.loads(self._raw(start, end))
+        except (json.JSONDecodeError, TypeError):
+            self.errors += 1
+            return
+        self.fields[self._key] = value
+        out.append((self._key, value))
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        out: List[Tuple[str, Any]] = []
+        if self._done or not chunk:
+            return out
+        self._text += chunk
+        end = self._base + len(self._text)
+        i = self._pos
+        while i < end and not self._done:
+            c = self._text[i - self._base]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._depth == 1 and self._expect == "key_str":
+                        try:
+                            self._key = json.loads(self._raw(self._tok_start, i + 1))
+                        except json.JSONDecodeError:
+                            self._key = None
+                        self._tok_start = None
+                        self._expect = "colon"
+                    elif self._depth == 1 and self._expect == "in_value":
+                        self._finish_value(i + 1, out)
+                i += 1
+                continue
+
+            if self._expect == "start":
+                if c == "{":
+                    self._depth, self._expect = 1, "key"
+            elif c == '"':
+                self._in_str = True
+                if self._depth == 1 and self._expect == "key":
+                    self._tok_start, self._expect = i, "key_str"
+                elif self._depth == 1 and self._expect == "value":
+                    self._tok_start, self._scalar, self._expect = i, False, "in_value"
+            elif c in "{[":
+                if self._depth == 1 and self._expect == "value":
+                    self._tok_start, self._scalar, self._expect = i, False, "in_value"
+                elif self._depth == 2 and self._key == _ITEMS_KEY and c == "{":
+                    self._item_start = i
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 1 and self._expect == "in_value" and self._scalar:
+                    self._finish_value(i, out)
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None and self._key == _ITEMS_KEY:
+                    try:
+                        item = json.loads(self._raw(self._item_start, i + 1))
+                        self.items.append(item)
+                        out.append((ITEM_EVENT, item))
+                    except json.JSONDecodeError:
+                        self.errors += 1
+                    self._item_start = None
+                elif self._depth == 1 and self._expect == "in_value":
+                    self._finish_value(i + 1, out)
+                elif self._depth == 0:
+                    self._done = True
+            elif self._depth == 1:
+                if c == ":" and self._expect == "colon":
+                    self._expect = "value"
+                elif c == ",":
+                    if self._expect == "in_value" and self._scalar:
+                        self._finish_value(i, out)
+                    self._expect = "key"
+                elif self._expect == "value" and not c.isspace():
+                    self._tok_start, self._scalar, self._expect = i, True, "in_value"
+            i += 1
+        self._pos = i
+
+        # Drop text nobody can reference any more. The implementation_plan
+        # array itself is never re-read (its items are), so it doesn't pin.
+        pins = [p for p in (self._item_start, self._tok_start) if p is not None]
+        if self._key == _ITEMS_KEY and self._tok_start is not None and not self._scalar and self._expect == "in_value":
+            pins = [p for p in (self._item_start,) if p is not None]
+        keep = min(pins) if pins else self._pos
+        if keep > self._base:
+            self._text = self._text[keep - self._base:]
+            self._base = keep
+        return out
+
+    @property
+    def complete(self) -> bool:
+        return self._done
+
+    def finish(self) -> PlanArtifacts:
+        """Artifacts from everything that closed; KeyError if the PRD or OpenAPI text never did."""
+        return PlanArtifacts(
+            prd_markdown=self.fields["prd_markdown"],
+            openapi_yaml=self.fields["openapi_yaml"],
+            implementation_plan=self.fields.get(_ITEMS_KEY, list(self.items)),
+        )
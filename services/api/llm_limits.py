@@ -0,0 +1,315 @@
+# services/api/llm_limits.py
+"""
+Per provider/model admission control for upstream LLM calls.
+
+Each (provider, model) pair gets a ProviderLimiter with:
+
+- a concurrency limit that adapts AIMD-style: +1/limit per success, halved
+  on 429/5xx/timeouts (at most once per LLM_LIMIT_BACKOFF_SECONDS window);
+- optional token buckets for requests/second (LLM_RPS) and estimated
+  tokens/minute (LLM_TPM);
+- a bounded FIFO wait queue (LLM_QUEUE_MAX) with a deadline
+  (LLM_QUEUE_TIMEOUT_SECONDS); overflow or timeout raises LLMThrottled;
+- a pause until `Retry-After` whenever the provider sends one.
+
+Every setting can be overridden per provider by suffixing the provider
+name, e.g. LLM_MAX_CONCURRENCY_OLLAMA=1. Without an override, Ollama's
+concurrency follows OLLAMA_NUM_PARALLEL (the requests the local server
+runs at once; more would only queue there).
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+import httpx
+
+from services.api.core.shared import env_int, env_num
+
+# local models share one GPU; hosted APIs take more parallel requests
+_DEFAULT_CONCURRENCY = {"ollama": 2}
+
+
+class LLMThrottled(RuntimeError):
+    """The limiter could not admit the call (queue full or wait deadline passed)."""
+
+
+def _provider_num(name: str, provider: str, default: float) -> float:
+    """`{name}_{PROVIDER}` overrides `{name}`, which overrides `default`."""
+    return env_num(f"{name}_{provider.upper()}", env_num(name, default))
+
+
+def _default_concurrency(provider: str) -> int:
+    if provider == "ollama":
+        parallel = env_int("OLLAMA_NUM_PARALLEL", 0)
+        if parallel > 0:
+            return parallel
+    return _DEFAULT_CONCURRENCY.get(provider, 8)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """`rate` units per second, bursting up to `capacity`. rate <= 0 means unlimited."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)  # one oversized request must still fit
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate > 0:
+            self.level -= min(amount, self.capacity)
+
+
+class ProviderLimiter:
+    _POLL_S = 0.05  # async waiters re-check at least this often
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        rps: float = 0.0,
+        tpm: float = 0.0,
+        max_queue: int = 64,
+        queue_timeout_s: float = 30.0,
+        backoff_window_s: float = 1.0,
+    ):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.backoff_window_s = backoff_window_s
+        self.requests = TokenBucket(rps, rps)
+        self.tokens = TokenBucket(tpm / 60.0, tpm)
+        self._cond = threading.Condition()
+        self._queue: Deque[int] = deque()
+        self._tickets = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_backoff = 0.0
+        self.stats: Dict[str, float] = {
+            "admitted": 0, "succeeded": 0, "throttled": 0, "failed": 0,
+            "rejected": 0, "timed_out": 0, "wait_s_total": 0.0,
+        }
+
+    # -- admission --
+    def _try_admit(self, ticket: int, tokens: float) -> float:
+        """0 when admitted (caller holds the lock), else seconds worth waiting."""
+        now = time.monotonic()
+        if self._queue[0] != ticket:
+            return self._POLL_S
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._in_flight >= int(self.limit):
+            return self._POLL_S
+        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self._queue.popleft()
+        self._in_flight += 1
+        self.stats["admitted"] += 1
+        self._cond.notify_all()  # the next ticket is now at the head
+        return 0.0
+
+    def _enqueue(self) -> int:
+        if len(self._queue) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise LLMThrottled(f"{self.name}: {len(self._queue)} calls already queued")
+        ticket = next(self._tickets)
+        self._queue.append(ticket)
+        return ticket
+
+    def _give_up(self, ticket: int) -> None:
+        self._queue.remove(ticket)
+        self.stats["timed_out"] += 1
+        self._cond.notify_all()
+
+    def acquire(self, tokens: float = 0.0, timeout: Optional[float] = None) -> None:
+        started = time.monotonic()
+        deadline = started + (self.queue_timeout_s if timeout is None else timeout)
+        with self._cond:
+            ticket = self._enqueue()
+            while True:
+                wait = self._try_admit(ticket, tokens)
+                if wait == 0:
+                    self.stats["wait_s_total"] += time.monotonic() - started
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._give_up(ticket)
+                    raise LLMThrottled(f"{self.name}: no capacity within {deadline - started:.1f}s")
+                self._cond.wait(min(wait, remaining))
+
+    async def aacquire(self, tokens: float = 0.0, timeout: Optional[float] = None) -> None:
+        started = time.monotonic()
+        deadline = started + (self.queue_timeout_s if timeout is None else timeout)
+        with self._cond:
+            ticket = self._enqueue()
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_admit(ticket, tokens)
+                    if wait == 0:
+                        self.stats["wait_s_total"] += time.monotonic() - started
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._give_up(ticket)
+                        ticket = -1
+                        raise LLMThrottled(f"{self.name}: no capacity within {deadline - started:.1f}s")
+                await asyncio.sleep(min(wait, remaining, self._POLL_S))
+        except asyncio.CancelledError:
+            with self._cond:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._cond.notify_all()
+            raise
+
+    # -- feedback --
+    def release(self, status: Optional[int] = None, retry_after: Optional[float] = None, failed: bool = False) -> None:
+        """
+        Return the slot. `status` is the upstream HTTP status when there was
+        one; `failed` marks transport errors (timeouts, resets), which are
+        treated like overload.
+        """
+        now = time.monotonic()
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            overloaded = failed or (status is not None and (status == 429 or status >= 500))
+            if overloaded:
+                self.stats["throttled" if status == 429 else "failed"] += 1
+                if now - self._last_backoff >= self.backoff_window_s:
+                    self.limit = max(float(self.min_concurrency), self.limit / 2)
+                    self._last_backoff = now
+            else:
+                self.stats["succeeded"] += 1
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            s: Dict[str, Any] = dict(self.stats)
+            s["wait_s_total"] = round(s["wait_s_total"], 4)
+            s.update(
+                limit=round(self.limit, 2),
+                max_concurrency=self.max_concurrency,
+                in_flight=self._in_flight,
+                queued=len(self._queue),
+                max_queue=self.max_queue,
+                paused_for_s=round(max(0.0, self._paused_until - time.monotonic()), 2),
+            )
+            return s
+
+    # -- call wrappers --
+    def _settle(self, exc: Optional[BaseException]) -> None:
+        if exc is None:
+            self.release(200)
+        elif isinstance(exc, httpx.HTTPStatusError):
+            resp = exc.response
+            self.release(resp.status_code, parse_retry_after(resp.headers.get("retry-after")))
+        elif isinstance(exc, httpx.TransportError):
+            self.release(failed=True)
+        else:
+            # not the provider's fault (bad JSON, cancelled stream)
+            self.release()
+
+    @contextmanager
+    def slot(self, tokens: float = 0.0) -> Iterator[None]:
+        """Hold a slot around a blocking call; raise_for_status() inside feeds AIMD."""
+        self.acquire(tokens)
+        try:
+            yield
+        except BaseException as e:
+            self._settle(e)
+            raise
+        self._settle(None)
+
+    @asynccontextmanager
+    async def aslot(self, tokens: float = 0.0) -> AsyncIterator[None]:
+        await self.aacquire(tokens)
+        try:
+            yield
+        except BaseException as e:
+            self._settle(e)
+            raise
+        self._settle(None)
+
+
+_LIMITERS: Dict[Tuple[str, str], ProviderLimiter] = {}
+_LOCK = threading.Lock()
+
+
+def limiter_for(provider: str, model: str = "") -> ProviderLimiter:
+    key = (provider, model or "")
+    limiter = _LIMITERS.get(key)
+    if limiter is None:
+        with _LOCK:
+            limiter = _LIMITERS.get(key)
+            if limiter is None:
+                limiter = ProviderLimiter(
+                    f"{provider}/{model}" if model else provider,
+                    max_concurrency=int(_provider_num("LLM_MAX_CONCURRENCY", provider, _default_concurrency(provider))),
+                    min_concurrency=int(_provider_num("LLM_MIN_CONCURRENCY", provider, 1)),
+                    rps=_provider_num("LLM_RPS", provider, 0),
+                    tpm=_provider_num("LLM_TPM", provider, 0),
+                    max_queue=int(_provider_num("LLM_QUEUE_MAX", provider, 64)),
+                    queue_timeout_s=_provider_num("LLM_QUEUE_TIMEOUT_SECONDS", provider, 30),
+                    backoff_window_s=_provider_num("LLM_LIMIT_BACKOFF_SECONDS", provider, 1),
+                )
+                _LIMITERS[key] = limiter
+    return limiter
+
+
+def estimate_tokens(payload: Any) -> int:
+    """Rough prompt size for the tokens/minute bucket (~4 characters per token)."""
+    return max(1, len(str(payload)) // 4)
+
+
+def limiter_stats() -> Dict[str, Any]:
+    with _LOCK:
+        limiters = list(_LIMITERS.values())
+    return {lim.name: lim.snapshot() for lim in limiters}
+
+
+def reset_limiters() -> None:
+    with _LOCK:
+        _LIMITERS.clear()
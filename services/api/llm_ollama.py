@@ -0,0 +1,465 @@
+# services/api/llm_ollama.py
+"""
+Local Ollama tuning: keep-alive, request options, warm pings and batching
+of small prompts.
+
+Ollama unloads a model once it has been idle for its keep-alive (5 minutes
+by default) and the next call pays the full load again. Every request from
+OllamaLLM therefore carries:
+
+- keep_alive: OLLAMA_KEEP_ALIVE (default "10m"; "server" leaves it to the
+  server's own setting, "-1" keeps the model loaded);
+- options.num_ctx: the context window the prompt budget assumes (see
+  llm_prompt.context_window, OLLAMA_NUM_CTX), so long prompts are not
+  silently cut by the server and every call asks for the same context (a
+  different num_ctx makes Ollama reload the model);
+- options.num_predict: OLLAMA_NUM_PREDICT when set (caps output tokens).
+
+OllamaWarmer sends an empty prompt (Ollama loads the model and generates
+nothing) at startup and then to every model idle for
+OLLAMA_WARM_INTERVAL_SECONDS (default 240; 0 disables), so calls find the
+model loaded. Only real calls count as traffic: a model without one for
+OLLAMA_WARM_MAX_IDLE_SECONDS (default 1800) is no longer pinged and
+unloads after its keep-alive. Pings bypass the limiter and telemetry.
+
+PromptBatcher packs small text prompts (OLLAMA_BATCH_MAX_PROMPT_TOKENS,
+default 512) submitted within OLLAMA_BATCH_WINDOW_MS (default 20) with the
+same system prompt into one request of up to OLLAMA_BATCH_SIZE prompts and
+splits the answer on numbered markers; a prompt whose answer is missing is
+sent again on its own. Packing changes what the model sees, so it is
+opt-in: OLLAMA_BATCH_SIZE defaults to 1 (off).
+
+The limiter's default concurrency for Ollama follows OLLAMA_NUM_PARALLEL
+(the server's parallel slots; see llm_limits). Counters are at
+GET /api/admin/llm-ollama.
+
+Benchmark against the stand-in server (cold loads, one parallel slot):
+
+    python -m services.api.llm_ollama --load-delay 2 --parallel 1 --bursts 3 --prompts 8
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.api.core.shared import env_num
+from services.api.llm_http import get_http_client
+from services.api.llm_prompt import context_window, count_tokens
+
+_DEFAULT_KEEP_ALIVE = "10m"
+
+_REQUEST_MARKER = "=== REQUEST {} ==="
+_ANSWER_MARKER = "=== ANSWER {} ==="
+_REQUEST_RE = re.compile(r"^=== REQUEST (\d+) ===[ \t]*$", re.M)
+_ANSWER_RE = re.compile(r"^[ \t]*=+[ \t]*ANSWER[ \t]+(\d+)[ \t]*=+[ \t]*$", re.M | re.I)
+
+_BATCH_PROMPT = """Answer each of the {n} requests below on its own, following that request's instructions.
+Begin every answer with a line "=== ANSWER <number> ===" using the request's number, answer every request
+in order, and write nothing before the first answer.
+
+{requests}"""
+
+
+# -----------------------------
+# Request fields
+# -----------------------------
+def keep_alive() -> Optional[str]:
+    value = os.getenv("OLLAMA_KEEP_ALIVE", "").strip() or _DEFAULT_KEEP_ALIVE
+    return None if value.lower() == "server" else value
+
+
+def ollama_options(model: str) -> Dict[str, Any]:
+    options: Dict[str, Any] = {"num_ctx": context_window("ollama", model)}
+    num_predict = int(env_num("OLLAMA_NUM_PREDICT", 0))
+    if num_predict > 0:
+        options["num_predict"] = num_predict
+    return options
+
+
+def request_fields(base_url: str, model: str) -> Dict[str, Any]:
+    """keep_alive and options for one /api/generate call; marks the model as in use for the warmer."""
+    warmer.touch(base_url, model)
+    return _fields(model)
+
+
+def _fields(model: str) -> Dict[str, Any]:
+    fields: Dict[str, Any] = {"options": ollama_options(model)}
+    alive = keep_alive()
+    if alive is not None:
+        fields["keep_alive"] = alive
+    return fields
+
+
+# -----------------------------
+# Warm pings
+# -----------------------------
+class OllamaWarmer:
+    """Keeps the (base_url, model) pairs in use loaded with periodic empty-prompt pings."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Tuple[str, str], float] = {}  # last real call (monotonic)
+        self._pings: Dict[Tuple[str, str], float] = {}  # last successful ping
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {"pings": 0, "failures": 0, "load_ms_last": None, "load_ms_max": 0.0}
+
+    def touch(self, base_url: str, model: str) -> None:
+        with self._lock:
+            self._calls[(base_url, model)] = time.monotonic()
+
+    def track(self, base_url: str, model: str) -> None:
+        """Add a model to keep warm (as if just called); it is pinged on the next pass."""
+        key = (base_url.rstrip("/"), model)
+        with self._lock:
+            self._calls.setdefault(key, time.monotonic())
+            self._pings[key] = -math.inf  # never pinged: due right away
+
+    def track_env(self) -> None:
+        """The Ollama model configured as LLM_PROVIDER or in LLM_FALLBACK_PROVIDERS, if any."""
+        primary = os.getenv("LLM_PROVIDER", "").strip().lower() == "ollama"
+        fallbacks = [p.strip().lower() for p in os.getenv("LLM_FALLBACK_PROVIDERS", "").split(",")]
+        if not primary and "ollama" not in fallbacks:
+            return
+        model = os.getenv("LLM_MODEL" if primary else "LLM_MODEL_OLLAMA") or "llama3.1:8b"
+        self.track(os.getenv("LLM_ENDPOINT", "http://localhost:11434"), model)
+
+    def ping(self, base_url: str, model: str, timeout: float = 120.0) -> bool:
+        """Load `model` now (an empty prompt generates nothing); True when the server answered."""
+        url = f"{base_url}/api/generate"
+        data = {"model": model, "prompt": "", "stream": False, **_fields(model)}
+        try:
+            resp = get_http_client(url).post(url, json=data, timeout=timeout)
+            resp.raise_for_status()
+            load_ms = (resp.json().get("load_duration") or 0) / 1e6
+        except Exception as e:
+            with self._lock:
+                self.stats["failures"] += 1
+                self._calls.pop((base_url, model), None)  # back on the list with its next real call
+                self._pings.pop((base_url, model), None)
+            print(f"[ollama] warm ping for {model} at {base_url} failed: {e}")
+            return False
+        with self._lock:
+            self._pings[(base_url, model)] = time.monotonic()
+            self.stats["pings"] += 1
+            self.stats["load_ms_last"] = round(load_ms, 1)
+            self.stats["load_ms_max"] = round(max(self.stats["load_ms_max"], load_ms), 1)
+        return True
+
+    def due(self, interval: float, max_idle: Optional[float] = None) -> List[Tuple[str, str]]:
+        """Models idle for `interval` that had a real call within `max_idle`; the rest are forgotten."""
+        if max_idle is None:
+            max_idle = env_num("OLLAMA_WARM_MAX_IDLE_SECONDS", 1800)
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, called in self._calls.items() if now - called > max_idle]:
+                del self._calls[key]
+                self._pings.pop(key, None)
+            return [key for key, called in self._calls.items()
+                    if self._pings.get(key) == -math.inf
+                    or now - max(called, self._pings.get(key, -math.inf)) >= interval]
+
+    def _loop(self, interval: float) -> None:
+        while not self._stop.is_set():
+            for base_url, model in self.due(interval):
+                self.ping(base_url, model)
+            self._stop.wait(min(interval, 30.0))
+
+    def start(self, interval: float) -> None:
+        self.track_env()
+        if interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="ollama-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            models = {f"{url}#{model}": round(now - called, 1) for (url, model), called in self._calls.items()}
+            return {**self.stats, "idle_s": models, "running": bool(self._thread and self._thread.is_alive())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls.clear()
+            self._pings.clear()
+            self.stats.update(pings=0, failures=0, load_ms_last=None, load_ms_max=0.0)
+
+
+# -----------------------------
+# Batching
+# -----------------------------
+def pack_requests(prompts: List[str]) -> str:
+    body = "\n\n".join(f"{_REQUEST_MARKER.format(i)}\n{p.strip()}" for i, p in enumerate(prompts, 1))
+    return _BATCH_PROMPT.format(n=len(prompts), requests=body)
+
+
+def unpack_requests(prompt: str) -> Optional[List[str]]:
+    """The prompts inside a packed batch prompt, or None for an ordinary prompt."""
+    parts = _REQUEST_RE.split(prompt)
+    if len(parts) < 3:
+        return None
+    return [parts[i + 1].strip() for i in range(1, len(parts), 2)]
+
+
+def pack_answers(answers: List[str]) -> str:
+    return "\n\n".join(f"{_ANSWER_MARKER.format(i)}\n{a.strip()}" for i, a in enumerate(answers, 1))
+
+
+def unpack_answers(text: str, n: int) -> List[Optional[str]]:
+    """Answers 1..n from a batched reply; None where an answer is missing or empty."""
+    parts = _ANSWER_RE.split(text)
+    answers: List[Optional[str]] = [None] * n
+    for i in range(1, len(parts), 2):
+        index = int(parts[i]) - 1
+        body = parts[i + 1].strip()
+        if 0 <= index < n and answers[index] is None and body:
+            answers[index] = body
+    return answers
+
+
+class _Batch:
+    __slots__ = ("provider", "system_prompt", "items", "timer")
+
+    def __init__(self, provider: Any, system_prompt: str):
+        self.provider = provider
+        self.system_prompt = system_prompt
+        self.items: List[Tuple[str, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class PromptBatcher:
+    """Collects small concurrent text prompts per model and system prompt and sends them as one request."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._open: Dict[Tuple[Any, ...], _Batch] = {}
+        self._tasks: set = set()  # running batches; the loop only keeps weak references
+        self.stats: Dict[str, int] = {"direct": 0, "batches": 0, "batched_prompts": 0, "fallbacks": 0}
+
+    def _bump(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    async def submit(self, provider: Any, user_prompt: str, system_prompt: str = "") -> str:
+        from services.api.llm import _acomplete_text
+        size = int(env_num("OLLAMA_BATCH_SIZE", 1))
+        if size <= 1 or count_tokens(user_prompt) > int(env_num("OLLAMA_BATCH_MAX_PROMPT_TOKENS", 512)):
+            self._bump("direct")
+            return await _acomplete_text(provider, user_prompt, system_prompt)
+        loop = asyncio.get_running_loop()
+        key = (loop, provider.base_url, provider.model, system_prompt)
+        batch = self._open.get(key)
+        if batch is None:
+            batch = self._open[key] = _Batch(provider, system_prompt)
+            batch.timer = loop.call_later(env_num("OLLAMA_BATCH_WINDOW_MS", 20) / 1000.0, self._flush, key)
+        future = loop.create_future()
+        batch.items.append((user_prompt, future))
+        if len(batch.items) >= size:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key: Tuple[Any, ...]) -> None:
+        batch = self._open.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: _Batch) -> None:
+        """Send the batch; whatever goes wrong is passed to every submitter still waiting."""
+        try:
+            await self._send(batch)
+        except BaseException as e:
+            for _, future in batch.items:
+                if future.done():
+                    continue
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+
+    async def _send(self, batch: _Batch) -> None:
+        from services.api.llm import _acomplete_text, _apost
+        provider, system = batch.provider, batch.system_prompt
+        items = [(p, f) for p, f in batch.items if not f.done()]
+        if not items:
+            return
+
+        async def alone(prompt: str, future: asyncio.Future) -> None:
+            try:
+                result = await _acomplete_text(provider, prompt, system)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+
+        if len(items) == 1:
+            self._bump("direct")
+            return await alone(*items[0])
+
+        url, _, data = provider._text_request(pack_requests([p for p, _ in items]), system)
+        if "num_predict" in data.get("options", {}):
+            data["options"]["num_predict"] *= len(items)
+        answers = unpack_answers(provider._response_text(await _apost(provider, url, {}, data)), len(items))
+        self._bump("batches")
+        self._bump("batched_prompts", len(items))
+        missing = []
+        for (prompt, future), answer in zip(items, answers):
+            if answer is None:
+                missing.append((prompt, future))
+            elif not future.done():
+                future.set_result(answer)
+        if missing:
+            self._bump("fallbacks", len(missing))
+            print(f"[ollama] batched reply missed {len(missing)} of {len(items)} answers; sending them alone")
+            await asyncio.gather(*(alone(p, f) for p, f in missing))
+
+    def reset(self) -> None:
+        with self._lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+
+warmer = OllamaWarmer()
+batcher = PromptBatcher()
+
+
+def ollama_stats() -> Dict[str, Any]:
+    from services.api.llm_limits import limiter_stats
+    with batcher._lock:
+        batching = dict(batcher.stats)
+    return {
+        "keep_alive": keep_alive() or "server",
+        "batch_size": int(env_num("OLLAMA_BATCH_SIZE", 1)),
+        "warmer": warmer.snapshot(),
+        "batching": batching,
+        "limiters": {name: s for name, s in limiter_stats().items() if name.startswith("ollama")},
+    }
+
+
+def reset_ollama_stats() -> None:
+    warmer.reset()
+    batcher.reset()
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+_BENCH_SYSTEM = "You are an agile coach. Return only JSON."
+
+
+def _bench_prompt(i: int) -> str:
+    return (f"FEATURE: Feature {i}\nFEATURE DESCRIPTION: Small change number {i}.\n"
+            "Write 1-3 user_stories for this feature as JSON.")
+
+
+def run_bench(load_delay: float = 2.0, parallel: int = 1, latency: str = "fixed:0.2", bursts: int = 3,
+              prompts: int = 8, idle: float = 1.5, unload_after: float = 1.0, batch_size: int = 4,
+              tuned: bool = True) -> Dict[str, Any]:
+    """
+    Send `bursts` bursts of `prompts` concurrent story-sized prompts, `idle`
+    seconds apart, to a stand-in Ollama that unloads after `unload_after`
+    idle seconds and takes `load_delay` seconds to load. `tuned` turns on
+    keep_alive, the warm ping, batching and the parallel-aware limiter;
+    otherwise requests go out like before (server keep-alive, one request
+    per prompt, default concurrency).
+    """
+    from services.api.llm import OllamaLLM
+    from services.api.llm_limits import reset_limiters
+    from services.api.llm_standin import StandinConfig, StandinServer
+
+    env = {
+        "OLLAMA_KEEP_ALIVE": "10m" if tuned else "server",
+        "OLLAMA_BATCH_SIZE": str(batch_size if tuned else 1),
+        "OLLAMA_NUM_PARALLEL": str(parallel) if tuned else "",
+    }
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    reset_limiters()
+    reset_ollama_stats()
+    config = StandinConfig(latency=latency, chunk_chars=64, chunk_delay=0.005, load_delay=load_delay,
+                           unload_after=unload_after, parallel=parallel)
+    durations: List[float] = []
+    try:
+        with StandinServer(config) as srv:
+            client = OllamaLLM(srv.url, "standin")
+            started = time.monotonic()
+            if tuned:
+                warmer.ping(srv.url, client.model)
+
+            async def one(i: int) -> None:
+                t0 = time.monotonic()
+                await client.agenerate_text(_bench_prompt(i), _BENCH_SYSTEM)
+                durations.append(time.monotonic() - t0)
+
+            async def main() -> None:
+                for b in range(bursts):
+                    if b:
+                        await asyncio.sleep(idle)
+                    await asyncio.gather(*(one(b * prompts + i) for i in range(prompts)))
+            asyncio.run(main())
+            wall = time.monotonic() - started - idle * (bursts - 1)
+            counts = dict(srv.counts)
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        reset_limiters()
+    durations.sort()
+    return {
+        "mode": "tuned" if tuned else "baseline",
+        "prompts": len(durations),
+        "busy_s": round(wall, 2),
+        "p50_s": round(durations[len(durations) // 2], 3),
+        "p95_s": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+        "requests": counts.get("ok", 0),
+        "loads": counts.get("loads", 0),
+        "batching": dict(batcher.stats),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark Ollama keep-warm and batching against the stand-in server.")
+    ap.add_argument("--load-delay", type=float, default=2.0, help="seconds to load the model when cold")
+    ap.add_argument("--unload-after", type=float, default=1.0, help="server-side idle keep-alive in seconds")
+    ap.add_argument("--parallel", type=int, default=1, help="requests the stand-in serves at once")
+    ap.add_argument("--latency", default="fixed:0.2")
+    ap.add_argument("--bursts", type=int, default=3)
+    ap.add_argument("--prompts", type=int, default=8, help="concurrent prompts per burst")
+    ap.add_argument("--idle", type=float, default=1.5, help="seconds between bursts")
+    ap.add_argument("--batch-size", type=int, default=4)
+    args = ap.parse_args(argv)
+
+    kwargs = dict(load_delay=args.load_delay, parallel=args.parallel, latency=args.latency, bursts=args.bursts,
+                  prompts=args.prompts, idle=args.idle, unload_after=args.unload_after, batch_size=args.batch_size)
+    print(f"{'mode':<9} {'busy_s':>7} {'p50_s':>7} {'p95_s':>7} {'requests':>9} {'loads':>6}")
+    for tuned in (False, True):
+        r = run_bench(tuned=tuned, **kwargs)
+        print(f"{r['mode']:<9} {r['busy_s']:>7} {r['p50_s']:>7} {r['p95_s']:>7} {r['requests']:>9} {r['loads']:>6}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,257 @@
+# services/api/llm_prompt.py
+"""
+Token-budgeted prompt assembly.
+
+Generation prompts are built from fixed scaffolding plus variable sections
+(the user request, the tech stack, chat history, earlier artifacts such as
+a PRD). PromptBuilder fits them into the budget of the model that will
+serve the call:
+
+    budget = context window - LLM_PROMPT_RESERVED_OUTPUT_TOKENS (2048)
+             - system prompt - scaffolding
+
+Sections are granted tokens in priority order (REQUEST, STACK, HISTORY,
+ARTIFACTS); a section that does not fit is cut at a token boundary (head
+or tail, per section) with a marker, or dropped when nothing is left. The
+same inputs always give the same prompt, and a prompt that fits is
+returned unchanged.
+
+Token counts come from a local approximation of BPE tokenizers (letter
+runs of up to six characters, groups of three digits, every other symbol
+and each newline run count as one token); no tokenizer package is needed.
+
+Context windows come from a small table keyed by model prefix;
+LLM_CONTEXT_TOKENS_<MODEL> (e.g. LLM_CONTEXT_TOKENS_GPT_4O_MINI) overrides
+one model, OLLAMA_NUM_CTX sets Ollama's window (Ollama ignores anything
+beyond it) and LLM_PROMPT_BUDGET_TOKENS caps every prompt. Per-step
+counters are at GET /api/admin/llm-prompts.
+"""
+from __future__ import annotations
+
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.api.core.shared import env_num
+from services.api.llm_telemetry import _leaf_providers
+
+# section priorities: lower is kept first
+REQUEST, STACK, HISTORY, ARTIFACTS = 0, 1, 2, 3
+
+_PIECE_RE = re.compile(r"[^\W\d_]+|\d{1,3}|\n+|[^\s\w]|_")
+_DEFAULT_WINDOW = 8192
+
+# (model prefix, context window in tokens); first match wins, so longer prefixes go first
+_CONTEXT_WINDOWS: List[Tuple[str, int]] = [
+    ("gpt-4o", 128000),
+    ("gpt-4.1", 1000000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4", 8192),
+    ("gpt-3.5", 16385),
+    ("o1", 200000),
+    ("o3", 200000),
+    ("claude", 200000),
+    ("llama3.1", 128000),
+    ("llama3.2", 128000),
+    ("llama3", 8192),
+    ("mistral", 32768),
+]
+
+
+def _piece_cost(piece: str) -> int:
+    first = piece[0]
+    if first.isalpha():
+        return (len(piece) + 5) // 6
+    return 1
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of `text` (deterministic, no tokenizer download)."""
+    if not text:
+        return 0
+    return sum(_piece_cost(m.group()) for m in _PIECE_RE.finditer(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cut `text` to about `max_tokens` tokens at a piece boundary, keeping its head or tail."""
+    if max_tokens <= 0:
+        return ""
+    pieces = list(_PIECE_RE.finditer(text))
+    total = sum(_piece_cost(m.group()) for m in pieces)
+    if total <= max_tokens:
+        return text
+    marker = "[... {} tokens omitted]"
+    room = max_tokens - count_tokens(marker.format(total)) - 1  # marker + its newline
+    if room <= 0:
+        return ""
+    used = 0
+    if keep == "tail":
+        start = len(text)
+        for m in reversed(pieces):
+            used += _piece_cost(m.group())
+            if used > room:
+                break
+            start = m.start()
+        kept = text[start:].lstrip()
+        return marker.format(total - count_tokens(kept)) + "\n" + kept
+    end = 0
+    for m in pieces:
+        used += _piece_cost(m.group())
+        if used > room:
+            break
+        end = m.end()
+    kept = text[:end].rstrip()
+    return kept + "\n" + marker.format(total - count_tokens(kept))
+
+
+# -----------------------------
+# Budgets
+# -----------------------------
+def _model_env_key(model: str) -> str:
+    return "LLM_CONTEXT_TOKENS_" + re.sub(r"[^A-Z0-9]+", "_", model.upper()).strip("_")
+
+
+def context_window(provider: str, model: str) -> int:
+    """Context window (tokens) for a provider/model pair."""
+    if model:
+        override = env_num(_model_env_key(model), 0)
+        if override > 0:
+            return int(override)
+    if provider == "ollama":
+        return int(env_num("OLLAMA_NUM_CTX", 4096))
+    name = (model or "").lower()
+    for prefix, window in _CONTEXT_WINDOWS:
+        if name.startswith(prefix):
+            return window
+    return _DEFAULT_WINDOW
+
+
+def prompt_budget(llm_client: Any = None) -> int:
+    """Tokens available for system + user prompt on `llm_client` (smallest window behind a failover chain)."""
+    windows = []
+    for provider in _leaf_providers(llm_client) if llm_client is not None else []:
+        key = getattr(provider, "_limit_key", None)
+        if isinstance(key, tuple) and len(key) == 2:
+            windows.append(context_window(key[0], key[1]))
+        else:
+            windows.append(context_window("", getattr(provider, "model", "") or ""))
+    window = min(windows) if windows else _DEFAULT_WINDOW
+    budget = window - int(env_num("LLM_PROMPT_RESERVED_OUTPUT_TOKENS", 2048))
+    cap = int(env_num("LLM_PROMPT_BUDGET_TOKENS", 0))
+    if cap > 0:
+        budget = min(budget, cap)
+    return max(budget, 256)
+
+
+# -----------------------------
+# Builder
+# -----------------------------
+class BuiltPrompt:
+    """The assembled prompt plus its token report."""
+
+    __slots__ = ("text", "tokens", "budget", "system_tokens", "sections")
+
+    def __init__(self, text: str, tokens: int, budget: int, system_tokens: int, sections: List[Dict[str, Any]]):
+        self.text = text
+        self.tokens = tokens
+        self.budget = budget
+        self.system_tokens = system_tokens
+        self.sections = sections
+
+    @property
+    def truncated(self) -> bool:
+        return any(s["truncated"] for s in self.sections)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            "tokens": self.tokens,
+            "system_tokens": self.system_tokens,
+            "truncated": self.truncated,
+            "sections": [dict(s) for s in self.sections],
+        }
+
+
+class PromptBuilder:
+    """
+    Collects prompt parts in output order: `text()` for scaffolding that is
+    always kept, `section()` for content that may be cut to fit the budget.
+    """
+
+    def __init__(self, budget: int, system_prompt: str = ""):
+        self.budget = budget
+        self.system_tokens = count_tokens(system_prompt)
+        self._parts: List[Tuple[Optional[Dict[str, Any]], str]] = []
+
+    def text(self, value: str) -> "PromptBuilder":
+        self._parts.append((None, value))
+        return self
+
+    def section(self, name: str, value: Any, priority: int, keep: str = "head") -> "PromptBuilder":
+        value = "" if value is None else str(value)
+        self._parts.append(({"name": name, "priority": priority, "keep": keep}, value))
+        return self
+
+    def build(self, step: Optional[str] = None) -> BuiltPrompt:
+        fixed = self.system_tokens + sum(count_tokens(v) for meta, v in self._parts if meta is None)
+        remaining = max(self.budget - fixed, 0)
+        costs = [count_tokens(v) if meta is not None else 0 for meta, v in self._parts]
+        order = sorted((i for i, (meta, _) in enumerate(self._parts) if meta is not None),
+                       key=lambda i: (self._parts[i][0]["priority"], i))
+        granted: Dict[int, int] = {}
+        for i in order:
+            granted[i] = min(costs[i], remaining)
+            remaining -= granted[i]
+
+        out: List[str] = []
+        sections: List[Dict[str, Any]] = []
+        for i, (meta, value) in enumerate(self._parts):
+            if meta is None:
+                out.append(value)
+                continue
+            fitted = value if granted[i] >= costs[i] else truncate_tokens(value, granted[i], meta["keep"])
+            out.append(fitted)
+            tokens = count_tokens(fitted)
+            sections.append({
+                "name": meta["name"],
+                "priority": meta["priority"],
+                "tokens": tokens,
+                "original_tokens": costs[i],
+                "truncated": fitted != value,
+                "dropped": bool(value) and not fitted,
+            })
+        text = "".join(out)
+        built = BuiltPrompt(text, count_tokens(text) + self.system_tokens, self.budget, self.system_tokens, sections)
+        _record(step, built)
+        return built
+
+
+# -----------------------------
+# Stats
+# -----------------------------
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, Any]] = {}
+
+
+def _record(step: Optional[str], built: BuiltPrompt) -> None:
+    key = step or "unknown"
+    with _lock:
+        s = _stats.setdefault(key, {"builds": 0, "truncated": 0, "tokens_total": 0, "tokens_max": 0, "last": None})
+        s["builds"] += 1
+        s["truncated"] += int(built.truncated)
+        s["tokens_total"] += built.tokens
+        s["tokens_max"] = max(s["tokens_max"], built.tokens)
+        s["last"] = built.report()
+    if built.truncated:
+        cut = ", ".join(f"{x['name']} {x['original_tokens']}->{x['tokens']}" for x in built.sections if x["truncated"])
+        print(f"[prompt] {key}: truncated to fit {built.budget} tokens ({cut})")
+
+
+def prompt_stats() -> Dict[str, Any]:
+    with _lock:
+        return {step: {**s, "last": dict(s["last"]) if s["last"] else None} for step, s in _stats.items()}
+
+
+def reset_prompt_stats() -> None:
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,521 @@
+# services/api/llm_repair.py
+"""
+Validation and repair of the plan JSON returned by providers.
+
+A plan answer goes through three stages instead of failing the whole
+generation on the first json.loads error:
+
+1. Local text repairs: prose or ``` fences around the object, raw control
+   characters inside strings, trailing commas, and a truncated tail (the
+   last complete value is kept and the open strings/arrays/objects are
+   closed).
+2. Validation against PLAN_SCHEMA (a JSON Schema subset: type, required,
+   properties, items, enum, minLength, minimum) after cheap coercions:
+   priorities are normalized, numeric strings become integers, missing ids
+   are generated, a bare acceptance criterion becomes a list.
+3. A targeted re-ask for each fragment that is still broken: the PRD, the
+   OpenAPI document, the plan array, or one plan item (sent back with its
+   validation errors). At most LLM_REPAIR_MAX_REASKS fragments are
+   re-asked (default 3; LLM_REPAIR_REASK=off disables re-asks). Plan items
+   that stay invalid are dropped; a PRD or OpenAPI document that cannot be
+   recovered raises PlanOutputError.
+
+Counters per provider/model (clean, repaired locally, re-asked, failed and
+the repairs applied) are at GET /api/admin/llm-repairs.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.api.llm import PlanArtifacts
+from services.api.llm_sections import _OPENAPI_PROMPT, _PLANNER_SYSTEM_PROMPT, _PRD_PROMPT, _parse_openapi, _parse_prd
+
+_PRIORITIES = ["critical", "high", "medium", "low"]
+
+_FEATURE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["id", "name"],
+    "properties": {
+        "id": {"type": "string", "minLength": 1},
+        "name": {"type": "string", "minLength": 1},
+        "description": {"type": "string"},
+        "priority": {"enum": _PRIORITIES},
+        "size_estimate_hours": {"type": "integer", "minimum": 0},
+        "acceptance_criteria": {"type": "array", "items": {"type": "string"}},
+    },
+}
+
+_PLAN_ITEM_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["id", "name", "features"],
+    "properties": {
+        "id": {"type": "string", "minLength": 1},
+        "name": {"type": "string", "minLength": 1},
+        "description": {"type": "string"},
+        "priority": {"enum": _PRIORITIES},
+        "size_estimate_days": {"type": "integer", "minimum": 0},
+        "features": {"type": "array", "items": _FEATURE_SCHEMA},
+    },
+}
+
+PLAN_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["prd_markdown", "openapi_yaml", "implementation_plan"],
+    "properties": {
+        "prd_markdown": {"type": "string", "minLength": 1},
+        "openapi_yaml": {"type": "string", "minLength": 1},
+        "implementation_plan": {"type": "array", "items": _PLAN_ITEM_SCHEMA},
+    },
+}
+
+_PLANS_PROMPT = """From this request:
+
+"{request}"
+
+Return a STRICT JSON object {{"implementation_plan": [...]}} where each plan has: "id", "name", "description",
+"priority" (critical|high|medium|low), "size_estimate_days" (integer) and "features"; each feature has: "id",
+"name", "description", "priority", "size_estimate_hours" (integer) and "acceptance_criteria" (array of strings).
+JSON only."""
+
+_ITEM_PROMPT = """This item of the implementation plan for the request "{request}" is invalid:
+
+{fragment}
+
+Problems:
+{errors}
+
+Return only the corrected JSON object for this one plan with keys "id", "name", "description", "priority",
+"size_estimate_days" and "features" (each feature: "id", "name", "description", "priority",
+"size_estimate_hours", "acceptance_criteria"). Keep the content. JSON only."""
+
+
+class PlanOutputError(ValueError):
+    """The plan answer could not be repaired; `errors` lists what is still wrong."""
+
+    def __init__(self, message: str, errors: Optional[List[str]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+# -----------------------------
+# JSON Schema subset
+# -----------------------------
+_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+}
+
+
+def validate(instance: Any, schema: Dict[str, Any], path: str = "") -> List[str]:
+    """Errors as "<json pointer>: <problem>"; empty when `instance` matches."""
+    where = path or "/"
+    expected = schema.get("type")
+    if expected and not _TYPES[expected](instance):
+        return [f"{where}: expected {expected}"]
+    if "enum" in schema and instance not in schema["enum"]:
+        return [f"{where}: must be one of {', '.join(map(str, schema['enum']))}"]
+    errors: List[str] = []
+    if isinstance(instance, str) and len(instance.strip()) < schema.get("minLength", 0):
+        errors.append(f"{where}: must not be empty")
+    if "minimum" in schema and isinstance(instance, (int, float)) and instance < schema["minimum"]:
+        errors.append(f"{where}: must be >= {schema['minimum']}")
+    if isinstance(instance, dict):
+        for key in schema.get("required", []):
+            if key not in instance:
+                errors.append(f"{path}/{key}: missing")
+        for key, sub in schema.get("properties", {}).items():
+            if key in instance:
+                errors.extend(validate(instance[key], sub, f"{path}/{key}"))
+    if isinstance(instance, list) and "items" in schema:
+        for i, item in enumerate(instance):
+            errors.extend(validate(item, schema["items"], f"{path}/{i}"))
+    return errors
+
+
+# -----------------------------
+# Local text repairs
+# -----------------------------
+def _strip_wrapping(text: str) -> str:
+    start = text.find("{")
+    if start < 0:
+        raise PlanOutputError("no JSON object in the answer")
+    end = text.rfind("}")
+    tail = text[end + 1:]
+    # a closing fence or prose after the last brace (a truncated answer has quotes there)
+    if end > start and tail.strip() and '"' not in tail:
+        return text[start:end + 1]
+    return text[start:]
+
+
+def _drop_trailing_commas(text: str) -> str:
+    out: List[str] = []
+    in_str = esc = False
+    for i, c in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c in "}]":
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+        out.append(c)
+    return "".join(out)
+
+
+TRUNCATED_KEY = "__truncated__"
+
+
+def _close_truncated(text: str) -> str:
+    """
+    Keep everything up to the last complete value and close what is still
+    open; every object closed here gets TRUNCATED_KEY so callers can tell
+    complete items from cut ones.
+    """
+    stack: List[str] = []
+    expect: List[str] = []          # per open object: "key" or "value"
+    in_str = esc = is_key = False
+    last: Optional[Tuple[int, Tuple[str, ...]]] = None
+    literal_start: Optional[int] = None
+    for i, c in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+                if not is_key:
+                    last = (i + 1, tuple(stack))
+            continue
+        if literal_start is not None and (c in ",}]" or c.isspace()):
+            last, literal_start = (i, tuple(stack)), None
+        if c == '"':
+            in_str = True
+            is_key = bool(stack) and stack[-1] == "{" and expect[-1] == "key"
+        elif c in "{[":
+            stack.append(c)
+            expect.append("key" if c == "{" else "value")
+        elif c in "}]":
+            if not stack:
+                break
+            stack.pop()
+            expect.pop()
+            last = (i + 1, tuple(stack))
+            if not stack:
+                break
+        elif c == ":" and stack:
+            expect[-1] = "value"
+        elif c == "," and stack and stack[-1] == "{":
+            expect[-1] = "key"
+        elif not c.isspace() and literal_start is None and c not in ",:":
+            literal_start = i
+    if last is None:
+        raise PlanOutputError("answer ends before any complete value")
+    end, open_ = last
+    kept = text[:end]
+    closers = []
+    for b in reversed(open_):
+        if b == "[":
+            closers.append("]")
+        else:
+            empty = not closers and kept.rstrip().endswith("{")
+            closers.append(("" if empty else ", ") + f'"{TRUNCATED_KEY}": true}}')
+    return kept + "".join(closers)
+
+
+def _pop_truncated(value: Any) -> bool:
+    """Remove TRUNCATED_KEY markers; True if `value` contained one."""
+    found = False
+    if isinstance(value, dict):
+        found = value.pop(TRUNCATED_KEY, None) is not None
+        for v in value.values():
+            found |= _pop_truncated(v)
+    elif isinstance(value, list):
+        for v in value:
+            found |= _pop_truncated(v)
+    return found
+
+
+def load_json_lenient(text: str, mark_truncated: bool = False) -> Tuple[Any, List[str]]:
+    """
+    (object, repairs applied) — raises PlanOutputError when nothing parses.
+    With mark_truncated, objects cut off by a truncated answer keep TRUNCATED_KEY.
+    """
+    repairs: List[str] = []
+    stripped = text.strip()
+    body = _strip_wrapping(stripped)
+    if body != stripped:
+        repairs.append("fence")
+    try:
+        return json.loads(body), repairs
+    except json.JSONDecodeError:
+        pass
+    try:
+        obj = json.loads(body, strict=False)
+        return obj, repairs + ["control_chars"]
+    except json.JSONDecodeError:
+        pass
+    fixed = _drop_trailing_commas(body)
+    if fixed != body:
+        repairs.append("trailing_commas")
+        try:
+            return json.loads(fixed, strict=False), repairs
+        except json.JSONDecodeError:
+            pass
+    try:
+        obj = json.loads(_drop_trailing_commas(_close_truncated(fixed)), strict=False)
+    except json.JSONDecodeError as e:
+        raise PlanOutputError(f"unrepairable JSON: {e}") from None
+    if not mark_truncated:
+        _pop_truncated(obj)
+    return obj, repairs + ["truncated"]
+
+
+# -----------------------------
+# Coercions
+# -----------------------------
+def _as_int(value: Any) -> Any:
+    if isinstance(value, float):
+        return int(round(value))
+    if isinstance(value, str) and re.fullmatch(r"\s*\d+(\.\d+)?\s*", value):
+        return int(round(float(value)))
+    return value
+
+
+def _coerce_entry(entry: Dict[str, Any], id_prefix: str, index: int, size_key: str) -> bool:
+    changed = False
+    if not entry.get("id"):
+        entry["id"], changed = f"{id_prefix}-{index}", True
+    elif not isinstance(entry["id"], str):
+        entry["id"], changed = str(entry["id"]), True
+    priority = entry.get("priority")
+    if priority is not None and priority not in _PRIORITIES:
+        normalized = str(priority).strip().lower()
+        entry["priority"], changed = (normalized if normalized in _PRIORITIES else "medium"), True
+    if size_key in entry:
+        size = _as_int(entry[size_key])
+        if size is not entry[size_key]:
+            entry[size_key], changed = size, True
+    return changed
+
+
+def _coerce_plan(plan: Dict[str, Any], index: int) -> bool:
+    changed = _coerce_entry(plan, "plan", index, "size_estimate_days")
+    if "features" not in plan:
+        plan["features"], changed = [], True
+    if isinstance(plan["features"], list):
+        for j, feature in enumerate(plan["features"], 1):
+            if isinstance(feature, dict):
+                changed |= _coerce_entry(feature, f"{plan['id']}-feature", j, "size_estimate_hours")
+                criteria = feature.get("acceptance_criteria")
+                if isinstance(criteria, str):
+                    feature["acceptance_criteria"], changed = [criteria], True
+    return changed
+
+
+def _coerce(obj: Dict[str, Any]) -> bool:
+    plans = obj.get("implementation_plan")
+    changed = False
+    if isinstance(plans, list):
+        for i, plan in enumerate(plans, 1):
+            if isinstance(plan, dict):
+                changed |= _coerce_plan(plan, i)
+    return changed
+
+
+# -----------------------------
+# Stats
+# -----------------------------
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, Any]] = {}
+
+
+def _record(model_key: Optional[str], outcome: str, kinds: List[str]) -> None:
+    if not model_key:
+        return
+    with _lock:
+        s = _stats.setdefault(model_key, {"answers": 0, "clean": 0, "repaired_locally": 0, "reasked": 0,
+                                          "failed": 0, "repairs": Counter()})
+        s["answers"] += 1
+        s[outcome] += 1
+        s["repairs"].update(kinds)
+
+
+def repair_stats() -> Dict[str, Any]:
+    with _lock:
+        out = {}
+        for key, s in _stats.items():
+            repaired = s["repaired_locally"] + s["reasked"]
+            out[key] = {**s, "repairs": dict(s["repairs"]),
+                        "repair_rate": round(repaired / s["answers"], 4) if s["answers"] else 0.0}
+        return out
+
+
+def reset_repair_stats() -> None:
+    with _lock:
+        _stats.clear()
+
+
+# -----------------------------
+# Pipeline
+# -----------------------------
+Reask = Callable[[str, str], str]
+AReask = Callable[[str, str], Awaitable[str]]
+
+
+class _Repair:
+    """State of one answer between the local stage and the re-asks."""
+
+    def __init__(self, text: str, user_request: str, model_key: Optional[str]):
+        self.user_request = user_request
+        self.model_key = model_key
+        self.kinds: List[str] = []
+        try:
+            obj, self.kinds = load_json_lenient(text, mark_truncated=True)
+        except PlanOutputError as e:
+            _record(model_key, "failed", ["unparseable"])
+            raise PlanOutputError(f"Plan answer is not valid JSON: {e}") from None
+        if not isinstance(obj, dict):
+            _record(model_key, "failed", self.kinds + ["not_an_object"])
+            raise PlanOutputError("Plan answer is not a JSON object")
+        self.obj = obj
+        truncated = obj.pop(TRUNCATED_KEY, None) is not None
+        if "implementation_plan" not in obj and not truncated:
+            obj["implementation_plan"] = []  # a plan-less answer is valid; a cut-off one is re-asked
+        # plan items the truncation cut through are incomplete even if they validate
+        plans = obj.get("implementation_plan")
+        self.cut = {i for i, p in enumerate(plans) if _pop_truncated(p)} if isinstance(plans, list) else set()
+        _pop_truncated(obj)
+        if _coerce(obj):
+            self.kinds.append("coerced")
+
+    def errors(self) -> List[str]:
+        return validate(self.obj, PLAN_SCHEMA) + [f"/implementation_plan/{i}: cut off by a truncated answer" for i in sorted(self.cut)]
+
+    def broken(self) -> List[Tuple[str, str, Callable[[str], Any]]]:
+        """(fragment name, prompt, parser) for each part that is still invalid."""
+        errors = self.errors()
+        request = self.user_request
+        out: List[Tuple[str, str, Callable[[str], Any]]] = []
+        top = {e.split(":")[0].split("/")[1] for e in errors}
+        if "prd_markdown" in top:
+            out.append(("prd_markdown", _PRD_PROMPT.format(request=request), _parse_prd))
+        if "openapi_yaml" in top:
+            out.append(("openapi_yaml", _OPENAPI_PROMPT.format(request=request), _parse_openapi))
+        plans = self.obj.get("implementation_plan")
+        if not isinstance(plans, list):
+            if "implementation_plan" in top:
+                out.append(("implementation_plan", _PLANS_PROMPT.format(request=request), self._parse_plans))
+            return out
+        for i, plan in enumerate(plans):
+            item_errors = [e for e in errors if e.startswith(f"/implementation_plan/{i}/") or e.startswith(f"/implementation_plan/{i}:")]
+            if item_errors:
+                prompt = _ITEM_PROMPT.format(request=request, fragment=json.dumps(plan, indent=1)[:4000],
+                                             errors="\n".join(f"- {e}" for e in item_errors))
+                out.append((f"implementation_plan/{i}", prompt, lambda t, i=i: self._parse_item(t, i)))
+        return out
+
+    def _parse_plans(self, text: str) -> List[Dict[str, Any]]:
+        obj, _ = load_json_lenient(text)
+        plans = obj.get("implementation_plan") if isinstance(obj, dict) else None
+        if not isinstance(plans, list):
+            raise ValueError("no implementation_plan array")
+        _coerce({"implementation_plan": plans})
+        return plans
+
+    def _parse_item(self, text: str, index: int) -> Dict[str, Any]:
+        item, _ = load_json_lenient(text)
+        if not isinstance(item, dict):
+            raise ValueError("not an object")
+        _coerce_plan(item, index + 1)
+        errors = validate(item, _PLAN_ITEM_SCHEMA)
+        if errors:
+            raise ValueError("; ".join(errors))
+        return item
+
+    def apply(self, name: str, value: Any) -> None:
+        if name.startswith("implementation_plan/"):
+            index = int(name.split("/")[1])
+            self.obj["implementation_plan"][index] = value
+            self.cut.discard(index)
+        else:
+            self.obj[name] = value
+
+    def finish(self, reasked: List[str]) -> PlanArtifacts:
+        errors = validate(self.obj, PLAN_SCHEMA)
+        for part in ("prd_markdown", "openapi_yaml"):
+            if any(e.startswith(f"/{part}") for e in errors):
+                _record(self.model_key, "failed", self.kinds)
+                raise PlanOutputError(f"Plan answer has no valid {part}", errors)
+        plans = self.obj.get("implementation_plan")
+        kept = [p for i, p in enumerate(plans if isinstance(plans, list) else [])
+                if i not in self.cut and not validate(p, _PLAN_ITEM_SCHEMA, f"/implementation_plan/{i}")]
+        if isinstance(plans, list) and len(kept) < len(plans):
+            self.kinds.append("dropped_items")
+        self.kinds.extend(f"reask:{name.split('/')[0]}" for name in reasked)
+        outcome = "reasked" if reasked else ("repaired_locally" if self.kinds else "clean")
+        _record(self.model_key, outcome, self.kinds)
+        if self.kinds:
+            print(f"[llm-repair] {self.model_key or 'plan'}: {', '.join(self.kinds)}")
+        return PlanArtifacts(prd_markdown=self.obj["prd_markdown"], openapi_yaml=self.obj["openapi_yaml"],
+                             implementation_plan=kept)
+
+
+def _reask_limit() -> int:
+    if os.getenv("LLM_REPAIR_REASK", "on").strip().lower() in {"off", "0", "false", "no"}:
+        return 0
+    try:
+        return int(os.getenv("LLM_REPAIR_MAX_REASKS", "3"))
+    except ValueError:
+        return 3
+
+
+def repair_plan_output(text: str, user_request: str = "", reask: Optional[Reask] = None,
+                       model_key: Optional[str] = None) -> PlanArtifacts:
+    """Parse a plan answer, repairing it locally and re-asking `reask(user, system)` for broken fragments."""
+    state = _Repair(text, user_request, model_key)
+    reasked: List[str] = []
+    if reask is not None:
+        for name, prompt, parse in state.broken()[:_reask_limit()]:
+            try:
+                state.apply(name, parse(reask(prompt, _PLANNER_SYSTEM_PROMPT)))
+                reasked.append(name)
+            except Exception as e:
+                print(f"[llm-repair] re-ask for {name} failed: {e}")
+    return state.finish(reasked)
+
+
+async def arepair_plan_output(text: str, user_request: str = "", reask: Optional[AReask] = None,
+                              model_key: Optional[str] = None) -> PlanArtifacts:
+    """Async repair_plan_output; the re-asks for different fragments run concurrently."""
+    state = _Repair(text, user_request, model_key)
+    reasked: List[str] = []
+    if reask is not None:
+        fragments = state.broken()[:_reask_limit()]
+        answers = await asyncio.gather(*(reask(prompt, _PLANNER_SYSTEM_PROMPT) for _, prompt, _ in fragments),
+                                       return_exceptions=True)
+        for (name, _, parse), answer in zip(fragments, answers):
+            try:
+                if isinstance(answer, BaseException):
+                    raise answer
+                state.apply(name, parse(answer))
+                reasked.append(name)
+            except Exception as e:
+                print(f"[llm-repair] re-ask for {name} failed: {e}")
+    return state.finish(reasked)
@@ -0,0 +1,391 @@
+# services/api/llm_router.py
+"""
+Failover and hedging across LLM providers.
+
+RoutedLLM holds an ordered chain (the configured provider first, then
+LLM_FALLBACK_PROVIDERS, e.g. "anthropic,ollama") and tries them in order.
+Health is tracked per provider/model for the whole process:
+
+- latency EWMA plus a window of recent latencies for percentiles;
+- error-rate EWMA;
+- a circuit breaker: LLM_CIRCUIT_FAILURES consecutive failures open it
+  for LLM_CIRCUIT_OPEN_SECONDS, after which one probe call is let through.
+
+Hedging (off by default) sends the same request to the next healthy
+provider once the primary has been running longer than its
+LLM_HEDGE_PERCENTILE latency (or a fixed LLM_HEDGE_AFTER_SECONDS); the
+first answer wins. Streams fail over only before their first chunk.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from services.api.core.shared import env_num
+from services.api.llm_telemetry import call_attempt
+
+
+class LLMUnavailable(RuntimeError):
+    """Every provider in the chain has an open circuit."""
+
+
+def provider_key(client: Any) -> Tuple[str, str]:
+    return getattr(client, "_limit_key", None) or (type(client).__name__, "")
+
+
+class ProviderHealth:
+    def __init__(self, name: str, alpha: float = 0.2, window: int = 100,
+                 failure_threshold: int = 5, open_seconds: float = 30.0):
+        self.name = name
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self.latency_ewma: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.stats = {"calls": 0, "failures": 0, "circuit_opened": 0}
+
+    def allow(self) -> bool:
+        """Closed circuit, or an open one whose cool-down passed (one probe per cool-down)."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.open_seconds:
+                return False
+            self.opened_at = now  # half-open: let this caller probe, hold the rest back
+            return True
+
+    def record(self, ok: bool, latency_s: float) -> None:
+        with self._lock:
+            self.stats["calls"] += 1
+            self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+            if ok:
+                self._latencies.append(latency_s)
+                self.latency_ewma = latency_s if self.latency_ewma is None else \
+                    self.latency_ewma + self.alpha * (latency_s - self.latency_ewma)
+                self.consecutive_failures = 0
+                self.opened_at = None
+                return
+            self.stats["failures"] += 1
+            self.consecutive_failures += 1
+            if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    self.stats["circuit_opened"] += 1
+                self.opened_at = time.monotonic()
+
+    def percentile(self, pct: float, min_samples: int = 10) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            samples = sorted(self._latencies)
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100.0))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(50, 1), self.percentile(95, 1)
+        with self._lock:
+            s: Dict[str, Any] = dict(self.stats)
+            s.update(
+                latency_ewma_s=None if self.latency_ewma is None else round(self.latency_ewma, 4),
+                latency_p50_s=None if p50 is None else round(p50, 4),
+                latency_p95_s=None if p95 is None else round(p95, 4),
+                error_rate=round(self.error_rate, 4),
+                consecutive_failures=self.consecutive_failures,
+                circuit="closed" if self.opened_at is None else "open",
+            )
+            return s
+
+
+_HEALTH: Dict[Tuple[str, str], ProviderHealth] = {}
+_HEALTH_LOCK = threading.Lock()
+_ROUTER_STATS = {"failovers": 0, "hedges": 0, "hedge_wins": 0, "short_circuited": 0}
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def health_for(client: Any) -> ProviderHealth:
+    key = provider_key(client)
+    with _HEALTH_LOCK:
+        h = _HEALTH.get(key)
+        if h is None:
+            h = _HEALTH[key] = ProviderHealth(
+                "/".join(p for p in key if p),
+                failure_threshold=int(env_num("LLM_CIRCUIT_FAILURES", 5)),
+                open_seconds=env_num("LLM_CIRCUIT_OPEN_SECONDS", 30),
+            )
+        return h
+
+
+def router_stats() -> Dict[str, Any]:
+    with _HEALTH_LOCK:
+        health = list(_HEALTH.values())
+        totals = dict(_ROUTER_STATS)
+    return {"router": totals, "providers": {h.name: h.snapshot() for h in health}}
+
+
+def reset_router_state() -> None:
+    with _HEALTH_LOCK:
+        _HEALTH.clear()
+        for k in _ROUTER_STATS:
+            _ROUTER_STATS[k] = 0
+
+
+def _bump(stat: str) -> None:
+    with _HEALTH_LOCK:
+        _ROUTER_STATS[stat] += 1
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _HEALTH_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+        return _EXECUTOR
+
+
+class RoutedLLM:
+    """
+    Ordered provider chain with failover and optional hedging. Capabilities
+    (generate_text, streaming) follow the primary; fallbacks that lack one
+    are skipped for that call.
+    """
+
+    _OPTIONAL = {
+        "generate_text": "generate_text",
+        "agenerate_text": "generate_text",
+        "astream_plan": "astream_plan",
+        "astream_text": "astream_text",
+    }
+
+    def __init__(self, providers: List[Any], hedge_percentile: float = 0.0,
+                 hedge_after_s: float = 0.0, hedge_min_s: float = 1.0):
+        if not providers:
+            raise ValueError("RoutedLLM needs at least one provider")
+        self.providers = providers
+        self.hedge_percentile = hedge_percentile
+        self.hedge_after_s = hedge_after_s
+        self.hedge_min_s = hedge_min_s
+
+    @property
+    def inner(self) -> Any:
+        # cache and singleflight keys follow the primary provider
+        return self.providers[0]
+
+    def _candidates(self, capability: str) -> List[Any]:
+        out = [p for p in self.providers if hasattr(p, capability) and health_for(p).allow()]
+        if not out:
+            _bump("short_circuited")
+            names = ", ".join(health_for(p).name for p in self.providers)
+            raise LLMUnavailable(f"all LLM providers are unavailable (circuit open: {names})")
+        return out
+
+    def _hedge_delay(self, primary: Any) -> Optional[float]:
+        if self.hedge_after_s > 0:
+            return self.hedge_after_s
+        if self.hedge_percentile > 0:
+            p = health_for(primary).percentile(self.hedge_percentile)
+            if p is not None:
+                return max(self.hedge_min_s, p)
+        return None
+
+    # -- blocking --
+    @staticmethod
+    def _timed(client: Any, attempt: int, method: str, *args: Any, **kwargs: Any) -> Any:
+        started = time.monotonic()
+        try:
+            with call_attempt(attempt):
+                result = getattr(client, method)(*args, **kwargs)
+        except Exception:
+            health_for(client).record(False, time.monotonic() - started)
+            raise
+        health_for(client).record(True, time.monotonic() - started)
+        return result
+
+    def _call(self, method: str, capability: str, *args: Any, **kwargs: Any) -> Any:
+        candidates = self._candidates(capability)
+        delay = self._hedge_delay(candidates[0]) if len(candidates) > 1 else None
+        errors: List[Exception] = []
+        if delay is None:
+            for i, client in enumerate(candidates):
+                if i:
+                    _bump("failovers")
+                try:
+                    return self._timed(client, i + 1, method, *args, **kwargs)
+                except Exception as e:
+                    print(f"[llm] {health_for(client).name} failed: {e}")
+                    errors.append(e)
+            raise errors[-1]
+
+        pool = _executor()
+        pending: Dict[Future, int] = {pool.submit(self._timed, candidates[0], 1, method, *args, **kwargs): 0}
+        nxt = 1
+        hedged = False
+        hedge_idx = -1
+        while pending:
+            done, _ = wait(list(pending), timeout=None if hedged else delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # primary is slower than usual: race the next provider against it
+                hedged = True
+                _bump("hedges")
+                hedge_idx = nxt
+                pending[pool.submit(self._timed, candidates[nxt], nxt + 1, method, *args, **kwargs)] = nxt
+                nxt += 1
+                continue
+            for fut in done:
+                idx = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    print(f"[llm] {health_for(candidates[idx]).name} failed: {e}")
+                    errors.append(e)
+                    continue
+                if idx == hedge_idx:
+                    _bump("hedge_wins")
+                return result  # a losing request finishes in the background
+            if not pending and nxt < len(candidates):
+                _bump("failovers")
+                hedged = True
+                pending[pool.submit(self._timed, candidates[nxt], nxt + 1, method, *args, **kwargs)] = nxt
+                nxt += 1
+        raise errors[-1]
+
+    def generate_plan(self, user_request: str, **kwargs: Any):
+        return self._call("generate_plan", "generate_plan", user_request, **kwargs)
+
+    def _generate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        return self._call("generate_text", "generate_text", user_prompt, system_prompt)
+
+    # -- async --
+    @staticmethod
+    async def _atimed(client: Any, attempt: int, call: Callable[[Any], Any]) -> Any:
+        started = time.monotonic()
+        try:
+            with call_attempt(attempt):
+                result = await call(client)
+        except asyncio.CancelledError:
+            raise  # a cancelled hedge loser says nothing about the provider
+        except Exception:
+            health_for(client).record(False, time.monotonic() - started)
+            raise
+        health_for(client).record(True, time.monotonic() - started)
+        return result
+
+    async def _acall(self, capability: str, call: Callable[[Any], Any]) -> Any:
+        candidates = self._candidates(capability)
+        delay = self._hedge_delay(candidates[0]) if len(candidates) > 1 else None
+        errors: List[Exception] = []
+        pending: Dict[asyncio.Task, int] = {asyncio.ensure_future(self._atimed(candidates[0], 1, call)): 0}
+        nxt = 1
+        hedged = delay is None
+        hedge_idx = -1
+        try:
+            while pending:
+                done, _ = await asyncio.wait(list(pending), timeout=None if hedged else delay,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    _bump("hedges")
+                    hedge_idx = nxt
+                    pending[asyncio.ensure_future(self._atimed(candidates[nxt], nxt + 1, call))] = nxt
+                    nxt += 1
+                    continue
+                for task in done:
+                    idx = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"[llm] {health_for(candidates[idx]).name} failed: {e}")
+                        errors.append(e)
+                        continue
+                    if idx == hedge_idx:
+                        _bump("hedge_wins")
+                    return result
+                if not pending and nxt < len(candidates):
+                    _bump("failovers")
+                    hedged = True
+                    pending[asyncio.ensure_future(self._atimed(candidates[nxt], nxt + 1, call))] = nxt
+                    nxt += 1
+            raise errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def agenerate_plan(self, user_request: str, **kwargs: Any):
+        from services.api.llm import agenerate_plan
+        return await self._acall("generate_plan", lambda c: agenerate_plan(c, user_request, **kwargs))
+
+    async def _agenerate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        from services.api.llm import agenerate_text
+        return await self._acall("generate_text", lambda c: agenerate_text(c, user_prompt, system_prompt))
+
+    # -- streams --
+    async def _astream(self, capability: str, open_stream: Callable[[Any], AsyncIterator[str]]) -> AsyncIterator[str]:
+        errors: List[Exception] = []
+        for i, client in enumerate(self._candidates(capability)):
+            if i:
+                _bump("failovers")
+            started = time.monotonic()
+            yielded = False
+            try:
+                async for chunk in open_stream(client):
+                    if not yielded:
+                        yielded = True
+                        # time to first chunk is what a stream's caller waits on
+                        health_for(client).record(True, time.monotonic() - started)
+                    yield chunk
+                if not yielded:
+                    health_for(client).record(True, time.monotonic() - started)
+                return
+            except Exception as e:
+                if yielded:
+                    raise  # the caller has partial output; can't switch providers now
+                health_for(client).record(False, time.monotonic() - started)
+                print(f"[llm] {health_for(client).name} stream failed: {e}")
+                errors.append(e)
+        raise errors[-1]
+
+    def _astream_plan(self, user_request: str) -> AsyncIterator[str]:
+        return self._astream("astream_plan", lambda c: c.astream_plan(user_request))
+
+    def _astream_text(self, user_prompt: str, system_prompt: str = "") -> AsyncIterator[str]:
+        return self._astream("astream_text", lambda c: c.astream_text(user_prompt, system_prompt))
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "providers":
+            raise AttributeError(name)
+        required = self._OPTIONAL.get(name)
+        if required is not None:
+            if not hasattr(self.providers[0], required):
+                raise AttributeError(name)
+            return getattr(self, "_" + name)
+        return getattr(self.providers[0], name)
+
+
+def with_failover(client: Any) -> Any:
+    """
+    Put `client` at the head of a RoutedLLM chain followed by the providers in
+    LLM_FALLBACK_PROVIDERS. MockLLM and already-routed clients pass through.
+    """
+    from services.api.llm import MockLLM, _provider_by_name
+    if client is None or isinstance(client, (MockLLM, RoutedLLM)):
+        return client
+    chain = [client]
+    seen = {provider_key(client)}
+    for name in os.getenv("LLM_FALLBACK_PROVIDERS", "").split(","):
+        fallback = _provider_by_name(name.strip().lower(), fallback=True) if name.strip() else None
+        if fallback is not None and provider_key(fallback) not in seen:
+            seen.add(provider_key(fallback))
+            chain.append(fallback)
+    return RoutedLLM(
+        chain,
+        hedge_percentile=env_num("LLM_HEDGE_PERCENTILE", 0),
+        hedge_after_s=env_num("LLM_HEDGE_AFTER_SECONDS", 0),
+        hedge_min_s=env_num("LLM_HEDGE_MIN_SECONDS", 1),
+    )
@@ -0,0 +1,233 @@
+# services/api/llm_sections.py
+"""
+Sectioned plan generation.
+
+The single-call plan prompt (llm._prompt) asks for the PRD, the OpenAPI
+YAML and every plan with its features in one JSON object, so output
+length sets the latency and one malformed character loses everything.
+In sectioned mode a short outline call lists the plans while the PRD and
+the OpenAPI document are generated alongside it; then one call per plan
+produces its features. Calls run concurrently (PLAN_SECTION_CONCURRENCY,
+default 4) and the results are merged into PlanArtifacts.
+
+A section whose call fails or returns unparseable output is retried on
+its own, bypassing the response caches (PLAN_SECTION_RETRIES, default 2).
+A plan whose features still fail is kept without features; a failed
+outline, PRD or OpenAPI section fails the whole generation.
+
+The mode is LLM_PLAN_MODE (single | sectioned, default single), overridden
+per project by projects.plan_generation_mode. Sectioned mode needs a
+client that takes free-form prompts (generate_text or astream_text);
+other clients, and MockLLM, always use the single call.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+from services.api.core.shared import env_num
+from services.api.llm import PlanArtifacts, _strip_code_fence, agenerate_plan, agenerate_text, astream_text
+from services.api.llm_cache import bypass_llm_cache
+
+PLAN_MODES = ("single", "sectioned")
+
+_PLANNER_SYSTEM_PROMPT = "You are a senior software planner. Follow the requested output format exactly and add no commentary."
+
+_OUTLINE_PROMPT = """From this request:
+
+"{request}"
+
+Outline the implementation as 1-5 plans. Return a STRICT JSON object:
+{{"plans": [{{"id": "plan-1", "name": "short title", "description": "summary of the plan",
+  "priority": "critical|high|medium|low", "size_estimate_days": <positive integer>}}]}}
+JSON only."""
+
+_PRD_PROMPT = """From this request:
+
+"{request}"
+
+Write the product requirements document as markdown: H1 title, problem, goals, non-goals, success criteria.
+Markdown only."""
+
+_OPENAPI_PROMPT = """From this request:
+
+"{request}"
+
+Write a minimal valid OpenAPI 3.1 YAML document describing the API touched by this feature.
+YAML only."""
+
+_FEATURES_PROMPT = """From this request:
+
+"{request}"
+
+the implementation was split into these plans:
+{outline}
+
+List the features of plan "{plan_id}" ({plan_name}) only. Return a STRICT JSON object:
+{{"features": [{{"id": "feature-1", "name": "short actionable title", "description": "1-2 sentences",
+  "priority": "critical|high|medium|low", "size_estimate_hours": <positive integer>,
+  "acceptance_criteria": ["bullet", "bullet"]}}]}}
+JSON only."""
+
+
+def default_plan_mode() -> str:
+    mode = os.getenv("LLM_PLAN_MODE", "single").strip().lower()
+    return mode if mode in PLAN_MODES else "single"
+
+
+def plan_mode_for_project(project_id: Optional[str]) -> str:
+    """The project's plan_generation_mode, else LLM_PLAN_MODE (blocking: reads the DB)."""
+    if project_id:
+        from services.api.core.repos import ProjectsRepoDB
+        from services.api.core.shared import _create_engine, _database_url, _repo_root
+        try:
+            mode = ProjectsRepoDB(_create_engine(_database_url(_repo_root()))).get_plan_generation_mode(str(project_id))
+        except Exception as e:
+            print(f"[plan] could not read plan mode for project {project_id}: {e}")
+            mode = None
+        if mode in PLAN_MODES:
+            return mode
+    return default_plan_mode()
+
+
+def supports_sections(llm_client: Any) -> bool:
+    from services.api.llm import MockLLM
+    if llm_client is None or isinstance(llm_client, MockLLM):
+        return False
+    return hasattr(llm_client, "generate_text") or hasattr(llm_client, "astream_text")
+
+
+async def _acomplete(llm_client: Any, user_prompt: str, system_prompt: str) -> str:
+    if hasattr(llm_client, "generate_text"):
+        return await agenerate_text(llm_client, user_prompt, system_prompt)
+    return "".join([chunk async for chunk in astream_text(llm_client, user_prompt, system_prompt)])
+
+
+def _parse_json_object(text: str, key: str) -> List[Dict[str, Any]]:
+    obj = json.loads(_strip_code_fence(text))
+    items = obj.get(key) if isinstance(obj, dict) else None
+    if not isinstance(items, list) or not all(isinstance(x, dict) for x in items):
+        raise ValueError(f"expected a JSON object with a '{key}' array")
+    return items
+
+
+def _parse_openapi(text: str) -> str:
+    body = _strip_code_fence(text)
+    if body.startswith("yaml\n"):
+        body = body[5:]
+    doc = yaml.safe_load(body)
+    if not isinstance(doc, dict) or "openapi" not in doc:
+        raise ValueError("expected an OpenAPI document")
+    return body.strip() + "\n"
+
+
+def _parse_prd(text: str) -> str:
+    body = _strip_code_fence(text)
+    if body.startswith("markdown\n"):
+        body = body[9:]
+    if not body.strip():
+        raise ValueError("empty PRD")
+    return body.strip() + "\n"
+
+
+async def _section(name: str, call: Callable[[], Awaitable[str]], parse: Callable[[str], Any],
+                   retries: int, sem: asyncio.Semaphore, report: Dict[str, Any]) -> Any:
+    """Run one section, retrying it alone (cache bypassed) until it parses."""
+    last: Optional[Exception] = None
+    for attempt in range(retries + 1):
+        try:
+            async with sem:
+                with bypass_llm_cache(attempt > 0):
+                    raw = await call()
+            return parse(raw)
+        except Exception as e:
+            last = e
+            if attempt < retries:
+                report["retries"] += 1
+                print(f"[plan] section {name} failed (attempt {attempt + 1}): {e}; retrying")
+    report["failed"].append(name)
+    raise RuntimeError(f"section {name} failed: {last}") from last
+
+
+def _normalize_plan(plan: Dict[str, Any], index: int) -> Dict[str, Any]:
+    out = dict(plan)
+    out["id"] = str(plan.get("id") or f"plan-{index}")
+    out.setdefault("name", out["id"])
+    out.setdefault("description", "")
+    out.setdefault("priority", "medium")
+    out.setdefault("size_estimate_days", 1)
+    return out
+
+
+def _merge_features(plan_id: str, features: List[Dict[str, Any]], seen: set) -> List[Dict[str, Any]]:
+    merged = []
+    for i, feature in enumerate(features, 1):
+        f = dict(feature)
+        fid = str(f.get("id") or "")
+        if not fid or fid in seen:
+            fid = f"{plan_id}-feature-{i}"
+        seen.add(fid)
+        f["id"] = fid
+        f.setdefault("acceptance_criteria", [])
+        merged.append(f)
+    return merged
+
+
+async def agenerate_plan_sectioned(llm_client: Any, user_request: str,
+                                   concurrency: Optional[int] = None,
+                                   retries: Optional[int] = None) -> Tuple[PlanArtifacts, Dict[str, Any]]:
+    """Outline + PRD + OpenAPI, then features per plan, merged; returns (artifacts, report)."""
+    sem = asyncio.Semaphore(max(1, concurrency or int(env_num("PLAN_SECTION_CONCURRENCY", 4))))
+    retries = int(env_num("PLAN_SECTION_RETRIES", 2)) if retries is None else retries
+    report: Dict[str, Any] = {"mode": "sectioned", "sections": 0, "retries": 0, "failed": []}
+    system = _PLANNER_SYSTEM_PROMPT
+
+    def text_call(prompt: str) -> Callable[[], Awaitable[str]]:
+        return lambda: _acomplete(llm_client, prompt, system)
+
+    first = [
+        _section("outline", text_call(_OUTLINE_PROMPT.format(request=user_request)),
+                 lambda t: _parse_json_object(t, "plans"), retries, sem, report),
+        _section("prd", text_call(_PRD_PROMPT.format(request=user_request)), _parse_prd, retries, sem, report),
+        _section("openapi", text_call(_OPENAPI_PROMPT.format(request=user_request)), _parse_openapi, retries, sem, report),
+    ]
+    done = await asyncio.gather(*first, return_exceptions=True)
+    for result in done:
+        if isinstance(result, BaseException):
+            raise result
+    outline, prd_md, openapi_yaml = done
+    plans = [_normalize_plan(p, i) for i, p in enumerate(outline, 1)]
+    outline_text = json.dumps([{k: p[k] for k in ("id", "name", "description")} for p in plans], indent=1)
+
+    def features_call(plan: Dict[str, Any]) -> Awaitable[Any]:
+        prompt = _FEATURES_PROMPT.format(request=user_request, outline=outline_text,
+                                         plan_id=plan["id"], plan_name=plan["name"])
+        return _section(f"features:{plan['id']}", text_call(prompt),
+                        lambda t: _parse_json_object(t, "features"), retries, sem, report)
+
+    results = await asyncio.gather(*(features_call(p) for p in plans), return_exceptions=True)
+    seen: set = set()
+    for plan, features in zip(plans, results):
+        if isinstance(features, BaseException):
+            if not isinstance(features, Exception):
+                raise features
+            plan["features"] = []  # kept so the outline survives; features can be regenerated
+            continue
+        plan["features"] = _merge_features(plan["id"], features, seen)
+    report["sections"] = 3 + len(plans)
+    if report["failed"] or report["retries"]:
+        print(f"[plan] sectioned generation: {report['sections']} sections, "
+              f"{report['retries']} retries, failed={report['failed']}")
+    return PlanArtifacts(prd_markdown=prd_md, openapi_yaml=openapi_yaml, implementation_plan=plans), report
+
+
+async def agenerate_plan_in_mode(llm_client: Any, user_request: str, mode: Optional[str] = None) -> PlanArtifacts:
+    """agenerate_plan, or sectioned generation when `mode` (default LLM_PLAN_MODE) asks for it."""
+    if (mode or default_plan_mode()) == "sectioned" and supports_sections(llm_client):
+        artifacts, _ = await agenerate_plan_sectioned(llm_client, user_request)
+        return artifacts
+    return await agenerate_plan(llm_client, user_request)
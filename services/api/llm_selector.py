@@ -1,15 +1,56 @@
 """
 Helper functions for LLM client selection based on project settings.
+
+Resolved clients are cached per (project_id, step) so generation calls skip
+the project/agent lookups. The projects routes call
+`invalidate_project_llm` when a project or its agents change; entries also
+expire after LLM_RESOLVER_TTL_SECONDS (default 300, 0 disables the cache)
+and are rebuilt when the LLM-related environment changes.
 """
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 import os
-from services.api.llm import get_llm_from_env, SupabaseLLM, LLMClient
+import threading
+import time
+from services.api.llm import _provider_from_env, SupabaseLLM, LLMClient
 from fastapi import HTTPException
 
+_ENV_PREFIXES = ("LLM_", "OPENAI_", "ANTHROPIC_", "OLLAMA_", "SUPABASE_")
+
+_resolved: Dict[Tuple[str, str], Tuple[Tuple, float, LLMClient]] = {}
+_resolved_lock = threading.Lock()
+_resolver_counts = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _resolver_ttl() -> float:
+    try:
+        return float(os.getenv("LLM_RESOLVER_TTL_SECONDS", "300"))
+    except ValueError:
+        return 300.0
+
+
+def _env_signature() -> Tuple:
+    return tuple(sorted((k, v) for k, v in os.environ.items() if k.startswith(_ENV_PREFIXES)))
+
+
+def invalidate_project_llm(project_id: Optional[Any] = None) -> int:
+    """Drop cached clients for one project (all projects when None); returns how many."""
+    with _resolved_lock:
+        keys = [k for k in _resolved if project_id is None or k[0] == str(project_id)]
+        for k in keys:
+            del _resolved[k]
+        _resolver_counts["invalidations"] += 1
+    return len(keys)
+
+
+def resolver_stats() -> Dict[str, Any]:
+    with _resolved_lock:
+        return {"entries": len(_resolved), "ttl_seconds": _resolver_ttl(), **_resolver_counts}
+
 
 def get_llm_for_project(project_id: str, step_name: str = "story_generation") -> LLMClient:
     """
-    Get the appropriate LLM client based on project settings.
+    Get the appropriate LLM client based on project settings, from the
+    resolver cache when possible.
     
     Args:
         project_id: The project ID
@@ -21,6 +62,37 @@ def get_llm_for_project(project_id: str, step_name: str = "story_generation") ->
     Raises:
         HTTPException: If no LLM is configured
     """
+    ttl = _resolver_ttl()
+    if ttl <= 0:
+        return _build_llm_for_project(project_id, step_name)
+    key, env = (str(project_id), step_name), _env_signature()
+    now = time.monotonic()
+    with _resolved_lock:
+        entry = _resolved.get(key)
+        if entry is not None and entry[0] == env and entry[1] > now:
+            _resolver_counts["hits"] += 1
+            return entry[2]
+        _resolver_counts["misses"] += 1
+        generation = _resolver_counts["invalidations"]
+    client = _build_llm_for_project(project_id, step_name)
+    with _resolved_lock:
+        # an invalidation during the build may have made this client stale
+        if _resolver_counts["invalidations"] == generation:
+            _resolved[key] = (env, now + ttl, client)
+    return client
+
+
+def _build_llm_for_project(project_id: str, step_name: str) -> LLMClient:
+    from services.api.llm_cache import with_response_cache
+    from services.api.llm_router import with_failover
+    from services.api.llm_similar import with_similarity_cache
+    from services.api.llm_singleflight import with_singleflight
+    from services.api.llm_telemetry import tag_llm_client
+    client = tag_llm_client(with_failover(_resolve_llm_for_project(project_id, step_name)), step=step_name, project_id=project_id)
+    return with_response_cache(with_similarity_cache(with_singleflight(client)))
+
+
+def _resolve_llm_for_project(project_id: str, step_name: str) -> LLMClient:
     from services.api.core.repos.project import ProjectRepository
     from services.api.core.repos.project_agent import ProjectAgentRepository
     from services.api.core.shared import _create_engine, _database_url, _repo_root
@@ -108,8 +180,8 @@ def get_llm_for_project(project_id: str, step_name: str = "story_generation") ->
 
 
 def _get_env_llm_or_raise() -> LLMClient:
-    """Get LLM from environment or raise HTTPException."""
-    llm_client = get_llm_from_env()
+    """Get the (unwrapped) LLM from environment or raise HTTPException."""
+    llm_client = _provider_from_env()
     
     if not llm_client:
         raise HTTPException(
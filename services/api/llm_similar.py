@@ -0,0 +1,225 @@
+# services/api/llm_similar.py
+"""
+Near-duplicate response cache for LLM calls.
+
+The exact cache (llm_cache) misses requests that differ only trivially:
+whitespace, casing, an appended chat line. This cache serves them by
+comparing locally computed MinHash signatures (bottom-k sketches over word
+3-shingles of the normalized request; no embedding service) and answering
+from the most similar earlier response when the estimated Jaccard
+similarity reaches the step's threshold.
+
+Only the variable part of a request is signed (the user request for plans,
+the user prompt for text), and entries are scoped by provider, model,
+temperature and system prompt, so different tasks never match. A one-word
+change can still be decisive, so the cache is opt-in:
+
+    LLM_SIMILAR_CACHE=on                       enable (default off)
+    LLM_SIMILAR_THRESHOLD=0.9                  default threshold
+    LLM_SIMILAR_THRESHOLD_<STEP>=0.97          per SDLC step (e.g. _PRD_GENERATION);
+                                               off or >= 1 disables the step
+    LLM_SIMILAR_MAX_ENTRIES / LLM_SIMILAR_TTL_SECONDS
+
+Every response served from here is kept in an audit log with the
+similarity and both requests (GET /api/admin/llm-similar-cache).
+Cache bypass (llm_cache.bypass_llm_cache / the no-cache headers) applies.
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+from services.api.core.shared import env_num
+from services.api.llm_cache import CachingLLM, cache_bypassed
+from services.api.llm_singleflight import request_fingerprint
+from services.api.llm_telemetry import _leaf_providers
+
+_TOKEN_RE = re.compile(r"\w+")
+SKETCH_SIZE = 256
+
+
+def similar_cache_enabled() -> bool:
+    return os.getenv("LLM_SIMILAR_CACHE", "off").strip().lower() in {"on", "1", "true", "yes"}
+
+
+def step_threshold(step: Optional[str]) -> Optional[float]:
+    """Similarity needed to serve a cached answer for `step`; None = disabled."""
+    raw = os.getenv(f"LLM_SIMILAR_THRESHOLD_{(step or '').upper()}", "").strip().lower() if step else ""
+    if not raw:
+        raw = os.getenv("LLM_SIMILAR_THRESHOLD", "0.9").strip().lower()
+    if raw in {"off", "none", "disabled"}:
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        return None
+    return value if 0 < value < 1 else None
+
+
+def sketch(text: str, k: int = SKETCH_SIZE) -> Tuple[int, ...]:
+    """Bottom-k MinHash sketch: the k smallest 64-bit hashes of the text's word 3-shingles."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    n = 3 if len(tokens) >= 3 else 1
+    shingles = {" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)}
+    hashes = (int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles)
+    return tuple(sorted(heapq.nsmallest(k, hashes)))
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...], k: int = SKETCH_SIZE) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two sketches."""
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    union = heapq.nsmallest(k, set(a) | set(b))
+    both = set(a) & set(b)
+    return sum(1 for h in union if h in both) / len(union)
+
+
+class _Entry:
+    __slots__ = ("scope", "sketch", "value", "request", "step", "created_at")
+
+    def __init__(self, scope: str, sig: Tuple[int, ...], value: str, request: str, step: Optional[str]):
+        self.scope = scope
+        self.sketch = sig
+        self.value = value
+        self.request = request
+        self.step = step
+        self.created_at = time.time()
+
+
+class SimilarityCache:
+    """In-process entries with an inverted index from sketch values to entries."""
+
+    def __init__(self, max_entries: int = 1000, ttl_s: float = 86400, audit_size: int = 200, candidates: int = 5):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._index: Dict[Tuple[str, int], Set[int]] = {}
+        self._next_id = 0
+        self._audit: Deque[Dict[str, Any]] = deque(maxlen=audit_size)
+        self.stats: Dict[str, int] = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for h in entry.sketch:
+            ids = self._index.get((entry.scope, h))
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._index[(entry.scope, h)]
+
+    def lookup(self, scope: str, request: str, step: Optional[str], threshold: float) -> Optional[str]:
+        sig = sketch(request)
+        now = time.time()
+        with self._lock:
+            self.stats["lookups"] += 1
+            votes: Counter = Counter()
+            for h in sig:
+                votes.update(self._index.get((scope, h), ()))
+            best: Optional[Tuple[float, _Entry]] = None
+            for entry_id, _ in votes.most_common(self.candidates):
+                entry = self._entries[entry_id]
+                if self.ttl_s > 0 and now - entry.created_at > self.ttl_s:
+                    continue
+                score = similarity(sig, entry.sketch)
+                if best is None or score > best[0]:
+                    best = (score, entry)
+            if best is None or best[0] < threshold:
+                self.stats["misses"] += 1
+                return None
+            score, entry = best
+            self.stats["hits"] += 1
+            self._audit.append({
+                "served_at": datetime.now(timezone.utc).isoformat(),
+                "step": step,
+                "similarity": round(score, 4),
+                "threshold": threshold,
+                "request": request[:200],
+                "matched_request": entry.request[:200],
+                "entry_age_s": round(now - entry.created_at, 1),
+            })
+            return entry.value
+
+    def store(self, scope: str, request: str, step: Optional[str], value: str) -> None:
+        entry = _Entry(scope, sketch(request), value, request, step)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            for h in entry.sketch:
+                self._index.setdefault((scope, h), set()).add(entry_id)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def snapshot(self, audit_limit: int = 50) -> Dict[str, Any]:
+        with self._lock:
+            s: Dict[str, Any] = dict(self.stats)
+            s["hit_rate"] = round(s["hits"] / s["lookups"], 4) if s["lookups"] else 0.0
+            s["entries"] = len(self._entries)
+            s["audit"] = list(self._audit)[-audit_limit:][::-1] if audit_limit > 0 else []
+        return s
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._audit.clear()
+            for k in self.stats:
+                self.stats[k] = 0
+
+
+similar_cache = SimilarityCache(
+    max_entries=int(env_num("LLM_SIMILAR_MAX_ENTRIES", 1000)),
+    ttl_s=env_num("LLM_SIMILAR_TTL_SECONDS", 86400),
+)
+
+
+# -----------------------------
+# Client wrapper
+# -----------------------------
+class SimilarLLM(CachingLLM):
+    """Near-duplicate cache wrapper; plans are matched on the raw request."""
+
+    def __init__(self, inner: Any, cache: Optional[SimilarityCache] = None):
+        super().__init__(inner)
+        self.cache = cache or similar_cache
+
+    def _step(self) -> Optional[str]:
+        leaves = _leaf_providers(self.inner)
+        return (getattr(leaves[0], "llm_tags", None) or {}).get("step") if leaves else None
+
+    def _lookup(self, system_prompt: str, request: str, **kwargs: Any) -> Tuple[Optional[str], Optional[Tuple[str, str, Optional[str]]]]:
+        """(cached value, store key) — the key is None when the step has the cache disabled."""
+        step = self._step()
+        threshold = step_threshold(step)
+        if threshold is None:
+            return None, None
+        scope = request_fingerprint(self.inner, system_prompt, "", **kwargs)
+        key = (scope, request, step)
+        if cache_bypassed():
+            with self.cache._lock:
+                self.cache.stats["bypassed"] += 1
+            return None, key
+        return self.cache.lookup(scope, request, step, threshold), key
+
+    def _store(self, key: Optional[Tuple[str, str, Optional[str]]], value: str) -> None:
+        if key is not None:
+            self.cache.store(key[0], key[1], key[2], value)
+
+
+def with_similarity_cache(client: Any) -> Any:
+    """Wrap a provider in the near-duplicate cache when LLM_SIMILAR_CACHE=on (never MockLLM)."""
+    from services.api.llm import MockLLM
+    if client is None or isinstance(client, (MockLLM, SimilarLLM)) or not similar_cache_enabled():
+        return client
+    return SimilarLLM(client)
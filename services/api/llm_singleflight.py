@@ -0,0 +1,249 @@
+# services/api/llm_singleflight.py
+"""
+Singleflight for LLM calls: concurrent callers with the same request
+fingerprint share one upstream call (or one upstream stream).
+
+Sync callers coalesce across threads, async callers per event loop. Late
+joiners of a stream get the chunks produced so far, then the live tail.
+Followers receive a deep copy of the leader's result, so nobody mutates a
+shared PlanArtifacts.
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+def request_fingerprint(client: Any, system_prompt: str, user_prompt: str, **kwargs: Any) -> str:
+    """sha256 over (provider, model, temperature, system prompt, user prompt[, kwargs])."""
+    inner = client
+    while hasattr(inner, "inner"):  # look through CachedLLM / CoalescedLLM wrappers
+        inner = inner.inner
+    model = getattr(inner, "model", None) or getattr(inner, "supabase_url", "") or ""
+    if kwargs:
+        user_prompt += "\n" + json.dumps(kwargs, sort_keys=True, default=str)
+    payload = json.dumps(
+        [type(inner).__name__, str(model), getattr(inner, "temperature", None), system_prompt, user_prompt],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _StreamFlight:
+    def __init__(self) -> None:
+        self.chunks: List[str] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.cond = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    def __init__(self, max_tracked_keys: int = 256):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Tuple[asyncio.Task, List[int]]]]" = weakref.WeakKeyDictionary()
+        self._streams: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _StreamFlight]]" = weakref.WeakKeyDictionary()
+        self._max_keys = max_tracked_keys
+        self._per_key: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self.totals = {"leaders": 0, "followers": 0}
+
+    # -- metrics --
+    def _record(self, key: str, role: str) -> None:
+        with self._lock:
+            self.totals[role] += 1
+            entry = self._per_key.setdefault(key, {"leaders": 0, "followers": 0})
+            entry[role] += 1
+            self._per_key.move_to_end(key)
+            while len(self._per_key) > self._max_keys:
+                self._per_key.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "totals": dict(self.totals),
+                # short key prefixes are enough to spot hot prompts
+                "keys": {k[:16]: dict(v) for k, v in self._per_key.items() if v["followers"]},
+            }
+
+    # -- blocking callers --
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._record(key, "leaders" if leader else "followers")
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    # -- async callers --
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        table = self._async.setdefault(loop, {})
+        entry = table.get(key)
+        leader = entry is None or entry[0].done()  # a task cancelled before it ran never pops itself
+        if leader:
+            task = loop.create_task(self._call(table, key, fn))
+            entry = table[key] = (task, [0])
+        task, waiters = entry
+        self._record(key, "leaders" if leader else "followers")
+        waiters[0] += 1
+        try:
+            # shielded, so one caller going away does not cancel the call the
+            # others are waiting on
+            result = await asyncio.shield(task)
+        finally:
+            waiters[0] -= 1
+            if not waiters[0] and not task.done():
+                task.cancel()  # the last waiter left; nobody wants the answer
+        return result if leader else copy.deepcopy(result)
+
+    @staticmethod
+    async def _call(table: Dict[str, Tuple[asyncio.Task, List[int]]], key: str,
+                    fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Runs as its own task, like _drive, so the upstream call is not tied
+        # to the request that happened to start it.
+        try:
+            return await fn()
+        finally:
+            table.pop(key, None)
+
+    async def astream(self, key: str, gen_fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        table = self._streams.setdefault(loop, {})
+        flight = table.get(key)
+        if flight is None:
+            flight = table[key] = _StreamFlight()
+            self._record(key, "leaders")
+            flight.task = loop.create_task(self._drive(table, key, flight, gen_fn))
+        else:
+            self._record(key, "followers")
+        seen = 0
+        while True:
+            async with flight.cond:
+                await flight.cond.wait_for(lambda: seen < len(flight.chunks) or flight.finished)
+                new = flight.chunks[seen:]
+                seen = len(flight.chunks)
+                finished, error = flight.finished, flight.error
+            for chunk in new:
+                yield chunk
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+    @staticmethod
+    async def _drive(table: Dict[str, _StreamFlight], key: str, flight: _StreamFlight,
+                     gen_fn: Callable[[], AsyncIterator[str]]) -> None:
+        # Runs as its own task so the upstream stream survives any single
+        # subscriber disconnecting.
+        try:
+            async for chunk in gen_fn():
+                async with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            table.pop(key, None)
+            async with flight.cond:
+                flight.finished = True
+                flight.cond.notify_all()
+
+
+singleflight = SingleFlight()
+
+
+def singleflight_enabled() -> bool:
+    return os.getenv("LLM_SINGLEFLIGHT", "on").strip().lower() not in {"off", "0", "false", "no"}
+
+
+class CoalescedLLM:
+    """
+    Provider wrapper routing every call through `singleflight`. Optional
+    capabilities (generate_text, streaming) are only exposed when the wrapped
+    client has them, so hasattr() checks keep picking the same code path.
+    """
+
+    _OPTIONAL = {
+        "generate_text": "generate_text",
+        "agenerate_text": "generate_text",
+        "astream_plan": "astream_plan",
+        "astream_text": "astream_text",
+    }
+
+    def __init__(self, inner: Any, flight: Optional[SingleFlight] = None):
+        self.inner = inner
+        self.flight = flight or singleflight
+
+    def generate_plan(self, user_request: str, **kwargs: Any):
+        key = request_fingerprint(self, "plan", user_request, **kwargs)
+        return self.flight.do(key, lambda: self.inner.generate_plan(user_request, **kwargs))
+
+    async def agenerate_plan(self, user_request: str, **kwargs: Any):
+        from services.api.llm import agenerate_plan
+        key = request_fingerprint(self, "plan", user_request, **kwargs)
+        return await self.flight.ado(key, lambda: agenerate_plan(self.inner, user_request, **kwargs))
+
+    def _generate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        key = request_fingerprint(self, system_prompt, user_prompt)
+        return self.flight.do(key, lambda: self.inner.generate_text(user_prompt, system_prompt))
+
+    async def _agenerate_text(self, user_prompt: str, system_prompt: str = "") -> str:
+        from services.api.llm import agenerate_text
+        key = request_fingerprint(self, system_prompt, user_prompt)
+        return await self.flight.ado(key, lambda: agenerate_text(self.inner, user_prompt, system_prompt))
+
+    def _astream_plan(self, user_request: str) -> AsyncIterator[str]:
+        key = "stream:" + request_fingerprint(self, "plan", user_request)
+        return self.flight.astream(key, lambda: self.inner.astream_plan(user_request))
+
+    def _astream_text(self, user_prompt: str, system_prompt: str = "") -> AsyncIterator[str]:
+        key = "stream:" + request_fingerprint(self, system_prompt, user_prompt)
+        return self.flight.astream(key, lambda: self.inner.astream_text(user_prompt, system_prompt))
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "inner":
+            raise AttributeError(name)
+        required = self._OPTIONAL.get(name)
+        if required is not None:
+            if not hasattr(self.inner, required):
+                raise AttributeError(name)
+            return getattr(self, "_" + name)
+        return getattr(self.inner, name)
+
+
+def with_singleflight(client: Any) -> Any:
+    """Wrap a provider in singleflight (LLM_SINGLEFLIGHT=off disables; MockLLM is left alone)."""
+    from services.api.llm import MockLLM
+    if client is None or isinstance(client, (MockLLM, CoalescedLLM)) or not singleflight_enabled():
+        return client
+    return CoalescedLLM(client)
@@ -0,0 +1,414 @@
+# services/api/llm_standin.py
+"""
+Local stand-in for LLM providers, for load and latency testing offline.
+
+Speaks the wire formats the clients in llm.py use:
+
+    POST /v1/chat/completions   OpenAI      (JSON, or SSE chunks + usage + [DONE])
+    POST /v1/messages           Anthropic   (JSON, or message_start/content_block_delta/... SSE)
+    POST /api/generate          Ollama      (JSON, or NDJSON lines ending with done + eval counts)
+    POST /functions/v1/chat     Supabase    (always an OpenAI-style SSE body)
+    GET  /stats                 request/status counters
+
+Responses come from a recordings file (JSONL, first entry whose `match`
+substring occurs in the prompt wins; `response` may be text or JSON) or,
+failing that, a template: MockLLM's plan JSON for plan prompts, a user
+story JSON for story prompts, otherwise a short text reply.
+
+Timing is realistic rather than instant: time to first byte is drawn from
+a latency distribution ("fixed:0.2", "uniform:0.1,0.6",
+"lognormal:<mu>,<sigma>" in seconds), then the text is emitted in
+`chunk_chars`-sized chunks `chunk_delay` seconds apart (non-streamed
+responses wait for the whole generation). `error_rate` answers 500 and
+`throttle_rate` answers 429 with Retry-After.
+
+The Ollama route also models a local server: a model that is not loaded
+(first use, idle past the request's keep_alive or `unload_after` seconds,
+or a different num_ctx) first waits `load_delay` seconds, an empty prompt
+only loads the model, and at most `parallel` requests are served at once
+(0 = unlimited). /stats counts loads when `load_delay` is set. Packed batch prompts (llm_ollama) get one answer per
+request.
+
+Run it and point the providers at it:
+
+    python -m services.api.llm_standin --port 8089 --latency lognormal:-1.2,0.4 --throttle-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 ANTHROPIC_BASE_URL=http://127.0.0.1:8089
+    LLM_ENDPOINT=http://127.0.0.1:8089 SUPABASE_URL=http://127.0.0.1:8089
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """'fixed:s' | 'uniform:lo,hi' | 'lognormal:mu,sigma' -> sampler (seconds)."""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    try:
+        nums = [float(x) for x in args.split(",") if x.strip()]
+        if kind == "fixed" and len(nums) == 1:
+            return lambda rnd: nums[0]
+        if kind == "uniform" and len(nums) == 2:
+            return lambda rnd: rnd.uniform(nums[0], nums[1])
+        if kind == "lognormal" and len(nums) == 2:
+            return lambda rnd: rnd.lognormvariate(nums[0], nums[1])
+    except ValueError:
+        pass
+    raise ValueError(f"bad latency spec {spec!r}; use fixed:s, uniform:lo,hi or lognormal:mu,sigma")
+
+
+def load_recordings(path: str) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in Path(path).read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+@dataclass
+class StandinConfig:
+    latency: str = "fixed:0.2"
+    chunk_chars: int = 16
+    chunk_delay: float = 0.01
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    seed: Optional[int] = None
+    recordings: List[Dict[str, Any]] = field(default_factory=list)
+    load_delay: float = 0.0
+    unload_after: float = 300.0
+    parallel: int = 0
+
+
+def parse_keep_alive(value: Any, default: float) -> float:
+    """Ollama keep_alive (seconds, or a duration like "10m", "1h30m") -> seconds; negative means forever."""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = str(value).strip()
+        try:
+            seconds = float(text)
+        except ValueError:
+            units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+            parts = re.findall(r"(-?\d+(?:\.\d+)?)(ms|h|m|s)", text)
+            if not parts:
+                return default
+            seconds = sum(float(n) * units[u] for n, u in parts)
+    return math.inf if seconds < 0 else seconds
+
+
+def _template_response(system: str, prompt: str) -> str:
+    text = f"{system}\n{prompt}"
+    if "prd_markdown" in text:
+        from services.api.llm import MockLLM
+        return json.dumps(asdict(MockLLM().generate_plan(prompt[:200])))
+    if "user_stories" in text:
+        feature = text.split("FEATURE: ", 1)[1].splitlines()[0] if "FEATURE: " in text else "the feature"
+        return json.dumps({"user_stories": [{
+            "title": f"As a user, I want {feature} so that I can get my work done",
+            "description": "Stand-in story.",
+            "priority": "medium",
+            "acceptance_criteria": ["Works end to end"],
+            "story_points": 3,
+            "tasks": [{"title": "Implement", "description": "Stand-in task."}],
+        }]})
+    return f"Stand-in response to: {prompt[:120]}"
+
+
+class StandinServer:
+    """Threaded HTTP server (port 0 picks a free port, see `url`); use as a context manager or call start()."""
+
+    def __init__(self, config: Optional[StandinConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StandinConfig()
+        self._latency = parse_latency(self.config.latency)
+        self._rnd = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self._loaded: Dict[str, Tuple[float, Any]] = {}  # model -> (unload time, num_ctx)
+        self._slots = threading.BoundedSemaphore(self.config.parallel) if self.config.parallel > 0 else None
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self.url = f"http://{host}:{self._httpd.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    # -- behaviour --------------------------------------------------------
+    def _roll(self) -> Tuple[str, float]:
+        """(outcome, first-byte delay) for one request."""
+        with self._lock:
+            r = self._rnd.random()
+            delay = max(0.0, self._latency(self._rnd))
+        if r < self.config.throttle_rate:
+            return "throttled", min(delay, 0.05)
+        if r < self.config.throttle_rate + self.config.error_rate:
+            return "error", delay
+        return "ok", delay
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def load_model(self, req: Dict[str, Any]) -> float:
+        """Seconds this Ollama request waits for its model to load (0 when already loaded)."""
+        model = req.get("model", "standin")
+        num_ctx = (req.get("options") or {}).get("num_ctx")
+        now = time.monotonic()
+        with self._lock:
+            until, loaded_ctx = self._loaded.get(model, (-math.inf, None))
+            cold = now >= until or loaded_ctx != num_ctx
+            delay = self.config.load_delay if cold else 0.0
+            keep = parse_keep_alive(req.get("keep_alive"), self.config.unload_after)
+            self._loaded[model] = (now + delay + keep, num_ctx)
+        if delay:
+            self._count("loads")
+        return delay
+
+    def respond_text(self, system: str, prompt: str) -> str:
+        from services.api.llm_ollama import pack_answers, unpack_requests
+        packed = unpack_requests(prompt)
+        if packed is not None:
+            return pack_answers([self.respond_text(system, p) for p in packed])
+        for rec in self.config.recordings:
+            if rec.get("match", "") in prompt or rec.get("match", "") in system:
+                response = rec["response"]
+                return response if isinstance(response, str) else json.dumps(response)
+        return _template_response(system, prompt)
+
+    def chunks(self, text: str) -> List[str]:
+        n = max(1, self.config.chunk_chars)
+        return [text[i:i + n] for i in range(0, len(text), n)] or [""]
+
+    # -- lifecycle --------------------------------------------------------
+    def start(self) -> "StandinServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="llm-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StandinServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    # -- HTTP -------------------------------------------------------------
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, status: int, obj: Any, headers: Optional[Dict[str, str]] = None) -> None:
+                self._send(status, json.dumps(obj).encode(), "application/json", headers)
+
+            def _stream(self, content_type: str, lines: Iterator[str]) -> None:
+                # chunked transfer so the client sees each event as it is written
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for line in lines:
+                    data = line.encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self) -> None:
+                if self.path.rstrip("/") == "/stats":
+                    with server._lock:
+                        return self._json(200, dict(server.counts))
+                self._json(404, {"error": "not found"})
+
+            def do_HEAD(self) -> None:  # connection pre-warm
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self) -> None:
+                routes = {
+                    "/v1/chat/completions": self._openai,
+                    "/chat/completions": self._openai,
+                    "/v1/messages": self._anthropic,
+                    "/api/generate": self._ollama,
+                    "/functions/v1/chat": self._supabase,
+                }
+                route = routes.get(self.path.split("?")[0].rstrip("/"))
+                try:
+                    req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0) or 0)) or b"{}")
+                except json.JSONDecodeError:
+                    return self._json(400, {"error": "invalid JSON"})
+                if route is None:
+                    return self._json(404, {"error": "not found"})
+                local = route == self._ollama
+                with server._slots if local and server._slots else nullcontext():
+                    self.load_s = server.load_model(req) if local else 0.0
+                    if local and not req.get("prompt"):
+                        time.sleep(self.load_s)
+                        server._count("load_requests")
+                        return self._json(200, {"model": req.get("model", "standin"), "response": "", "done": True,
+                                                "done_reason": "load", "load_duration": int(self.load_s * 1e9)})
+                    outcome, delay = server._roll()
+                    server._count(outcome)
+                    time.sleep(self.load_s + delay)
+                    if outcome == "throttled":
+                        return self._json(429, {"error": {"type": "rate_limit_error", "message": "stand-in throttle"}},
+                                          {"Retry-After": f"{server.config.retry_after:g}"})
+                    if outcome == "error":
+                        return self._json(500, {"error": {"type": "server_error", "message": "stand-in injected error"}})
+                    route(req)
+
+            def _generate(self, system: str, prompt: str) -> Tuple[str, List[str], int, int]:
+                text = server.respond_text(system, prompt)
+                return text, server.chunks(text), max(1, len(system + prompt) // 4), max(1, len(text) // 4)
+
+            def _paced(self, parts: List[str]) -> Iterator[Tuple[int, str]]:
+                for i, part in enumerate(parts):
+                    if i:
+                        time.sleep(server.config.chunk_delay)
+                    yield i, part
+
+            def _wait_generation(self, parts: List[str]) -> None:
+                time.sleep(server.config.chunk_delay * max(0, len(parts) - 1))
+
+            # OpenAI chat completions
+            def _openai(self, req: Dict[str, Any], supabase: bool = False) -> None:
+                msgs = req.get("messages") or []
+                system = req.get("systemPrompt", "") or "".join(m.get("content", "") for m in msgs if m.get("role") == "system")
+                prompt = "".join(m.get("content", "") for m in msgs if m.get("role") == "user")
+                text, parts, n_in, n_out = self._generate(system, prompt)
+                model = req.get("model", "standin")
+                if not (req.get("stream") or supabase):
+                    self._wait_generation(parts)
+                    return self._json(200, {
+                        "id": "chatcmpl-standin", "object": "chat.completion", "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": n_in, "completion_tokens": n_out, "total_tokens": n_in + n_out},
+                    })
+
+                def events() -> Iterator[str]:
+                    for _, part in self._paced(parts):
+                        yield "data: " + json.dumps({"model": model, "choices": [{"index": 0, "delta": {"content": part}}]}) + "\n\n"
+                    if (req.get("stream_options") or {}).get("include_usage"):
+                        yield "data: " + json.dumps({"model": model, "choices": [],
+                                                     "usage": {"prompt_tokens": n_in, "completion_tokens": n_out}}) + "\n\n"
+                    yield "data: [DONE]\n\n"
+                self._stream("text/event-stream", events())
+
+            def _supabase(self, req: Dict[str, Any]) -> None:
+                self._openai(req, supabase=True)
+
+            # Anthropic messages
+            def _anthropic(self, req: Dict[str, Any]) -> None:
+                prompt = "".join(
+                    m["content"] if isinstance(m.get("content"), str) else
+                    "".join(b.get("text", "") for b in m.get("content") or [])
+                    for m in req.get("messages") or [] if m.get("role") == "user"
+                )
+                text, parts, n_in, n_out = self._generate(req.get("system", "") or "", prompt)
+                model = req.get("model", "standin")
+                if not req.get("stream"):
+                    self._wait_generation(parts)
+                    return self._json(200, {
+                        "id": "msg_standin", "type": "message", "role": "assistant", "model": model,
+                        "content": [{"type": "text", "text": text}], "stop_reason": "end_turn",
+                        "usage": {"input_tokens": n_in, "output_tokens": n_out},
+                    })
+
+                def sse(event: str, data: Dict[str, Any]) -> str:
+                    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+                def events() -> Iterator[str]:
+                    yield sse("message_start", {"type": "message_start", "message": {
+                        "id": "msg_standin", "type": "message", "role": "assistant", "model": model, "content": [],
+                        "usage": {"input_tokens": n_in, "output_tokens": 1}}})
+                    yield sse("content_block_start", {"type": "content_block_start", "index": 0,
+                                                      "content_block": {"type": "text", "text": ""}})
+                    for _, part in self._paced(parts):
+                        yield sse("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                          "delta": {"type": "text_delta", "text": part}})
+                    yield sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+                    yield sse("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                                                "usage": {"output_tokens": n_out}})
+                    yield sse("message_stop", {"type": "message_stop"})
+                self._stream("text/event-stream", events())
+
+            # Ollama generate
+            def _ollama(self, req: Dict[str, Any]) -> None:
+                text, parts, n_in, n_out = self._generate(req.get("system", "") or "", req.get("prompt", ""))
+                model = req.get("model", "standin")
+                final = {"model": model, "response": "", "done": True, "prompt_eval_count": n_in, "eval_count": n_out,
+                         "load_duration": int(self.load_s * 1e9)}
+                if not req.get("stream", True):
+                    self._wait_generation(parts)
+                    return self._json(200, {**final, "response": text})
+
+                def lines() -> Iterator[str]:
+                    for _, part in self._paced(parts):
+                        yield json.dumps({"model": model, "response": part, "done": False}) + "\n"
+                    yield json.dumps(final) + "\n"
+                self._stream("application/x-ndjson", lines())
+
+        return Handler
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Stand-in LLM provider server for offline load/latency tests.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", default="fixed:0.2", help="fixed:s | uniform:lo,hi | lognormal:mu,sigma")
+    ap.add_argument("--chunk-chars", type=int, default=16)
+    ap.add_argument("--chunk-delay", type=float, default=0.01)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--recordings", help="JSONL of {\"match\": ..., \"response\": ...}")
+    ap.add_argument("--load-delay", type=float, default=0.0, help="Ollama model load time when cold (seconds)")
+    ap.add_argument("--unload-after", type=float, default=300.0, help="Ollama default keep-alive (seconds)")
+    ap.add_argument("--parallel", type=int, default=0, help="Ollama requests served at once (0 = unlimited)")
+    args = ap.parse_args(argv)
+
+    config = StandinConfig(
+        latency=args.latency, chunk_chars=args.chunk_chars, chunk_delay=args.chunk_delay,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+        seed=args.seed, recordings=load_recordings(args.recordings) if args.recordings else [],
+        load_delay=args.load_delay, unload_after=args.unload_after, parallel=args.parallel,
+    )
+    server = StandinServer(config, args.host, args.port)
+    print(f"[llm-standin] listening on {server.url}")
+    print(f"  OPENAI_BASE_URL={server.url}/v1 ANTHROPIC_BASE_URL={server.url}")
+    print(f"  LLM_ENDPOINT={server.url} SUPABASE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
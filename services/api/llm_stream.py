@@ -0,0 +1,112 @@
+# services/api/llm_stream.py
+"""
+Server-sent events for streamed LLM generations.
+
+`sse_generation` turns a token iterator into an SSE body:
+
+    event: token   data: {"text": "..."}        (one per provider chunk)
+    event: <name>  data: ...                    (extra events from on_chunk)
+    event: done    data: {...on_complete result...}
+    event: error   data: {"detail": "..."}
+
+Time to first token is recorded per stream kind in `stream_metrics`.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class StreamMetrics:
+    """Time-to-first-token samples (seconds) per stream kind, last N kept."""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._window = window
+        self._ttft: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, kind: str, key: str) -> None:
+        c = self._counts.setdefault(kind, {"started": 0, "completed": 0, "failed": 0})
+        c[key] += 1
+
+    def started(self, kind: str) -> None:
+        with self._lock:
+            self._count(kind, "started")
+
+    def first_token(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self._ttft.setdefault(kind, deque(maxlen=self._window)).append(seconds)
+
+    def finished(self, kind: str, ok: bool) -> None:
+        with self._lock:
+            self._count(kind, "completed" if ok else "failed")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {}
+            for kind, counts in self._counts.items():
+                samples = sorted(self._ttft.get(kind, ()))
+                entry: Dict[str, Any] = dict(counts)
+                if samples:
+                    entry["ttft_avg_s"] = round(sum(samples) / len(samples), 4)
+                    entry["ttft_p50_s"] = round(samples[len(samples) // 2], 4)
+                    entry["ttft_p95_s"] = round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4)
+                out[kind] = entry
+            return out
+
+
+stream_metrics = StreamMetrics()
+
+
+async def sse_generation(
+    kind: str,
+    tokens: AsyncIterator[str],
+    on_complete: Optional[Callable[[str], Dict[str, Any]]] = None,
+    on_chunk: Optional[Callable[[str], Awaitable[List[Tuple[str, Any]]]]] = None,
+) -> AsyncIterator[str]:
+    """
+    Forward tokens as SSE, then run `on_complete(full_text)` on a worker
+    thread (it persists the artifact) and send its result as the `done` event.
+    `on_chunk` may turn each chunk into extra (event, data) pairs.
+    """
+    started = time.perf_counter()
+    stream_metrics.started(kind)
+    parts = []
+    try:
+        async for chunk in tokens:
+            if not parts:
+                stream_metrics.first_token(kind, time.perf_counter() - started)
+            parts.append(chunk)
+            yield sse_event("token", {"text": chunk})
+            if on_chunk is not None:
+                for event, data in await on_chunk(chunk):
+                    yield sse_event(event, data)
+        full = "".join(parts)
+        result = await run_in_threadpool(on_complete, full) if on_complete else {"content": full}
+    except Exception as e:
+        print(f"[llm] {kind} stream failed: {e}")
+        stream_metrics.finished(kind, ok=False)
+        yield sse_event("error", {"detail": str(e)})
+        return
+    stream_metrics.finished(kind, ok=True)
+    yield sse_event("done", result)
+
+
+def sse_response(body: AsyncIterator[str]) -> StreamingResponse:
+    # no-transform/X-Accel-Buffering keep proxies from buffering the stream
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,332 @@
+# services/api/llm_telemetry.py
+"""
+Telemetry for upstream LLM calls.
+
+Every provider request made through llm._post/_apost/_astream is recorded
+with latency (end to end, including limiter queueing), time to first token
+for streams, input/output tokens (from the provider's usage block, else
+estimated at ~4 characters per token), estimated cost, status, and the
+attempt number within a failover/hedge chain. Records are tagged with
+provider, model, SDLC step and project; `tag_llm_client` attaches the last
+two to a client (get_llm_for_project does this).
+
+Records feed in-process aggregates (GET /api/admin/llm-telemetry) and are
+written in batches to the `llm_calls` table by a background flusher
+(LLM_TELEMETRY_FLUSH_SECONDS, default 5; LLM_TELEMETRY=off disables).
+Cost uses per-1k-token prices for a few default models, overridable with
+LLM_PRICES='{"model": [input_per_1k, output_per_1k]}'.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+_ATTEMPT: contextvars.ContextVar[int] = contextvars.ContextVar("llm_call_attempt", default=1)
+
+# USD per 1k tokens (input, output)
+_DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "claude-3-5-sonnet-latest": (0.003, 0.015),
+    "claude-3-5-haiku-latest": (0.0008, 0.004),
+}
+
+
+def telemetry_enabled() -> bool:
+    return os.getenv("LLM_TELEMETRY", "on").strip().lower() not in {"off", "0", "false", "no"}
+
+
+def _prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(_DEFAULT_PRICES)
+    raw = os.getenv("LLM_PRICES", "").strip()
+    if raw:
+        try:
+            prices.update({k: (float(v[0]), float(v[1])) for k, v in json.loads(raw).items()})
+        except (ValueError, TypeError, IndexError, AttributeError) as e:
+            print(f"[llm] ignoring LLM_PRICES: {e}")
+    return prices
+
+
+def estimate_cost(provider: str, model: str, input_tokens: Optional[int], output_tokens: Optional[int]) -> Optional[float]:
+    if provider == "ollama":
+        return 0.0  # local
+    price = _prices().get(model)
+    if price is None or input_tokens is None or output_tokens is None:
+        return None
+    return round(input_tokens / 1000 * price[0] + output_tokens / 1000 * price[1], 6)
+
+
+def usage_from_body(body: Any) -> Tuple[Optional[int], Optional[int]]:
+    """(input, output) tokens from an OpenAI, Anthropic or Ollama response body or stream event."""
+    if not isinstance(body, dict):
+        return None, None
+    if "prompt_eval_count" in body or "eval_count" in body:  # ollama
+        return body.get("prompt_eval_count"), body.get("eval_count")
+    usage = body.get("usage") or (body.get("message") or {}).get("usage")
+    if not isinstance(usage, dict):
+        return None, None
+    return (usage.get("prompt_tokens", usage.get("input_tokens")),
+            usage.get("completion_tokens", usage.get("output_tokens")))
+
+
+def _stream_usage(line: str) -> Tuple[Optional[int], Optional[int]]:
+    # only the few lines that carry usage are worth a second parse
+    if "usage" not in line and "eval_count" not in line:
+        return None, None
+    payload = line[5:].strip() if line.startswith("data:") else line
+    try:
+        return usage_from_body(json.loads(payload))
+    except json.JSONDecodeError:
+        return None, None
+
+
+# -----------------------------
+# Client tags
+# -----------------------------
+def _leaf_providers(client: Any) -> List[Any]:
+    providers = getattr(client, "providers", None)  # RoutedLLM, also through wrappers
+    if isinstance(providers, list):
+        return providers
+    inner = getattr(client, "inner", None)
+    return _leaf_providers(inner) if inner is not None else [client]
+
+
+def tag_llm_client(client: Any, step: Optional[str] = None, project_id: Optional[str] = None) -> Any:
+    """Tag every provider behind `client` so its calls are attributed to step/project."""
+    if client is not None:
+        tags = {"step": step, "project_id": None if project_id is None else str(project_id)}
+        for provider in _leaf_providers(client):
+            try:
+                provider.llm_tags = tags
+            except AttributeError:
+                pass
+    return client
+
+
+@contextmanager
+def call_attempt(n: int) -> Iterator[None]:
+    token = _ATTEMPT.set(n)
+    try:
+        yield
+    finally:
+        _ATTEMPT.reset(token)
+
+
+# -----------------------------
+# Recorder
+# -----------------------------
+class TelemetryRecorder:
+    def __init__(self, buffer_size: int = 10000, window: int = 200):
+        self._lock = threading.Lock()
+        self._pending: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self._window = window
+        self._agg: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._engines: Dict[str, Any] = {}
+        self.dropped = 0
+        self.written = 0
+
+    def record(self, row: Dict[str, Any]) -> None:
+        key = (row["provider"], row.get("model") or "", row.get("step") or "")
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(row)
+            a = self._agg.get(key)
+            if a is None:
+                a = self._agg[key] = {
+                    "calls": 0, "errors": 0, "throttled": 0, "input_tokens": 0, "output_tokens": 0,
+                    "cost_usd": 0.0, "latency_ms": deque(maxlen=self._window), "ttft_ms": deque(maxlen=self._window),
+                }
+            a["calls"] += 1
+            if row["status"] == "throttled":
+                a["throttled"] += 1
+            elif row["status"] == "error":
+                a["errors"] += 1
+            a["input_tokens"] += row.get("input_tokens") or 0
+            a["output_tokens"] += row.get("output_tokens") or 0
+            a["cost_usd"] += row.get("cost_usd") or 0.0
+            a["latency_ms"].append(row["latency_ms"])
+            if row.get("ttft_ms") is not None:
+                a["ttft_ms"].append(row["ttft_ms"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        def pct(samples: List[float], p: float) -> Optional[float]:
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))], 1) if samples else None
+
+        with self._lock:
+            groups = []
+            for (provider, model, step), a in self._agg.items():
+                lat, ttft = sorted(a["latency_ms"]), sorted(a["ttft_ms"])
+                groups.append({
+                    "provider": provider, "model": model, "step": step or None,
+                    "calls": a["calls"], "errors": a["errors"], "throttled": a["throttled"],
+                    "latency_p50_ms": pct(lat, 0.5), "latency_p95_ms": pct(lat, 0.95),
+                    "ttft_p50_ms": pct(ttft, 0.5),
+                    "input_tokens": a["input_tokens"], "output_tokens": a["output_tokens"],
+                    "cost_usd": round(a["cost_usd"], 6),
+                })
+            return {"groups": groups, "pending": len(self._pending), "written": self.written, "dropped": self.dropped}
+
+    def _repo(self):
+        from services.api.core.repos import LLMCallsRepoDB
+        from services.api.core.shared import _create_engine, _database_url, _repo_root
+        url = _database_url(_repo_root())
+        engine = self._engines.get(url)
+        if engine is None:
+            engine = self._engines[url] = _create_engine(url)
+        return LLMCallsRepoDB(engine)
+
+    def flush(self) -> int:
+        """Write pending records to llm_calls; on failure they stay queued."""
+        with self._lock:
+            rows = list(self._pending)
+            self._pending.clear()
+        if not rows:
+            return 0
+        try:
+            self._repo().add_many(rows)
+        except Exception as e:
+            print(f"[llm] telemetry flush failed: {e}")
+            with self._lock:
+                self._pending.extendleft(reversed(rows))
+            return 0
+        with self._lock:
+            self.written += len(rows)
+        return len(rows)
+
+    def _loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def start(self, interval: float) -> None:
+        if interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="llm-telemetry", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._agg.clear()
+            self.dropped = self.written = 0
+
+
+telemetry = TelemetryRecorder()
+
+
+# -----------------------------
+# Per-call observation
+# -----------------------------
+class CallObservation:
+    def __init__(self, provider: Any, mode: str, request_data: Any):
+        self.provider = provider
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.ttft_ms: Optional[float] = None
+        self.input_chars = len(json.dumps(request_data, default=str))
+        self.output_chars = 0
+        self.input_tokens: Optional[int] = None
+        self.output_tokens: Optional[int] = None
+        self.http_status: Optional[int] = None
+
+    def chunk(self, text: str) -> None:
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self.started) * 1000
+        self.output_chars += len(text)
+
+    def stream_line(self, line: str) -> None:
+        i, o = _stream_usage(line)
+        if i is not None:
+            self.input_tokens = i
+        if o is not None:
+            self.output_tokens = o
+
+    def response(self, resp: httpx.Response) -> None:
+        self.http_status = resp.status_code
+        if "json" in resp.headers.get("content-type", ""):
+            try:
+                self.input_tokens, self.output_tokens = usage_from_body(resp.json())
+            except ValueError:
+                pass
+        else:
+            self.output_chars += len(resp.text)
+
+    def _row(self, error: Optional[BaseException]) -> Dict[str, Any]:
+        from services.api.llm_limits import LLMThrottled
+        provider, model = getattr(self.provider, "_limit_key", None) or (type(self.provider).__name__, "")
+        tags = getattr(self.provider, "llm_tags", None) or {}
+        status = "ok"
+        if error is not None:
+            if isinstance(error, httpx.HTTPStatusError):
+                self.http_status = error.response.status_code
+            throttled = isinstance(error, LLMThrottled) or self.http_status == 429
+            # hedge losers and disconnected stream readers were stopped on our side
+            cancelled = isinstance(error, (asyncio.CancelledError, GeneratorExit))
+            status = "throttled" if throttled else "cancelled" if cancelled else "error"
+        estimated = self.input_tokens is None or self.output_tokens is None
+        input_tokens = self.input_tokens if self.input_tokens is not None else max(1, self.input_chars // 4)
+        output_tokens = self.output_tokens if self.output_tokens is not None else self.output_chars // 4
+        return {
+            "provider": provider,
+            "model": model or None,
+            "step": tags.get("step"),
+            "project_id": tags.get("project_id"),
+            "mode": self.mode,
+            "status": status,
+            "http_status": self.http_status,
+            "error": None if error is None else f"{type(error).__name__}: {error}"[:500],
+            "attempt": _ATTEMPT.get(),
+            "latency_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "ttft_ms": None if self.ttft_ms is None else round(self.ttft_ms, 2),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "tokens_estimated": int(estimated),
+            "cost_usd": estimate_cost(provider, model, input_tokens, output_tokens),
+            "created_at": datetime.now(timezone.utc),
+        }
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if telemetry_enabled():
+            telemetry.record(self._row(error))
+
+
+@contextmanager
+def observe_call(provider: Any, mode: str, request_data: Any) -> Iterator[CallObservation]:
+    obs = CallObservation(provider, mode, request_data)
+    try:
+        yield obs
+    except BaseException as e:
+        obs.finish(e)
+        raise
+    obs.finish()
+
+
+@asynccontextmanager
+async def aobserve_call(provider: Any, mode: str, request_data: Any) -> AsyncIterator[CallObservation]:
+    obs = CallObservation(provider, mode, request_data)
+    try:
+        yield obs
+    except BaseException as e:
+        obs.finish(e)
+        raise
+    obs.finish()
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
-from typing import Dict
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime, UTC
 
+from services.api.core.shared import env_num
 from services.api.planner.prompt_templates import render_template
 
 # Optional OpenAPI generator: safe import for environments that don't ship the module.
@@ -62,6 +66,15 @@ security:
   - bearerAuth: []
 """
 
+def _fallback_prd_md(vision: str) -> str:
+    return (
+        "# Product Requirements (PRD)\n\n"
+        f"Vision: {vision}\n\n"
+        "## Stack Summary\n- FastAPI\n- SQLite\n\n"
+        "## Acceptance Gates\n- All routes return expected codes\n"
+    )
+
+
 def prd_agent(vision: str) -> str:
     """
     Deterministic PRD generator (agent specializing in PRD).
@@ -78,12 +91,7 @@ def prd_agent(vision: str) -> str:
             },
         )
     except Exception:
-        md = (
-            "# Product Requirements (PRD)\n\n"
-            f"Vision: {vision}\n\n"
-            "## Stack Summary\n- FastAPI\n- SQLite\n\n"
-            "## Acceptance Gates\n- All routes return expected codes\n"
-        )
+        md = _fallback_prd_md(vision)
 
     # Ensure required sections (idempotent)
     if "## Stack Summary" not in md:
@@ -131,13 +139,16 @@ def openapi_agent(title: str = "Notes Service") -> str:
     return _fallback_openapi_yaml()
 
 
-def adr_agent(vision: str) -> str:
-    """ADR-specialist agent; deterministic ADR."""
+def adr_agent(vision: str, prd_md: Optional[str] = None) -> str:
+    """ADR-specialist agent; deterministic ADR, referencing the PRD when given."""
     now = datetime.now(UTC).strftime("%Y-%m-%d")
+    prd_title = next((ln.lstrip("# ").strip() for ln in (prd_md or "").splitlines() if ln.startswith("# ")), "")
     md = (
         f"# ADR: Initial Architecture — {now}\n\n"
         "## Context\n"
-        f"- Product vision: {vision}\n\n"
+        f"- Product vision: {vision}\n"
+        + (f"- Requirements: {prd_title}\n" if prd_title else "")
+        + "\n"
         "## Decision\n"
         "- Use FastAPI for API.\n"
         "- Use SQLAlchemy with SQLite/Postgres via DATABASE_URL.\n\n"
@@ -150,10 +161,111 @@ def adr_agent(vision: str) -> str:
     return md
 
 
+@dataclass
+class PlanAgent:
+    """
+    One planning agent. `run(vision, deps)` returns the artifact stored under
+    `name`; `deps` holds the outputs of the agents listed in `requires`.
+    `fallback(vision)` stands in for the output when the agent fails or times out.
+    """
+    name: str
+    run: Callable[[str, Dict[str, str]], str]
+    requires: Tuple[str, ...] = ()
+    fallback: Optional[Callable[[str], str]] = None
+    timeout_s: Optional[float] = None
+
+
+PLAN_AGENTS: List[PlanAgent] = [
+    PlanAgent("prd_md", lambda vision, deps: prd_agent(vision), fallback=_fallback_prd_md),
+    PlanAgent("openapi_yaml", lambda vision, deps: openapi_agent("Notes Service"),
+              fallback=lambda vision: _fallback_openapi_yaml()),
+    PlanAgent("adr_md", lambda vision, deps: adr_agent(vision, prd_md=deps.get("prd_md")), requires=("prd_md",)),
+]
+
+
+def run_plan_agents(
+    vision: str,
+    agents: Optional[List[PlanAgent]] = None,
+    max_workers: Optional[int] = None,
+    timeout_s: Optional[float] = None,
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Run agents concurrently, each as soon as the agents it requires are done.
+    Returns (outputs, errors). A failed or timed-out agent contributes its
+    fallback output if it has one; agents requiring an output that is still
+    missing are skipped.
+    """
+    agents = PLAN_AGENTS if agents is None else agents
+    by_name = {a.name: a for a in agents}
+    for a in agents:
+        unknown = [r for r in a.requires if r not in by_name]
+        if unknown:
+            raise ValueError(f"agent {a.name} requires unknown agent(s): {', '.join(unknown)}")
+    default_timeout = timeout_s if timeout_s is not None else env_num("PLANNER_AGENT_TIMEOUT_SECONDS", 120)
+    workers = max_workers or int(env_num("PLANNER_MAX_WORKERS", 4))
+
+    outputs: Dict[str, str] = {}
+    errors: Dict[str, str] = {}
+    pending = list(agents)
+    running: Dict[Future, Tuple[PlanAgent, float]] = {}
+
+    def settle(agent: PlanAgent, error: str) -> None:
+        errors[agent.name] = error
+        print(f"[planner] agent {agent.name} failed: {error}")
+        if agent.fallback is not None:
+            try:
+                outputs[agent.name] = agent.fallback(vision)
+            except Exception as e:
+                errors[agent.name] += f"; fallback failed: {e}"
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(agents) or 1)), thread_name_prefix="plan-agent")
+    try:
+        while pending or running:
+            done_names = set(outputs) | set(errors)
+            for agent in list(pending):
+                if not all(r in done_names for r in agent.requires):
+                    continue
+                pending.remove(agent)
+                missing = [r for r in agent.requires if r not in outputs]
+                if missing:
+                    settle(agent, f"skipped: missing {', '.join(missing)}")
+                    continue
+                deps = {r: outputs[r] for r in agent.requires}
+                timeout = agent.timeout_s if agent.timeout_s is not None else default_timeout
+                running[pool.submit(agent.run, vision, deps)] = (agent, time.monotonic() + timeout)
+            if not running:
+                if pending:  # a dependency cycle: nothing can become ready
+                    for agent in pending:
+                        settle(agent, "skipped: dependency cycle")
+                    pending.clear()
+                continue
+
+            wait_s = max(0.0, min(deadline for _, deadline in running.values()) - time.monotonic())
+            done, _ = wait(list(running), timeout=wait_s, return_when=FIRST_COMPLETED)
+            for fut in done:
+                agent, _ = running.pop(fut)
+                try:
+                    outputs[agent.name] = fut.result()
+                except Exception as e:
+                    settle(agent, f"{type(e).__name__}: {e}")
+            now = time.monotonic()
+            for fut, (agent, deadline) in list(running.items()):
+                if deadline <= now:
+                    # the worker thread can't be interrupted; its late result is dropped
+                    running.pop(fut)
+                    fut.cancel()
+                    settle(agent, "timed out")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return outputs, errors
+
+
 def multi_agent_plan(vision: str) -> Dict[str, str]:
-    """Collaborate across agents and return artifact contents."""
-    return {
-        "prd_md": prd_agent(vision),
-        "openapi_yaml": openapi_agent("Notes Service"),
-        "adr_md": adr_agent(vision),
-    }
+    """
+    Collaborate across agents and return artifact contents. Independent agents
+    run concurrently (PLANNER_MAX_WORKERS, default 4), each bounded by
+    PLANNER_AGENT_TIMEOUT_SECONDS (default 120); an artifact whose agent failed
+    without a fallback is left out.
+    """
+    outputs, _ = run_plan_agents(vision)
+    return outputs
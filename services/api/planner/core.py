@@ -6,11 +6,12 @@ import yaml
 import os
 from typing import Any, Dict, Optional
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 
 # LLM and history imports
-from services.api.llm import get_llm_from_env, PlanArtifacts
-from services.api.core.repos import InteractionHistoryRepoDB
-from services.api.core.shared import _create_engine, _database_url, _repo_root
+from services.api.llm import agenerate_plan, agenerate_text, get_llm_from_env, PlanArtifacts
+from services.api.llm_prompt import HISTORY, REQUEST, STACK, PromptBuilder, prompt_budget
+from services.api.planner.history_context import build_history_context
 
 def _rand_suffix(length: int = 6) -> str:
     """Generate a random suffix for unique identifiers."""
@@ -18,58 +19,67 @@ def _rand_suffix(length: int = 6) -> str:
     import string
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
 
-def _get_chat_history_context(owner: str, limit: int = 10) -> str:
-    """Get recent chat history for context."""
+def _get_chat_history_context(project_id: Optional[str], step: Optional[str] = None, limit: int = 10) -> str:
+    """Recent chat history of a project for one SDLC step (bounded; see planner.history_context)."""
+    if not project_id:
+        return ""  # no project, no history to draw on
     try:
-        engine = _create_engine(_database_url(_repo_root()))
-        repo = InteractionHistoryRepoDB(engine)
-        history = repo.list_by_project(owner) if owner != "public" else repo.list_all()
-        
-        # Get most recent interactions
-        recent_history = sorted(history, key=lambda x: x.get('created_at', ''), reverse=True)[:limit]
-        recent_history.reverse()  # chronological order
-        
-        if not recent_history:
-            return ""
-            
-        context = "\n## Previous Interactions (for context):\n"
-        for interaction in recent_history:
-            role = interaction.get('role', 'unknown')
-            prompt = interaction.get('prompt', '')[:200]  # truncate long prompts
-            response = interaction.get('response', '')[:300]  # truncate long responses
-            context += f"**{role.title()}**: {prompt}\n"
-            if response:
-                context += f"**Response**: {response[:200]}...\n\n"
-        
-        return context
+        return build_history_context(project_id, step=step, limit=limit)
     except Exception as e:
         print(f"Warning: Could not load chat history: {e}")
         return ""
 
-def _generate_prd_with_llm(request_text: str, owner: str, stack: dict, gates: dict, project_id: Optional[str] = None) -> Optional[str]:
-    """Generate PRD using LLM with chat history context and project-specific LLM selection."""
+_PRD_SYSTEM_PROMPT = "You are an expert Product Manager. Write the PRD as markdown only."
+
+def _join_history(*parts: str) -> str:
+    return "\n\n".join(p for p in parts if p)
+
+def _generate_prd_with_llm(request_text: str, owner: str, stack: dict, gates: dict, project_id: Optional[str] = None,
+                           include_history: bool = True) -> Optional[str]:
+    """
+    Generate PRD using LLM with chat history context and project-specific LLM selection.
+    Clients that take free-form prompts get the token-budgeted PRD prompt; others
+    fall back to generate_plan. The project's history for the prd_generation step
+    goes in the prompt's history section unless `include_history` is off.
+    """
     from services.api.llm_selector import get_llm_for_project
     
     # Use project-based LLM selection if project_id provided, otherwise fall back to env-based
     if project_id:
         llm_client = get_llm_for_project(project_id, "prd_generation")
     else:
-        llm_client = get_llm_from_env()
+        llm_client = get_llm_from_env(step="prd_generation")
     
     if not llm_client:
         return None
     
     # Get chat history context
-    chat_context = _get_chat_history_context(owner)
-    
-    # Create a focused PRD generation prompt
-    prompt = f"""You are an expert Product Manager. Generate a comprehensive Product Requirements Document (PRD) for the following request.
+    chat_context = _get_chat_history_context(project_id, "prd_generation") if include_history else ""
 
-USER REQUEST: {request_text}
-
-{chat_context}
+    try:
+        if hasattr(llm_client, 'generate_text'):
+            prompt = _prd_prompt(request_text, chat_context, stack, gates, llm_client, _PRD_SYSTEM_PROMPT)
+            return _prd_from_text(llm_client.generate_text(prompt, _PRD_SYSTEM_PROMPT), request_text, chat_context, stack, gates)
+        if hasattr(llm_client, 'generate_plan'):
+            artifacts = llm_client.generate_plan(_join_history(request_text, chat_context))
+            return _prd_from_artifacts(artifacts, request_text, chat_context, stack, gates)
+        
+        return None
+        
+    except Exception as e:
+        print(f"LLM PRD generation failed: {e}")
+        return None
 
-TECHNICAL STACK:
+def _prd_prompt(request_text: str, chat_context: str, stack: dict, gates: dict,
+                llm_client: Any = None, system_prompt: str = "") -> str:
+    """PRD prompt fitted to the token budget of `llm_client` (see services.api.llm_prompt)."""
+    b = PromptBuilder(prompt_budget(llm_client), system_prompt)
+    b.text("You are an expert Product Manager. Generate a comprehensive Product Requirements Document (PRD) for the following request.\n\nUSER REQUEST: ")
+    b.section("request", request_text, REQUEST)
+    b.text("\n\n")
+    b.section("history", chat_context, HISTORY, keep="tail")  # newest turns are at the end
+    b.text("\n\n")
+    b.section("stack", f"""TECHNICAL STACK:
 - Language: {stack.get('language', 'Python')}
 - Backend Framework: {stack.get('framework', 'FastAPI')}  
 - Frontend: {stack.get('frontend', 'React')}
@@ -78,7 +88,8 @@ TECHNICAL STACK:
 
 QUALITY GATES:
 - Coverage: {gates.get('coverage_gate', 0.8)}
-- Risk Threshold: {gates.get('risk_threshold', 'medium')}
+- Risk Threshold: {gates.get('risk_threshold', 'medium')}""", STACK)
+    b.text("""
 
 Generate a detailed PRD with these sections:
 1. Problem Statement
@@ -90,22 +101,44 @@ Generate a detailed PRD with these sections:
 7. Success Metrics
 8. Risks & Mitigations
 
-Make it comprehensive and professional."""
+Make it comprehensive and professional.""")
+    return b.build("prd_generation").text
+
+def _prd_from_text(text: str, request_text: str, chat_context: str, stack: dict, gates: dict) -> Optional[str]:
+    text = (text or "").strip()
+    if "Generated by MockLLM" in text:
+        return _enhance_mock_prd(request_text, chat_context, stack, gates)
+    return text or None
+
+def _prd_from_artifacts(artifacts: Any, request_text: str, chat_context: str, stack: dict, gates: dict) -> Optional[str]:
+    if hasattr(artifacts, 'prd_markdown') and artifacts.prd_markdown:
+        # If it's the mock LLM, enhance the result
+        if "Generated by MockLLM" in artifacts.prd_markdown:
+            return _enhance_mock_prd(request_text, chat_context, stack, gates)
+        return artifacts.prd_markdown
+    return None
+
+def _prd_llm_and_context(project_id: Optional[str], include_history: bool = True):
+    """Blocking half of PRD generation (DB lookups); run it off the event loop."""
+    from services.api.llm_selector import get_llm_for_project
+    llm_client = get_llm_for_project(project_id, "prd_generation") if project_id else get_llm_from_env(step="prd_generation")
+    if not llm_client:
+        return None, ""
+    return llm_client, _get_chat_history_context(project_id, "prd_generation") if include_history else ""
 
-    try:
-        # For real LLM providers, we'd need to modify them to accept custom prompts
-        # For now, let's use the existing generate_plan but with a cleaner approach
-        if hasattr(llm_client, 'generate_plan'):
-            # Try to use the existing method but intercept the result
-            artifacts = llm_client.generate_plan(request_text)
-            if hasattr(artifacts, 'prd_markdown') and artifacts.prd_markdown:
-                # If it's the mock LLM, enhance the result
-                if "Generated by MockLLM" in artifacts.prd_markdown:
-                    return _enhance_mock_prd(request_text, chat_context, stack, gates)
-                return artifacts.prd_markdown
-        
+async def _agenerate_prd_with_llm(request_text: str, owner: str, stack: dict, gates: dict, project_id: Optional[str] = None,
+                                  include_history: bool = True) -> Optional[str]:
+    """Async variant of _generate_prd_with_llm for the async routes."""
+    llm_client, chat_context = await run_in_threadpool(_prd_llm_and_context, project_id, include_history)
+    if not llm_client:
         return None
-        
+    try:
+        if hasattr(llm_client, 'generate_text'):
+            prompt = _prd_prompt(request_text, chat_context, stack, gates, llm_client, _PRD_SYSTEM_PROMPT)
+            text = await agenerate_text(llm_client, prompt, _PRD_SYSTEM_PROMPT)
+            return _prd_from_text(text, request_text, chat_context, stack, gates)
+        artifacts = await agenerate_plan(llm_client, _join_history(request_text, chat_context))
+        return _prd_from_artifacts(artifacts, request_text, chat_context, stack, gates)
     except Exception as e:
         print(f"LLM PRD generation failed: {e}")
         return None
@@ -341,7 +374,7 @@ def plan_request(request_text: str, repo_root: Path, owner: str = "public") -> d
     tasks_path = plans_dir / f"TASKS-{date}-{slug}.md"
 
     # Generate tasks with LLM - no fallback
-    llm_client = get_llm_from_env()
+    llm_client = get_llm_from_env(step="task_generation")
     if not llm_client:
         raise HTTPException(
             status_code=503,
@@ -0,0 +1,106 @@
+# services/api/planner/history_context.py
+"""
+Chat history context for generation prompts, bounded in rows and tokens.
+
+Only the newest `limit` rows are read (ORDER BY created_at DESC LIMIT n on
+an indexed column). Rows that drop out of that window are folded into a
+rolling extractive summary stored per project/step in
+interaction_history_summaries, together with a watermark, so each build
+reads the summary plus at most `limit + LLM_HISTORY_FOLD_MAX` rows newer
+than the watermark however long the conversation gets.
+
+The rendered context is capped at LLM_HISTORY_TOKEN_BUDGET tokens
+(~4 characters each); the summary gets at most a third of it and the
+newest interactions fill the rest.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.engine import Engine
+
+from services.api.core.repos import InteractionHistoryRepoDB
+from services.api.core.shared import _create_engine, _database_url, _repo_root, env_int
+
+_HEADER = "\n## Previous Interactions (for context):\n"
+_SUMMARY_HEADER = "### Earlier conversation (summary)\n"
+
+
+def _summary_line(row: Dict[str, Any]) -> str:
+    text = (row.get("prompt") or row.get("response") or "").strip()
+    first = text.splitlines()[0] if text else ""
+    if len(first) > 160:
+        first = first[:157] + "..."
+    return f"- {(row.get('role') or 'unknown')}: {first}" if first else ""
+
+
+def fold_summary(summary: str, rows: List[Dict[str, Any]], max_chars: int) -> str:
+    """Append one line per row (oldest first), then drop the oldest lines beyond max_chars."""
+    lines = [ln for ln in summary.splitlines() if ln]
+    lines += [ln for ln in (_summary_line(r) for r in rows) if ln]
+    while lines and sum(len(ln) + 1 for ln in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def _render_row(row: Dict[str, Any]) -> str:
+    role = row.get("role") or "unknown"
+    prompt = (row.get("prompt") or "")[:200]  # truncate long prompts
+    response = (row.get("response") or "")[:200]
+    out = f"**{role.title()}**: {prompt}\n"
+    if response:
+        out += f"**Response**: {response}...\n\n"
+    return out
+
+
+def build_history_context(
+    project_id: Optional[str],
+    step: Optional[str] = None,
+    limit: int = 10,
+    token_budget: Optional[int] = None,
+    engine: Optional[Engine] = None,
+) -> str:
+    """
+    Summary of older interactions plus the newest ones for `project_id` (None =
+    all projects). With a `step` (e.g. "prd_generation") the rolling summary is
+    kept per project and step, over that step's rows plus plain chat turns.
+    """
+    budget = 4 * (token_budget or env_int("LLM_HISTORY_TOKEN_BUDGET", 800))
+    fold_max = env_int("LLM_HISTORY_FOLD_MAX", 50)
+    repo = InteractionHistoryRepoDB(engine or _create_engine(_database_url(_repo_root())))
+    project_key, step_key = project_id or "*", step or ""
+
+    state = repo.get_summary(project_key, step_key)
+    summary = state["summary"] if state else ""
+    watermark = state["covered_until"] if state else None
+    covered = state["covered_rows"] if state else 0
+
+    rows = repo.list_recent(project_id, step=step, limit=limit + fold_max, after=watermark, with_unscoped=True)
+    recent, older = rows[:limit], rows[limit:]
+    if older:
+        # rows newer than the watermark that left the recent window since the last build
+        summary = fold_summary(summary, list(reversed(older)), budget // 3)
+        covered += len(older)
+        try:
+            repo.save_summary(project_key, step_key, summary, older[0]["created_at"], covered)
+        except Exception as e:
+            print(f"Warning: Could not save history summary: {e}")
+
+    if not recent and not summary:
+        return ""
+
+    parts: List[str] = []
+    used = len(_HEADER)
+    if summary:
+        block = _SUMMARY_HEADER + summary + "\n\n"
+        parts.append(block)
+        used += len(block)
+    picked: List[str] = []
+    for row in recent:  # newest first, so the budget keeps the latest turns
+        rendered = _render_row(row)
+        if used + len(rendered) > budget:
+            break
+        picked.append(rendered)
+        used += len(rendered)
+    parts.extend(reversed(picked))  # chronological order
+    return _HEADER + "".join(parts)
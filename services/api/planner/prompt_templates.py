@@ -1,11 +1,64 @@
 # services/api/planner/prompt_templates.py
+"""
+Prompt templates (`templates/*.md`, string.Template syntax).
+
+Templates are read and compiled once per process together with their
+placeholder set, so a render is a dict build plus substitute(). While
+PROMPT_TEMPLATES_RELOAD is on (the default) a render also costs one stat()
+and an edited file is recompiled on the next use; set it to off in
+production to skip the stat().
+"""
+import os
+import threading
 from pathlib import Path
 from string import Template
-from typing import Any, Mapping, List
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
 
 # Directory that contains the .md templates
 _TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
 
+_Sig = Tuple[int, int, int]  # (inode, size, mtime_ns)
+
+
+class CompiledTemplate:
+    """A parsed template and the placeholders it needs."""
+
+    __slots__ = ("name", "template", "placeholders", "sig")
+
+    def __init__(self, name: str, text: str, sig: _Sig):
+        self.name = name
+        self.template = Template(text)
+        self.placeholders: FrozenSet[str] = frozenset(self.template.get_identifiers())
+        self.sig = sig
+
+    def missing(self, data: Mapping[str, Any]) -> List[str]:
+        return sorted(self.placeholders.difference(data))
+
+    def render(self, data: Mapping[str, Any]) -> str:
+        missing = self.missing(data)
+        if missing:
+            # fail fast on every missing key at once (tests rely on missing keys raising)
+            raise KeyError(f"Template {self.name} is missing: {', '.join(missing)}")
+        return self.template.substitute({k: _stringify(data[k]) for k in self.placeholders})
+
+
+_cache: Dict[str, CompiledTemplate] = {}
+_lock = threading.Lock()
+compiles = 0  # number of file reads + compiles (observability/tests)
+
+
+def _reload_enabled() -> bool:
+    return os.getenv("PROMPT_TEMPLATES_RELOAD", "on").strip().lower() not in {"off", "0", "false", "no"}
+
+
+def _file_sig(path: Path) -> Optional[_Sig]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
 def list_templates() -> List[str]:
     """Return available template filenames."""
     if not _TEMPLATES_DIR.exists():
@@ -21,12 +74,38 @@ def _stringify(value: Any) -> str:
         return "\n".join(f"{x}" for x in value)
     return str(value)
 
-def render_template(name: str, data: Mapping[str, Any]) -> str:
-    """Load a template by name and render; raise if a key is missing."""
+def get_template(name: str) -> CompiledTemplate:
+    """Compiled template by name, recompiled when its file changed (while reload is on)."""
+    global compiles
+    cached = _cache.get(name)
+    if cached is not None and not _reload_enabled():
+        return cached
     path = _TEMPLATES_DIR / name
-    if not path.exists():
+    sig = _file_sig(path)
+    if sig is None:
         raise FileNotFoundError(f"Template not found: {path}")
-    text = path.read_text(encoding="utf-8")
-    normalized = {k: _stringify(v) for k, v in dict(data).items()}
-    # IMPORTANT: .substitute (not .safe_substitute) so tests fail on missing keys
-    return Template(text).substitute(**normalized)
+    if cached is not None and cached.sig == sig:
+        return cached
+    with _lock:
+        cached = _cache.get(name)
+        if cached is None or cached.sig != sig:
+            cached = _cache[name] = CompiledTemplate(name, path.read_text(encoding="utf-8"), sig)
+            compiles += 1
+    return cached
+
+def template_placeholders(name: str) -> FrozenSet[str]:
+    """Keys a template needs; lets callers validate their data before rendering."""
+    return get_template(name).placeholders
+
+def render_template(name: str, data: Mapping[str, Any]) -> str:
+    """Render a template by name; raise KeyError if a key is missing."""
+    return get_template(name).render(data)
+
+def render_many(name: str, rows: Iterable[Mapping[str, Any]]) -> List[str]:
+    """Render one template for many data rows (one lookup, one compile)."""
+    tpl = get_template(name)
+    return [tpl.render(row) for row in rows]
+
+def clear_template_cache() -> None:
+    with _lock:
+        _cache.clear()
@@ -124,6 +124,133 @@ def list_users(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list users: {str(e)}")
 
+@router.get("/llm-cache")
+def get_llm_cache_stats(
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """LLM response cache hit/miss counters and hit rate (admin only)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from services.api.llm_cache import cache_stats
+    return cache_stats()
+
+@router.get("/llm-stream")
+def get_llm_stream_stats(
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Streamed generation counts and time-to-first-token per kind (admin only)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from services.api.llm_stream import stream_metrics
+    return stream_metrics.snapshot()
+
+
+@router.get("/llm-singleflight")
+def get_llm_singleflight_stats(
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Leader/follower counts of coalesced in-flight LLM calls (admin only)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from services.api.llm_singleflight import singleflight
+    return singleflight.stats()
+
+
+@router.get("/llm-similar-cache")
+def get_llm_similar_cache(
+    audit_limit: int = Query(50, ge=0, le=200),
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Near-duplicate cache counters and an audit of responses it served (admin only)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from services.api.llm_similar import similar_cache, similar_cache_enabled
+    return {"enabled": similar_cache_enabled(), **similar_cache.snapshot(audit_limit)}
+
+
+@router.get("/llm-prompts")
+def get_llm_prompts(user: Dict[str, Any] = Depends(get_current_user)):
+    """Per-step prompt token counts and truncations, with the last build's section report (admin only)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from services.api.llm_prompt import prompt_stats
+    return prompt_stats()
+
+
+@router.get("/llm-repairs")
+def get_llm_repairs(user: Dict[str, Any] = Depends(get_current_user)):
+    """Plan-answer repair counters and repair rate per provider/model (admin only)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from services.api.llm_repair import repair_stats
+    return repair_stats()
+
+
+@router.get("/llm-ollama")
+def get_llm_ollama(user: Dict[str, Any] = Depends(get_current_user)):
+    """Ollama keep-alive, warm pings, batching counters and limiters (admin only)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from services.api.llm_ollama import ollama_stats
+    return ollama_stats()
+
+
+@router.get("/llm-resolver")
+def get_llm_resolver_stats(
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Hit/miss counts of the per-project LLM client cache (admin only)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from services.api.llm_selector import resolver_stats
+    return resolver_stats()
+
+
+@router.get("/llm-limits")
+def get_llm_limits(
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Concurrency limit, in-flight calls, queue depth and throttling per provider/model (admin only)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from services.api.llm_limits import limiter_stats
+    return limiter_stats()
+
+
+@router.get("/llm-providers")
+def get_llm_provider_health(
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Latency, error rate and circuit state per provider, plus failover/hedge counts (admin only)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from services.api.llm_router import router_stats
+    return router_stats()
+
+
+@router.get("/llm-telemetry")
+def get_llm_telemetry(
+    group_by: str = Query("provider,model,step", description="Comma-separated: provider, model, step, project_id, status, mode"),
+    since_hours: Optional[float] = Query(None, ge=0),
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    LLM call metrics (admin only): live aggregates since process start, and
+    totals from the llm_calls table grouped by `group_by`.
+    """
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    from datetime import timedelta, timezone
+    from services.api.core.repos import LLMCallsRepoDB
+    from services.api.llm_telemetry import telemetry
+    telemetry.flush()
+    since = datetime.now(timezone.utc) - timedelta(hours=since_hours) if since_hours else None
+    repo = LLMCallsRepoDB(_create_engine(_database_url(_repo_root())))
+    return {
+        "live": telemetry.snapshot(),
+        "stored": repo.summary([g.strip() for g in group_by.split(",") if g.strip()], since=since),
+    }
+
 @router.get("/activity")
 def get_recent_activity(
     limit: int = Query(default=50, ge=1, le=200),
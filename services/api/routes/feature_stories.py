@@ -1,15 +1,21 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 from pathlib import Path
+import asyncio
 import json
+import os
 from datetime import datetime
 import httpx
+from starlette.concurrency import run_in_threadpool
 
 from services.api.core.shared import _repo_root, _auth_enabled, _create_engine, _database_url
 from services.api.auth.routes import get_current_user
-from services.api.llm import get_llm_from_env
+from services.api.llm import agenerate_plan, agenerate_text, get_llm_from_env
+from services.api.llm_prompt import ARTIFACTS, REQUEST, PromptBuilder, prompt_budget
+from services.api.llm_stream import sse_event, sse_response
 
 router = APIRouter(prefix="/api/plans", tags=["feature-stories"])
 
@@ -20,7 +26,7 @@ def get_db():
         yield session
 
 @router.post("/{plan_id}/features/{feature_id}/generate-stories")
-def generate_feature_stories(
+async def generate_feature_stories(
     plan_id: str,
     feature_id: str,
     db: Session = Depends(get_db),
@@ -34,36 +40,11 @@ def generate_feature_stories(
         raise HTTPException(status_code=401, detail="authentication required")
     
     try:
-        # Get plan details
-        plan_result = db.execute(text("""
-            SELECT * FROM plans WHERE id = :plan_id LIMIT 1
-        """), {"plan_id": plan_id}).fetchone()
-        
-        if not plan_result:
-            raise HTTPException(status_code=404, detail="Plan not found")
-        
-        plan = dict(plan_result._mapping)
-        
-        # Get feature details
-        feature_result = db.execute(text("""
-            SELECT * FROM features WHERE id = :feature_id AND plan_id = :plan_id LIMIT 1
-        """), {"feature_id": feature_id, "plan_id": plan_id}).fetchone()
-        
-        if not feature_result:
-            raise HTTPException(status_code=404, detail="Feature not found")
-        
-        feature = dict(feature_result._mapping)
-        
-        # Get project details for more context
-        project_result = db.execute(text("""
-            SELECT * FROM projects WHERE id = :project_id LIMIT 1
-        """), {"project_id": plan['project_id']}).fetchone()
-        
-        project = dict(project_result._mapping) if project_result else {}
+        plan, feature, project = await run_in_threadpool(_load_story_context, db, plan_id, feature_id)
         project_id = plan.get('project_id', '')
         
         # Generate user stories using LLM (uses project-specific LLM configuration)
-        user_stories = _generate_stories_with_llm(
+        user_stories = await _agenerate_stories_with_llm(
             feature, 
             plan, 
             project,
@@ -71,26 +52,7 @@ def generate_feature_stories(
             project_id
         )
         
-        # Save user stories to file
-        repo_root = _repo_root()
-        stories_dir = Path(repo_root) / "docs" / "stories"
-        stories_dir.mkdir(parents=True, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        stories_file = stories_dir / f"{timestamp}-{plan['project_id']}-feature-{feature_id}-user-stories.json"
-        
-        stories_data = {
-            "project_id": plan['project_id'],
-            "plan_id": plan_id,
-            "plan_name": plan['name'],
-            "feature_id": feature_id,
-            "feature_name": feature['name'],
-            "generated_at": datetime.now().isoformat(),
-            "user_stories": user_stories
-        }
-        
-        with open(stories_file, 'w', encoding='utf-8') as f:
-            json.dump(stories_data, f, indent=2, ensure_ascii=False)
+        stories_file = _save_stories(plan_id, plan, feature_id, feature, user_stories)
         
         return {
             "success": True,
@@ -108,55 +70,204 @@ def generate_feature_stories(
         raise HTTPException(status_code=500, detail=f"Failed to generate user stories: {str(e)}")
 
 
-def _generate_stories_with_llm(
-    feature: Dict[str, Any],
-    plan: Dict[str, Any],
-    project: Dict[str, Any],
-    feature_id: str,
-    project_id: str
-) -> list:
-    """Generate user stories using LLM - uses project-specific LLM configuration."""
+def _load_story_context(db: Session, plan_id: str, feature_id: str):
+    """Plan, feature and project rows for story generation (404 if missing)."""
+    # Get plan details
+    plan_result = db.execute(text("""
+        SELECT * FROM plans WHERE id = :plan_id LIMIT 1
+    """), {"plan_id": plan_id}).fetchone()
     
-    from services.api.llm_selector import get_llm_for_project
+    if not plan_result:
+        raise HTTPException(status_code=404, detail="Plan not found")
     
-    # Get LLM client based on project settings (Supabase or custom agents)
-    llm_client = get_llm_for_project(project_id, step_name="story_generation")
+    plan = dict(plan_result._mapping)
+    
+    # Get feature details
+    feature_result = db.execute(text("""
+        SELECT * FROM features WHERE id = :feature_id AND plan_id = :plan_id LIMIT 1
+    """), {"feature_id": feature_id, "plan_id": plan_id}).fetchone()
+    
+    if not feature_result:
+        raise HTTPException(status_code=404, detail="Feature not found")
+    
+    feature = dict(feature_result._mapping)
+    
+    # Get project details for more context
+    project_result = db.execute(text("""
+        SELECT * FROM projects WHERE id = :project_id LIMIT 1
+    """), {"project_id": plan['project_id']}).fetchone()
     
-    # Build a comprehensive prompt that the LLM can understand
-    request_text = f"""Generate user stories for this software feature:
+    project = dict(project_result._mapping) if project_result else {}
+    return plan, feature, project
+
+
+def _save_stories(plan_id: str, plan: Dict[str, Any], feature_id: str, feature: Dict[str, Any], user_stories: list) -> Path:
+    # Save user stories to file
+    repo_root = _repo_root()
+    stories_dir = Path(repo_root) / "docs" / "stories"
+    stories_dir.mkdir(parents=True, exist_ok=True)
+    
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    stories_file = stories_dir / f"{timestamp}-{plan['project_id']}-feature-{feature_id}-user-stories.json"
+    
+    stories_data = {
+        "project_id": plan['project_id'],
+        "plan_id": plan_id,
+        "plan_name": plan['name'],
+        "feature_id": feature_id,
+        "feature_name": feature['name'],
+        "generated_at": datetime.now().isoformat(),
+        "user_stories": user_stories
+    }
+    
+    with open(stories_file, 'w', encoding='utf-8') as f:
+        json.dump(stories_data, f, indent=2, ensure_ascii=False)
+    return stories_file
+
+
+_STORY_SYSTEM_PROMPT = """You are a software requirements analyst. Generate user stories as strict JSON following the exact schema provided. 
+
+CRITICAL: Return ONLY valid JSON with no markdown formatting, no code blocks (no ```json), no additional text or explanations. Start directly with { and end with }."""
 
-PROJECT: {project.get('title', 'Unknown Project')}
+
+def _story_prompt(feature: Dict[str, Any], plan: Dict[str, Any], project: Dict[str, Any], llm_client: Any = None) -> str:
+    # Build a comprehensive prompt that the LLM can understand; project/plan context is cut first when over budget
+    b = PromptBuilder(prompt_budget(llm_client), _STORY_SYSTEM_PROMPT)
+    b.text("Generate user stories for this software feature:\n\n")
+    b.section("project", f"""PROJECT: {project.get('title', 'Unknown Project')}
 PROJECT DESCRIPTION: {project.get('description', 'No description')}
 
 PLAN: {plan.get('name', 'Unknown Plan')}
-PLAN DESCRIPTION: {plan.get('description', 'No description')}
-
-FEATURE: {feature['name']}
+PLAN DESCRIPTION: {plan.get('description', 'No description')}""", ARTIFACTS)
+    b.text("\n\n")
+    b.section("request", f"""FEATURE: {feature['name']}
 FEATURE DESCRIPTION: {feature.get('description', 'No description')}
 PRIORITY: {feature.get('priority', 'medium')}
-SIZE ESTIMATE: {feature.get('size_estimate', 5)} days
+SIZE ESTIMATE: {feature.get('size_estimate', 5)} days""", REQUEST)
+    b.text("""
 
 Generate 2-4 user stories in this JSON format:
-{{
+{
   "user_stories": [
-    {{
+    {
       "title": "As a [role], I want to [action] so that [benefit]",
       "description": "Detailed description",
       "priority": "critical|high|medium|low",
       "acceptance_criteria": ["criterion 1", "criterion 2"],
       "story_points": <1-13>,
       "tasks": [
-        {{"title": "Task description", "description": "Details"}},
-        {{"title": "Another task", "description": "Details"}}
+        {"title": "Task description", "description": "Details"},
+        {"title": "Another task", "description": "Details"}
       ]
-    }}
+    }
   ]
-}}
+}
 
 Include both user-facing and technical stories (testing, deployment, documentation).
 Each story should have 3-5 specific, actionable tasks.
 
-IMPORTANT: Return ONLY valid JSON with no markdown formatting, no code blocks, no additional text."""
+IMPORTANT: Return ONLY valid JSON with no markdown formatting, no code blocks, no additional text.""")
+    return b.build("story_generation").text
+
+
+def _parse_stories(content: str, feature: Dict[str, Any], feature_id: str) -> list:
+    # Extract JSON from markdown code blocks if present
+    if "```json" in content:
+        start = content.find("```json") + 7
+        end = content.find("```", start)
+        content = content[start:end].strip()
+    elif "```" in content:
+        start = content.find("```") + 3
+        end = content.find("```", start)
+        content = content[start:end].strip()
+    
+    # Try to parse as JSON
+    try:
+        response_data = json.loads(content)
+    except json.JSONDecodeError as json_err:
+        # If the content is not JSON, try to find JSON-like structure
+        print(f"[WARN] LLM returned non-JSON content: {content[:200]}...")
+        # Look for { "user_stories": pattern
+        json_start = content.find('{"user_stories"')
+        if json_start == -1:
+            json_start = content.find("{'user_stories'")
+        if json_start >= 0:
+            # Find matching closing brace
+            brace_count = 0
+            json_end = json_start
+            for i in range(json_start, len(content)):
+                if content[i] == '{':
+                    brace_count += 1
+                elif content[i] == '}':
+                    brace_count -= 1
+                    if brace_count == 0:
+                        json_end = i + 1
+                        break
+            content = content[json_start:json_end]
+            try:
+                response_data = json.loads(content)
+            except json.JSONDecodeError:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"LLM returned invalid JSON format. Please try again or check LLM configuration."
+                )
+        else:
+            raise HTTPException(
+                status_code=500,
+                detail=f"LLM did not return valid JSON structure. Please try again or check LLM configuration."
+            )
+    
+    if not response_data or "user_stories" not in response_data:
+        raise HTTPException(
+            status_code=500,
+            detail="LLM failed to generate valid user stories. Please try again."
+        )
+    
+    # Process and enrich the LLM response
+    user_stories = []
+    for idx, story in enumerate(response_data["user_stories"], 1):
+        story_id = f"story-{feature_id}-{idx}"
+        
+        # Add tasks with proper IDs
+        tasks = []
+        for task_idx, task in enumerate(story.get("tasks", []), 1):
+            tasks.append({
+                "id": f"task-{feature_id}-{idx}-{task_idx}",
+                "title": task.get("title", "Implement requirement"),
+                "description": task.get("description", ""),
+                "status": "pending"
+            })
+        
+        user_stories.append({
+            "id": story_id,
+            "title": story.get("title", f"User story {idx}"),
+            "description": story.get("description", ""),
+            "feature_id": feature_id,
+            "feature_name": feature['name'],
+            "priority": story.get("priority", "medium"),
+            "acceptance_criteria": story.get("acceptance_criteria", []),
+            "story_points": story.get("story_points", 3),
+            "status": "ready",
+            "tasks": tasks
+        })
+    
+    return user_stories
+
+
+def _generate_stories_with_llm(
+    feature: Dict[str, Any],
+    plan: Dict[str, Any],
+    project: Dict[str, Any],
+    feature_id: str,
+    project_id: str
+) -> list:
+    """Generate user stories using LLM - uses project-specific LLM configuration."""
+    
+    from services.api.llm_selector import get_llm_for_project
+    
+    # Get LLM client based on project settings (Supabase or custom agents)
+    llm_client = get_llm_for_project(project_id, step_name="story_generation")
+    request_text = _story_prompt(feature, plan, project, llm_client)
 
     try:
         # Use the LLM client's appropriate method
@@ -165,96 +276,13 @@ IMPORTANT: Return ONLY valid JSON with no markdown formatting, no code blocks, n
         # Use generate_text for SupabaseLLM, generate_plan for others
         if hasattr(llm_client, 'generate_text'):
             # SupabaseLLM - use generate_text with custom system prompt emphasizing JSON
-            system_prompt = """You are a software requirements analyst. Generate user stories as strict JSON following the exact schema provided. 
-
-CRITICAL: Return ONLY valid JSON with no markdown formatting, no code blocks (no ```json), no additional text or explanations. Start directly with { and end with }."""
-            content = llm_client.generate_text(request_text, system_prompt)
+            content = llm_client.generate_text(request_text, _STORY_SYSTEM_PROMPT)
         else:
             # Other LLM clients - use generate_plan
             artifacts = llm_client.generate_plan(request_text)
             content = artifacts.prd_markdown if hasattr(artifacts, 'prd_markdown') else str(artifacts)
         
-        # Extract JSON from markdown code blocks if present
-        if "```json" in content:
-            start = content.find("```json") + 7
-            end = content.find("```", start)
-            content = content[start:end].strip()
-        elif "```" in content:
-            start = content.find("```") + 3
-            end = content.find("```", start)
-            content = content[start:end].strip()
-        
-        # Try to parse as JSON
-        try:
-            response_data = json.loads(content)
-        except json.JSONDecodeError as json_err:
-            # If the content is not JSON, try to find JSON-like structure
-            print(f"[WARN] LLM returned non-JSON content: {content[:200]}...")
-            # Look for { "user_stories": pattern
-            json_start = content.find('{"user_stories"')
-            if json_start == -1:
-                json_start = content.find("{'user_stories'")
-            if json_start >= 0:
-                # Find matching closing brace
-                brace_count = 0
-                json_end = json_start
-                for i in range(json_start, len(content)):
-                    if content[i] == '{':
-                        brace_count += 1
-                    elif content[i] == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            json_end = i + 1
-                            break
-                content = content[json_start:json_end]
-                try:
-                    response_data = json.loads(content)
-                except json.JSONDecodeError:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"LLM returned invalid JSON format. Please try again or check LLM configuration."
-                    )
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"LLM did not return valid JSON structure. Please try again or check LLM configuration."
-                )
-        
-        if not response_data or "user_stories" not in response_data:
-            raise HTTPException(
-                status_code=500,
-                detail="LLM failed to generate valid user stories. Please try again."
-            )
-        
-        # Process and enrich the LLM response
-        user_stories = []
-        for idx, story in enumerate(response_data["user_stories"], 1):
-            story_id = f"story-{feature_id}-{idx}"
-            
-            # Add tasks with proper IDs
-            tasks = []
-            for task_idx, task in enumerate(story.get("tasks", []), 1):
-                tasks.append({
-                    "id": f"task-{feature_id}-{idx}-{task_idx}",
-                    "title": task.get("title", "Implement requirement"),
-                    "description": task.get("description", ""),
-                    "status": "pending"
-                })
-            
-            user_stories.append({
-                "id": story_id,
-                "title": story.get("title", f"User story {idx}"),
-                "description": story.get("description", ""),
-                "feature_id": feature_id,
-                "feature_name": feature['name'],
-                "priority": story.get("priority", "medium"),
-                "acceptance_criteria": story.get("acceptance_criteria", []),
-                "story_points": story.get("story_points", 3),
-                "status": "ready",
-                "tasks": tasks
-            })
-        
-        return user_stories
+        return _parse_stories(content, feature, feature_id)
         
     except HTTPException:
         raise
@@ -266,3 +294,181 @@ CRITICAL: Return ONLY valid JSON with no markdown formatting, no code blocks (no
             status_code=500,
             detail=f"Failed to generate user stories with LLM: {str(e)}"
         )
+
+
+async def _agenerate_stories_with_llm(
+    feature: Dict[str, Any],
+    plan: Dict[str, Any],
+    project: Dict[str, Any],
+    feature_id: str,
+    project_id: str,
+    llm_client: Any = None
+) -> list:
+    """Async variant of _generate_stories_with_llm; the client lookup runs on a worker thread."""
+    from services.api.llm_selector import get_llm_for_project
+
+    if llm_client is None:
+        llm_client = await run_in_threadpool(get_llm_for_project, project_id, "story_generation")
+    request_text = _story_prompt(feature, plan, project, llm_client)
+
+    try:
+        print(f"[DEBUG] Generating stories with LLM client: {type(llm_client).__name__}")
+        if hasattr(llm_client, 'generate_text'):
+            content = await agenerate_text(llm_client, request_text, _STORY_SYSTEM_PROMPT)
+        else:
+            artifacts = await agenerate_plan(llm_client, request_text)
+            content = artifacts.prd_markdown if hasattr(artifacts, 'prd_markdown') else str(artifacts)
+        return _parse_stories(content, feature, feature_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[ERROR] LLM story generation failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate user stories with LLM: {str(e)}"
+        )
+
+
+# -----------------------------
+# Plan-level batch generation
+# -----------------------------
+class BatchStoriesRequest(BaseModel):
+    feature_ids: Optional[List[str]] = None  # default: every feature of the plan
+
+
+def _load_batch_context(db: Session, plan_id: str, feature_ids: Optional[List[str]]):
+    """Plan and project rows plus the selected features, in priority order, in one pass."""
+    plan_result = db.execute(text("SELECT * FROM plans WHERE id = :plan_id LIMIT 1"), {"plan_id": plan_id}).fetchone()
+    if not plan_result:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    plan = dict(plan_result._mapping)
+
+    query = "SELECT * FROM features WHERE plan_id = :plan_id"
+    params: Dict[str, Any] = {"plan_id": plan_id}
+    if feature_ids:
+        query += " AND id IN :feature_ids"
+        params["feature_ids"] = [str(f) for f in feature_ids]
+    stmt = text(query + " ORDER BY priority_order ASC, created_at ASC")
+    if feature_ids:
+        stmt = stmt.bindparams(bindparam("feature_ids", expanding=True))
+    features = [dict(r._mapping) for r in db.execute(stmt, params).fetchall()]
+    if feature_ids:
+        missing = set(map(str, feature_ids)) - {str(f["id"]) for f in features}
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Feature(s) not found: {', '.join(sorted(missing))}")
+    if not features:
+        raise HTTPException(status_code=404, detail="Plan has no features")
+
+    project_result = db.execute(text("SELECT * FROM projects WHERE id = :project_id LIMIT 1"),
+                                {"project_id": plan['project_id']}).fetchone()
+    project = dict(project_result._mapping) if project_result else {}
+    return plan, features, project
+
+
+def _save_batch_stories(plan_id: str, plan: Dict[str, Any], results: List[Dict[str, Any]]) -> Path:
+    """All features' stories in one file, written atomically (readers never see a partial batch)."""
+    stories_dir = Path(_repo_root()) / "docs" / "stories"
+    stories_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    stories_file = stories_dir / f"{timestamp}-{plan['project_id']}-plan-{plan_id}-user-stories.json"
+    stories_data = {
+        "project_id": plan['project_id'],
+        "plan_id": plan_id,
+        "plan_name": plan['name'],
+        "generated_at": datetime.now().isoformat(),
+        "features": [
+            {"feature_id": r["feature_id"], "feature_name": r["feature_name"], "story_count": len(r["stories"])}
+            for r in results
+        ],
+        "user_stories": [story for r in results for story in r["stories"]],
+    }
+    tmp = stories_file.with_name(stories_file.name + ".tmp")
+    tmp.write_text(json.dumps(stories_data, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, stories_file)
+    return stories_file
+
+
+@router.post("/{plan_id}/generate-stories")
+async def generate_plan_stories(
+    plan_id: str,
+    body: Optional[BatchStoriesRequest] = None,
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Generate user stories for all (or the selected) features of a plan.
+
+    Plan, project and LLM client are loaded once and features run with
+    bounded parallelism (STORY_BATCH_CONCURRENCY, default 4). Progress
+    streams as SSE: a `feature` event as each feature finishes (ok or
+    error), then `done` once every story is saved in a single file.
+    """
+    if _auth_enabled() and user.get("id") == "public":
+        raise HTTPException(status_code=401, detail="authentication required")
+
+    from services.api.llm_selector import get_llm_for_project
+
+    plan, features, project = await run_in_threadpool(
+        _load_batch_context, db, plan_id, body.feature_ids if body else None
+    )
+    project_id = plan.get('project_id', '')
+    llm_client = await run_in_threadpool(get_llm_for_project, project_id, "story_generation")
+    try:
+        limit = max(1, int(os.getenv("STORY_BATCH_CONCURRENCY", "4")))
+    except ValueError:
+        limit = 4
+    sem = asyncio.Semaphore(limit)
+
+    async def one(feature: Dict[str, Any]) -> Dict[str, Any]:
+        feature_id = str(feature["id"])
+        result: Dict[str, Any] = {"feature_id": feature_id, "feature_name": feature["name"], "stories": []}
+        async with sem:
+            try:
+                result["stories"] = await _agenerate_stories_with_llm(
+                    feature, plan, project, feature_id, project_id, llm_client=llm_client
+                )
+            except HTTPException as e:
+                result["error"] = e.detail
+            except Exception as e:
+                result["error"] = str(e)
+        return result
+
+    async def events():
+        tasks = [asyncio.create_task(one(f)) for f in features]
+        results: List[Dict[str, Any]] = []
+        try:
+            for fut in asyncio.as_completed(tasks):
+                r = await fut
+                results.append(r)
+                yield sse_event("feature", {
+                    "feature_id": r["feature_id"],
+                    "feature_name": r["feature_name"],
+                    "status": "error" if "error" in r else "ok",
+                    "story_count": len(r["stories"]),
+                    **({"detail": r["error"]} if "error" in r else {}),
+                    "completed": len(results),
+                    "total": len(tasks),
+                })
+        finally:
+            for t in tasks:
+                t.cancel()  # client went away: stop the remaining generations
+
+        order = {str(f["id"]): i for i, f in enumerate(features)}
+        ok = sorted((r for r in results if "error" not in r), key=lambda r: order[r["feature_id"]])
+        stories_file = None
+        if ok:
+            try:
+                stories_file = await run_in_threadpool(_save_batch_stories, plan_id, plan, ok)
+            except Exception as e:
+                yield sse_event("error", {"detail": f"Failed to save user stories: {e}"})
+                return
+        yield sse_event("done", {
+            "success": bool(ok),
+            "message": f"Generated {sum(len(r['stories']) for r in ok)} user stories for {len(ok)} of {len(features)} features",
+            "stories_file": str(stories_file) if stories_file else None,
+            "failed": [{"feature_id": r["feature_id"], "detail": r["error"]} for r in results if "error" in r],
+        })
+
+    return sse_response(events())
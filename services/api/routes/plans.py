@@ -461,86 +461,67 @@ def get_next_task(project_id: str, db: Session = Depends(get_db), user: dict = D
 
     return {"message": "No pending tasks found"}
 
-# Bulk save plans and features to files
-@router.post("/save-all")
-def save_all_plans(payload: dict, db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
-    """Save all plans and features to both database and markdown files."""
-    from pathlib import Path
-    import json
+def _save_plan(db: Session, plan_data: dict, plan_idx: int, project_id: str, owner: str) -> tuple:
+    """
+    Upsert one plan and its features (DB rows + markdown files).
+    Returns (plan_id, saved file paths, feature count).
+    """
     from datetime import datetime
-    
-    if _auth_enabled() and user.get("id") == "public":
-        raise HTTPException(status_code=401, detail="authentication required")
-    
-    project_id = payload.get("project_id")
-    project_name = payload.get("project_name", project_id)
-    plans = payload.get("plans", [])
-    
-    if not project_id or not plans:
-        raise HTTPException(status_code=400, detail="project_id and plans are required")
-    
-    # Get the docs root directory
+
     docs_root = _repo_root() / "docs"
     plans_dir = docs_root / "plans"
     features_dir = docs_root / "features"
     plans_dir.mkdir(parents=True, exist_ok=True)
     features_dir.mkdir(parents=True, exist_ok=True)
-    
-    saved_files = []
-    saved_plan_count = 0
     saved_feature_count = 0
-    db_plan_ids = []
+
+    # Extract plan data
+    # Generate unique ID if not provided or if it's a temporary frontend ID (e.g., "plan-1", "plan-2")
+    plan_id = plan_data.get("id", "")
+    if not plan_id or plan_id.startswith("plan-"):
+        plan_id = str(uuid.uuid4())
     
-    try:
-        for plan_idx, plan_data in enumerate(plans, 1):
-            # Extract plan data
-            # Generate unique ID if not provided or if it's a temporary frontend ID (e.g., "plan-1", "plan-2")
-            plan_id = plan_data.get("id", "")
-            if not plan_id or plan_id.startswith("plan-"):
-                plan_id = str(uuid.uuid4())
-            
-            plan_name = plan_data.get("name", f"Plan {plan_idx}")
-            plan_desc = plan_data.get("description", "")
-            plan_priority = plan_data.get("priority", "medium")
-            plan_order = plan_data.get("priority_order", plan_idx)
-            plan_size = plan_data.get("size_estimate", 0)
-            plan_features = plan_data.get("features", [])
-            
-            print(f"[SAVE PLANS] Saving plan: id={plan_id}, name={plan_name}, priority={plan_priority}, priority_order={plan_order}")
-            
-            # Save plan to database
-            db.execute(text("""
-                INSERT OR REPLACE INTO plans 
-                (id, project_id, request, owner, artifacts, name, description, priority, priority_order, 
-                 size_estimate, status, created_at, updated_at)
-                VALUES (:id, :project_id, :request, :owner, :artifacts, :name, :description, :priority, 
-                        :priority_order, :size_estimate, :status,
-                        COALESCE((SELECT created_at FROM plans WHERE id = :id), datetime('now')),
-                        datetime('now'))
-            """), {
-                "id": plan_id,
-                "project_id": project_id,
-                "request": plan_name,  # Using plan name as the request
-                "owner": user.get("id", "system"),
-                "artifacts": "{}",  # Empty JSON object
-                "name": plan_name,
-                "description": plan_desc,
-                "priority": plan_priority,
-                "priority_order": plan_order,
-                "size_estimate": plan_size,
-                "status": "pending"
-            })
-            db.commit()
-            db_plan_ids.append(plan_id)
-            
-            # Sanitize filename
-            safe_name = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in plan_name)
-            safe_name = safe_name.replace(' ', '-').lower()
-            plan_filename = f"{plan_order:02d}-{safe_name}.md"
-            plan_file = plans_dir / plan_filename
-            
-            # Create plan markdown content
-            plan_content = f"""# {plan_name}
+    plan_name = plan_data.get("name", f"Plan {plan_idx}")
+    plan_desc = plan_data.get("description", "")
+    plan_priority = plan_data.get("priority", "medium")
+    plan_order = plan_data.get("priority_order", plan_idx)
+    plan_size = plan_data.get("size_estimate", 0)
+    plan_features = plan_data.get("features", [])
+    
+    print(f"[SAVE PLANS] Saving plan: id={plan_id}, name={plan_name}, priority={plan_priority}, priority_order={plan_order}")
+    
+    # Save plan to database
+    db.execute(text("""
+        INSERT OR REPLACE INTO plans 
+        (id, project_id, request, owner, artifacts, name, description, priority, priority_order, 
+         size_estimate, status, created_at, updated_at)
+        VALUES (:id, :project_id, :request, :owner, :artifacts, :name, :description, :priority, 
+                :priority_order, :size_estimate, :status,
+                COALESCE((SELECT created_at FROM plans WHERE id = :id), datetime('now')),
+                datetime('now'))
+    """), {
+        "id": plan_id,
+        "project_id": project_id,
+        "request": plan_name,  # Using plan name as the request
+        "owner": owner,
+        "artifacts": "{}",  # Empty JSON object
+        "name": plan_name,
+        "description": plan_desc,
+        "priority": plan_priority,
+        "priority_order": plan_order,
+        "size_estimate": plan_size,
+        "status": "pending"
+    })
+    db.commit()
+    
+    # Sanitize filename
+    safe_name = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in plan_name)
+    safe_name = safe_name.replace(' ', '-').lower()
+    plan_filename = f"{plan_order:02d}-{safe_name}.md"
+    plan_file = plans_dir / plan_filename
+    
+    # Create plan markdown content
+    plan_content = f"""# {plan_name}
 
 **Priority:** {plan_priority.upper()}  
 **Order:** {plan_order}  
@@ -554,54 +535,54 @@ def save_all_plans(payload: dict, db: Session = Depends(get_db), user: dict = De
 ## Features
 
 """
+    
+    # Save features as separate files and reference them in plan
+    feature_files = []
+    for feat_idx, feature in enumerate(plan_features, 1):
+        # Generate unique ID if not provided or if it's a temporary frontend ID (e.g., "feature-1-1")
+        feat_id = feature.get("id", "")
+        if not feat_id or feat_id.startswith("feature-"):
+            feat_id = str(uuid.uuid4())
             
-            # Save features as separate files and reference them in plan
-            feature_files = []
-            for feat_idx, feature in enumerate(plan_features, 1):
-                # Generate unique ID if not provided or if it's a temporary frontend ID (e.g., "feature-1-1")
-                feat_id = feature.get("id", "")
-                if not feat_id or feat_id.startswith("feature-"):
-                    feat_id = str(uuid.uuid4())
-                    
-                feat_name = feature.get("name", f"Feature {feat_idx}")
-                feat_desc = feature.get("description", "")
-                feat_priority = feature.get("priority", "medium")
-                feat_order = feature.get("priority_order", feat_idx)
-                feat_size = feature.get("size_estimate", 0)
-                feat_criteria = feature.get("acceptance_criteria", [])
-                
-                print(f"[SAVE PLANS] Saving feature: id={feat_id}, name={feat_name}, priority={feat_priority}, priority_order={feat_order}")
-                
-                # Save feature to database
-                db.execute(text("""
-                    INSERT OR REPLACE INTO features 
-                    (id, plan_id, name, description, priority, priority_order, size_estimate, status,
-                     created_at, updated_at)
-                    VALUES (:id, :plan_id, :name, :description, :priority, :priority_order, :size_estimate,
-                            :status,
-                            COALESCE((SELECT created_at FROM features WHERE id = :id), datetime('now')),
-                            datetime('now'))
-                """), {
-                    "id": feat_id,
-                    "plan_id": plan_id,
-                    "name": feat_name,
-                    "description": feat_desc,
-                    "priority": feat_priority,
-                    "priority_order": feat_order,
-                    "size_estimate": feat_size,
-                    "status": "pending"
-                })
-                db.commit()
-                saved_feature_count += 1
-                
-                # Create separate feature file
-                safe_feat_name = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in feat_name)
-                safe_feat_name = safe_feat_name.replace(' ', '-').lower()
-                feature_filename = f"{plan_order:02d}-{feat_order:02d}-{safe_feat_name}.md"
-                feature_file = features_dir / feature_filename
-                
-                # Create feature markdown content
-                feature_content = f"""# {feat_name}
+        feat_name = feature.get("name", f"Feature {feat_idx}")
+        feat_desc = feature.get("description", "")
+        feat_priority = feature.get("priority", "medium")
+        feat_order = feature.get("priority_order", feat_idx)
+        feat_size = feature.get("size_estimate", 0)
+        feat_criteria = feature.get("acceptance_criteria", [])
+        
+        print(f"[SAVE PLANS] Saving feature: id={feat_id}, name={feat_name}, priority={feat_priority}, priority_order={feat_order}")
+        
+        # Save feature to database
+        db.execute(text("""
+            INSERT OR REPLACE INTO features 
+            (id, plan_id, name, description, priority, priority_order, size_estimate, status,
+             created_at, updated_at)
+            VALUES (:id, :plan_id, :name, :description, :priority, :priority_order, :size_estimate,
+                    :status,
+                    COALESCE((SELECT created_at FROM features WHERE id = :id), datetime('now')),
+                    datetime('now'))
+        """), {
+            "id": feat_id,
+            "plan_id": plan_id,
+            "name": feat_name,
+            "description": feat_desc,
+            "priority": feat_priority,
+            "priority_order": feat_order,
+            "size_estimate": feat_size,
+            "status": "pending"
+        })
+        db.commit()
+        saved_feature_count += 1
+        
+        # Create separate feature file
+        safe_feat_name = "".join(c if c.isalnum() or c in (' ', '-', '_') else '_' for c in feat_name)
+        safe_feat_name = safe_feat_name.replace(' ', '-').lower()
+        feature_filename = f"{plan_order:02d}-{feat_order:02d}-{safe_feat_name}.md"
+        feature_file = features_dir / feature_filename
+        
+        # Create feature markdown content
+        feature_content = f"""# {feat_name}
 
 **Plan:** {plan_name}  
 **Priority:** {feat_priority.upper()}  
@@ -614,29 +595,60 @@ def save_all_plans(payload: dict, db: Session = Depends(get_db), user: dict = De
 {feat_desc}
 
 """
-                if feat_criteria:
-                    feature_content += "**Acceptance Criteria:**\n\n"
-                    for criterion in feat_criteria:
-                        feature_content += f"- {criterion}\n"
-                    feature_content += "\n"
-                
-                # Write feature file
-                feature_file.write_text(feature_content, encoding='utf-8')
-                feature_files.append(str(feature_file.relative_to(_repo_root())))
-                
-                # Add reference to plan file
-                plan_content += f"""### {feat_order}. {feat_name}
+        if feat_criteria:
+            feature_content += "**Acceptance Criteria:**\n\n"
+            for criterion in feat_criteria:
+                feature_content += f"- {criterion}\n"
+            feature_content += "\n"
+        
+        # Write feature file
+        feature_file.write_text(feature_content, encoding='utf-8')
+        feature_files.append(str(feature_file.relative_to(_repo_root())))
+        
+        # Add reference to plan file
+        plan_content += f"""### {feat_order}. {feat_name}
 
 **Priority:** {feat_priority.upper()}  
 **Estimated Size:** {feat_size} hours  
 **File:** [{feature_filename}](../features/{feature_filename})
 
 """
-            
-            # Write plan file
-            plan_file.write_text(plan_content, encoding='utf-8')
-            saved_files.append(str(plan_file.relative_to(_repo_root())))
-            saved_files.extend(feature_files)  # Include feature files in saved files list
+    
+    # Write plan file
+    plan_file.write_text(plan_content, encoding='utf-8')
+    saved_files = [str(plan_file.relative_to(_repo_root()))]
+    saved_files.extend(feature_files)  # Include feature files in saved files list
+    return plan_id, saved_files, saved_feature_count
+
+# Bulk save plans and features to files
+@router.post("/save-all")
+def save_all_plans(payload: dict, db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
+    """Save all plans and features to both database and markdown files."""
+    from pathlib import Path
+    import json
+    from datetime import datetime
+    
+    if _auth_enabled() and user.get("id") == "public":
+        raise HTTPException(status_code=401, detail="authentication required")
+    
+    project_id = payload.get("project_id")
+    project_name = payload.get("project_name", project_id)
+    plans = payload.get("plans", [])
+    
+    if not project_id or not plans:
+        raise HTTPException(status_code=400, detail="project_id and plans are required")
+    
+    saved_files = []
+    saved_plan_count = 0
+    saved_feature_count = 0
+    db_plan_ids = []
+    
+    try:
+        for plan_idx, plan_data in enumerate(plans, 1):
+            plan_id, files, feature_count = _save_plan(db, plan_data, plan_idx, project_id, user.get("id", "system"))
+            db_plan_ids.append(plan_id)
+            saved_files.extend(files)
+            saved_feature_count += feature_count
             saved_plan_count += 1
         
         return {
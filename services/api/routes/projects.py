@@ -1,7 +1,7 @@
 # services/api/routes/projects.py
 
 from __future__ import annotations
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Literal, Optional
 from datetime import datetime, UTC
 from pathlib import Path
 from fastapi import APIRouter, Depends, HTTPException, Query
@@ -11,6 +11,7 @@ from uuid import uuid4
 from services.api.core.shared import _create_engine, _database_url, _repo_root
 from services.api.core.repos import ProjectsRepoDB
 from services.api.auth.routes import get_current_user
+from services.api.llm_selector import invalidate_project_llm
 from services.api.models.project import ProjectAgent, ProjectAgentCreate
 from sqlalchemy import text
 
@@ -26,6 +27,7 @@ class ProjectUpdate(BaseModel):
     description: Optional[str] = None
     status: Optional[str] = None
     repository_id: Optional[str] = None
+    plan_generation_mode: Optional[Literal["single", "sectioned", "default"]] = None  # "default" = LLM_PLAN_MODE
 
 class Project(BaseModel):
     id: str
@@ -452,6 +454,9 @@ def update_project(
         # Always include repository_id if it was sent (even if null) to allow clearing it
         if hasattr(project_data, 'repository_id'):
             update_fields["repository_id"] = project_data.repository_id
+        if project_data.plan_generation_mode is not None:
+            mode = project_data.plan_generation_mode
+            update_fields["plan_generation_mode"] = None if mode == "default" else mode
         
         print(f"[UPDATE PROJECT] Update fields: {update_fields}")
         
@@ -470,6 +475,7 @@ def update_project(
             )
         
         updated_project = projects_repo.update(project_id, update_fields)
+        invalidate_project_llm(project_id)
         if not updated_project:
             raise HTTPException(status_code=404, detail="Project not found")
         
@@ -608,6 +614,7 @@ def replace_project_agents(
                 ))
             
             session.commit()
+            invalidate_project_llm(project_id)
             return created_agents
             
     except HTTPException:
@@ -682,6 +689,7 @@ def add_project_agent(
             )
             session.commit()
             print(f"[Auto-detection] Set use_supabase_llm=false for project {project_id} (custom agent assigned)")
+            invalidate_project_llm(project_id)
             
             # Fetch created agent
             agent_id = result.inserted_primary_key[0]
@@ -820,6 +828,7 @@ def remove_project_agent(
                 )
                 session.commit()
                 print(f"[Auto-detection] Set use_supabase_llm=true for project {project_id} (no custom agents)")
+            invalidate_project_llm(project_id)
             
             return None
     except HTTPException:
@@ -7,12 +7,17 @@ from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 from datetime import datetime
+import json
 import uuid
 from services.api.auth.routes import get_current_user
 from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
 
 import services.api.core.shared as shared
-from services.api.planner.core import plan_request, _generate_prd_with_llm  # deterministic planner fallback
+from services.api.planner.core import plan_request, _agenerate_prd_with_llm  # deterministic planner fallback
+from services.api.llm import agenerate_plan, agenerate_text, astream_plan, astream_text
+from services.api.llm_prompt import ARTIFACTS, HISTORY, REQUEST, PromptBuilder, prompt_budget
+from services.api.llm_stream import sse_generation, sse_response
 from services.api.planner.openapi_gen import generate_openapi  # blueprint→OpenAPI
 from services.api.core.shared import _auth_enabled, _repo_root, _create_engine, _database_url
 from services.api.core.repos import InteractionHistoryRepoDB
@@ -87,6 +92,7 @@ class PlanGenerateRequest(BaseModel):
     project_name: Optional[str] = None
     project_description: Optional[str] = None
     prd_content: Optional[str] = None
+    save_plans: bool = False  # streaming only: persist each plan as soon as it is generated
 
 class PlanGenerateResponse(BaseModel):
     plan: Dict[str, Any]  # Contains implementation_plan array
@@ -182,9 +188,21 @@ def update_feature_priority_endpoint(feature_id: str, priority_update: FeaturePr
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update feature: {str(e)}")
 
+# Get stack info (simplified for now)
+_PRD_STACK = {"language": "python", "framework": "fastapi", "database": "sqlite"}
+_PRD_GATES = {"coverage_gate": 0.8, "risk_threshold": "medium", "approvals": {}}
+
+def _prd_full_request(prd_request: PRDRequest) -> str:
+    """Project request; chat history is fetched by the generator into the prompt's HISTORY section."""
+    project_name = prd_request.project_name or prd_request.project_id
+    full_request = f"{project_name}"
+    if prd_request.project_description:
+        full_request += f"\n{prd_request.project_description}"
+    return full_request
+
 # PRD generation endpoint
 @router.post("/api/prd/generate", response_model=PRDResponse)
-def generate_prd_endpoint(
+async def generate_prd_endpoint(
     prd_request: PRDRequest,
     user: Dict[str, Any] = Depends(get_current_user),
 ):
@@ -192,32 +210,17 @@ def generate_prd_endpoint(
     if _auth_enabled() and user.get("id") == "public":
         raise HTTPException(status_code=401, detail="authentication required")
 
-    # Get chat history if requested
-    chat_context = ""
-    project_name = prd_request.project_name or prd_request.project_id
-    if prd_request.include_chat_history:
-        from services.api.planner.core import _get_chat_history_context
-        chat_context = _get_chat_history_context(project_name)
-
-    # Combine project info with chat context
-    full_request = f"{project_name}"
-    if prd_request.project_description:
-        full_request += f"\n{prd_request.project_description}"
-
-    if chat_context:
-        full_request += f"\n\n{chat_context}"
-
-    # Get stack info (simplified for now)
-    stack = {"language": "python", "framework": "fastapi", "database": "sqlite"}
-    gates = {"coverage_gate": 0.8, "risk_threshold": "medium", "approvals": {}}
+    full_request = _prd_full_request(prd_request)
+    stack, gates = _PRD_STACK, _PRD_GATES
 
     # Generate PRD using project-specific LLM
-    prd_content = _generate_prd_with_llm(
+    prd_content = await _agenerate_prd_with_llm(
         full_request,
         user.get("id", "public"),
         stack,
         gates,
-        project_id=prd_request.project_id
+        project_id=prd_request.project_id,
+        include_history=prd_request.include_chat_history,
     )
 
     if not prd_content:
@@ -325,7 +328,7 @@ def get_prd_endpoint(
 
 # ADR generation endpoint
 @router.post("/api/adr/generate", response_model=ADRResponse)
-def generate_adr_endpoint(
+async def generate_adr_endpoint(
     adr_request: ADRRequest,
     user: Dict[str, Any] = Depends(get_current_user),
 ):
@@ -334,8 +337,7 @@ def generate_adr_endpoint(
         raise HTTPException(status_code=401, detail="authentication required")
 
     # Get project-based LLM client
-    from services.api.llm_selector import get_llm_for_project
-    llm_client = get_llm_for_project(adr_request.project_id, "adr_generation")
+    llm_client, chat_context = await run_in_threadpool(_adr_llm_and_context, adr_request)
     
     if not llm_client:
         raise HTTPException(
@@ -343,17 +345,51 @@ def generate_adr_endpoint(
             detail="ADR generation requires LLM configuration. Please configure Supabase credentials or assign custom agents to this project."
         )
 
+    system_prompt, user_prompt = _adr_prompts(adr_request, llm_client, chat_context)
+
+    try:
+        # Use generate_text for SupabaseLLM, generate_plan for others
+        if hasattr(llm_client, 'generate_text'):
+            adr_content = await agenerate_text(llm_client, user_prompt, system_prompt)
+        else:
+            # For other LLM clients that might support system_prompt parameter
+            adr_content = await agenerate_plan(llm_client, user_prompt, system_prompt=system_prompt)
+    except Exception as e:
+        print(f"LLM ADR generation failed: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate ADR: {str(e)}"
+        )
+
+    return ADRResponse(
+        adr_content=adr_content,
+        plan_id=None
+    )
+
+def _adr_llm_and_context(adr_request: ADRRequest):
+    """Blocking half of ADR generation (DB lookups); run it off the event loop."""
+    from services.api.llm_selector import get_llm_for_project
+    from services.api.planner.core import _get_chat_history_context
+    llm_client = get_llm_for_project(adr_request.project_id, "adr_generation")
+    if not llm_client or not adr_request.include_chat_history:
+        return llm_client, ""
+    return llm_client, _get_chat_history_context(adr_request.project_id, "adr_generation")
+
+def _adr_prompts(adr_request: ADRRequest, llm_client: Any = None, chat_context: str = ""):
+    """(system_prompt, user_prompt) for ADR + tech stack generation, fitted to the client's token budget."""
     # Generate ADR using LLM
     system_prompt = """You are an expert software architect. Generate comprehensive Architecture Design Records (ADR) and Technology Stack Specification based on the provided PRD and project information. Follow ADR best practices with clear context, decisions, and consequences."""
     
     project_name = adr_request.project_name or adr_request.project_id
-    user_prompt = f"""Generate Architecture Design Records and Technology Stack Specification for this project:
-
-Project: {project_name}
-Description: {adr_request.project_description or 'No description provided'}
-
-PRD Content:
-{adr_request.prd_content or 'No PRD content available'}
+    b = PromptBuilder(prompt_budget(llm_client), system_prompt)
+    b.text("Generate Architecture Design Records and Technology Stack Specification for this project:\n\n")
+    b.section("request", f"""Project: {project_name}
+Description: {adr_request.project_description or 'No description provided'}""", REQUEST)
+    b.text("\n\nPRD Content:\n")
+    b.section("prd", adr_request.prd_content or 'No PRD content available', ARTIFACTS)
+    b.text("\n\n")
+    b.section("history", chat_context, HISTORY, keep="tail")  # newest turns are at the end
+    b.text("""
 
 Please create TWO separate documents:
 
@@ -376,30 +412,22 @@ Example structure:
 # Technology Stack Specification
 ## [Project Name]
 
-[Tech stack content here]"""
+[Tech stack content here]""")
+    return system_prompt, b.build("adr_generation").text
 
-    try:
-        # Use generate_text for SupabaseLLM, generate_plan for others
-        if hasattr(llm_client, 'generate_text'):
-            adr_content = llm_client.generate_text(user_prompt, system_prompt)
-        else:
-            # For other LLM clients that might support system_prompt parameter
-            adr_content = llm_client.generate_plan(user_prompt, system_prompt=system_prompt)
-    except Exception as e:
-        print(f"LLM ADR generation failed: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to generate ADR: {str(e)}"
-        )
-
-    return ADRResponse(
-        adr_content=adr_content,
-        plan_id=None
-    )
+def _plan_user_request(plan_request: PlanGenerateRequest) -> str:
+    # Build the prompt
+    project_name = plan_request.project_name or plan_request.project_id
+    user_request = f"Project: {project_name}"
+    if plan_request.project_description:
+        user_request += f"\nDescription: {plan_request.project_description}"
+    if plan_request.prd_content:
+        user_request += f"\n\nPRD:\n{plan_request.prd_content}"
+    return user_request
 
 # Plan generation endpoint
 @router.post("/api/plan/generate", response_model=PlanGenerateResponse)
-def generate_plan_endpoint(
+async def generate_plan_endpoint(
     plan_request: PlanGenerateRequest,
     user: Dict[str, Any] = Depends(get_current_user),
 ):
@@ -409,7 +437,7 @@ def generate_plan_endpoint(
 
     # Get project-based LLM client
     from services.api.llm_selector import get_llm_for_project
-    llm_client = get_llm_for_project(plan_request.project_id, "plan_generation")
+    llm_client = await run_in_threadpool(get_llm_for_project, plan_request.project_id, "plan_generation")
     
     if not llm_client:
         raise HTTPException(
@@ -417,17 +445,13 @@ def generate_plan_endpoint(
             detail="Plan generation requires LLM configuration. Please configure Supabase credentials or assign custom agents to this project."
         )
 
-    # Build the prompt
-    project_name = plan_request.project_name or plan_request.project_id
-    user_request = f"Project: {project_name}"
-    if plan_request.project_description:
-        user_request += f"\nDescription: {plan_request.project_description}"
-    if plan_request.prd_content:
-        user_request += f"\n\nPRD:\n{plan_request.prd_content}"
+    user_request = _plan_user_request(plan_request)
+    from services.api.llm_sections import agenerate_plan_in_mode, plan_mode_for_project
+    mode = await run_in_threadpool(plan_mode_for_project, plan_request.project_id)
 
     try:
-        # Call LLM to generate plan
-        artifacts = llm_client.generate_plan(user_request)
+        # Call LLM to generate plan (one call, or outline + parallel sections per the project's mode)
+        artifacts = await agenerate_plan_in_mode(llm_client, user_request, mode)
         
         # Return the implementation plan
         return PlanGenerateResponse(
@@ -444,6 +468,130 @@ def generate_plan_endpoint(
             detail=f"Failed to generate plan: {str(e)}"
         )
 
+# --------------------------------------------------------------------------------------
+# Streaming generation (SSE): token events as they arrive, artifact persisted on "done"
+# --------------------------------------------------------------------------------------
+@router.post("/api/prd/generate/stream")
+async def stream_prd_endpoint(
+    prd_request: PRDRequest,
+    user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Stream PRD generation as server-sent events; the PRD is saved when the stream completes."""
+    if _auth_enabled() and user.get("id") == "public":
+        raise HTTPException(status_code=401, detail="authentication required")
+
+    from services.api.planner.core import _PRD_SYSTEM_PROMPT, _enhance_mock_prd, _prd_llm_and_context, _prd_prompt
+    full_request = _prd_full_request(prd_request)
+    llm_client, chat_context = await run_in_threadpool(
+        _prd_llm_and_context, prd_request.project_id, prd_request.include_chat_history
+    )
+    if not llm_client:
+        raise HTTPException(status_code=503, detail="PRD generation requires LLM configuration.")
+    project_name = prd_request.project_name or prd_request.project_id
+
+    def _finish(text: str) -> Dict[str, Any]:
+        if "Generated by MockLLM" in text:
+            text = _enhance_mock_prd(full_request, chat_context, _PRD_STACK, _PRD_GATES)
+        saved = save_prd_endpoint(PRDSaveRequest(project_name=project_name, prd_content=text, project_id=prd_request.project_id))
+        return {"prd_content": text, "file_path": saved.file_path}
+
+    tokens = astream_text(llm_client, _prd_prompt(full_request, chat_context, _PRD_STACK, _PRD_GATES, llm_client, _PRD_SYSTEM_PROMPT), _PRD_SYSTEM_PROMPT)
+    return sse_response(sse_generation("prd", tokens, _finish))
+
+@router.post("/api/adr/generate/stream")
+async def stream_adr_endpoint(
+    adr_request: ADRRequest,
+    user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Stream ADR + tech stack generation as server-sent events; both files are saved on completion."""
+    if _auth_enabled() and user.get("id") == "public":
+        raise HTTPException(status_code=401, detail="authentication required")
+
+    llm_client, chat_context = await run_in_threadpool(_adr_llm_and_context, adr_request)
+    system_prompt, user_prompt = _adr_prompts(adr_request, llm_client, chat_context)
+    project_name = adr_request.project_name or adr_request.project_id
+
+    def _finish(text: str) -> Dict[str, Any]:
+        saved = save_adr_endpoint(ADRSaveRequest(project_name=project_name, adr_content=text, project_id=adr_request.project_id))
+        return {"adr_content": text, "file_path": saved.file_path}
+
+    return sse_response(sse_generation("adr", astream_text(llm_client, user_prompt, system_prompt), _finish))
+
+@router.post("/api/plan/generate/stream")
+async def stream_plan_endpoint(
+    plan_request: PlanGenerateRequest,
+    user: Dict[str, Any] = Depends(get_current_user),
+):
+    """
+    Stream plan generation as server-sent events. Besides raw tokens, the
+    parsed fields are sent as they close: `prd_markdown`, `openapi_yaml` and
+    one `plan` event per implementation_plan item. With save_plans=true each
+    plan (and its features) is saved to the DB right away (`plan_saved`).
+    On completion the plan is written to docs/implementation_plans/.
+    """
+    if _auth_enabled() and user.get("id") == "public":
+        raise HTTPException(status_code=401, detail="authentication required")
+
+    from services.api.llm_json import ITEM_EVENT, PlanStreamParser
+    from services.api.llm_selector import get_llm_for_project
+    llm_client = await run_in_threadpool(get_llm_for_project, plan_request.project_id, "plan_generation")
+    parser = PlanStreamParser()
+    saved_ids: List[str] = []
+
+    async def _on_chunk(chunk: str):
+        events = []
+        for field, value in parser.feed(chunk):
+            if field != ITEM_EVENT:
+                events.append((field, value))
+                continue
+            index = len(parser.items) - 1
+            events.append(("plan", {"index": index, "item": value}))
+            if plan_request.save_plans:
+                plan_id = await run_in_threadpool(
+                    _save_generated_plan, plan_request.project_id, value, index + 1, user.get("id", "system")
+                )
+                saved_ids.append(plan_id)
+                events.append(("plan_saved", {"index": index, "plan_id": plan_id}))
+        return events
+
+    def _finish(text: str) -> Dict[str, Any]:
+        try:
+            artifacts = parser.finish()
+        except KeyError:
+            from services.api.llm import _artifacts_from_json
+            artifacts = _artifacts_from_json(text)
+        out_dir = _repo_root() / "docs" / "implementation_plans"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        out_path = out_dir / f"{timestamp}-{plan_request.project_id}-implementation-plan.json"
+        out_path.write_text(json.dumps({
+            "project_id": plan_request.project_id,
+            "generated_at": datetime.now().isoformat(),
+            "implementation_plan": artifacts.implementation_plan,
+        }, indent=2, ensure_ascii=False), encoding="utf-8")
+        return {
+            "plan": {"implementation_plan": artifacts.implementation_plan},
+            "file_path": str(out_path),
+            "saved_plan_ids": saved_ids,
+        }
+
+    tokens = astream_plan(llm_client, _plan_user_request(plan_request))
+    return sse_response(sse_generation("plan", tokens, _finish, on_chunk=_on_chunk))
+
+def _save_generated_plan(project_id: str, item: Dict[str, Any], plan_idx: int, owner: str) -> str:
+    """Persist one generated plan item the way /plans/save-all does."""
+    from sqlalchemy.orm import Session
+    from services.api.routes.plans import _save_plan
+    plan_data = dict(item)
+    plan_data.setdefault("size_estimate", item.get("size_estimate_days", 0))
+    plan_data["features"] = [
+        {**f, "size_estimate": f.get("size_estimate", f.get("size_estimate_hours", 0))}
+        for f in item.get("features", []) if isinstance(f, dict)
+    ]
+    with Session(_create_engine(_database_url(_repo_root()))) as db:
+        plan_id, _files, _count = _save_plan(db, plan_data, plan_idx, project_id, owner)
+    return plan_id
+
 # ADR save endpoint
 @router.post("/api/adr/save", response_model=ADRSaveResponse)
 def save_adr_endpoint(adr_save_request: ADRSaveRequest):
@@ -612,7 +760,7 @@ def chat_message_endpoint(
 
     # Get LLM client
     from services.api.llm import get_llm_from_env
-    llm_client = get_llm_from_env()
+    llm_client = get_llm_from_env(step="chat")
     
     if not llm_client:
         # Fallback response if no LLM configured
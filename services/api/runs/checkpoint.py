@@ -0,0 +1,45 @@
+# services/api/runs/checkpoint.py
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict
+
+from services.api.runs.manifest import write_json_atomic
+
+# Lives next to manifest.json / execution.log in docs/plans/{plan_id}/runs/{run_id}/
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def checkpoint_path(run_dir: Path) -> Path:
+    return run_dir / CHECKPOINT_FILE
+
+
+def load_checkpoint(run_dir: Path) -> Dict[str, Any]:
+    """Return the persisted checkpoint, or an empty one if missing/corrupt."""
+    p = checkpoint_path(run_dir)
+    try:
+        data = json.loads(p.read_text(encoding="utf-8"))
+        if isinstance(data, dict) and isinstance(data.get("completed_steps"), list):
+            return data
+    except Exception:
+        pass
+    return {"completed_steps": [], "step_results": {}}
+
+
+def record_step(run_dir: Path, plan_id: str, run_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Durably mark a step completed. Unlike the manifest this is never debounced:
+    it is the source of truth the startup reconciler resumes from.
+    """
+    cp = load_checkpoint(run_dir)
+    name = result["name"]
+    if name not in cp["completed_steps"]:
+        cp["completed_steps"].append(name)
+    cp.setdefault("step_results", {})[name] = result
+    cp["plan_id"] = plan_id
+    cp["run_id"] = run_id
+    cp["updated_at"] = datetime.now(timezone.utc).isoformat()
+    write_json_atomic(checkpoint_path(run_dir), cp)
+    return cp
@@ -0,0 +1,109 @@
+# services/api/runs/lease.py
+"""
+Run leases, so several processes can share one repo.
+
+A process stamps every run it executes with an owner ("host:pid") and a
+heartbeat, in manifest.json and on the runs row, and RunHeartbeat refreshes
+them while the process is alive. The startup reconciler only reclaims runs
+whose heartbeat is older than RUN_LEASE_SECONDS (default 60); runs without a
+heartbeat predate leases and count as expired.
+"""
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from services.api.core.shared import env_num
+
+# Created with O_EXCL in the run dir by the process reclaiming it, so two
+# processes starting together cannot both resume the same orphan.
+CLAIM_FILE = "reclaim.lock"
+
+
+def run_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def lease_seconds() -> float:
+    return env_num("RUN_LEASE_SECONDS", 60.0)
+
+
+def stale_before(now: Optional[datetime] = None) -> datetime:
+    """Heartbeats older than this have lost their lease."""
+    return (now or datetime.now(timezone.utc)) - timedelta(seconds=lease_seconds())
+
+
+def lease_expired(heartbeat_at: Any, now: Optional[datetime] = None) -> bool:
+    """True when `heartbeat_at` (datetime or ISO string) is missing or older than the lease."""
+    if isinstance(heartbeat_at, str):
+        try:
+            heartbeat_at = datetime.fromisoformat(heartbeat_at)
+        except ValueError:
+            return True
+    if not isinstance(heartbeat_at, datetime):
+        return True
+    if heartbeat_at.tzinfo is None:  # SQLite hands back naive UTC
+        heartbeat_at = heartbeat_at.replace(tzinfo=timezone.utc)
+    return heartbeat_at < stale_before(now)
+
+
+def claim_run_dir(run_dir: Path) -> bool:
+    """Take the reclaim lock for a run dir; a lock older than the lease is broken."""
+    lock = Path(run_dir) / CLAIM_FILE
+    for _ in range(2):
+        try:
+            fd = os.open(str(lock), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - lock.stat().st_mtime <= lease_seconds():
+                    return False
+                lock.unlink()
+            except FileNotFoundError:
+                pass
+            continue
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(run_owner())
+        return True
+    return False
+
+
+class RunHeartbeat:
+    """Background thread refreshing this process's leases every third of the lease."""
+
+    def __init__(self, repo_root_fn: Callable[[], Path]):
+        self._repo_root_fn = repo_root_fn
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None or lease_seconds() <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="runs-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def beat(self) -> None:
+        from services.api.core.repos import RunsRepoDB
+        from services.api.core.shared import _create_engine, _database_url
+        from services.api.runs.manifest import manifest_writer
+
+        manifest_writer.touch_all()
+        RunsRepoDB(_create_engine(_database_url(self._repo_root_fn()))).heartbeat(run_owner())
+
+    def _loop(self) -> None:
+        while not self._stop.wait(lease_seconds() / 3):
+            try:
+                self.beat()
+            except Exception as e:
+                print(f"[runs] lease heartbeat failed: {e}")
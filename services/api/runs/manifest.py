@@ -0,0 +1,132 @@
+# services/api/runs/manifest.py
+from __future__ import annotations
+
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from services.api.runs.lease import run_owner
+
+# How long step updates may be coalesced before they must reach disk.
+_DEFAULT_DEBOUNCE_S = float(os.getenv("RUN_MANIFEST_DEBOUNCE_SECONDS", "0.25"))
+
+_Key = Tuple[str, str]
+
+
+def write_json_atomic(path: Path, data: Dict[str, Any]) -> None:
+    """Write JSON through a sibling temp file + rename so readers never see a torn file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class ManifestWriter:
+    """
+    Debounced, atomic manifest persistence for live runs.
+
+    - update(): publish the latest manifest in memory; hit disk at most once per
+      debounce window (a timer flushes the trailing update).
+    - finish(): force a final write and drop the run from the live set.
+    - get():    in-memory snapshot while the run is live, else None.
+
+    Every write stamps the run's lease (owner + heartbeat_at, see runs.lease);
+    touch_all() rewrites live manifests so long steps keep their lease.
+    """
+
+    def __init__(self, debounce_s: float = _DEFAULT_DEBOUNCE_S):
+        self.debounce_s = max(0.0, float(debounce_s))
+        self._lock = threading.Lock()
+        self._live: Dict[_Key, Dict[str, Any]] = {}
+        self._paths: Dict[_Key, Path] = {}
+        self._dirty: set[_Key] = set()
+        self._last_flush: Dict[_Key, float] = {}
+        self._timers: Dict[_Key, threading.Timer] = {}
+        self.writes = 0  # disk writes performed (observability/tests)
+
+    @staticmethod
+    def _key(manifest: Dict[str, Any]) -> _Key:
+        return (str(manifest.get("plan_id", "")), str(manifest.get("run_id", "")))
+
+    def update(self, path: Path, manifest: Dict[str, Any], *, flush: bool = False) -> None:
+        key = self._key(manifest)
+        snapshot = copy.deepcopy(manifest)
+        with self._lock:
+            self._live[key] = snapshot
+            self._paths[key] = Path(path)
+            self._dirty.add(key)
+            last = self._last_flush.get(key)
+            elapsed = self.debounce_s if last is None else time.monotonic() - last
+            if flush or elapsed >= self.debounce_s:
+                self._flush_locked(key)
+                return
+            if key not in self._timers:
+                t = threading.Timer(self.debounce_s - elapsed, self._flush_key, args=(key,))
+                t.daemon = True
+                self._timers[key] = t
+                t.start()
+
+    def finish(self, path: Path, manifest: Dict[str, Any]) -> None:
+        """Persist the terminal manifest immediately and stop serving it from memory."""
+        key = self._key(manifest)
+        self.update(path, manifest, flush=True)
+        with self._lock:
+            self._live.pop(key, None)
+            self._paths.pop(key, None)
+            self._last_flush.pop(key, None)
+
+    def get(self, plan_id: str, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            m = self._live.get((plan_id, run_id))
+            return copy.deepcopy(m) if m is not None else None
+
+    def flush_all(self) -> None:
+        """Write every pending manifest now (used on shutdown)."""
+        with self._lock:
+            for key in list(self._dirty):
+                self._flush_locked(key)
+
+    def touch_all(self) -> None:
+        """Refresh the lease heartbeat of every live manifest."""
+        with self._lock:
+            for key in list(self._live):
+                self._flush_locked(key)
+
+    # --- internals ---
+    def _flush_key(self, key: _Key) -> None:
+        with self._lock:
+            self._timers.pop(key, None)
+            if key in self._dirty:
+                self._flush_locked(key)
+
+    def _flush_locked(self, key: _Key) -> None:
+        t = self._timers.pop(key, None)
+        if t is not None:
+            t.cancel()
+        data, path = self._live.get(key), self._paths.get(key)
+        self._dirty.discard(key)
+        if data is None or path is None:
+            return
+        data["owner"] = run_owner()
+        data["heartbeat_at"] = datetime.now(timezone.utc).isoformat()
+        write_json_atomic(path, data)
+        self._last_flush[key] = time.monotonic()
+        self.writes += 1
+
+
+# Process-wide writer shared by the run engine and the status endpoints.
+manifest_writer = ManifestWriter()
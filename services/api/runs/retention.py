@@ -0,0 +1,252 @@
+# services/api/runs/retention.py
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tarfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from services.api.core.shared import _locked_index, env_num
+from services.api.runs.manifest import manifest_writer
+
+# Archived run bundles live beside the runs they replace:
+#   docs/plans/{plan_id}/runs/{run_id}/  ->  docs/plans/{plan_id}/archive/{run_id}.tar.gz
+ARCHIVE_DIR = "archive"
+
+
+@dataclass
+class RetentionPolicy:
+    """0 disables a limit."""
+    keep_last: int = 20                  # newest runs kept per plan
+    max_age_days: float = 30.0           # older runs are archived
+    max_total_bytes: int = 512 * 1024 * 1024  # runs + archives across all plans
+    interval_s: float = 3600.0           # background compactor period
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            keep_last=int(env_num("RUN_RETENTION_KEEP_LAST", cls.keep_last)),
+            max_age_days=env_num("RUN_RETENTION_MAX_AGE_DAYS", cls.max_age_days),
+            max_total_bytes=int(env_num("RUN_RETENTION_MAX_BYTES", cls.max_total_bytes)),
+            interval_s=env_num("RUN_RETENTION_INTERVAL_SECONDS", cls.interval_s),
+        )
+
+
+@dataclass
+class _RunDir:
+    plan_id: str
+    run_id: str
+    path: Path
+    size: int
+    mtime: float
+
+
+def _scan_dir(path: Path) -> tuple[int, float]:
+    size, mtime = 0, path.stat().st_mtime
+    for f in path.rglob("*"):
+        if f.is_file():
+            st = f.stat()
+            size += st.st_size
+            mtime = max(mtime, st.st_mtime)
+    return size, mtime
+
+
+def _db_live_run_ids(repo_root: Path) -> set[str]:
+    from services.api.core.shared import _create_engine, _database_url
+    from services.api.core.repos import RunsRepoDB
+    try:
+        rows = RunsRepoDB(_create_engine(_database_url(repo_root))).list_by_status("running", "queued")
+        return {r["id"] for r in rows}
+    except Exception:
+        return set()
+
+
+def _is_live(run: _RunDir, db_live: set[str]) -> bool:
+    if run.run_id in db_live or manifest_writer.get(run.plan_id, run.run_id) is not None:
+        return True
+    try:
+        m = json.loads((run.path / "manifest.json").read_text(encoding="utf-8"))
+        return m.get("status") in {"running", "queued"}
+    except Exception:
+        return False
+
+
+def _archive(run: _RunDir) -> Path:
+    out_dir = run.path.parent.parent / ARCHIVE_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    bundle = out_dir / f"{run.run_id}.tar.gz"
+    tmp = bundle.with_name(bundle.name + ".tmp")
+    with tarfile.open(tmp, "w:gz") as tar:
+        tar.add(run.path, arcname=run.run_id)
+    os.replace(tmp, bundle)
+    shutil.rmtree(run.path, ignore_errors=True)
+    return bundle
+
+
+def _select_victims(runs: List[_RunDir], policy: RetentionPolicy, now: float) -> List[_RunDir]:
+    victims: Dict[str, _RunDir] = {}
+    by_plan: Dict[str, List[_RunDir]] = {}
+    for r in runs:
+        by_plan.setdefault(r.plan_id, []).append(r)
+    for plan_runs in by_plan.values():
+        plan_runs.sort(key=lambda r: r.mtime, reverse=True)
+        if policy.keep_last > 0:
+            for r in plan_runs[policy.keep_last:]:
+                victims[r.run_id] = r
+    if policy.max_age_days > 0:
+        cutoff = now - policy.max_age_days * 86400
+        for r in runs:
+            if r.mtime < cutoff:
+                victims[r.run_id] = r
+    return list(victims.values())
+
+
+def compact_runs(repo_root: Path, policy: Optional[RetentionPolicy] = None, *, now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    One retention pass: archive runs beyond keep_last / max_age, then archive
+    oldest runs (and finally drop oldest bundles) until under max_total_bytes.
+    Archived runs are removed from index.json and the runs table; keep_last and
+    max_age also apply to runs table rows directly, since runs queued through the
+    DB worker may never get a run directory.
+    """
+    policy = policy or RetentionPolicy.from_env()
+    now = time.time() if now is None else now
+    plans_dir = Path(repo_root) / "docs" / "plans"
+
+    runs: List[_RunDir] = []
+    live_bytes = 0
+    db_live = _db_live_run_ids(Path(repo_root))
+    for d in plans_dir.glob("*/runs/*"):
+        if not d.is_dir():
+            continue
+        size, mtime = _scan_dir(d)
+        r = _RunDir(plan_id=d.parent.parent.name, run_id=d.name, path=d, size=size, mtime=mtime)
+        if _is_live(r, db_live):
+            live_bytes += size  # counts toward the budget but is never evicted
+        else:
+            runs.append(r)
+    bundles = sorted(plans_dir.glob(f"*/{ARCHIVE_DIR}/*.tar.gz"), key=lambda p: p.stat().st_mtime)
+
+    victims = _select_victims(runs, policy, now)
+    archived: List[_RunDir] = []
+    for r in victims:
+        bundles.append(_archive(r))
+        archived.append(r)
+
+    remaining = sorted((r for r in runs if r not in archived), key=lambda r: r.mtime)
+    deleted_bundles: List[str] = []
+    if policy.max_total_bytes > 0:
+        total = live_bytes + sum(r.size for r in remaining) + sum(b.stat().st_size for b in bundles)
+        while total > policy.max_total_bytes and remaining:
+            r = remaining.pop(0)
+            b = _archive(r)
+            bundles.append(b)
+            archived.append(r)
+            total += b.stat().st_size - r.size
+        bundles.sort(key=lambda p: p.stat().st_mtime)
+        while total > policy.max_total_bytes and bundles:
+            b = bundles.pop(0)
+            total -= b.stat().st_size
+            b.unlink(missing_ok=True)
+            deleted_bundles.append(b.name)
+
+    archived_ids = {r.run_id for r in archived}
+    if archived_ids:
+        _prune_index(Path(repo_root), archived_ids)
+    on_disk = {d.name for d in plans_dir.glob("*/runs/*") if d.is_dir()}
+    db_rows_deleted = _prune_db(Path(repo_root), archived_ids, policy, now, on_disk)
+
+    return {
+        "scanned": len(runs),
+        "archived": sorted(archived_ids),
+        "deleted_bundles": deleted_bundles,
+        "bytes_freed": sum(r.size for r in archived),
+        "db_rows_deleted": db_rows_deleted,
+    }
+
+
+def _prune_index(repo_root: Path, run_ids: set[str]) -> None:
+    # under the index lock, so plans/runs added by other threads meanwhile survive
+    with _locked_index(repo_root) as idx:
+        for entry in idx.values():
+            if not isinstance(entry, dict) or not entry.get("runs"):
+                continue
+            kept = [r for r in entry["runs"] if r.get("run_id") not in run_ids]
+            if len(kept) != len(entry["runs"]):
+                entry["archived_runs"] = int(entry.get("archived_runs", 0)) + len(entry["runs"]) - len(kept)
+                entry["runs"] = kept
+
+
+def _created_ts(value: Any) -> float:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:  # SQLite hands back naive UTC
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float("inf")  # unknown age: never old enough
+
+
+def _prune_db(repo_root: Path, archived_ids: set[str], policy: RetentionPolicy, now: float,
+              on_disk: set[str]) -> int:
+    """Delete archived runs' rows, then finished rows beyond keep_last / max_age per plan."""
+    from services.api.core.shared import _create_engine, _database_url
+    from services.api.core.repos import RunsRepoDB
+    try:
+        runs = RunsRepoDB(_create_engine(_database_url(repo_root)))
+        victims = set(archived_ids)
+        by_plan: Dict[str, List[Dict[str, Any]]] = {}
+        for row in runs.list_finished():
+            by_plan.setdefault(row["plan_id"], []).append(row)
+        cutoff = now - policy.max_age_days * 86400 if policy.max_age_days > 0 else None
+        for rows in by_plan.values():
+            for i, row in enumerate(rows):  # newest first
+                if (policy.keep_last > 0 and i >= policy.keep_last) or \
+                        (cutoff is not None and _created_ts(row["created_at"]) < cutoff):
+                    victims.add(row["id"])
+        # rows whose run dir the pass above kept stay until the dir goes
+        return runs.delete_many(victims - on_disk)
+    except Exception as e:
+        print(f"[runs] retention DB prune skipped: {e}")
+        return 0
+
+
+class RunCompactor:
+    """Background thread that applies the retention policy periodically."""
+
+    def __init__(self, repo_root_fn, policy: Optional[RetentionPolicy] = None):
+        self._repo_root_fn = repo_root_fn
+        self.policy = policy or RetentionPolicy.from_env()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def start(self) -> None:
+        if self._thread is not None or self.policy.interval_s <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="runs-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self) -> Dict[str, Any]:
+        self.last_report = compact_runs(self._repo_root_fn(), self.policy)
+        return self.last_report
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.policy.interval_s):
+            try:
+                report = self.run_once()
+                if report["archived"] or report["deleted_bundles"] or report["db_rows_deleted"]:
+                    print(f"[runs] retention: {report}")
+            except Exception as e:
+                print(f"[runs] retention pass failed: {e}")
@@ -7,7 +7,7 @@ import uuid
 import json, threading
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from pydantic import BaseModel
 
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Request
@@ -24,6 +24,9 @@ from services.api.core.shared import (
 )
 from services.api.core.repos import PlansRepoDB, RunsRepoDB
 from services.api.auth.routes import get_current_user  # reuse existing dependency
+from services.api.runs.manifest import manifest_writer
+from services.api.runs.checkpoint import load_checkpoint, record_step
+from services.api.runs.lease import claim_run_dir, lease_expired, run_owner, stale_before
 
 router = APIRouter(prefix="", tags=["runs"])
 
@@ -156,13 +159,33 @@ class RunOut(BaseModel):
 # --------------------------------------------------------------------------------------
 # Execute plan (background)
 # --------------------------------------------------------------------------------------
-def _run_plan(plan_id: str, run_id: str, repo_root: Path) -> None:
+def _busy_step(duration_s: float, should_cancel: Callable[[], bool]):
+    # do small sleeps so we can react to cancellation quickly
+    t_end = time.time() + duration_s
+    while time.time() < t_end:
+        if should_cancel():
+            return  # cooperatively stop
+        time.sleep(0.01)
+
+# Three illustrative steps. Keep them short so tests remain fast.
+# (name, fn, idempotent): an idempotent step may be replayed after a crash that
+# interrupted it; a non-idempotent one makes the interrupted run fail instead.
+_PLAN_STEPS: List[Tuple[str, Callable[[Callable[[], bool]], Any], bool]] = [
+    ("prepare",   lambda sc: _busy_step(0.12, sc), True),
+    ("generate",  lambda sc: _busy_step(0.15, sc), True),
+    ("finalize",  lambda sc: _busy_step(0.10, sc), False),
+]
+
+def _run_plan(plan_id: str, run_id: str, repo_root: Path, resume: bool = False) -> None:
     """
     Execute a plan run and persist:
       - execution log: docs/plans/{plan_id}/runs/{run_id}/execution.log
       - manifest:      docs/plans/{plan_id}/runs/{run_id}/manifest.json
-    Also append an entry under the plan's index with (run_id, log, manifest, status).
+      - checkpoint:    docs/plans/{plan_id}/runs/{run_id}/checkpoint.json
+    Also upserts the run's entry (run_id, log, manifest, status) in the plan's index.
     Supports cancellation, per-step timeout, retry/backoff.
+    With resume=True, steps recorded in the checkpoint are skipped and their
+    results carried over from it.
     """
     # Load index -> get plan entry
     idx = _load_index(repo_root)
@@ -179,11 +202,18 @@ def _run_plan(plan_id: str, run_id: str, repo_root: Path) -> None:
     abs_manifest = run_dir / "manifest.json"
     cancel_flag = run_dir / "cancel.flag"
 
+    checkpoint = load_checkpoint(run_dir) if resume else {"completed_steps": [], "step_results": {}}
+    done = set(checkpoint["completed_steps"])
+    previous = _read_manifest(abs_manifest) if resume else {}
+
     # Begin log + initial 'running' manifest
     with abs_log.open("a", encoding="utf-8") as lf:
-        lf.write(f"BEGIN run {run_id}\n")
+        if resume:
+            lf.write(f"RESUME run {run_id} (completed: {', '.join(checkpoint['completed_steps']) or 'none'})\n")
+        else:
+            lf.write(f"BEGIN run {run_id}\n")
 
-    started = datetime.now(timezone.utc).isoformat()
+    started = previous.get("started_at") or datetime.now(timezone.utc).isoformat()
 
     manifest: Dict[str, Any] = {
         "plan_id": plan_id,
@@ -194,32 +224,23 @@ def _run_plan(plan_id: str, run_id: str, repo_root: Path) -> None:
         "artifacts": [],           # filled from index
         "steps": [],               # step results appended below
     }
+    if resume:
+        manifest["resumed_at"] = datetime.now(timezone.utc).isoformat()
+        manifest["resume_count"] = int(previous.get("resume_count", 0)) + 1
+        results = checkpoint.get("step_results") or {}
+        manifest["steps"] = [results[n] for n, _, _ in _PLAN_STEPS if n in done and n in results]
     # include artifacts known at plan time
     arts = entry.get("artifacts") or {}
     # persist as posix rel
     for k in ["prd", "openapi", "adr", "stories", "tasks"]:
         if k in arts and arts[k]:
             manifest["artifacts"].append(arts[k])
-    _write_json(abs_manifest, manifest)
-
-    # define some "work" steps that regularly check for cancellation
-    def _busy_step(duration_s: float, should_cancel: Callable[[], bool]):
-        # do small sleeps so we can react to cancellation quickly
-        t_end = time.time() + duration_s
-        while time.time() < t_end:
-            if should_cancel():
-                return  # cooperatively stop
-            time.sleep(0.01)
-
-    # Three illustrative steps. Keep them short so tests remain fast.
-    steps_spec = [
-        ("prepare",   lambda sc: _busy_step(0.12, sc)),
-        ("generate",  lambda sc: _busy_step(0.15, sc)),
-        ("finalize",  lambda sc: _busy_step(0.10, sc)),
-    ]
+    manifest_writer.update(abs_manifest, manifest)
 
     overall_status = "completed"
-    for name, fn in steps_spec:
+    for name, fn, _idempotent in _PLAN_STEPS:
+        if name in done:
+            continue
         res = run_step(
             name,
             fn,
@@ -238,13 +259,14 @@ def _run_plan(plan_id: str, run_id: str, repo_root: Path) -> None:
             overall_status = "failed"
             break
 
-        # persist manifest after each step
-        _write_json(abs_manifest, manifest)
+        # durable per-step checkpoint, then publish (debounced; readers get the in-memory copy)
+        record_step(run_dir, plan_id, run_id, res)
+        manifest_writer.update(abs_manifest, manifest)
 
     # finalize manifest/status
     manifest["status"] = overall_status
     manifest["completed_at"] = datetime.now(timezone.utc).isoformat()
-    _write_json(abs_manifest, manifest)
+    manifest_writer.finish(abs_manifest, manifest)
 
     with abs_log.open("a", encoding="utf-8") as lf:
         lf.write(f"END run {run_id}\n")
@@ -278,7 +300,7 @@ def _bootstrap_running_manifest(repo_root: Path, plan_id: str, run_id: str) -> D
         "artifacts": [],
         "steps": [],
     }
-    _write_json(manifest_path, manifest)
+    manifest_writer.update(manifest_path, manifest, flush=True)
     # ensure log file exists
     if not log_path.exists():
         log_path.write_text("", encoding="utf-8")
@@ -287,6 +309,98 @@ def _bootstrap_running_manifest(repo_root: Path, plan_id: str, run_id: str) -> D
         cancel_flag.unlink()
     return manifest
 
+def _read_manifest(path: Path) -> Dict[str, Any]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _fail_orphan(repo_root: Path, manifest_path: Path, manifest: Dict[str, Any], step: str) -> None:
+    """Close out a run whose interrupted step cannot be replayed safely."""
+    plan_id, run_id = manifest["plan_id"], manifest["run_id"]
+    log_path = manifest_path.parent / "execution.log"
+    manifest["status"] = "failed"
+    manifest["error"] = f"interrupted by process restart during non-idempotent step '{step}'"
+    manifest["completed_at"] = datetime.now(timezone.utc).isoformat()
+    manifest_writer.finish(manifest_path, manifest)
+    with log_path.open("a", encoding="utf-8") as lf:
+        lf.write(f"[{step}] interrupted by restart; not idempotent, run failed\nEND run {run_id}\n")
+    _append_run_to_index(
+        repo_root, plan_id, run_id,
+        _posix_rel(manifest_path, repo_root), _posix_rel(log_path, repo_root), "failed",
+    )
+
+
+def reconcile_orphaned_runs(
+    repo_root: Path,
+    *,
+    background: bool = True,
+    requeue: Optional[Callable[[str, str], None]] = None,
+) -> Dict[str, List[str]]:
+    """
+    Startup reconciler for runs left behind by a dead process.
+
+    Only runs whose lease has expired are touched (see runs.lease); runs
+    another live process is heartbeating are reported as "leased".
+    File-backed runs (manifest.json still "running", not live in this process):
+      - resume from the checkpoint if the next pending step is idempotent,
+      - otherwise mark the run failed.
+    DB run rows: "running" rows are marked failed (the worker that owned them
+    is gone); "queued" rows are handed to `requeue` when given. Each row is
+    claimed first, so only one process reclaims it.
+    """
+    report: Dict[str, List[str]] = {"resumed": [], "failed": [], "requeued": [], "leased": []}
+
+    plans_dir = _docs_root(repo_root) / "plans"
+    for manifest_path in sorted(plans_dir.glob("*/runs/*/manifest.json")):
+        manifest = _read_manifest(manifest_path)
+        plan_id, run_id = manifest.get("plan_id"), manifest.get("run_id")
+        if manifest.get("status") != "running" or not plan_id or not run_id:
+            continue
+        if manifest_writer.get(plan_id, run_id) is not None:
+            continue  # still executing in this process
+        if not lease_expired(manifest.get("heartbeat_at")) or not claim_run_dir(manifest_path.parent):
+            report["leased"].append(run_id)
+            continue
+
+        done = set(load_checkpoint(manifest_path.parent)["completed_steps"])
+        pending = [(n, idem) for n, _, idem in _PLAN_STEPS if n not in done]
+        if pending and not pending[0][1]:
+            _fail_orphan(repo_root, manifest_path, manifest, pending[0][0])
+            report["failed"].append(run_id)
+            continue
+
+        if background:
+            threading.Thread(
+                target=_run_plan, args=(plan_id, run_id, repo_root),
+                kwargs={"resume": True}, name=f"run-resume-{run_id}", daemon=True,
+            ).start()
+        else:
+            _run_plan(plan_id, run_id, repo_root, resume=True)
+        report["resumed"].append(run_id)
+
+    try:
+        runs = RunsRepoDB(_create_engine(_database_url(repo_root)))
+        owner, cutoff = run_owner(), stale_before()
+        for row in runs.list_by_status("running", "queued"):
+            if row["owner"] == owner or (row["status"] == "queued" and requeue is None):
+                continue  # this process's own run, or nowhere to requeue it
+            if not lease_expired(row["heartbeat_at"]) or not runs.claim(row["id"], owner, cutoff):
+                report["leased"].append(row["id"])
+                continue
+            if row["status"] == "running":
+                runs.set_completed(row["id"], "failed")
+                report["failed"].append(row["id"])
+            else:
+                requeue(row["plan_id"], row["id"])
+                report["requeued"].append(row["id"])
+    except Exception as e:
+        print(f"[runs] DB run reconciliation skipped: {e}")
+
+    return report
+
 # --- routes ---
 
 @router.post("/plans/{plan_id}/execute")
@@ -321,10 +435,14 @@ def list_runs(plan_id: str, user: Dict[str, Any] = Depends(get_current_user)):
 
 
 @router.get("/plans/{plan_id}/runs/{run_id}/manifest")
-def get_run_manifest(plan_id: str, run_id: str):
+def get_run_manifest(plan_id: str, run_id: str, user: Dict[str, Any] = Depends(get_current_user)):
     if _auth_enabled() and user.get("id") == "public":
         raise HTTPException(status_code=401, detail="authentication required")
-    repo_root = _repo_root()
+    # live runs are served from memory; finished runs from the (atomically written) file
+    live = manifest_writer.get(plan_id, run_id)
+    if live is not None:
+        return live
+    repo_root = shared._repo_root()
     manifest_rel = f"docs/plans/{plan_id}/runs/{run_id}/manifest.json"
     p = Path(repo_root) / manifest_rel
     if not p.exists():
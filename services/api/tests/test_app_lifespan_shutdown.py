@@ -0,0 +1,20 @@
+# services/api/tests/test_app_lifespan_shutdown.py
+from fastapi.testclient import TestClient
+
+from services.api import app as app_module
+
+
+def test_shutdown_runs_every_cleanup_despite_failures(monkeypatch):
+    calls = []
+
+    def boom():
+        calls.append("compactor")
+        raise RuntimeError("compactor stuck")
+
+    monkeypatch.setattr(app_module.manifest_writer, "flush_all", lambda: calls.append("manifests"))
+    monkeypatch.setattr(app_module._run_compactor, "stop", boom)
+    monkeypatch.setattr(app_module.telemetry, "stop", lambda: calls.append("telemetry"))
+    monkeypatch.setattr(app_module, "close_http_clients", lambda: calls.append("http"))
+    with TestClient(app_module.app):
+        pass
+    assert calls == ["manifests", "compactor", "telemetry", "http"]
@@ -0,0 +1,88 @@
+# services/api/tests/test_auth_user_index.py
+import json
+import os
+from pathlib import Path
+
+from services.api.auth.users import FileUserStore, UserIndex, write_users_file
+
+
+def test_index_reads_every_users_file_shape(tmp_path: Path):
+    uf = tmp_path / "users.json"
+    uf.write_text(json.dumps({
+        "version": 1,
+        "users": [{"id": "u_store", "email": "Store@Example.com"}],
+        "u_route": {"id": "u_route", "email": "route@example.com"},
+    }), encoding="utf-8")
+    idx = UserIndex(uf)
+    assert idx.get_by_id("u_store")["email"] == "Store@Example.com"
+    assert idx.get_by_email("store@example.com")["id"] == "u_store"
+    assert idx.get_by_email(" ROUTE@example.com ")["id"] == "u_route"
+    assert idx.get_by_id("missing") is None
+
+
+def test_index_parses_once_until_file_changes(tmp_path: Path):
+    uf = tmp_path / "users.json"
+    uf.write_text(json.dumps({"u_1": {"id": "u_1", "email": "a@example.com"}}), encoding="utf-8")
+    idx = UserIndex(uf)
+    for _ in range(50):
+        assert idx.get_by_id("u_1")
+    assert idx.loads == 1
+
+    # external edit (different size) is picked up on the next read
+    uf.write_text(json.dumps({"u_2": {"id": "u_2", "email": "bob@example.com"}}), encoding="utf-8")
+    st = uf.stat()
+    os.utime(uf, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert idx.get_by_id("u_1") is None
+    assert idx.get_by_email("bob@example.com")["id"] == "u_2"
+    assert idx.loads == 2
+
+
+def test_write_users_file_refreshes_shared_index(tmp_path: Path):
+    uf = tmp_path / "users.json"
+    store = FileUserStore(uf)
+    created = store.create("carol@example.com", "h")
+    assert store.get_by_email("CAROL@example.com")["id"] == created["id"]
+
+    raw = json.loads(uf.read_text(encoding="utf-8"))
+    raw["u_x"] = {"id": "u_x", "email": "x@example.com"}
+    write_users_file(uf, raw)
+    assert store.get_by_id("u_x")["email"] == "x@example.com"
+    # envelope shape preserved
+    assert json.loads(uf.read_text(encoding="utf-8"))["version"] == 1
+
+
+def test_returned_records_are_copies(tmp_path: Path):
+    store = FileUserStore(tmp_path / "users.json")
+    u = store.create("dave@example.com", "h")
+    got = store.get_by_id(u["id"])
+    got["role"] = "admin"
+    assert "role" not in store.get_by_id(u["id"])
+
+
+def test_route_writes_and_store_saves_do_not_race(tmp_path: Path):
+    import threading
+    uf = tmp_path / "users.json"
+    store = FileUserStore(uf)
+    errors = []
+
+    def route_writes():
+        for i in range(50):
+            try:
+                write_users_file(uf, {f"u_r{i}": {"id": f"u_r{i}", "email": f"r{i}@example.com"}})
+            except Exception as e:
+                errors.append(e)
+
+    def store_saves():
+        for i in range(50):
+            try:
+                store._save({"version": 1, "users": [{"id": f"u_s{i}", "email": f"s{i}@example.com"}]})
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=route_writes), threading.Thread(target=store_saves)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == [] and not uf.with_suffix(".tmp").exists()
+    json.loads(uf.read_text(encoding="utf-8"))
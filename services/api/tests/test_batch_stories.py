@@ -0,0 +1,97 @@
+# services/api/tests/test_batch_stories.py
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from services.api import llm_selector
+from services.api.app import app
+from services.api.core.repos import ensure_features_schema, ensure_plans_schema
+from services.api.core.shared import _create_engine, _database_url
+
+
+class StoryLLM:
+    """Returns one story per feature, failing for features named 'broken'."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def agenerate_text(self, user_prompt, system_prompt=""):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.05)
+            feature = user_prompt.split("FEATURE: ", 1)[1].splitlines()[0]
+            if feature == "broken":
+                raise RuntimeError("provider down")
+            return json.dumps({"user_stories": [{"title": f"As a user I want {feature}", "tasks": [{"title": "t"}]}]})
+        finally:
+            self.active -= 1
+
+    def generate_text(self, user_prompt, system_prompt=""):
+        raise AssertionError("async path expected")
+
+
+@pytest.fixture()
+def plan(repo_root: Path, monkeypatch):
+    engine = _create_engine(_database_url(repo_root))
+    ensure_plans_schema(engine)
+    ensure_features_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO plans (id, project_id, request, owner, artifacts, name) "
+            "VALUES ('pl1', 'proj1', 'r', 'u', '{}', 'Plan one')"
+        ))
+        for i, name in enumerate(["search", "broken", "export", "sharing", "tags"]):
+            conn.execute(text(
+                "INSERT INTO features (id, plan_id, name, description, priority_order) "
+                "VALUES (:id, 'pl1', :name, 'd', :i)"
+            ), {"id": f"f{i}", "name": name, "i": i})
+    llm = StoryLLM()
+    resolved = []
+    monkeypatch.setattr(llm_selector, "get_llm_for_project", lambda pid, step: resolved.append(pid) or llm)
+    monkeypatch.setenv("STORY_BATCH_CONCURRENCY", "2")
+    return llm, resolved
+
+
+def _events(body: str):
+    out = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_batch_streams_progress_and_writes_one_file(plan, repo_root):
+    llm, resolved = plan
+    with TestClient(app) as client:
+        r = client.post("/api/plans/pl1/generate-stories")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/event-stream")
+    events = _events(r.text)
+    progress = [d for e, d in events if e == "feature"]
+    assert len(progress) == 5 and [d["completed"] for d in progress] == [1, 2, 3, 4, 5]
+    assert {d["feature_id"]: d["status"] for d in progress}["f1"] == "error"
+    event, done = events[-1]
+    assert event == "done" and done["failed"][0]["feature_id"] == "f1"
+    assert resolved == ["proj1"]  # the client was resolved once for the whole batch
+    assert llm.peak == 2
+
+    saved = json.loads(Path(done["stories_file"]).read_text())
+    assert saved["plan_id"] == "pl1"
+    assert [f["feature_id"] for f in saved["features"]] == ["f0", "f2", "f3", "f4"]
+    assert [s["id"] for s in saved["user_stories"]] == ["story-f0-1", "story-f2-1", "story-f3-1", "story-f4-1"]
+    assert len(list(Path(done["stories_file"]).parent.glob("*user-stories.json"))) == 1
+
+
+def test_batch_selected_features(plan):
+    with TestClient(app) as client:
+        r = client.post("/api/plans/pl1/generate-stories", json={"feature_ids": ["f4", "f2"]})
+        missing = client.post("/api/plans/pl1/generate-stories", json={"feature_ids": ["nope"]})
+    events = _events(r.text)
+    assert sorted(d["feature_id"] for e, d in events if e == "feature") == ["f2", "f4"]
+    assert events[-1][1]["failed"] == []
+    assert missing.status_code == 404
@@ -0,0 +1,93 @@
+# services/api/tests/test_history_context.py
+from sqlalchemy import event
+
+from services.api.core.repos import InteractionHistoryRepoDB
+from services.api.core.shared import _create_engine, _database_url
+from services.api.planner.core import _get_chat_history_context
+from services.api.planner.history_context import build_history_context, fold_summary
+
+
+def _engine(repo_root):
+    return _create_engine(_database_url(repo_root))
+
+
+def _add(repo, project, n, start=0, step=None):
+    for i in range(start, start + n):
+        repo.add({"project_id": project, "role": "user", "prompt": f"message {i}", "response": f"answer {i}", "step": step})
+
+
+def test_keeps_newest_rows_in_order_and_scopes_by_project(repo_root):
+    repo = InteractionHistoryRepoDB(_engine(repo_root))
+    _add(repo, "p1", 15)
+    _add(repo, "p2", 3, start=100)
+    ctx = build_history_context("p1", limit=5, engine=_engine(repo_root))
+    assert ctx.startswith("\n## Previous Interactions (for context):\n")
+    shown = [i for i in range(15) if f"**User**: message {i}\n" in ctx]
+    assert shown == [10, 11, 12, 13, 14]
+    assert ctx.index("message 10") < ctx.index("message 14")
+    assert "message 100" not in ctx
+    # rows that left the window went into the summary
+    assert "Earlier conversation (summary)" in ctx and "- user: message 9" in ctx
+    assert "message 100" in build_history_context(None, limit=5, engine=_engine(repo_root))
+
+
+def test_summary_rolls_forward_and_reads_stay_bounded(repo_root):
+    engine = _engine(repo_root)
+    repo = InteractionHistoryRepoDB(engine)
+    _add(repo, "p", 12)
+    build_history_context("p", limit=5, engine=engine)
+    state = repo.get_summary("p")
+    assert state["covered_rows"] == 7
+
+    _add(repo, "p", 3, start=12)
+    statements = []
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def capture(conn, cursor, statement, params, context, executemany):
+        statements.append(" ".join(statement.split()))
+
+    ctx = build_history_context("p", limit=5, engine=engine)
+    event.remove(engine, "after_cursor_execute", capture)
+    assert repo.get_summary("p")["covered_rows"] == 10
+    # only rows newer than the watermark were fetched
+    assert len(repo.list_recent("p", limit=100, after=state["covered_until"])) == 8
+    assert "- user: message 9" in ctx and "**User**: message 14\n" in ctx
+    # history rows come from one bounded, newest-first query
+    [query] = [q for q in statements if q.startswith("SELECT") and "FROM interaction_history " in q]
+    assert "ORDER BY interaction_history.created_at DESC" in query and "LIMIT" in query
+
+
+def test_token_budget_caps_the_context(repo_root):
+    repo = InteractionHistoryRepoDB(_engine(repo_root))
+    for i in range(10):
+        repo.add({"project_id": "p", "role": "user", "prompt": f"{i} " + "x" * 190, "response": "y" * 190})
+    ctx = build_history_context("p", limit=10, token_budget=200, engine=_engine(repo_root))
+    assert len(ctx) <= 800
+    assert "9 xxx" in ctx and "0 xxx" not in ctx  # the newest turns win
+
+
+def test_fold_summary_drops_oldest_lines_beyond_limit():
+    rows = [{"role": "user", "prompt": f"line {i}"} for i in range(10)]
+    s = fold_summary("", rows, max_chars=60)
+    assert len(s) <= 60 and s.endswith("- user: line 9")
+    assert fold_summary("- user: old", [{"role": "assistant", "prompt": "", "response": "new\nmore"}], 100) == \
+        "- user: old\n- assistant: new"
+
+
+def test_summaries_are_kept_per_step_over_chat_and_step_rows(repo_root):
+    engine = _engine(repo_root)
+    repo = InteractionHistoryRepoDB(engine)
+    _add(repo, "p", 8)  # plain chat turns, recorded without a step
+    _add(repo, "p", 4, start=50, step="adr_generation")
+    prd = build_history_context("p", step="prd_generation", limit=3, engine=engine)
+    assert "message 7" in prd and "message 50" not in prd
+    assert repo.get_summary("p", "prd_generation")["covered_rows"] == 5
+    adr = build_history_context("p", step="adr_generation", limit=3, engine=engine)
+    assert "**User**: message 53\n" in adr and "- user: message 7" in adr
+    assert repo.get_summary("p", "adr_generation")["covered_rows"] == 9
+    assert repo.get_summary("p") is None  # the unscoped summary was never touched
+
+
+def test_legacy_helper_returns_empty_without_history(repo_root):
+    assert _get_chat_history_context("nobody", "prd_generation") == ""
+    assert _get_chat_history_context(None) == ""
@@ -0,0 +1,88 @@
+# services/api/tests/test_llm_async.py
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.api import llm_http
+from services.api.app import app
+from services.api.llm import MockLLM, OllamaLLM, SupabaseLLM, agenerate_plan, agenerate_text
+
+
+@pytest.fixture()
+def fake_llm_server():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path == "/api/generate":  # ollama
+                body = json.dumps({"response": json.dumps({"prd_markdown": "# Async PRD", "openapi_yaml": "openapi: 3.1.0"})})
+            else:  # supabase chat function (SSE)
+                body = "".join(
+                    f"data: {json.dumps({'choices': [{'delta': {'content': c}}]})}\n\n" for c in ("hel", "lo")
+                ) + "data: [DONE]\n\n"
+            raw = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{srv.server_address[1]}"
+    finally:
+        srv.shutdown()
+
+
+def test_async_providers_match_sync_results(fake_llm_server):
+    ollama = OllamaLLM(base_url=fake_llm_server, model="m")
+    supa = SupabaseLLM(fake_llm_server, "key")
+
+    async def main():
+        try:
+            return (
+                await agenerate_plan(ollama, "x"),
+                await agenerate_text(supa, "hi"),
+            )
+        finally:
+            await llm_http.aclose_http_clients()
+
+    artifacts, text = asyncio.run(main())
+    assert artifacts == ollama.generate_plan("x")
+    assert text == "hello" == supa.generate_text("hi")
+    llm_http.close_http_clients()
+
+
+def test_sync_only_clients_run_off_the_event_loop():
+    loop_thread = []
+
+    class SyncOnly:
+        def generate_plan(self, text):
+            loop_thread.append(threading.get_ident())
+            return MockLLM().generate_plan(text)
+
+    async def main():
+        return threading.get_ident(), await agenerate_plan(SyncOnly(), "x")
+
+    caller, artifacts = asyncio.run(main())
+    assert "MockLLM" in artifacts.prd_markdown
+    assert loop_thread and loop_thread[0] != caller
+
+
+def test_generation_endpoints_are_async_and_serve_mock(repo_root):
+    with TestClient(app) as client:
+        r = client.post("/api/plan/generate", json={"project_id": "no-such-project", "project_name": "Demo"})
+        assert r.status_code == 200, r.text
+        assert r.json()["plan"]["implementation_plan"][0]["id"] == "plan-1"
+
+        r = client.post("/api/prd/generate", json={"project_id": "no-such-project", "project_name": "Demo", "include_chat_history": False})
+        assert r.status_code == 200, r.text
+        assert "Product Requirements Document" in r.json()["prd_content"]
@@ -0,0 +1,133 @@
+# services/api/tests/test_llm_cache.py
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.api import llm_cache
+from services.api.llm import MockLLM, get_llm_from_env
+from services.api.llm_cache import CachedLLM, LLMCacheBypassMiddleware, LLMResponseCache, bypass_llm_cache, with_response_cache
+
+
+class CountingLLM:
+    """Stand-in provider that counts upstream calls."""
+    temperature = 0.2
+
+    def __init__(self, model="m1"):
+        self.model = model
+        self.calls = 0
+
+    def generate_plan(self, user_request):
+        self.calls += 1
+        return MockLLM().generate_plan(f"{user_request} #{self.calls}")
+
+
+class CountingTextLLM(CountingLLM):
+    def generate_text(self, user_prompt, system_prompt=""):
+        self.calls += 1
+        return f"{system_prompt}|{user_prompt}|{self.calls}"
+
+
+def test_repeat_prompt_is_served_from_memory_then_disk(tmp_path):
+    db = tmp_path / "cache.db"
+    inner = CountingLLM()
+    client = CachedLLM(inner, LLMResponseCache(db))
+    first = client.generate_plan("todo api")
+    assert client.generate_plan("todo api") == first
+    assert inner.calls == 1
+    assert client.cache.stats["memory_hits"] == 1
+
+    # new process: fresh memory tier, same file
+    restarted = CachedLLM(inner, LLMResponseCache(db))
+    assert restarted.generate_plan("todo api") == first
+    assert inner.calls == 1
+    assert restarted.cache.snapshot()["disk_hits"] == 1
+
+
+def test_key_covers_model_temperature_and_prompts(tmp_path):
+    cache = LLMResponseCache(tmp_path / "c.db")
+    a, b = CountingTextLLM("m1"), CountingTextLLM("m2")
+    CachedLLM(a, cache).generate_text("u", "s")
+    CachedLLM(b, cache).generate_text("u", "s")        # other model
+    CachedLLM(a, cache).generate_text("u", "other")    # other system prompt
+    a.temperature = 0.9
+    CachedLLM(a, cache).generate_text("u", "s")        # other temperature
+    assert a.calls + b.calls == 4
+    assert cache.snapshot()["hit_rate"] == 0.0
+
+
+def test_ttl_and_lru_eviction(tmp_path):
+    cache = LLMResponseCache(tmp_path / "c.db", ttl_s=0.05, max_entries=2, memory_entries=1)
+    cache.put("a", "1")
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+    cache.ttl_s = 0
+    for k in ("x", "y", "z"):
+        cache.put(k, k)
+        time.sleep(0.01)
+    assert cache.stats["evictions"] >= 1
+    assert cache.get("x") is None and cache.get("z") == "z"
+
+
+def test_bypass_refreshes_entry(tmp_path):
+    inner = CountingTextLLM()
+    client = CachedLLM(inner, LLMResponseCache(tmp_path / "c.db"))
+    assert client.generate_text("p") == "|p|1"
+    with bypass_llm_cache():
+        assert client.generate_text("p") == "|p|2"
+    assert client.generate_text("p") == "|p|2"
+    assert client.cache.stats["bypassed"] == 1
+
+
+def test_async_path_shares_entries(tmp_path):
+    inner = CountingTextLLM()
+    client = CachedLLM(inner, LLMResponseCache(tmp_path / "c.db"))
+    sync = client.generate_text("p", "s")
+    assert asyncio.run(client.agenerate_text("p", "s")) == sync
+    assert inner.calls == 1
+
+
+def test_async_path_keeps_sqlite_off_the_event_loop(tmp_path):
+    import threading
+    cache = LLMResponseCache(tmp_path / "c.db")
+    threads = []
+    for name in ("get", "put"):
+        real = getattr(cache, name)
+        setattr(cache, name, lambda *a, _real=real: threads.append(threading.get_ident()) or _real(*a))
+    client = CachedLLM(CountingTextLLM(), cache)
+
+    async def main():
+        first = await client.agenerate_text("p")
+        return threading.get_ident(), first, await client.agenerate_text("p")
+
+    loop_thread, first, second = asyncio.run(main())
+    assert first == second == "|p|1"
+    assert len(threads) == 3 and loop_thread not in threads  # miss, store, hit
+
+
+def test_wrapper_preserves_capability_checks():
+    assert not hasattr(CachedLLM(CountingLLM()), "generate_text")
+    assert hasattr(CachedLLM(CountingTextLLM()), "generate_text")
+    assert isinstance(get_llm_from_env(), MockLLM)  # mock is never cached
+
+
+def test_wrapping_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "off")
+    inner = CountingLLM()
+    assert with_response_cache(inner) is inner
+
+
+def test_bypass_header_reaches_sync_handlers():
+    app = FastAPI()
+
+    @app.get("/probe")
+    def probe():
+        return {"bypass": llm_cache._BYPASS.get()}
+
+    app.add_middleware(LLMCacheBypassMiddleware)
+    with TestClient(app) as c:
+        assert c.get("/probe").json() == {"bypass": False}
+        assert c.get("/probe", headers={"Cache-Control": "no-cache"}).json() == {"bypass": True}
+        assert c.get("/probe", headers={"X-LLM-Cache": "bypass"}).json() == {"bypass": True}
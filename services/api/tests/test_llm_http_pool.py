@@ -0,0 +1,75 @@
+# services/api/tests/test_llm_http_pool.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.api import llm_http
+from services.api.llm import OllamaLLM
+
+
+@pytest.fixture()
+def ollama_server():
+    peers = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            peers.append(self.client_address)
+            body = json.dumps({"response": json.dumps({"prd_markdown": "# PRD", "openapi_yaml": "openapi: 3.1.0"})}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_HEAD(self):
+            peers.append(self.client_address)
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{srv.server_address[1]}", peers
+    finally:
+        srv.shutdown()
+        llm_http.close_http_clients()
+
+
+def test_providers_reuse_one_connection(ollama_server):
+    base, peers = ollama_server
+    for _ in range(3):
+        # a fresh provider object per call still shares the pooled client
+        OllamaLLM(base_url=base, model="m").generate_plan("x")
+    assert len(peers) == 3
+    assert len(set(peers)) == 1
+
+
+def test_prewarm_opens_connection_used_by_first_call(ollama_server):
+    base, peers = ollama_server
+    assert llm_http.prewarm([base]) == [llm_http._origin(base)]
+    OllamaLLM(base_url=base, model="m").generate_plan("x")
+    assert len(set(peers)) == 1
+
+
+def test_clients_are_per_origin_and_recreated_after_close():
+    a = llm_http.get_http_client("https://api.openai.com/v1/chat/completions")
+    assert llm_http.get_http_client("https://api.openai.com/other") is a
+    assert llm_http.get_http_client("https://api.anthropic.com/v1/messages") is not a
+    llm_http.close_http_clients()
+    assert a.is_closed
+    assert llm_http.get_http_client("https://api.openai.com/x") is not a
+    llm_http.close_http_clients()
+
+
+def test_prewarm_ignores_unreachable_hosts():
+    assert llm_http.prewarm(["http://127.0.0.1:9"], timeout=0.5) == []
+    llm_http.close_http_clients()
@@ -0,0 +1,71 @@
+# services/api/tests/test_llm_json_stream.py
+import json
+import random
+from dataclasses import asdict
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from services.api.app import app
+from services.api.core.repos import ensure_features_schema, ensure_plans_schema
+from services.api.core.shared import _create_engine, _database_url
+from services.api.llm import MockLLM, _artifacts_from_json
+from services.api.llm_json import ITEM_EVENT, PlanStreamParser
+
+
+def _plan_json() -> dict:
+    obj = asdict(MockLLM().generate_plan('notes "search" {v2}'))
+    obj["implementation_plan"].append({"id": "plan-2", "name": "tricky ]} name", "features": []})
+    return obj
+
+
+def test_fields_and_items_are_emitted_as_they_close():
+    obj = _plan_json()
+    raw = "```json\n" + json.dumps(obj, indent=2) + "\n```"
+    rnd = random.Random(7)
+    for _ in range(50):
+        parser, events, i = PlanStreamParser(), [], 0
+        while i < len(raw):
+            n = rnd.randint(1, 17)
+            events += parser.feed(raw[i:i + n])
+            i += n
+        assert [e for e, _ in events] == ["prd_markdown", "openapi_yaml", ITEM_EVENT, ITEM_EVENT]
+        assert asdict(parser.finish()) == obj
+        assert parser.complete
+
+
+def test_first_item_is_available_before_the_stream_ends():
+    raw = json.dumps(_plan_json())
+    cut = raw.index('"plan-2"')
+    events = PlanStreamParser().feed(raw[:cut])
+    assert events[-1][0] == ITEM_EVENT and events[-1][1]["id"] == "plan-1"
+
+
+def test_truncated_tail_keeps_closed_parts():
+    raw = json.dumps(_plan_json())
+    broken = raw[: raw.index('"plan-2"') + 10]  # dies mid-item
+    artifacts = _artifacts_from_json(broken)
+    assert artifacts.prd_markdown.startswith("# Product Requirements")
+    assert [p["id"] for p in artifacts.implementation_plan] == ["plan-1"]
+
+
+def test_stream_endpoint_saves_each_plan_while_streaming(repo_root: Path):
+    engine = _create_engine(_database_url(repo_root))
+    ensure_plans_schema(engine)
+    ensure_features_schema(engine)
+    with TestClient(app) as client:
+        r = client.post("/api/plan/generate/stream", json={"project_id": "proj-1", "save_plans": True})
+    events = []
+    for block in r.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    names = [e for e, _ in events if e != "token"]
+    assert names == ["prd_markdown", "openapi_yaml", "plan", "plan_saved", "done"]
+    saved_id = events[[e for e, _ in events].index("plan_saved")][1]["plan_id"]
+    assert events[-1][1]["saved_plan_ids"] == [saved_id]
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT name, size_estimate FROM plans WHERE id = :id"), {"id": saved_id}).fetchone()
+        n_features = conn.execute(text("SELECT COUNT(*) FROM features WHERE plan_id = :id"), {"id": saved_id}).scalar()
+    assert row[0] == "Primary Delivery Plan" and row[1] == 12
+    assert n_features == 3
@@ -0,0 +1,184 @@
+# services/api/tests/test_llm_limits.py
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from services.api import llm_http, llm_limits
+from services.api.llm import OllamaLLM
+from services.api.llm_limits import LLMThrottled, ProviderLimiter, TokenBucket, limiter_for, parse_retry_after
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiters():
+    llm_limits.reset_limiters()
+    yield
+    llm_limits.reset_limiters()
+
+
+def test_concurrency_is_capped_and_waiters_run_in_order():
+    lim = ProviderLimiter("t", max_concurrency=2)
+    peak, running, order = [0], [0], []
+    lock = threading.Lock()
+
+    def call(i):
+        with lim.slot():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+                order.append(i)
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+    threads = []
+    for i in range(6):
+        t = threading.Thread(target=call, args=(i,))
+        t.start()
+        threads.append(t)
+        time.sleep(0.005)  # enqueue in a known order
+    for t in threads:
+        t.join()
+    assert peak[0] == 2
+    assert order == list(range(6))
+    assert lim.snapshot()["succeeded"] == 6
+
+
+def test_full_queue_rejects_and_deadline_times_out():
+    lim = ProviderLimiter("t", max_concurrency=1, max_queue=1, queue_timeout_s=0.1)
+    lim.acquire()
+    waiter = threading.Thread(target=lambda: pytest.raises(LLMThrottled, lim.acquire))
+    waiter.start()
+    time.sleep(0.02)
+    with pytest.raises(LLMThrottled, match="already queued"):
+        lim.acquire()
+    waiter.join()
+    s = lim.snapshot()
+    assert s["rejected"] == 1 and s["timed_out"] == 1 and s["queued"] == 0 and s["in_flight"] == 1
+
+
+def test_aimd_halves_on_429_and_recovers_additively():
+    lim = ProviderLimiter("t", max_concurrency=8, backoff_window_s=0)
+    lim.acquire()
+    lim.release(429)
+    assert lim.limit == 4
+    lim.acquire()
+    lim.release(503)
+    assert lim.limit == 2
+    for _ in range(4):
+        lim.acquire()
+        lim.release(200)
+    assert 2 < lim.limit < 4
+    assert lim.snapshot()["throttled"] == 1 and lim.snapshot()["failed"] == 1
+
+
+def test_simultaneous_429s_back_off_once_per_window():
+    lim = ProviderLimiter("t", max_concurrency=8, backoff_window_s=60)
+    for _ in range(3):
+        lim.acquire()
+    for _ in range(3):
+        lim.release(429)
+    assert lim.limit == 4
+
+
+def test_retry_after_pauses_admission():
+    lim = ProviderLimiter("t", max_concurrency=4)
+    lim.acquire()
+    lim.release(429, retry_after=0.2)
+    started = time.monotonic()
+    lim.acquire()
+    assert time.monotonic() - started >= 0.15
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate=10, capacity=1)
+    now = time.monotonic()
+    assert bucket.wait_time(1, now) == 0
+    bucket.take(1)
+    assert bucket.wait_time(1, now) == pytest.approx(0.1, abs=0.01)
+    assert TokenBucket(rate=0, capacity=0).wait_time(10**6, now) == 0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("garbage") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+def test_async_slots_share_the_limit():
+    lim = ProviderLimiter("t", max_concurrency=1)
+    active, peak = [0], [0]
+
+    async def call():
+        async with lim.aslot():
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            await asyncio.sleep(0.02)
+            active[0] -= 1
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(4)))
+
+    asyncio.run(run())
+    assert peak[0] == 1
+    assert lim.snapshot()["admitted"] == 4
+
+
+def test_env_overrides_per_provider(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY", "5")
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY_OPENAI", "3")
+    assert limiter_for("openai", "gpt").max_concurrency == 3
+    assert limiter_for("anthropic", "claude").max_concurrency == 5
+    assert limiter_for("openai", "gpt") is limiter_for("openai", "gpt")
+
+
+@pytest.fixture()
+def throttling_server():
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = json.dumps({"response": json.dumps({"prd_markdown": "# PRD", "openapi_yaml": "openapi: 3.1.0"})}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{srv.server_address[1]}", calls
+    finally:
+        srv.shutdown()
+        llm_http.close_http_clients()
+
+
+def test_provider_429_feeds_the_limiter(throttling_server):
+    base, calls = throttling_server
+    client = OllamaLLM(base_url=base, model="m")
+    with pytest.raises(httpx.HTTPStatusError):
+        client.generate_plan("x")
+    s = limiter_for("ollama", "m").snapshot()
+    assert s["throttled"] == 1 and s["limit"] == 1 and s["paused_for_s"] > 0.5
+    # the next call waits out Retry-After before reaching the server
+    assert client.generate_plan("x").prd_markdown == "# PRD"
+    assert calls[1] - calls[0] >= 0.9
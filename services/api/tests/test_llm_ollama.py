@@ -0,0 +1,114 @@
+# services/api/tests/test_llm_ollama.py
+import asyncio
+import time
+
+import pytest
+
+from services.api import llm_http, llm_ollama
+from services.api.llm import OllamaLLM
+from services.api.llm_limits import limiter_for, reset_limiters
+from services.api.llm_ollama import pack_answers, pack_requests, run_bench, unpack_answers, unpack_requests, warmer
+from services.api.llm_standin import StandinConfig, StandinServer, parse_keep_alive
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    llm_ollama.reset_ollama_stats()
+    reset_limiters()
+    yield
+    llm_ollama.reset_ollama_stats()
+    reset_limiters()
+    llm_http.close_http_clients()
+
+
+def test_requests_carry_keep_alive_and_options(monkeypatch):
+    client = OllamaLLM("http://x", "llama3.1:8b")
+    _, _, data = client._text_request("hi", "sys")
+    assert data["keep_alive"] == "10m" and data["options"] == {"num_ctx": 4096} and data["system"] == "sys"
+    monkeypatch.setenv("OLLAMA_NUM_CTX", "8192")
+    monkeypatch.setenv("OLLAMA_NUM_PREDICT", "512")
+    monkeypatch.setenv("OLLAMA_KEEP_ALIVE", "server")
+    _, data = client._request("notes", stream=True)
+    assert "keep_alive" not in data and data["options"] == {"num_ctx": 8192, "num_predict": 512}
+    assert data["stream"] is True and "http://x#llama3.1:8b" in warmer.snapshot()["idle_s"]
+
+    monkeypatch.setenv("OLLAMA_NUM_PARALLEL", "3")
+    assert limiter_for("ollama", "m").max_concurrency == 3
+    assert limiter_for("openai", "m").max_concurrency == 8
+    assert parse_keep_alive("1h30m", 5) == 5400 and parse_keep_alive(-1, 5) == float("inf")
+
+
+def test_warm_ping_loads_the_model_before_the_first_call():
+    cfg = StandinConfig(latency="fixed:0", load_delay=0.3, unload_after=0.2)
+    with StandinServer(cfg) as srv:
+        client = OllamaLLM(srv.url, "llama")
+        warmer.track(srv.url, "llama")
+        assert warmer.due(60) == [(srv.url, "llama")]
+        assert warmer.ping(srv.url, "llama") and warmer.snapshot()["load_ms_last"] >= 300
+        assert warmer.due(60) == []
+        time.sleep(0.3)  # past the server default, but the ping asked for 10 minutes
+        started = time.monotonic()
+        assert client.generate_text("hello").startswith("Stand-in response to: hello")
+        assert time.monotonic() - started < 0.25
+        assert srv.counts["loads"] == 1  # only the ping paid for the load
+
+        # pings are not traffic: once real calls stop for max_idle the model is let go
+        assert warmer.ping(srv.url, "llama") and warmer.due(0, max_idle=60) == [(srv.url, "llama")]
+        time.sleep(0.05)
+        assert warmer.due(0, max_idle=0.01) == [] and warmer.snapshot()["idle_s"] == {}
+
+    # an unreachable server is dropped until its next real call
+    llm_http.close_http_clients()
+    assert not warmer.ping(srv.url, "llama") and warmer.due(0) == []
+    assert warmer.snapshot()["failures"] == 1
+
+
+def test_small_prompts_are_packed_into_one_request(monkeypatch):
+    monkeypatch.setenv("OLLAMA_BATCH_SIZE", "4")
+    monkeypatch.setenv("OLLAMA_BATCH_WINDOW_MS", "50")
+    prompts = [f"question {i}" for i in range(5)]
+    assert unpack_requests(pack_requests(prompts)) == prompts and unpack_requests("plain") is None
+    assert unpack_answers("=== ANSWER 2 ===\nb\n=== answer 1 ===\na\n", 3) == ["a", "b", None]
+
+    # recordings match each packed prompt; the empty third answer is asked again on its own
+    recordings = [{"match": f"question {i}", "response": f"a{i}" if i != 2 else ""} for i in range(4)]
+    with StandinServer(StandinConfig(latency="fixed:0", recordings=recordings)) as srv:
+        client = OllamaLLM(srv.url, "llama")
+
+        async def main():
+            try:
+                return await asyncio.gather(*(client.agenerate_text(p) for p in prompts))
+            finally:
+                await llm_http.aclose_http_clients()
+
+        answers = asyncio.run(main())
+        assert answers[:4] == ["a0", "a1", "", "a3"] and answers[4] == "Stand-in response to: question 4"
+        assert srv.counts["ok"] == 3  # one batch of four, the retry, the fifth prompt alone
+    assert llm_ollama.batcher.stats == {"direct": 1, "batches": 1, "batched_prompts": 4, "fallbacks": 1}
+
+    # a batch that fails before it is sent still answers every submitter
+    class Broken(OllamaLLM):
+        def _text_request(self, user_prompt, system_prompt):
+            raise ValueError("bad request")
+
+    async def broken():
+        results = await asyncio.gather(*(Broken("http://x", "m").agenerate_text(p) for p in prompts[:2]),
+                                       return_exceptions=True)
+        await asyncio.sleep(0.01)  # let the finished batch task drop out
+        return results, len(llm_ollama.batcher._tasks)
+
+    results, running = asyncio.run(asyncio.wait_for(broken(), 5))
+    assert [str(r) for r in results] == ["bad request", "bad request"] and running == 0
+
+    assert pack_answers(["x", "y"]) == "=== ANSWER 1 ===\nx\n\n=== ANSWER 2 ===\ny"
+    monkeypatch.delenv("OLLAMA_BATCH_SIZE")
+    assert llm_ollama.ollama_stats()["batch_size"] == 1  # off by default
+
+
+def test_bench_shows_fewer_loads_and_requests():
+    kwargs = dict(load_delay=0.3, unload_after=0.1, latency="fixed:0.02", bursts=2, prompts=4, idle=0.25)
+    baseline = run_bench(tuned=False, **kwargs)
+    tuned = run_bench(tuned=True, **kwargs)
+    assert (baseline["loads"], baseline["requests"]) == (2, 8)
+    assert (tuned["loads"], tuned["requests"]) == (1, 2)
+    assert tuned["p50_s"] < baseline["p50_s"]
@@ -0,0 +1,122 @@
+# services/api/tests/test_llm_prompt.py
+import pytest
+
+from services.api import llm_prompt
+from services.api.llm import OllamaLLM, OpenAIChatLLM
+from services.api.llm_prompt import (
+    ARTIFACTS, HISTORY, REQUEST, PromptBuilder, context_window, count_tokens, prompt_budget, truncate_tokens,
+)
+from services.api.llm_router import RoutedLLM
+from services.api.llm_telemetry import tag_llm_client
+from services.api.planner.core import _prd_prompt
+from services.api.routes.feature_stories import _story_prompt
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    llm_prompt.reset_prompt_stats()
+    yield
+    llm_prompt.reset_prompt_stats()
+
+
+def test_count_tokens_approximates_bpe():
+    assert count_tokens("") == 0
+    assert count_tokens("Hello, world!") == 4
+    assert count_tokens("requirements") == 2  # long words cost more than one token
+    assert count_tokens("123456") == 2
+    text = "Build a notes service with auth. " * 50
+    assert count_tokens(text) == 50 * count_tokens("Build a notes service with auth. ")
+
+
+def test_truncation_is_deterministic_and_bounded():
+    text = " ".join(f"word{i}" for i in range(200))
+    head = truncate_tokens(text, 40)
+    assert head.startswith("word0 ") and head.endswith("tokens omitted]") and count_tokens(head) <= 40
+    tail = truncate_tokens(text, 40, keep="tail")
+    assert tail.startswith("[...") and tail.endswith("word199") and count_tokens(tail) <= 40
+    assert truncate_tokens(text, 40) == head
+    assert truncate_tokens("short", 40) == "short" and truncate_tokens(text, 0) == ""
+
+
+def test_sections_are_granted_by_priority():
+    b = PromptBuilder(budget=120, system_prompt="be brief")
+    b.text("REQUEST: ").section("request", "notes app " * 20, REQUEST)
+    b.text("\nPRD:\n").section("prd", "lorem ipsum " * 200, ARTIFACTS)
+    b.text("\nHISTORY:\n").section("history", "turn " * 100, HISTORY, keep="tail")
+    built = b.build("prd_generation")
+    assert built.tokens <= 120
+    request, prd, history = built.sections
+    assert not request["truncated"] and request["tokens"] == 40
+    assert history["truncated"] and history["tokens"] > 0
+    assert prd["dropped"] and prd["tokens"] == 0 and prd["original_tokens"] == 400
+    assert built.text.startswith("REQUEST: notes app") and "HISTORY:\n[..." in built.text
+
+    stats = llm_prompt.prompt_stats()["prd_generation"]
+    assert (stats["builds"], stats["truncated"], stats["tokens_max"]) == (1, 1, built.tokens)
+    assert stats["last"]["sections"][2]["name"] == "history"
+
+
+def test_budgets_follow_the_model(monkeypatch):
+    assert context_window("openai", "gpt-4o-mini") == 128000
+    assert context_window("anthropic", "claude-3-5-haiku-latest") == 200000
+    assert context_window("ollama", "llama3.1:8b") == 4096
+    monkeypatch.setenv("OLLAMA_NUM_CTX", "16384")
+    assert context_window("ollama", "llama3.1:8b") == 16384
+    monkeypatch.setenv("LLM_CONTEXT_TOKENS_GPT_4O_MINI", "5000")
+    assert prompt_budget(OpenAIChatLLM("k", "gpt-4o-mini")) == 5000 - 2048
+    # a failover chain must fit its smallest window
+    chain = tag_llm_client(RoutedLLM([OpenAIChatLLM("k", "gpt-4o"), OllamaLLM("http://x", "llama3")]), step="s")
+    assert prompt_budget(chain) == 16384 - 2048
+    monkeypatch.setenv("LLM_PROMPT_BUDGET_TOKENS", "1000")
+    assert prompt_budget(chain) == 1000
+
+
+def test_generation_prompts_fit_and_keep_the_request(monkeypatch):
+    feature = {"name": "Tagging", "description": "Tag notes", "priority": "high", "size_estimate": 3}
+    plan = {"name": "MVP", "description": "First release"}
+    project = {"title": "Notes", "description": "Notes service"}
+    small = _story_prompt(feature, plan, project)
+    assert "PROJECT DESCRIPTION: Notes service\n\nPLAN: MVP" in small and "FEATURE: Tagging" in small
+
+    monkeypatch.setenv("LLM_PROMPT_BUDGET_TOKENS", "600")
+    project["description"] = "A very long project description. " * 500
+    big = _story_prompt(feature, plan, project)
+    assert "tokens omitted]" in big and "FEATURE DESCRIPTION: Tag notes" in big
+    assert llm_prompt.prompt_stats()["story_generation"]["last"]["tokens"] <= 600
+
+    history = "\n".join(f"**User**: message {i}" for i in range(500))
+    prd = _prd_prompt("Build a notes service", history, {}, {})
+    assert "USER REQUEST: Build a notes service" in prd and "message 499" in prd and "message 0\n" not in prd
+    assert "TECHNICAL STACK:" in prd and prd.endswith("Make it comprehensive and professional.")
+
+
+def test_prd_generation_sends_the_fitted_prompt(monkeypatch):
+    import asyncio
+    from services.api.planner import core
+
+    class TextLLM:
+        def __init__(self):
+            self.sent = []
+
+        def generate_text(self, user_prompt, system_prompt=""):
+            self.sent.append((user_prompt, system_prompt))
+            return "# PRD\n"
+
+        def generate_plan(self, user_request):
+            raise AssertionError("text clients get the PRD prompt")
+
+    llm = TextLLM()
+    monkeypatch.setenv("LLM_PROMPT_BUDGET_TOKENS", "600")
+    monkeypatch.setattr(core, "get_llm_from_env", lambda step=None: llm)
+    history = "\n".join(f"**User**: message {i}" for i in range(500))
+    asked = []
+    monkeypatch.setattr(core, "_get_chat_history_context",
+                        lambda project_id, step=None, limit=10: asked.append((project_id, step)) or history)
+    monkeypatch.setattr("services.api.llm_selector.get_llm_for_project", lambda project_id, step: llm)
+    prd = asyncio.run(core._agenerate_prd_with_llm("Notes\nA notes service", "u", {}, {}, project_id="proj-1"))
+    assert asked == [("proj-1", "prd_generation")]
+    assert prd == "# PRD"
+    prompt, system = llm.sent[0]
+    assert system == core._PRD_SYSTEM_PROMPT and "USER REQUEST: Notes\nA notes service\n\n[..." in prompt
+    assert "message 499" in prompt and "message 0\n" not in prompt  # project history is cut, not the request
+    assert llm_prompt.prompt_stats()["prd_generation"]["builds"] == 1
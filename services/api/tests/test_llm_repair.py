@@ -0,0 +1,108 @@
+# services/api/tests/test_llm_repair.py
+import asyncio
+import json
+
+import pytest
+
+from services.api import llm_http, llm_limits, llm_router
+from services.api.llm import MockLLM, OllamaLLM
+from services.api.llm_repair import (
+    PLAN_SCHEMA, PlanOutputError, load_json_lenient, repair_plan_output, repair_stats, reset_repair_stats, validate,
+)
+from services.api.llm_standin import StandinConfig, StandinServer
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    reset_repair_stats()
+    llm_limits.reset_limiters()
+    llm_router.reset_router_state()
+    yield
+    llm_http.close_http_clients()
+    reset_repair_stats()
+
+
+def _plan():
+    from dataclasses import asdict
+    return asdict(MockLLM().generate_plan("notes"))
+
+
+def test_local_repairs():
+    raw = json.dumps(_plan())
+    assert load_json_lenient(raw) == (_plan(), [])
+    fenced = "Here you go:\n```json\n" + raw.replace("}]}]", "},]},]") + "\n```"
+    assert load_json_lenient(fenced) == (_plan(), ["fence", "trailing_commas"])
+    assert load_json_lenient('{"a": "line\nbreak"}') == ({"a": "line\nbreak"}, ["control_chars"])
+    obj, repairs = load_json_lenient('{"a": [1, {"b": "x"}, {"c": "unfinish')
+    assert obj == {"a": [1, {"b": "x"}]} and repairs == ["truncated"]
+    obj, _ = load_json_lenient('{"a": [{"b": "x"}, {"c": 1, "d": "unfin', mark_truncated=True)
+    assert obj == {"a": [{"b": "x"}, {"c": 1, "__truncated__": True}], "__truncated__": True}
+    with pytest.raises(PlanOutputError):
+        load_json_lenient("no json here")
+
+
+def test_schema_validation_and_coercion():
+    plan = _plan()
+    assert validate(plan, PLAN_SCHEMA) == []
+    del plan["openapi_yaml"]
+    plan["implementation_plan"][0]["features"][0]["priority"] = "urgent"
+    assert validate(plan, PLAN_SCHEMA) == [
+        "/openapi_yaml: missing",
+        "/implementation_plan/0/features/0/priority: must be one of critical, high, medium, low",
+    ]
+
+    messy = _plan()
+    item = messy["implementation_plan"][0]
+    item.pop("id")
+    item["priority"], item["size_estimate_days"] = "HIGH", "12"
+    item["features"][0]["acceptance_criteria"] = "Approved"
+    artifacts = repair_plan_output(json.dumps(messy), model_key="test:m")
+    fixed = artifacts.implementation_plan[0]
+    assert (fixed["id"], fixed["priority"], fixed["size_estimate_days"]) == ("plan-1", "high", 12)
+    assert fixed["features"][0]["acceptance_criteria"] == ["Approved"]
+    assert repair_stats()["test:m"]["repaired_locally"] == 1
+
+
+def test_only_broken_fragments_are_reasked():
+    raw = json.dumps(_plan())
+    truncated = raw[: raw.index('"size_estimate_days"')]  # dies inside the only plan
+    prompts = []
+
+    def reask(user, system):
+        prompts.append(user)
+        assert "This item of the implementation plan" in user and "/implementation_plan/0: cut off" in user
+        return json.dumps(_plan()["implementation_plan"][0])
+
+    artifacts = repair_plan_output(truncated, "notes", reask, model_key="test:m")
+    assert len(prompts) == 1 and artifacts.implementation_plan == _plan()["implementation_plan"]
+    stats = repair_stats()["test:m"]
+    assert stats["reasked"] == 1 and stats["repairs"]["truncated"] == 1 and stats["repair_rate"] == 1.0
+
+    # without a re-ask the invalid item is dropped; a missing PRD cannot be dropped
+    assert repair_plan_output(truncated).implementation_plan == []
+    with pytest.raises(PlanOutputError, match="prd_markdown"):
+        repair_plan_output('{"openapi_yaml": "openapi: 3.1.0", "implementation_plan": []}')
+    # a complete answer without plans is valid; one cut off before them is re-asked
+    plan_less = '{"prd_markdown": "# PRD", "openapi_yaml": "openapi: 3.1.0"}'
+    assert repair_plan_output(plan_less, "notes", reask).implementation_plan == [] and len(prompts) == 1
+
+
+def test_provider_reasks_through_the_same_endpoint(monkeypatch):
+    broken = json.dumps(_plan())
+    broken = broken.replace('"openapi_yaml"', '"openapi"')  # wrong key -> OpenAPI is re-asked alone
+    recordings = [
+        {"match": "Return a **STRICT** JSON object", "response": broken},
+        {"match": "Write a minimal valid OpenAPI", "response": "openapi: 3.1.0\ninfo: {title: Notes, version: '1'}\npaths: {}"},
+    ]
+    with StandinServer(StandinConfig(latency="fixed:0", recordings=recordings)) as srv:
+        client = OllamaLLM(srv.url, "llama")
+        plan = client.generate_plan("notes")
+        assert plan.openapi_yaml.startswith("openapi: 3.1.0") and plan.implementation_plan
+        plan = asyncio.run(client.agenerate_plan("notes"))
+        assert plan.openapi_yaml.startswith("openapi: 3.1.0")
+        stats = repair_stats()["ollama:llama"]
+        assert (stats["answers"], stats["reasked"]) == (2, 2) and stats["repairs"]["reask:openapi_yaml"] == 2
+
+        monkeypatch.setenv("LLM_REPAIR_REASK", "off")
+        with pytest.raises(PlanOutputError, match="openapi_yaml"):
+            client.generate_plan("notes")
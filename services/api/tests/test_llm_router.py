@@ -0,0 +1,148 @@
+# services/api/tests/test_llm_router.py
+import asyncio
+import time
+
+import pytest
+
+from services.api import llm_router
+from services.api.llm_router import LLMUnavailable, RoutedLLM, health_for, router_stats, with_failover
+
+
+@pytest.fixture(autouse=True)
+def fresh_health(monkeypatch):
+    llm_router.reset_router_state()
+    yield
+    llm_router.reset_router_state()
+
+
+class FakeProvider:
+    """Stand-in provider with a fixed delay that can be made to fail."""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    @property
+    def _limit_key(self):
+        return (self.name, "m")
+
+    def generate_plan(self, user_request):
+        from services.api.llm import MockLLM
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        return MockLLM().generate_plan(f"{self.name}: {user_request}")
+
+    async def agenerate_plan(self, user_request):
+        from services.api.llm import MockLLM
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        return MockLLM().generate_plan(f"{self.name}: {user_request}")
+
+    async def astream_text(self, user_prompt, system_prompt=""):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        for part in (self.name, "!"):
+            yield part
+
+
+def test_fails_over_in_order_and_tracks_health():
+    a, b = FakeProvider("a", fail=True), FakeProvider("b")
+    plan = RoutedLLM([a, b]).generate_plan("todo")
+    assert "b: todo" in plan.prd_markdown
+    assert (a.calls, b.calls) == (1, 1)
+    stats = router_stats()
+    assert stats["router"]["failovers"] == 1
+    assert stats["providers"]["a/m"]["failures"] == 1
+    assert stats["providers"]["b/m"]["latency_ewma_s"] is not None
+
+
+def test_circuit_opens_after_consecutive_failures_and_probes_after_cooldown(monkeypatch):
+    monkeypatch.setenv("LLM_CIRCUIT_FAILURES", "2")
+    monkeypatch.setenv("LLM_CIRCUIT_OPEN_SECONDS", "0.1")
+    a, b = FakeProvider("a", fail=True), FakeProvider("b")
+    routed = RoutedLLM([a, b])
+    routed.generate_plan("1")
+    routed.generate_plan("2")
+    assert health_for(a).snapshot()["circuit"] == "open"
+    routed.generate_plan("3")
+    assert a.calls == 2  # skipped while open
+    time.sleep(0.12)
+    a.fail = False
+    assert "a: 4" in routed.generate_plan("4").prd_markdown
+    assert health_for(a).snapshot()["circuit"] == "closed"
+
+
+def test_all_circuits_open_fails_fast(monkeypatch):
+    monkeypatch.setenv("LLM_CIRCUIT_FAILURES", "1")
+    a = FakeProvider("a", fail=True)
+    routed = RoutedLLM([a])
+    with pytest.raises(RuntimeError, match="a down"):
+        routed.generate_plan("x")
+    with pytest.raises(LLMUnavailable):
+        routed.generate_plan("x")
+    assert a.calls == 1
+
+
+def test_hedge_beats_a_slow_primary():
+    slow, fast = FakeProvider("slow", delay=0.5), FakeProvider("fast")
+    started = time.monotonic()
+    plan = RoutedLLM([slow, fast], hedge_after_s=0.05).generate_plan("x")
+    assert time.monotonic() - started < 0.4
+    assert "fast: x" in plan.prd_markdown
+    assert router_stats()["router"]["hedges"] == 1
+    assert router_stats()["router"]["hedge_wins"] == 1
+
+
+def test_hedge_delay_follows_latency_percentile():
+    p = FakeProvider("p")
+    routed = RoutedLLM([p, FakeProvider("q")], hedge_percentile=95, hedge_min_s=0.01)
+    assert routed._hedge_delay(p) is None  # not enough samples yet
+    for ms in range(1, 21):
+        health_for(p).record(True, ms / 1000)
+    assert routed._hedge_delay(p) == pytest.approx(0.02)
+
+
+def test_async_hedge_cancels_the_loser():
+    slow, fast = FakeProvider("slow", delay=1.0), FakeProvider("fast")
+
+    async def run():
+        started = time.monotonic()
+        plan = await RoutedLLM([slow, fast], hedge_after_s=0.05).agenerate_plan("x")
+        return plan, time.monotonic() - started
+
+    plan, elapsed = asyncio.run(run())
+    assert "fast: x" in plan.prd_markdown and elapsed < 0.5
+    # the cancelled request is not counted against the slow provider
+    assert health_for(slow).snapshot()["failures"] == 0
+
+
+def test_stream_fails_over_before_the_first_chunk():
+    a, b = FakeProvider("a", fail=True), FakeProvider("b")
+
+    async def run():
+        return [c async for c in RoutedLLM([a, b]).astream_text("p")]
+
+    assert asyncio.run(run()) == ["b", "!"]
+    assert not hasattr(RoutedLLM([a, b]), "generate_text")
+
+
+def test_with_failover_builds_the_chain_from_env(monkeypatch):
+    from services.api.llm import MockLLM, OllamaLLM
+    monkeypatch.setenv("LLM_FALLBACK_PROVIDERS", "openai, anthropic, ollama")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "k")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("LLM_MODEL_ANTHROPIC", "claude-x")
+    # openai has no key; ollama's default model is the primary itself
+    routed = with_failover(OllamaLLM("http://localhost:11434", "llama3.1:8b"))
+    assert [type(p).__name__ for p in routed.providers] == ["OllamaLLM", "AnthropicMessagesLLM"]
+    assert routed.providers[1].model == "claude-x"
+    assert routed.model == "llama3.1:8b"  # attribute lookups go to the primary
+    mock = MockLLM()
+    assert with_failover(mock) is mock
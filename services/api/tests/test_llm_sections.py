@@ -0,0 +1,97 @@
+# services/api/tests/test_llm_sections.py
+import asyncio
+import json
+
+import pytest
+
+from services.api.core.repos import ProjectsRepoDB
+from services.api.core.shared import _create_engine, _database_url
+from services.api import llm as llm_module
+from services.api.llm_sections import agenerate_plan_in_mode, agenerate_plan_sectioned, plan_mode_for_project
+
+OPENAPI = "openapi: 3.1.0\ninfo:\n  title: Notes\n  version: '1'\npaths: {}\n"
+
+
+class SectionLLM:
+    """Answers each section prompt; `bad` maps a marker in the prompt to how many bad answers to give first."""
+
+    def __init__(self, bad=None, delay=0.02):
+        self.bad = dict(bad or {})
+        self.delay = delay
+        self.prompts = []
+        self.in_flight = self.max_in_flight = 0
+
+    async def agenerate_text(self, user_prompt, system_prompt=""):
+        self.prompts.append(user_prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        for marker, left in self.bad.items():
+            if marker in user_prompt and left:
+                self.bad[marker] = left - 1
+                return "{not json"
+        if "Outline the implementation" in user_prompt:
+            return json.dumps({"plans": [
+                {"id": "plan-1", "name": "API", "description": "Backend", "priority": "high", "size_estimate_days": 5},
+                {"id": "plan-2", "name": "UI", "description": "Frontend", "priority": "medium", "size_estimate_days": 3},
+            ]})
+        if "OpenAPI" in user_prompt:
+            return "```yaml\n" + OPENAPI + "```"
+        if "product requirements" in user_prompt:
+            return "# Notes PRD\n\nGoals..."
+        plan_id = user_prompt.split('features of plan "')[1].split('"')[0]
+        return json.dumps({"features": [{"id": "feature-1", "name": f"{plan_id} work", "description": "d",
+                                          "priority": "high", "size_estimate_hours": 4}]})
+
+    def generate_text(self, user_prompt, system_prompt=""):
+        raise AssertionError("sync path not used")
+
+
+def test_sections_run_in_parallel_and_merge():
+    llm = SectionLLM()
+    artifacts, report = asyncio.run(agenerate_plan_sectioned(llm, "notes service", concurrency=4))
+    assert artifacts.prd_markdown == "# Notes PRD\n\nGoals...\n"
+    assert artifacts.openapi_yaml == OPENAPI
+    plan1, plan2 = artifacts.implementation_plan
+    assert [f["name"] for f in plan1["features"]] == ["plan-1 work"]
+    # duplicate feature ids across plans are made unique
+    assert plan1["features"][0]["id"] == "feature-1" and plan2["features"][0]["id"] == "plan-2-feature-1"
+    assert plan2["features"][0]["acceptance_criteria"] == []
+    assert report == {"mode": "sectioned", "sections": 5, "retries": 0, "failed": []}
+    assert len(llm.prompts) == 5 and llm.max_in_flight >= 2
+    assert '"id": "plan-2"' in llm.prompts[-1]  # feature calls see the whole outline
+
+
+def test_failed_sections_are_retried_individually():
+    llm = SectionLLM(bad={'plan "plan-2"': 1, "OpenAPI": 1})
+    artifacts, report = asyncio.run(agenerate_plan_sectioned(llm, "notes", retries=2))
+    assert report["retries"] == 2 and not report["failed"]
+    assert len(llm.prompts) == 7
+    assert sum('plan "plan-1"' in p for p in llm.prompts) == 1
+    assert artifacts.implementation_plan[1]["features"]
+
+    # features that never parse leave the plan in place; a broken outline fails the call
+    llm = SectionLLM(bad={'plan "plan-1"': 5})
+    artifacts, report = asyncio.run(agenerate_plan_sectioned(llm, "notes", retries=1))
+    assert artifacts.implementation_plan[0]["features"] == [] and report["failed"] == ["features:plan-1"]
+    with pytest.raises(RuntimeError, match="section outline failed"):
+        asyncio.run(agenerate_plan_sectioned(SectionLLM(bad={"Outline": 5}), "notes", retries=1))
+
+
+def test_mode_selection(repo_root, monkeypatch):
+    llm = SectionLLM()
+    single = asyncio.run(agenerate_plan_in_mode(llm_module.MockLLM(), "notes", "sectioned"))
+    assert "Generated by MockLLM" in single.prd_markdown  # no free-form prompts on the mock
+    assert asyncio.run(agenerate_plan_in_mode(llm, "notes", "sectioned")).implementation_plan
+
+    repo = ProjectsRepoDB(_create_engine(_database_url(repo_root)))
+    repo.create({"id": "p1", "title": "Notes", "owner": "u"})
+    repo.create({"id": "p2", "title": "Other", "owner": "u"})
+    assert plan_mode_for_project("p1") == "single"
+    repo.update("p1", {"plan_generation_mode": "sectioned"})
+    assert plan_mode_for_project("p1") == "sectioned"
+    monkeypatch.setenv("LLM_PLAN_MODE", "sectioned")
+    assert plan_mode_for_project("p2") == "sectioned" and plan_mode_for_project(None) == "sectioned"
+    repo.update("p1", {"plan_generation_mode": "single"})
+    assert plan_mode_for_project("p1") == "single"
@@ -0,0 +1,68 @@
+# services/api/tests/test_llm_selector.py
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.api import llm_selector
+from services.api.auth.routes import get_current_user
+from services.api.llm_selector import get_llm_for_project, invalidate_project_llm, resolver_stats
+
+
+@pytest.fixture(autouse=True)
+def builds(monkeypatch):
+    invalidate_project_llm()
+    calls = []
+    real = llm_selector._build_llm_for_project
+
+    def counting(project_id, step_name):
+        calls.append((project_id, step_name))
+        return real(project_id, step_name)
+
+    monkeypatch.setattr(llm_selector, "_build_llm_for_project", counting)
+    yield calls
+    invalidate_project_llm()
+
+
+def test_client_is_resolved_once_per_project_and_step(builds):
+    first = get_llm_for_project("p1", "prd_generation")
+    assert get_llm_for_project("p1", "prd_generation") is first
+    assert get_llm_for_project("p1", "story_generation") is not first
+    assert get_llm_for_project("p2", "prd_generation") is not first
+    assert builds == [("p1", "prd_generation"), ("p1", "story_generation"), ("p2", "prd_generation")]
+    assert resolver_stats()["hits"] >= 1
+
+
+def test_invalidation_is_scoped_to_the_project(builds):
+    p1 = get_llm_for_project("p1", "prd_generation")
+    p2 = get_llm_for_project("p2", "prd_generation")
+    assert invalidate_project_llm("p1") == 1
+    assert get_llm_for_project("p1", "prd_generation") is not p1
+    assert get_llm_for_project("p2", "prd_generation") is p2
+    assert len(builds) == 3
+
+
+def test_env_change_and_ttl(builds, monkeypatch):
+    first = get_llm_for_project("p", "chat")
+    monkeypatch.setenv("LLM_MODEL", "other")
+    assert get_llm_for_project("p", "chat") is not first
+    monkeypatch.setenv("LLM_RESOLVER_TTL_SECONDS", "0")
+    get_llm_for_project("p", "chat")
+    get_llm_for_project("p", "chat")
+    assert len(builds) == 4
+
+
+def test_update_project_route_invalidates(builds):
+    from services.api.app import app
+    get_llm_for_project("abc", "prd_generation")
+    project = {"id": "abc", "title": "t", "status": "planning"}
+    app.dependency_overrides[get_current_user] = lambda: {"id": "u", "role": "user"}
+    try:
+        with patch("services.api.routes.projects.ProjectsRepoDB") as repo_cls:
+            repo_cls.return_value = MagicMock(**{"get.return_value": project, "update.return_value": project})
+            resp = TestClient(app).put("/api/projects/abc", json={"title": "t"})
+    finally:
+        app.dependency_overrides.clear()
+    assert resp.status_code == 200
+    get_llm_for_project("abc", "prd_generation")
+    assert len(builds) == 2
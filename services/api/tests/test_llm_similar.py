@@ -0,0 +1,90 @@
+# services/api/tests/test_llm_similar.py
+import asyncio
+
+import pytest
+
+from services.api.llm_cache import bypass_llm_cache
+from services.api.llm_similar import (
+    SimilarityCache, SimilarLLM, similarity, sketch, step_threshold, with_similarity_cache,
+)
+from services.api.llm_telemetry import tag_llm_client
+
+
+class CountingLLM:
+    model = "m"
+    temperature = 0.2
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_plan(self, user_request):
+        from services.api.llm import MockLLM
+        self.calls += 1
+        return MockLLM().generate_plan(user_request)
+
+    def generate_text(self, user_prompt, system_prompt=""):
+        self.calls += 1
+        return f"answer {self.calls}"
+
+
+REQUEST = (
+    "Build a notes service where users can create, edit, tag and search notes. "
+    "Notes belong to a project and support markdown, attachments and sharing with teammates."
+)
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    monkeypatch.setenv("LLM_SIMILAR_THRESHOLD", "0.8")
+    inner = CountingLLM()
+    return inner, SimilarLLM(tag_llm_client(inner, step="prd_generation"), cache=SimilarityCache())
+
+
+def test_near_identical_requests_are_served_from_cache(client):
+    inner, llm = client
+    first = llm.generate_plan(REQUEST)
+    tweaked = "  " + REQUEST.upper().replace(" ", "   ") + "\nAlso: thanks!"
+    assert llm.generate_plan(tweaked).prd_markdown == first.prd_markdown
+    assert inner.calls == 1
+    llm.generate_plan("Design a billing system with invoices, refunds and tax reports for EU customers.")
+    assert inner.calls == 2
+
+    snap = llm.cache.snapshot()
+    assert (snap["hits"], snap["misses"], snap["stores"]) == (1, 2, 2)
+    [audit] = snap["audit"]
+    assert audit["step"] == "prd_generation" and audit["similarity"] >= 0.8
+    assert audit["request"].startswith("  BUILD") and audit["matched_request"] == REQUEST
+
+
+def test_scope_threshold_and_bypass(client, monkeypatch):
+    inner, llm = client
+    assert llm.generate_text(REQUEST, "system A") == "answer 1"
+    assert llm.generate_text(REQUEST + " ok", "system A") == "answer 1"
+    assert llm.generate_text(REQUEST, "system B") == "answer 2"  # other task, other scope
+    with bypass_llm_cache():
+        assert llm.generate_text(REQUEST, "system A") == "answer 3"
+    monkeypatch.setenv("LLM_SIMILAR_THRESHOLD_PRD_GENERATION", "off")
+    assert llm.generate_text(REQUEST, "system A") == "answer 4"
+    assert asyncio.run(llm.agenerate_text(REQUEST, "system B")) == "answer 5"
+    monkeypatch.delenv("LLM_SIMILAR_THRESHOLD_PRD_GENERATION")
+    assert asyncio.run(llm.agenerate_text(REQUEST, "system B")) == "answer 2"
+
+
+def test_sketch_similarity_tracks_jaccard():
+    a = sketch(REQUEST)
+    assert similarity(a, sketch(REQUEST.lower())) == 1.0
+    assert 0.7 < similarity(a, sketch(REQUEST + " Also export to PDF.")) < 1.0
+    assert similarity(a, sketch("completely unrelated text about weather")) < 0.1
+
+
+def test_thresholds_and_wrapping(monkeypatch):
+    monkeypatch.setenv("LLM_SIMILAR_THRESHOLD", "0.95")
+    monkeypatch.setenv("LLM_SIMILAR_THRESHOLD_STORY_GENERATION", "1")
+    assert step_threshold("prd_generation") == 0.95
+    assert step_threshold("story_generation") is None
+    inner = CountingLLM()
+    assert with_similarity_cache(inner) is inner  # opt-in
+    monkeypatch.setenv("LLM_SIMILAR_CACHE", "on")
+    wrapped = with_similarity_cache(inner)
+    assert isinstance(wrapped, SimilarLLM) and hasattr(wrapped, "generate_text")
+    assert not hasattr(SimilarLLM(object()), "generate_text")
@@ -0,0 +1,163 @@
+# services/api/tests/test_llm_singleflight.py
+import asyncio
+import threading
+import time
+
+from services.api.llm import MockLLM
+from services.api.llm_cache import CachedLLM, LLMResponseCache
+from services.api.llm_singleflight import CoalescedLLM, SingleFlight, request_fingerprint, with_singleflight
+
+
+class SlowLLM:
+    """Stand-in provider that counts upstream calls and takes a while to answer."""
+    temperature = 0.2
+
+    def __init__(self, delay=0.2, fail=False):
+        self.model = "m1"
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def generate_plan(self, user_request):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return MockLLM().generate_plan(f"{user_request} #{self.calls}")
+
+    async def agenerate_plan(self, user_request):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return MockLLM().generate_plan(f"{user_request} #{self.calls}")
+
+    async def astream_text(self, user_prompt, system_prompt=""):
+        self.calls += 1
+        for part in ("a", "b", "c", "d"):
+            await asyncio.sleep(self.delay / 4)
+            yield part
+
+
+def test_concurrent_threads_share_one_upstream_call():
+    inner = SlowLLM()
+    client = CoalescedLLM(inner, SingleFlight())
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.generate_plan("todo api"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert inner.calls == 1
+    assert len(results) == 5 and all(r == results[0] for r in results)
+    # followers get copies, not the leader's object
+    assert len({id(r) for r in results}) == 5
+    stats = client.flight.stats()
+    assert stats["totals"] == {"leaders": 1, "followers": 4}
+    assert list(stats["keys"].values()) == [{"leaders": 1, "followers": 4}]
+
+    # once the flight has landed, the next call goes upstream again
+    client.generate_plan("todo api")
+    assert inner.calls == 2
+
+
+def test_errors_reach_every_waiter():
+    inner = SlowLLM(fail=True)
+    client = CoalescedLLM(inner, SingleFlight())
+    errors = []
+
+    def call():
+        try:
+            client.generate_plan("x")
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert inner.calls == 1
+    assert errors == ["upstream down"] * 3
+
+
+def test_async_callers_coalesce_and_distinct_prompts_do_not():
+    inner = SlowLLM()
+    client = CoalescedLLM(inner, SingleFlight())
+
+    async def run():
+        return await asyncio.gather(
+            client.agenerate_plan("a"), client.agenerate_plan("a"), client.agenerate_plan("b"),
+        )
+
+    a1, a2, b = asyncio.run(run())
+    assert inner.calls == 2
+    assert a1 == a2 and a1 is not a2
+    assert b != a1
+
+
+def test_late_stream_joiner_replays_buffered_chunks():
+    inner = SlowLLM()
+    client = CoalescedLLM(inner, SingleFlight())
+
+    async def consume(delay):
+        await asyncio.sleep(delay)
+        return [c async for c in client.astream_text("p", "s")]
+
+    async def run():
+        return await asyncio.gather(consume(0), consume(0.12))
+
+    first, late = asyncio.run(run())
+    assert first == late == ["a", "b", "c", "d"]
+    assert inner.calls == 1
+
+
+def test_optional_capabilities_follow_the_inner_client():
+    client = CoalescedLLM(SlowLLM())
+    assert hasattr(client, "astream_text")
+    assert not hasattr(client, "generate_text")
+    assert not hasattr(client, "astream_plan")
+    assert client.model == "m1"
+
+
+def test_wrapping_rules(monkeypatch):
+    assert isinstance(with_singleflight(SlowLLM()), CoalescedLLM)
+    from services.api import llm  # other tests reload the module
+    mock = llm.MockLLM()
+    assert with_singleflight(mock) is mock
+    monkeypatch.setenv("LLM_SINGLEFLIGHT", "off")
+    inner = SlowLLM()
+    assert with_singleflight(inner) is inner
+
+
+def test_cache_key_ignores_the_singleflight_wrapper(tmp_path):
+    inner = SlowLLM(delay=0)
+    assert request_fingerprint(CoalescedLLM(inner), "s", "u") == request_fingerprint(inner, "s", "u")
+    db = tmp_path / "cache.db"
+    CachedLLM(CoalescedLLM(inner), LLMResponseCache(db)).generate_plan("todo")
+    # a plain-wrapped client reads the same disk entry
+    CachedLLM(inner, LLMResponseCache(db)).generate_plan("todo")
+    assert inner.calls == 1
+
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    inner = SlowLLM()
+    client = CoalescedLLM(inner, SingleFlight())
+
+    async def run():
+        leader = asyncio.ensure_future(client.agenerate_plan("a"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(client.agenerate_plan("a"))
+        await asyncio.sleep(0.05)
+        leader.cancel()  # the request that started the call disconnects
+        plan = await follower
+        assert leader.cancelled() and plan.prd_markdown
+
+        # with every waiter gone the upstream call itself is cancelled
+        lone = asyncio.ensure_future(client.agenerate_plan("b"))
+        await asyncio.sleep(0.05)
+        lone.cancel()
+        await asyncio.sleep(0.01)
+        return client.flight._async[asyncio.get_running_loop()]
+
+    table = asyncio.run(run())
+    assert inner.calls == 2 and table == {}
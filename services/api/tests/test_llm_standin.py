@@ -0,0 +1,87 @@
+# services/api/tests/test_llm_standin.py
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from services.api import llm_http, llm_limits, llm_router
+from services.api.llm import AnthropicMessagesLLM, OllamaLLM, OpenAIChatLLM, SupabaseLLM
+from services.api.llm_standin import StandinConfig, StandinServer, parse_latency
+from services.api.llm_telemetry import telemetry
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    llm_limits.reset_limiters()
+    llm_router.reset_router_state()
+    telemetry.reset()
+    yield
+    llm_http.close_http_clients()
+    telemetry.reset()
+
+
+def _providers(url):
+    return {
+        "openai": OpenAIChatLLM("k", "gpt-4o-mini", base_url=f"{url}/v1"),
+        "anthropic": AnthropicMessagesLLM("k", "claude-3-5-haiku-latest", base_url=url),
+        "ollama": OllamaLLM(url, "llama"),
+        "supabase": SupabaseLLM(url, "k"),
+    }
+
+
+def test_every_provider_round_trips_blocking_and_streamed():
+    with StandinServer(StandinConfig(latency="fixed:0", chunk_chars=8, chunk_delay=0)) as srv:
+        for name, client in _providers(srv.url).items():
+            plan = client.generate_plan("notes search")
+            assert plan.prd_markdown.startswith("# Product Requirements"), name
+
+            async def stream():
+                return [c async for c in client.astream_text("say hi", "plain text")]
+
+            chunks = asyncio.run(stream())
+            assert len(chunks) > 1 and "".join(chunks) == "Stand-in response to: say hi", name
+    # provider usage blocks made it through to telemetry
+    assert all(r["tokens_estimated"] == 0 for r in telemetry._pending if r["provider"] != "supabase")
+
+
+def test_stream_chunks_are_paced():
+    config = StandinConfig(latency="fixed:0.1", chunk_chars=4, chunk_delay=0.03)
+    with StandinServer(config) as srv:
+        client = OllamaLLM(srv.url, "llama")
+
+        async def stream():
+            started, stamps = time.perf_counter(), []
+            async for _ in client.astream_text("abcdefghijklmnop"):
+                stamps.append(time.perf_counter() - started)
+            return stamps
+
+        stamps = asyncio.run(stream())
+    assert stamps[0] >= 0.1  # time to first token
+    assert stamps[-1] - stamps[0] >= 0.03 * (len(stamps) - 1) * 0.8
+
+
+def test_recordings_and_injected_failures():
+    recordings = [{"match": "weather", "response": {"forecast": "sun"}}]
+    with StandinServer(StandinConfig(latency="fixed:0", recordings=recordings)) as srv:
+        r = httpx.post(f"{srv.url}/api/generate", json={"prompt": "weather today?", "stream": False})
+        assert json.loads(r.json()["response"]) == {"forecast": "sun"}
+
+    with StandinServer(StandinConfig(latency="fixed:0", throttle_rate=1.0, retry_after=2)) as srv:
+        r = httpx.post(f"{srv.url}/v1/chat/completions", json={"messages": []})
+        assert r.status_code == 429 and r.headers["Retry-After"] == "2"
+    with StandinServer(StandinConfig(latency="fixed:0", error_rate=1.0)) as srv:
+        with pytest.raises(httpx.HTTPStatusError):
+            OllamaLLM(srv.url, "llama").generate_plan("x")
+        assert httpx.get(f"{srv.url}/stats").json() == {"error": 1}
+
+
+def test_latency_specs():
+    import random
+    rnd = random.Random(1)
+    assert parse_latency("fixed:0.5")(rnd) == 0.5
+    assert 0.1 <= parse_latency("uniform:0.1,0.2")(rnd) <= 0.2
+    assert parse_latency("lognormal:-1,0.3")(rnd) > 0
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1")
@@ -0,0 +1,108 @@
+# services/api/tests/test_llm_streaming.py
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.api import llm_http
+from services.api.app import app
+from services.api.llm import OllamaLLM, astream_text
+from services.api.llm_stream import stream_metrics
+
+
+def _events(body: str):
+    out = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_prd_stream_emits_tokens_then_saves(repo_root: Path):
+    with TestClient(app) as client:
+        r = client.post("/api/prd/generate/stream", json={
+            "project_id": "p1", "project_name": "Demo App", "include_chat_history": False,
+        })
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = _events(r.text)
+    assert [e for e, _ in events[:-1]] == ["token"] * (len(events) - 1) and len(events) > 2
+    kind, done = events[-1]
+    assert kind == "done"
+    assert Path(done["file_path"]).read_text(encoding="utf-8").strip() == done["prd_content"].strip()
+    assert stream_metrics.snapshot()["prd"]["ttft_avg_s"] >= 0
+
+
+def test_plan_stream_persists_parsed_plan(repo_root: Path):
+    with TestClient(app) as client:
+        r = client.post("/api/plan/generate/stream", json={"project_id": "p1", "project_name": "Demo"})
+    events = _events(r.text)
+    streamed = "".join(d["text"] for e, d in events if e == "token")
+    kind, done = events[-1]
+    assert kind == "done"
+    assert json.loads(streamed)["implementation_plan"] == done["plan"]["implementation_plan"]
+    saved = json.loads(Path(done["file_path"]).read_text(encoding="utf-8"))
+    assert saved["implementation_plan"][0]["id"] == "plan-1"
+
+
+def test_stream_failure_is_reported_as_error_event(repo_root: Path, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise RuntimeError("upstream went away")
+        yield  # pragma: no cover
+
+    import services.api.routes.ui_requests as ui_requests
+    monkeypatch.setattr(ui_requests, "astream_plan", broken)
+    with TestClient(app) as client:
+        r = client.post("/api/plan/generate/stream", json={"project_id": "p1"})
+    assert _events(r.text) == [("error", {"detail": "upstream went away"})]
+
+
+@pytest.fixture()
+def ndjson_server():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            assert req["stream"] is True and req["system"] == "sys"
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for part in ("Hel", "lo", ""):
+                line = json.dumps({"response": part, "done": part == ""}).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{srv.server_address[1]}"
+    finally:
+        srv.shutdown()
+
+
+def test_ollama_streams_ndjson_chunks(ndjson_server):
+    async def main():
+        try:
+            return [c async for c in astream_text(OllamaLLM(ndjson_server, "m"), "hi", "sys")]
+        finally:
+            await llm_http.aclose_http_clients()
+
+    assert asyncio.run(main()) == ["Hel", "lo"]
+
+
+def test_provider_stream_line_parsers():
+    from services.api.llm import _anthropic_sse_delta, _openai_sse_delta
+    assert _openai_sse_delta('data: {"choices": [{"delta": {"content": "ab"}}]}') == "ab"
+    assert _openai_sse_delta("data: [DONE]") == ""
+    assert _anthropic_sse_delta('data: {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "cd"}}') == "cd"
+    assert _anthropic_sse_delta('data: {"type": "message_stop"}') == ""
+    assert _anthropic_sse_delta("event: ping") == ""
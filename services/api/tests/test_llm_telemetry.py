@@ -0,0 +1,132 @@
+# services/api/tests/test_llm_telemetry.py
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.api import llm_http, llm_limits, llm_router
+from services.api.core.repos import LLMCallsRepoDB
+from services.api.core.shared import _create_engine, _database_url
+from services.api.llm import OllamaLLM
+from services.api.llm_router import RoutedLLM
+from services.api.llm_telemetry import estimate_cost, tag_llm_client, telemetry, usage_from_body
+
+_PLAN = json.dumps({"prd_markdown": "# PRD", "openapi_yaml": "openapi: 3.1.0"})
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    telemetry.reset()
+    llm_limits.reset_limiters()
+    llm_router.reset_router_state()
+    yield
+    telemetry.reset()
+
+
+@pytest.fixture()
+def ollama_server():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if req.get("model") == "broken":
+                self.send_response(500)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if req.get("stream"):
+                lines = [json.dumps({"response": c}) for c in ("He", "llo")]
+                lines.append(json.dumps({"response": "", "done": True, "prompt_eval_count": 12, "eval_count": 2}))
+                body = ("\n".join(lines) + "\n").encode()
+                content_type = "application/x-ndjson"
+            else:
+                body = json.dumps({"response": _PLAN, "prompt_eval_count": 40, "eval_count": 9}).encode()
+                content_type = "application/json"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{srv.server_address[1]}"
+    finally:
+        srv.shutdown()
+        llm_http.close_http_clients()
+
+
+def _rows():
+    with telemetry._lock:
+        return list(telemetry._pending)
+
+
+def test_blocking_call_records_usage_and_tags(ollama_server):
+    client = tag_llm_client(OllamaLLM(ollama_server, "llama"), step="prd_generation", project_id=7)
+    client.generate_plan("todo api")
+    [row] = _rows()
+    assert row["provider"] == "ollama" and row["model"] == "llama"
+    assert row["step"] == "prd_generation" and row["project_id"] == "7"
+    assert (row["input_tokens"], row["output_tokens"], row["tokens_estimated"]) == (40, 9, 0)
+    assert row["status"] == "ok" and row["http_status"] == 200 and row["mode"] == "sync"
+    assert row["latency_ms"] > 0 and row["cost_usd"] == 0.0
+
+
+def test_stream_records_ttft_and_final_usage(ollama_server):
+    client = OllamaLLM(ollama_server, "llama")
+
+    async def run():
+        return [c async for c in client.astream_text("hi")]
+
+    assert asyncio.run(run()) == ["He", "llo"]
+    [row] = _rows()
+    assert row["mode"] == "stream" and row["ttft_ms"] is not None
+    assert (row["input_tokens"], row["output_tokens"]) == (12, 2)
+
+
+def test_errors_and_failover_attempts_are_recorded(ollama_server):
+    routed = RoutedLLM([OllamaLLM(ollama_server, "broken"), OllamaLLM(ollama_server, "llama")])
+    routed.generate_plan("x")
+    first, second = _rows()
+    assert (first["status"], first["http_status"], first["attempt"]) == ("error", 500, 1)
+    assert "HTTPStatusError" in first["error"]
+    assert (second["status"], second["attempt"]) == ("ok", 2)
+    groups = {g["model"]: g for g in telemetry.snapshot()["groups"]}
+    assert groups["broken"]["errors"] == 1 and groups["llama"]["calls"] == 1
+
+
+def test_flush_writes_queryable_rows(repo_root, ollama_server):
+    client = tag_llm_client(OllamaLLM(ollama_server, "llama"), step="story_generation", project_id="p1")
+    client.generate_plan("a")
+    client.generate_plan("b")
+    assert telemetry.flush() == 2
+    repo = LLMCallsRepoDB(_create_engine(_database_url(repo_root)))
+    [summary] = repo.summary(["step", "project_id"])
+    assert summary["step"] == "story_generation" and summary["project_id"] == "p1"
+    assert summary["calls"] == 2 and summary["errors"] == 0
+    assert summary["input_tokens"] == 80 and summary["output_tokens"] == 18
+    assert len(repo.list_recent(project_id="p1")) == 2
+
+
+def test_usage_and_cost_helpers(monkeypatch):
+    assert usage_from_body({"usage": {"prompt_tokens": 3, "completion_tokens": 4}}) == (3, 4)
+    assert usage_from_body({"usage": {"input_tokens": 5, "output_tokens": 6}}) == (5, 6)
+    assert usage_from_body({"type": "message_start", "message": {"usage": {"input_tokens": 7}}}) == (7, None)
+    assert usage_from_body("nope") == (None, None)
+    assert estimate_cost("openai", "gpt-4o-mini", 1000, 1000) == pytest.approx(0.00075)
+    assert estimate_cost("openai", "unknown-model", 1000, 1000) is None
+    monkeypatch.setenv("LLM_PRICES", '{"unknown-model": [1, 2]}')
+    assert estimate_cost("openai", "unknown-model", 1000, 500) == 2.0
+
+
+def test_telemetry_can_be_disabled(monkeypatch, ollama_server):
+    monkeypatch.setenv("LLM_TELEMETRY", "off")
+    OllamaLLM(ollama_server, "llama").generate_plan("x")
+    assert _rows() == []
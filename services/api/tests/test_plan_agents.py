@@ -0,0 +1,78 @@
+# services/api/tests/test_plan_agents.py
+import threading
+import time
+
+import pytest
+
+from services.api.planner.agents import PlanAgent, multi_agent_plan, run_plan_agents
+
+
+def _sleeper(name, delay, log):
+    def run(vision, deps):
+        log.append((name, "start", time.monotonic()))
+        time.sleep(delay)
+        log.append((name, "end", time.monotonic()))
+        return f"{name}:{vision}:{','.join(sorted(deps.values()))}"
+    return run
+
+
+def test_independent_agents_overlap_and_dependents_wait():
+    log = []
+    agents = [
+        PlanAgent("a", _sleeper("a", 0.2, log)),
+        PlanAgent("b", _sleeper("b", 0.2, log)),
+        PlanAgent("c", _sleeper("c", 0.0, log), requires=("a",)),
+    ]
+    started = time.monotonic()
+    outputs, errors = run_plan_agents("v", agents)
+    assert time.monotonic() - started < 0.35  # a and b ran side by side
+    assert errors == {}
+    assert outputs["c"] == "c:v:a:v:"  # saw a's output
+    times = {(n, ev): t for n, ev, t in log}
+    assert times[("c", "start")] >= times[("a", "end")]
+
+
+def test_failure_uses_fallback_and_skips_dependents_without_one():
+    def boom(vision, deps):
+        raise RuntimeError("llm down")
+
+    agents = [
+        PlanAgent("prd", boom, fallback=lambda v: "fallback prd"),
+        PlanAgent("adr", lambda v, d: "adr from " + d["prd"], requires=("prd",)),
+        PlanAgent("spec", boom),
+        PlanAgent("review", lambda v, d: "never", requires=("spec",)),
+    ]
+    outputs, errors = run_plan_agents("v", agents)
+    assert outputs == {"prd": "fallback prd", "adr": "adr from fallback prd"}
+    assert "llm down" in errors["prd"] and "llm down" in errors["spec"]
+    assert errors["review"] == "skipped: missing spec"
+
+
+def test_timeout_returns_partial_results():
+    release = threading.Event()
+    agents = [
+        PlanAgent("slow", lambda v, d: release.wait(5) and "late", timeout_s=0.1, fallback=lambda v: "stub"),
+        PlanAgent("fast", lambda v, d: "ok"),
+    ]
+    started = time.monotonic()
+    outputs, errors = run_plan_agents("v", agents)
+    release.set()
+    assert time.monotonic() - started < 1
+    assert outputs == {"slow": "stub", "fast": "ok"} and errors == {"slow": "timed out"}
+
+
+def test_bad_declarations():
+    with pytest.raises(ValueError, match="unknown"):
+        run_plan_agents("v", [PlanAgent("a", lambda v, d: "", requires=("zzz",))])
+    outputs, errors = run_plan_agents("v", [
+        PlanAgent("a", lambda v, d: "", requires=("b",)),
+        PlanAgent("b", lambda v, d: "", requires=("a",)),
+    ])
+    assert outputs == {} and set(errors) == {"a", "b"}
+
+
+def test_default_agents_adr_references_the_prd():
+    outs = multi_agent_plan("Search on notes list")
+    assert set(outs) == {"prd_md", "openapi_yaml", "adr_md"}
+    assert "## Stack Summary" in outs["prd_md"] and "[ADR Agent]" in outs["adr_md"]
+    assert "- Requirements:" in outs["adr_md"]
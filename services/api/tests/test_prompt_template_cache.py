@@ -0,0 +1,51 @@
+# services/api/tests/test_prompt_template_cache.py
+import os
+
+import pytest
+
+from services.api.planner import prompt_templates as pt
+
+
+@pytest.fixture()
+def tpl_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(pt, "_TEMPLATES_DIR", tmp_path)
+    pt.clear_template_cache()
+    (tmp_path / "greet.md").write_text("Hello $name, welcome to ${project}.\n$items", encoding="utf-8")
+    yield tmp_path
+    pt.clear_template_cache()
+
+
+def test_compiled_once_and_placeholders_precomputed(tpl_dir):
+    before = pt.compiles
+    for _ in range(5):
+        out = pt.render_template("greet.md", {"name": "Ada", "project": "SDLC", "items": ["a", "b"], "extra": 1})
+    assert out == "Hello Ada, welcome to SDLC.\na\nb"
+    assert pt.compiles - before == 1
+    assert pt.template_placeholders("greet.md") == {"name", "project", "items"}
+
+
+def test_missing_keys_are_all_reported(tpl_dir):
+    with pytest.raises(KeyError, match="items, name"):
+        pt.render_template("greet.md", {"project": "x"})
+
+
+def test_edits_are_picked_up_unless_reload_is_off(tpl_dir, monkeypatch):
+    path = tpl_dir / "greet.md"
+    assert pt.render_template("greet.md", {"name": "a", "project": "b", "items": ""}).startswith("Hello")
+    path.write_text("Bye $name", encoding="utf-8")
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert pt.render_template("greet.md", {"name": "a"}) == "Bye a"
+
+    monkeypatch.setenv("PROMPT_TEMPLATES_RELOAD", "off")
+    path.write_text("Ciao $name!!", encoding="utf-8")
+    assert pt.render_template("greet.md", {"name": "a"}) == "Bye a"
+
+
+def test_render_many(tpl_dir):
+    before = pt.compiles
+    rows = [{"name": n, "project": "p", "items": []} for n in ("x", "y")]
+    assert pt.render_many("greet.md", rows) == ["Hello x, welcome to p.\n", "Hello y, welcome to p.\n"]
+    assert pt.compiles - before == 1
+    with pytest.raises(FileNotFoundError):
+        pt.render_many("nope.md", rows)
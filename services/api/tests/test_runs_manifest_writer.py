@@ -0,0 +1,79 @@
+# services/api/tests/test_runs_manifest_writer.py
+import json
+import time
+from pathlib import Path
+
+from services.api.runs.manifest import ManifestWriter, write_json_atomic
+
+
+def _manifest(step_count: int = 0, status: str = "running") -> dict:
+    return {
+        "plan_id": "p1",
+        "run_id": "r1",
+        "status": status,
+        "steps": [{"name": f"s{i}"} for i in range(step_count)],
+    }
+
+
+def test_write_json_atomic_leaves_no_temp_files(tmp_path: Path):
+    p = tmp_path / "runs" / "manifest.json"
+    write_json_atomic(p, {"a": 1})
+    write_json_atomic(p, {"a": 2})
+    assert json.loads(p.read_text(encoding="utf-8")) == {"a": 2}
+    assert [x.name for x in p.parent.iterdir()] == ["manifest.json"]
+
+
+def test_updates_are_coalesced_within_window(tmp_path: Path):
+    w = ManifestWriter(debounce_s=5.0)
+    p = tmp_path / "manifest.json"
+    w.update(p, _manifest(0))          # first update hits disk
+    for i in range(1, 6):
+        w.update(p, _manifest(i))      # coalesced
+    assert w.writes == 1
+    assert len(json.loads(p.read_text(encoding="utf-8"))["steps"]) == 0
+    # readers get the latest state from memory
+    assert len(w.get("p1", "r1")["steps"]) == 5
+
+    w.finish(p, _manifest(6, status="completed"))
+    assert w.writes == 2
+    assert json.loads(p.read_text(encoding="utf-8"))["status"] == "completed"
+    assert w.get("p1", "r1") is None
+
+
+def test_trailing_update_flushed_by_timer(tmp_path: Path):
+    w = ManifestWriter(debounce_s=0.05)
+    p = tmp_path / "manifest.json"
+    w.update(p, _manifest(0))
+    w.update(p, _manifest(3))
+    for _ in range(100):
+        if w.writes >= 2:
+            break
+        time.sleep(0.01)
+    assert len(json.loads(p.read_text(encoding="utf-8"))["steps"]) == 3
+
+
+def test_get_returns_copy(tmp_path: Path):
+    w = ManifestWriter(debounce_s=5.0)
+    w.update(tmp_path / "manifest.json", _manifest(1))
+    snap = w.get("p1", "r1")
+    snap["steps"].append({"name": "mutated"})
+    assert len(w.get("p1", "r1")["steps"]) == 1
+
+
+def test_manifest_route_serves_live_then_disk(tmp_path: Path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from services.api.app import app
+    from services.api.runs.manifest import manifest_writer
+    monkeypatch.setenv("REPO_ROOT", str(tmp_path))
+    client = TestClient(app)
+
+    path = tmp_path / "docs" / "plans" / "p1" / "runs" / "r1" / "manifest.json"
+    manifest_writer.update(path, _manifest(2))
+    r = client.get("/plans/p1/runs/r1/manifest")
+    assert r.status_code == 200
+    assert len(r.json()["steps"]) == 2
+
+    manifest_writer.finish(path, _manifest(3, status="completed"))
+    r = client.get("/plans/p1/runs/r1/manifest")
+    assert r.status_code == 200
+    assert r.json()["status"] == "completed"
@@ -0,0 +1,120 @@
+# services/api/tests/test_runs_recovery.py
+import json
+from pathlib import Path
+
+from services.api.runs import routes as runs_routes
+from services.api.runs.checkpoint import load_checkpoint, record_step
+from services.api.runs.manifest import write_json_atomic
+
+
+def _orphan(repo_root: Path, plan_id: str, run_id: str, completed: list[str]) -> Path:
+    """Simulate a run left 'running' on disk by a process that died."""
+    run_dir = repo_root / "docs" / "plans" / plan_id / "runs" / run_id
+    run_dir.mkdir(parents=True, exist_ok=True)
+    (run_dir / "execution.log").write_text(f"BEGIN run {run_id}\n", encoding="utf-8")
+    for name in completed:
+        record_step(run_dir, plan_id, run_id, {"name": name, "status": "completed", "attempts": 1})
+    write_json_atomic(run_dir / "manifest.json", {
+        "plan_id": plan_id, "run_id": run_id, "status": "running",
+        "started_at": "2024-01-01T00:00:00+00:00", "steps": [],
+    })
+    return run_dir
+
+
+def test_run_writes_checkpoint_per_step(tmp_path: Path):
+    runs_routes._run_plan("p1", "r1", tmp_path)
+    run_dir = tmp_path / "docs" / "plans" / "p1" / "runs" / "r1"
+    cp = load_checkpoint(run_dir)
+    assert cp["completed_steps"] == ["prepare", "generate", "finalize"]
+
+
+def test_reconciler_resumes_from_last_completed_step(tmp_path: Path):
+    run_dir = _orphan(tmp_path, "p1", "r1", ["prepare"])
+    report = runs_routes.reconcile_orphaned_runs(tmp_path, background=False)
+    assert report["resumed"] == ["r1"]
+
+    manifest = json.loads((run_dir / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["status"] == "completed"
+    assert manifest["resume_count"] == 1
+    assert manifest["started_at"] == "2024-01-01T00:00:00+00:00"
+    assert [s["name"] for s in manifest["steps"]] == ["prepare", "generate", "finalize"]
+    # prepare was not replayed
+    log = (run_dir / "execution.log").read_text(encoding="utf-8")
+    assert "RESUME run r1" in log
+    assert "[prepare]" not in log
+
+
+def test_reconciler_fails_run_interrupted_in_non_idempotent_step(tmp_path: Path):
+    run_dir = _orphan(tmp_path, "p1", "r2", ["prepare", "generate"])
+    report = runs_routes.reconcile_orphaned_runs(tmp_path, background=False)
+    assert report["failed"] == ["r2"]
+
+    manifest = json.loads((run_dir / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["status"] == "failed"
+    assert "finalize" in manifest["error"]
+    idx = json.loads((tmp_path / "docs" / "plans" / "index.json").read_text(encoding="utf-8"))
+    assert idx["p1"]["runs"][-1]["status"] == "failed"
+
+
+def test_reconciler_ignores_finished_runs(tmp_path: Path):
+    runs_routes._run_plan("p1", "done1", tmp_path)
+    report = runs_routes.reconcile_orphaned_runs(tmp_path, background=False)
+    assert report["resumed"] == [] and report["failed"] == []
+
+
+def test_reconciler_leaves_runs_another_process_holds(tmp_path: Path, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import text
+    from services.api.core.repos import RunsRepoDB
+    from services.api.core.shared import _create_engine, _database_url
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    run_dir = _orphan(tmp_path, "p1", "live", ["prepare"])
+    manifest = json.loads((run_dir / "manifest.json").read_text(encoding="utf-8"))
+    manifest.update(owner="other-host:1", heartbeat_at=datetime.now(timezone.utc).isoformat())
+    write_json_atomic(run_dir / "manifest.json", manifest)
+
+    engine = _create_engine(_database_url(tmp_path))
+    runs = RunsRepoDB(engine)
+    runs.create("q-live", "p1", owner="other-host:1")
+    runs.create("q-dead", "p1", owner="other-host:2")
+    runs.create("r-legacy", "p1")  # predates leases: no owner, no heartbeat
+    runs.set_running("r-legacy", "m", "l")
+    stale = datetime.now(timezone.utc) - timedelta(seconds=120)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE runs SET heartbeat_at = :t WHERE id = 'q-dead'"), {"t": stale})
+
+    requeued = []
+    report = runs_routes.reconcile_orphaned_runs(
+        tmp_path, background=False, requeue=lambda plan_id, run_id: requeued.append(run_id),
+    )
+    assert report["leased"] == ["live", "q-live"] and report["resumed"] == []
+    assert report["failed"] == ["r-legacy"] and requeued == ["q-dead"]
+    assert json.loads((run_dir / "manifest.json").read_text(encoding="utf-8"))["status"] == "running"
+
+    # the claim renewed q-dead's lease, so a second process starting now leaves it alone
+    monkeypatch.setattr(runs_routes, "run_owner", lambda: "other-host:3")
+    again = runs_routes.reconcile_orphaned_runs(tmp_path, background=False, requeue=lambda *a: requeued.append(a))
+    assert "q-dead" in again["leased"] and len(requeued) == 1
+
+
+def test_live_manifests_carry_a_renewable_lease(tmp_path: Path):
+    from services.api.runs.lease import lease_expired, run_owner
+    from services.api.runs.manifest import ManifestWriter
+
+    writer = ManifestWriter(debounce_s=60)
+    path = tmp_path / "manifest.json"
+    writer.update(path, {"plan_id": "p", "run_id": "r", "status": "running"}, flush=True)
+    first = json.loads(path.read_text(encoding="utf-8"))
+    assert first["owner"] == run_owner() and not lease_expired(first["heartbeat_at"])
+    writer.touch_all()
+    assert json.loads(path.read_text(encoding="utf-8"))["heartbeat_at"] >= first["heartbeat_at"]
+    assert lease_expired(None) and lease_expired("2024-01-01T00:00:00+00:00")
+
+
+def test_resumed_run_keeps_one_index_row(tmp_path: Path):
+    _orphan(tmp_path, "p1", "r1", ["prepare"])
+    runs_routes._append_run_to_index(tmp_path, "p1", "r1", "m", "l", "running")
+    runs_routes.reconcile_orphaned_runs(tmp_path, background=False)
+    idx = json.loads((tmp_path / "docs" / "plans" / "index.json").read_text(encoding="utf-8"))
+    assert [(r["run_id"], r["status"]) for r in idx["p1"]["runs"]] == [("r1", "completed")]
@@ -0,0 +1,122 @@
+# services/api/tests/test_runs_retention.py
+import json
+import os
+import tarfile
+import time
+from pathlib import Path
+
+from services.api.core.shared import _append_run_to_index
+from services.api.runs.retention import RetentionPolicy, compact_runs
+
+
+def _mk_run(repo_root: Path, plan_id: str, run_id: str, *, age_s: float = 0, status: str = "completed", size: int = 100) -> Path:
+    run_dir = repo_root / "docs" / "plans" / plan_id / "runs" / run_id
+    run_dir.mkdir(parents=True, exist_ok=True)
+    (run_dir / "manifest.json").write_text(json.dumps({"plan_id": plan_id, "run_id": run_id, "status": status}), encoding="utf-8")
+    (run_dir / "execution.log").write_text("x" * size, encoding="utf-8")
+    ts = time.time() - age_s
+    for p in [run_dir, *run_dir.iterdir()]:
+        os.utime(p, (ts, ts))
+    _append_run_to_index(repo_root, plan_id, run_id, f"{run_id}/manifest.json", f"{run_id}/execution.log", status)
+    return run_dir
+
+
+def _policy(**kw) -> RetentionPolicy:
+    base = dict(keep_last=0, max_age_days=0, max_total_bytes=0, interval_s=0)
+    base.update(kw)
+    return RetentionPolicy(**base)
+
+
+def test_keep_last_archives_older_runs_and_prunes_index(tmp_path: Path):
+    for i in range(4):
+        _mk_run(tmp_path, "p1", f"r{i}", age_s=100 - i)  # r3 is newest
+    report = compact_runs(tmp_path, _policy(keep_last=2))
+    assert report["archived"] == ["r0", "r1"]
+
+    runs_dir = tmp_path / "docs" / "plans" / "p1" / "runs"
+    assert sorted(p.name for p in runs_dir.iterdir()) == ["r2", "r3"]
+    bundle = tmp_path / "docs" / "plans" / "p1" / "archive" / "r0.tar.gz"
+    with tarfile.open(bundle) as tar:
+        assert "r0/manifest.json" in tar.getnames()
+
+    idx = json.loads((tmp_path / "docs" / "plans" / "index.json").read_text(encoding="utf-8"))
+    assert [r["run_id"] for r in idx["p1"]["runs"]] == ["r2", "r3"]
+    assert idx["p1"]["archived_runs"] == 2
+
+
+def test_max_age_and_live_runs_are_skipped(tmp_path: Path):
+    _mk_run(tmp_path, "p1", "old", age_s=10 * 86400)
+    _mk_run(tmp_path, "p1", "old-live", age_s=10 * 86400, status="running")
+    _mk_run(tmp_path, "p1", "new", age_s=10)
+    report = compact_runs(tmp_path, _policy(max_age_days=1))
+    assert report["archived"] == ["old"]
+    assert (tmp_path / "docs" / "plans" / "p1" / "runs" / "old-live").exists()
+
+
+def test_byte_budget_evicts_oldest_first(tmp_path: Path):
+    _mk_run(tmp_path, "p1", "a", age_s=30, size=50_000)
+    _mk_run(tmp_path, "p2", "b", age_s=20, size=50_000)
+    _mk_run(tmp_path, "p3", "c", age_s=10, size=50_000)
+    report = compact_runs(tmp_path, _policy(max_total_bytes=120_000))
+    # compressible logs: archiving the oldest run is enough to fit
+    assert report["archived"] == ["a"]
+    assert (tmp_path / "docs" / "plans" / "p3" / "runs" / "c").exists()
+
+
+def test_byte_budget_drops_bundles_when_still_over(tmp_path: Path):
+    _mk_run(tmp_path, "p1", "a", age_s=30, size=1000)
+    report = compact_runs(tmp_path, _policy(max_total_bytes=1))
+    assert report["archived"] == ["a"]
+    assert report["deleted_bundles"] == ["a.tar.gz"]
+
+
+def test_prune_does_not_drop_runs_added_concurrently(tmp_path: Path):
+    import threading
+    from services.api.runs.retention import _prune_index
+
+    _append_run_to_index(tmp_path, "p1", "old", "m", "l", "completed")
+    done = threading.Event()
+
+    def prune():
+        while not done.is_set():
+            _prune_index(tmp_path, {"old"})
+
+    pruner = threading.Thread(target=prune)
+    pruner.start()
+    try:
+        for i in range(50):
+            _append_run_to_index(tmp_path, f"p{i % 3}", f"r{i}", "m", "l", "running")
+    finally:
+        done.set()
+        pruner.join()
+    idx = json.loads((tmp_path / "docs" / "plans" / "index.json").read_text(encoding="utf-8"))
+    kept = {r["run_id"] for e in idx.values() for r in e.get("runs", [])}
+    assert kept == {f"r{i}" for i in range(50)}
+    assert not list((tmp_path / "docs" / "plans").glob(".index.json.*"))  # no temp files left behind
+
+
+def test_db_rows_without_run_dirs_are_pruned(tmp_path: Path, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import text
+    from services.api.core.repos import RunsRepoDB
+    from services.api.core.shared import _create_engine, _database_url
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    engine = _create_engine(_database_url(tmp_path))
+    runs = RunsRepoDB(engine)
+    base = datetime.now(timezone.utc) - timedelta(hours=1)
+    # queued through the DB worker: rows only, no run dirs
+    rows = [("q0", "p1", "done", 0), ("q1", "p1", "done", 1), ("q2", "p1", "done", 2), ("q3", "p1", "done", 3),
+            ("ancient", "p2", "failed", -10 * 24 * 60), ("waiting", "p2", "queued", -10 * 24 * 60)]
+    for run_id, plan_id, status, minutes in rows:
+        runs.create(run_id, plan_id)
+        if status != "queued":
+            runs.set_completed(run_id, status)
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE runs SET created_at = :t WHERE id = :id"),
+                         {"t": base + timedelta(minutes=minutes), "id": run_id})
+    _mk_run(tmp_path, "p1", "q0")  # q0 still has its dir, so the file pass decides for it
+
+    report = compact_runs(tmp_path, _policy(keep_last=2, max_age_days=1))
+    left = {r["id"] for r in runs.list_finished()} | {r["id"] for r in runs.list_by_status("queued")}
+    assert left == {"q0", "q2", "q3", "waiting"} and report["db_rows_deleted"] == 2
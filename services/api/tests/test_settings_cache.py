@@ -0,0 +1,69 @@
+# services/api/tests/test_settings_cache.py
+import json
+import os
+import time
+from pathlib import Path
+
+from services.api.core import settings as cfg
+from services.api.core import shared
+
+
+def _bump_mtime(p: Path) -> None:
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def test_repeated_reads_parse_once(monkeypatch, tmp_path: Path):
+    monkeypatch.setenv("REPO_ROOT", str(tmp_path))
+    shared._reset_repo_root_cache_for_tests()
+    cfg.save_settings(tmp_path, {"auth_enabled": True})
+    before = cfg.settings_cache.loads
+    for _ in range(100):
+        assert shared._auth_enabled() is True
+        shared._planner_defaults()
+        shared._github_cfg()
+    assert cfg.settings_cache.loads == before
+
+
+def test_update_settings_invalidates_and_notifies(tmp_path: Path):
+    seen = []
+    unsubscribe = cfg.settings_cache.subscribe(lambda d, c: seen.append((d, c["planner_mode"])))
+    try:
+        cfg.get_settings(tmp_path)
+        cfg.update_settings(tmp_path, {"planner_mode": "multi"})
+        assert cfg.get_settings(tmp_path)["planner_mode"] == "multi"
+        assert seen == [(tmp_path, "multi")]
+    finally:
+        unsubscribe()
+
+
+def test_external_edit_is_picked_up(tmp_path: Path):
+    cfg.save_settings(tmp_path, {"github_repo": "a/b"})
+    assert cfg.get_settings(tmp_path)["github_repo"] == "a/b"
+    p = tmp_path / "settings.json"
+    p.write_text(json.dumps({"github_repo": "c/d"}), encoding="utf-8")
+    _bump_mtime(p)
+    assert cfg.get_settings(tmp_path)["github_repo"] == "c/d"
+
+
+def test_load_settings_returns_mutable_copy(tmp_path: Path):
+    out = cfg.load_settings(tmp_path)
+    out["planner_mode"] = "multi"
+    assert cfg.get_settings(tmp_path)["planner_mode"] == "single"
+
+
+def test_watcher_refreshes_in_background(tmp_path: Path):
+    cache = cfg.SettingsCache()
+    p = tmp_path / "settings.json"
+    p.write_text(json.dumps({"auth_enabled": False}), encoding="utf-8")
+    assert cache.get(tmp_path)["auth_enabled"] is False
+    cache.start_watch(0.01)
+    try:
+        p.write_text(json.dumps({"auth_enabled": True}), encoding="utf-8")
+        _bump_mtime(p)
+        deadline = time.time() + 2
+        while cache.get(tmp_path)["auth_enabled"] is not True and time.time() < deadline:
+            time.sleep(0.01)
+        assert cache.get(tmp_path)["auth_enabled"] is True
+    finally:
+        cache.stop_watch()
@@ -19,10 +19,11 @@ from services.api.integrations.github import GH
 from services.api.core.shared import (
     _repo_root, _database_url, _create_engine, _render_markdown,
     _read_text_if_exists, _sort_key, _auth_enabled, _load_index,
-    _new_id, _save_index, AUTH_MODE
+    _new_id, _save_index, _locked_index, AUTH_MODE
 )
 from queue import Queue, Empty
 from services.api.core.repos import PlansRepoDB, ensure_plans_schema, RunsRepoDB
+from services.api.runs.lease import run_owner
 from services.api.auth.routes import get_current_user  # reuse existing dependency
 try:
     from services.api.storage import plan_store  # real store if present
@@ -49,7 +50,7 @@ try:
     from services.api.llm import get_llm_from_env, MockLLM
 except Exception:  # pragma: no cover
     # Runtime import safety; tests still pass without the module
-    get_llm_from_env = lambda: None  # type: ignore
+    get_llm_from_env = lambda **_: None  # type: ignore
     PlanArtifacts = None  # type: ignore
 
 router = APIRouter(tags=["ui"])
@@ -192,7 +193,7 @@ def _ensure_worker_thread():
                 manifest = _create_running_manifest(repo_root, plan_id, run_id)
                 rel_log = manifest["log_path"]
                 rel_manifest = rel_log.replace("execution.log", "manifest.json")
-                runs.set_running(run_id, rel_manifest, rel_log)
+                runs.set_running(run_id, rel_manifest, rel_log, owner=run_owner())
 
                 # If cancellation already happened, stop now
                 curr = runs.get(run_id)
@@ -691,7 +692,7 @@ def ui_artifact(path: str):
     if _auth_enabled() and plan.get("owner") != user.get("id"):
         raise HTTPException(status_code=403, detail="Not authorized to execute this plan")
     run_id = _new_id("run")
-    RunsRepoDB(engine).create(run_id, plan_id)
+    RunsRepoDB(engine).create(run_id, plan_id, owner=run_owner())
     _RUN_QUEUE.put((plan_id, run_id))
     return JSONResponse({"run_id": run_id}, status_code=202)
 
@@ -1100,7 +1101,7 @@ def enqueue_run(plan_id: str, user: Dict[str, Any] = Depends(get_current_user)):
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
     run_id = _new_id("run")
-    RunsRepoDB(engine).create(run_id, plan_id)
+    RunsRepoDB(engine).create(run_id, plan_id, owner=run_owner())
     _RUN_QUEUE.put((plan_id, run_id))
     return RunsRepoDB(engine).get(run_id)  # queued
 
@@ -1387,10 +1388,10 @@ def create_request(req: RequestIn, user: Dict[str, Any] = Depends(get_current_us
 
 
     if use_multi:
-        outs = multi_agent_plan(req.text)
+        outs = multi_agent_plan(req.text)  # agents run concurrently; a failed ADR agent leaves adr_md out
         prd_md = outs["prd_md"]
         openapi_yaml = outs["openapi_yaml"]
-        adr_md = outs["adr_md"]
+        adr_md = outs.get("adr_md")
         # ensure artifact paths (ADR new)
         artifacts.setdefault("adr", f"docs/adrs/ADR-{ts}-{slug}.md")
     else:
@@ -1451,7 +1452,7 @@ def create_request(req: RequestIn, user: Dict[str, Any] = Depends(get_current_us
 
     # --- Optional LLM override (env-driven) ---
     provider = os.getenv("LLM_PROVIDER", "").strip().lower()
-    llm_client = get_llm_from_env()
+    llm_client = get_llm_from_env(step="plan_generation")
 
     # Force the mock if explicitly requested
     if llm_client is None and provider in {"mock", "test"}:
@@ -1536,7 +1537,6 @@ def create_request(req: RequestIn, user: Dict[str, Any] = Depends(get_current_us
     plans.create(entry)
 
     # Keep filesystem index.json in sync (until /plans fully migrates to DB)
-    idx = _load_index(repo_root)
     # include a created_at compatible with the existing index format
     entry_for_index = {
         "id": plan_id,
@@ -1547,8 +1547,8 @@ def create_request(req: RequestIn, user: Dict[str, Any] = Depends(get_current_us
         "created_at": ts,
         "updated_at": ts,
     }
-    idx[plan_id] = entry_for_index
-    _save_index(repo_root, idx)
+    with _locked_index(repo_root) as idx:
+        idx[plan_id] = entry_for_index
     
     # NOTE: do not write docs/plans/{plan_id}/plan.json — DB is the source of truth
 
@@ -1585,7 +1585,7 @@ def execute_plan_ui(request: Request, plan_id: str, user: Dict[str, Any] = Depen
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
     run_id = _new_id("run")
-    RunsRepoDB(engine).create(run_id, plan_id)
+    RunsRepoDB(engine).create(run_id, plan_id, owner=run_owner())
     _RUN_QUEUE.put((plan_id, run_id))
     run = RunsRepoDB(engine).get(run_id)
     ctx = {
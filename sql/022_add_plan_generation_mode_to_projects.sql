@@ -0,0 +1,10 @@
+-- Migration: Add plan_generation_mode field to projects table
+-- Selects how implementation plans are generated for the project:
+--   'single'    one LLM call returns PRD, OpenAPI and every plan as one JSON object
+--   'sectioned' an outline call, then PRD, OpenAPI and each plan's features in parallel calls
+-- NULL uses the server default (LLM_PLAN_MODE environment variable).
+
+-- Note: SQLite doesn't support COMMENT ON COLUMN, so the comment is in the migration file
+
+ALTER TABLE projects 
+ADD COLUMN plan_generation_mode TEXT;
@@ -0,0 +1,12 @@
+-- Migration: Add lease columns to runs table
+-- owner:        "host:pid" of the process executing (or holding the queued) run
+-- heartbeat_at: refreshed by that process while it is alive; the startup
+--               reconciler only reclaims runs whose heartbeat is older than
+--               RUN_LEASE_SECONDS. NULL (rows from before this migration)
+--               counts as expired.
+
+ALTER TABLE runs
+ADD COLUMN owner TEXT;
+
+ALTER TABLE runs
+ADD COLUMN heartbeat_at TIMESTAMP;